@@ -17,7 +17,8 @@ from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.schemas.chunks import ChunkMetadata
-from api.schemas.core.elasticsearch import ElasticsearchChunk, ElasticsearchIndexLanguage
+from api.schemas.core.elasticsearch import ElasticsearchIndexLanguage
+from api.schemas.core.vectorstore import VectorStoreChunk
 from api.sql.models import Collection as CollectionTable
 from api.sql.models import Document as DocumentTable
 
@@ -119,7 +120,7 @@ class ElasticSearchSource:
             created = hit["_source"]["metadata"].get("document_created", hit["_source"]["metadata"].get("document_created_at", int(time.time())))
 
             chunks.append(
-                ElasticsearchChunk(
+                VectorStoreChunk(
                     id=hit["_source"].get("id", 0),
                     collection_id=collection_id,
                     document_id=hit["_source"]["metadata"]["document_id"],
@@ -153,7 +154,7 @@ class ElasticSearchDestination:
             vector_size=vector_size,
         )
 
-    async def upsert_chunks(self, chunks: list[ElasticsearchChunk]):
+    async def upsert_chunks(self, chunks: list[VectorStoreChunk]):
         _es = ElasticsearchVectorStore(index_name=self.index_name)
         await _es.upsert(client=self.client, chunks=chunks)
 
@@ -212,7 +213,7 @@ class ElasticSearchDestination:
             size=limit,
             from_=offset,
         )
-        chunks = [ElasticsearchChunk(**hit["_source"]) for hit in results["hits"]["hits"]]
+        chunks = [VectorStoreChunk(**hit["_source"]) for hit in results["hits"]["hits"]]
 
         chunks = sorted(chunks, key=lambda chunk: chunk.id)
         return chunks
@@ -267,7 +268,7 @@ async def core_migration_logic(
                         "document_created", hit["_source"]["metadata"].get("document_created_at", int(time.time()))
                     )
                     chunks.append(
-                        ElasticsearchChunk(
+                        VectorStoreChunk(
                             id=hit["_source"].get("id", 0),
                             collection_id=hit["_source"]["metadata"]["collection_id"],
                             document_id=hit["_source"]["metadata"]["document_id"],
@@ -0,0 +1,45 @@
+"""add_document_ingestion_status
+
+Revision ID: 7d3e5f1a9b2c
+Revises: c206a2bfefe9
+Create Date: 2026-10-16 10:00:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3e5f1a9b2c'
+down_revision: Union[str, None] = 'c206a2bfefe9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+document_status = sa.Enum('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', name='documentstatus')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    document_status.create(op.get_bind(), checkfirst=True)
+
+    # existing documents have been ingested synchronously
+    op.add_column('document', sa.Column('status', document_status, server_default='COMPLETED', nullable=False))
+    op.add_column('document', sa.Column('progress', sa.Integer(), server_default='100', nullable=False))
+    op.add_column('document', sa.Column('error', sa.String(), nullable=True))
+    op.add_column('document', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('document', sa.Column('updated', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.create_index(op.f('ix_document_status'), 'document', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_document_status'), table_name='document')
+    op.drop_column('document', 'updated')
+    op.drop_column('document', 'attempts')
+    op.drop_column('document', 'error')
+    op.drop_column('document', 'progress')
+    op.drop_column('document', 'status')
+
+    document_status.drop(op.get_bind(), checkfirst=True)
@@ -1,16 +1,14 @@
 from importlib import import_module
 import logging
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 import sentry_sdk
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import JSONResponse
 
 from api.endpoints.monitoring import setup_prometheus
-from api.schemas.core.context import RequestContext
-from api.schemas.usage import Usage
 from api.utils.configuration import Configuration, get_configuration
-from api.utils.context import request_context
+from api.utils.hooks_decorator import HooksMiddleware
 from api.utils.lifespan import lifespan
 from api.utils.variables import RouterName
 
@@ -55,11 +53,7 @@ def _setup_sentry(configuration: Configuration) -> None:
 
 def _setup_middleware(app: FastAPI, configuration: Configuration) -> None:
     app.add_middleware(SessionMiddleware, secret_key=configuration.settings.session_secret_key)
-
-    @app.middleware("http")
-    async def set_request_context(request: Request, call_next):
-        request_context.set(RequestContext(method=request.method, endpoint=request.url.path, usage=Usage()))
-        return await call_next(request)
+    app.add_middleware(HooksMiddleware)
 
 
 def _register_routers(app: FastAPI, configuration: Configuration) -> None:
@@ -0,0 +1,3 @@
+from ._httpclientpool import HttpClientPool, get_http_client
+
+__all__ = ["HttpClientPool", "get_http_client"]
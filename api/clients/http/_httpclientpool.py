@@ -0,0 +1,116 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+from api.utils.context import global_context
+from api.utils.variables import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientPool:
+    """
+    Long-lived HTTP clients shared by the model providers and the parser clients. One client is kept per upstream origin (scheme, host and port),
+    so consecutive requests to the same provider reuse keep-alive connections instead of paying a new TCP (and TLS) handshake each time.
+
+    Clients are created lazily on first use and closed by the lifespan on shutdown.
+    """
+
+    def __init__(self, max_connections: int, max_keepalive_connections: int, keepalive_expiry: float, http2: bool = False) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and self._is_http2_available()
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def _is_http2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning(
+                "HTTP/2 is enabled for provider clients but `h2` package is not installed (pip install httpx[http2]), fallback to HTTP/1.1."
+            )
+            return False
+
+        return True
+
+    @staticmethod
+    def get_key(url: str) -> str:
+        """
+        Get the pool key of an URL, the upstream origin of the URL.
+
+        Args:
+            url(str): The URL to get the key of.
+
+        Returns:
+            str: The origin of the URL (eg. "https://api.openai.com:443").
+        """
+        url = urlsplit(url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+
+        return f"{url.scheme}://{url.hostname}:{port}"
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """
+        Get the shared client of the upstream origin of the URL, create it if it does not exist yet.
+
+        Args:
+            url(str): The URL of the upstream (base URL of the provider or full URL of the request).
+
+        Returns:
+            httpx.AsyncClient: The shared client. Do not close it, its lifecycle is owned by the pool.
+        """
+        key = self.get_key(url=url)
+        client = self.clients.get(key)
+
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                http2=self.http2,
+                timeout=DEFAULT_TIMEOUT,
+                # clients are shared between users, never store cookies sent by upstreams
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            )
+            self.clients[key] = client
+            logger.debug(f"HTTP client created for {key} (http2: {self.http2}).")
+
+        return client
+
+    async def close(self) -> None:
+        """
+        Close all clients of the pool. Run in lifespan context.
+        """
+        clients, self.clients = self.clients, {}
+        for key, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception:
+                logger.warning(f"Failed to close HTTP client for {key}.", exc_info=True)
+
+
+@asynccontextmanager
+async def get_http_client(url: str) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Get an HTTP client to request the given URL. If the HTTP client pool is set up (API lifespan), the shared client of the
+    upstream origin is used, otherwise (scripts, Celery workers, tests) a short-lived client is created and closed on exit.
+
+    Args:
+        url(str): The URL of the upstream.
+
+    Returns:
+        httpx.AsyncClient: The HTTP client.
+    """
+    pool: HttpClientPool | None = getattr(global_context, "http_client_pool", None)
+
+    if pool is not None:
+        yield pool.get_client(url=url)
+    else:
+        async with httpx.AsyncClient() as client:
+            yield client
@@ -1,5 +1,6 @@
 from abc import ABC
 import ast
+import asyncio
 import importlib
 from json import JSONDecodeError, dumps, loads
 import logging
@@ -9,8 +10,10 @@ from urllib.parse import urljoin
 
 from fastapi import HTTPException
 import httpx
+import orjson
 from redis.asyncio import Redis as AsyncRedis
 
+from api.clients.http import get_http_client
 from api.schemas.admin.providers import ProviderType
 from api.schemas.audio import AudioTranscription, CreateAudioTranscription
 from api.schemas.chat import ChatCompletionChunk, CreateChatCompletion
@@ -19,12 +22,17 @@ from api.schemas.rerank import CreateRerank, Reranks
 from api.schemas.usage import Usage
 from api.utils.carbon import get_carbon_footprint
 from api.utils.context import generate_request_id, global_context, request_context
+from api.utils.embeddings import encode_embedding
 from api.utils.exceptions import ModelIsTooBusyException, RequestFormatFailedException, ResponseFormatFailedException
 from api.utils.redis import redis_retry, safe_redis_reset
+from api.utils.sketch import add_to_sketch
 from api.utils.variables import PREFIX__REDIS_METRIC_GAUGE, PREFIX__REDIS_METRIC_TIMESERIE, REDIS__TIMESERIE_RETENTION_SECONDS, EndpointRoute
 
 logger = logging.getLogger(__name__)
 
+# keep a reference to the metrics writes running in background
+_background_tasks: set[asyncio.Task] = set()
+
 
 class BaseModelProvider(ABC):
     ENDPOINT_TABLE: ProviderEndpoints = ProviderEndpoints()
@@ -51,6 +59,9 @@ class BaseModelProvider(ABC):
         self.id: int | None = None  # set by the ModelRegistry when the provider is created
         self.cost_prompt_tokens: float | None = None  # set by the ModelRegistry when the provider is retrieved
         self.cost_completion_tokens: float | None = None  # set by the ModelRegistry when the provider is retrieved
+        self.max_context_length: int | None = None  # set by the ModelRegistry when the provider is retrieved
+        self.qos_metric: Metric | None = None  # set by the ModelRegistry when the provider is retrieved
+        self.qos_limit: float | None = None  # set by the ModelRegistry when the provider is retrieved
 
         self.headers = {"Authorization": f"Bearer {self.key}"} if self.key else {}
 
@@ -84,7 +95,7 @@ class BaseModelProvider(ABC):
 
         url = urljoin(base=self.url, url=self.ENDPOINT_TABLE.embeddings.lstrip("/"))
 
-        async with httpx.AsyncClient() as client:
+        async with get_http_client(url=self.url) as client:
             response = await client.post(url=url, headers=self.headers, json={"model": self.model_name, "input": "hello world"}, timeout=self.timeout)
             assert response.status_code == 200, f"Model is not reachable ({response.status_code} - {response.text})."
 
@@ -93,14 +104,21 @@ class BaseModelProvider(ABC):
 
         return vector_size
 
-    def _get_usage(self, request_content: RequestContent, response_data: dict | list[dict], request_latency: float | None = 0.0) -> Usage | None:
+    def _get_usage(
+        self,
+        request_content: RequestContent,
+        response_data: dict | None = None,
+        request_latency: float | None = 0.0,
+        completion_tokens: int | None = None,
+    ) -> Usage | None:
         """
         Get usage data from request and response.
 
         Args:
             request_content(RequestContent): The request content.
-            response_data(dict | list[dict]): The data of the response.
+            response_data(dict | None): The data of the response, to count the completion tokens.
             request_latency(float): The request latency in seconds.
+            completion_tokens(int | None): The completion tokens already counted (e.g. while streaming), if provided the response data is not used.
 
         Returns:
             Usage | None: The usage data.
@@ -114,7 +132,8 @@ class BaseModelProvider(ABC):
         if tokenizer and request_content.endpoint in tokenizer.USAGE_ENDPOINTS:
             try:
                 prompt_tokens = tokenizer.get_prompt_tokens(endpoint=request_content.endpoint, body=request_content.body)
-                completion_tokens = tokenizer.get_completion_tokens(endpoint=request_content.endpoint, response_data=response_data)
+                if completion_tokens is None:
+                    completion_tokens = tokenizer.get_completion_tokens(endpoint=request_content.endpoint, response_data=response_data)
                 total_tokens = prompt_tokens + completion_tokens
 
                 carbon_footprint = get_carbon_footprint(
@@ -179,7 +198,8 @@ class BaseModelProvider(ABC):
 
         content_type = response.headers.get("Content-Type", "")
         if content_type == "application/json":
-            response_data = response.json()
+            # parsed once, the id, model and usage are patched in place and the response is serialized once
+            response_data = orjson.loads(response.content)
 
             usage = self._get_usage(request_content=request_content, response_data=response_data, request_latency=request_latency)
 
@@ -208,63 +228,95 @@ class BaseModelProvider(ABC):
                     ).model_dump()
 
                 else:
+                    if request_content.endpoint == EndpointRoute.EMBEDDINGS and request_content.body.get("encoding_format") == "base64":
+                        # pack locally the embeddings of the providers not supporting base64 encoding
+                        for item in response_data.get("data", []):
+                            if isinstance(item.get("embedding"), list):
+                                item["embedding"] = encode_embedding(embedding=item["embedding"])
+
                     response_data.update(additional_data)
 
             except Exception as e:
                 logger.error(f"Failed to build response from {self.model_name}: {e}.", exc_info=True)
                 raise ResponseFormatFailedException()
 
-            response = httpx.Response(status_code=response.status_code, content=dumps(response_data))
+            response = httpx.Response(status_code=response.status_code, content=orjson.dumps(response_data), headers={"Content-Type": "application/json"})  # fmt: off
 
         return response
 
-    @staticmethod
-    async def _ensure_timeseries_exists(redis_client: AsyncRedis, key: str) -> None:
-        """
-        Ensure a time series exists with proper retention configuration.
-
-        Args:
-            redis_client(AsyncRedis): The redis client to use.
-            key(str): The time series key to create.
-        """
-        try:
-            await redis_client.ts().info(key)
-        except Exception:
-            try:
-                await redis_client.ts().create(key, retention_msecs=REDIS__TIMESERIE_RETENTION_SECONDS * 1000, duplicate_policy="LAST")
-            except Exception:
-                pass
-
-    async def _log_performance_metric(self, redis_client: AsyncRedis, ttft: int | None, latency: int | None) -> None:
+    def _log_performance_metric(self, redis_client: AsyncRedis, ttft: int | None, latency: int | None, inflight_key: str | None = None) -> None:
         """
-        Log performance metrics in redis.
+        Log performance metrics in redis and release the inflight request. All the metrics are written in a single pipeline,
+        in background to not delay the response.
 
         Args:
             redis_client(AsyncRedis): The redis client to use for the request.
             ttft(int | None): The time to first token in milliseconds (ms).
             latency(int | None): The latency in milliseconds (ms).
+            inflight_key(str | None): The inflight requests gauge to decrement, if the request has been counted.
         """
         request_context.get().ttft = ttft
         request_context.get().latency = latency
 
+        pipeline = redis_client.pipeline(transaction=False)
+        if inflight_key is not None:
+            pipeline.decr(inflight_key)
+
+        # Use milliseconds timestamp to avoid collisions
+        timestamp = int(time.time() * 1000)
+        for metric, value in ((Metric.TTFT, ttft), (Metric.LATENCY, latency)):
+            if value is None:
+                continue
+            # the time series is created with its retention by the first sample, no need to check if it exists
+            key = f"{PREFIX__REDIS_METRIC_TIMESERIE}:{metric.value}:{self.id}"
+            pipeline.ts().add(key=key, timestamp=timestamp, value=value, retention_msecs=REDIS__TIMESERIE_RETENTION_SECONDS * 1000, duplicate_policy="LAST")  # fmt: off
+            # quantile sketches read by the least busy load balancing strategy
+            add_to_sketch(pipeline, metric=metric.value, provider_id=self.id, value=value)
+
+        task = asyncio.create_task(self._write_performance_metric(redis_client=redis_client, pipeline=pipeline, inflight_key=inflight_key))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def _write_performance_metric(self, redis_client: AsyncRedis, pipeline, inflight_key: str | None) -> None:
         try:
-            if ttft is not None:
-                key = f"{PREFIX__REDIS_METRIC_TIMESERIE}:{Metric.TTFT.value}:{self.id}"
-                await self._ensure_timeseries_exists(redis_client, key)
-                await redis_client.ts().add(key=key, timestamp=int(time.time() * 1000), value=ttft)
+            # a non transactional pipeline runs all its commands, the errors are returned in the results
+            results = await pipeline.execute(raise_on_error=False)
         except Exception:
-            logger.error(f"Failed to log request metrics (TTFT) in redis (id: {self.id})", exc_info=True)
+            # the commands may have been applied before the error, the decrement is not replayed to not release the
+            # inflight request twice
+            logger.error(f"Failed to log request metrics in redis (id: {self.id})", exc_info=True)
             await safe_redis_reset(redis_client)
+            results = []
 
-        try:
-            if latency is not None:
-                key = f"{PREFIX__REDIS_METRIC_TIMESERIE}:{Metric.LATENCY.value}:{self.id}"
-                await self._ensure_timeseries_exists(redis_client, key)
-                # Use milliseconds timestamp to avoid collisions
-                await redis_client.ts().add(key=key, timestamp=int(time.time() * 1000), value=latency)
-        except Exception:
-            logger.error(f"Failed to log request metrics (latency) in redis (id: {self.id})", exc_info=True)
-            await safe_redis_reset(redis_client)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.error(f"Failed to log request metrics in redis (id: {self.id}): {errors[0]}")
+
+        # a missed decrement would block the provider by its QoS policy, the decrement is the first command
+        if inflight_key is not None and results and isinstance(results[0], Exception):
+            try:
+                await redis_retry(redis_client.decr, name=inflight_key, max_retries=2)
+            except Exception:
+                logger.error("Unable to decrement redis requests inflight key")
+
+        if inflight_key is not None and global_context.admission_queue is not None:
+            await global_context.admission_queue.notify(provider_id=self.id)
+
+    def _use_inflight_reservation(self) -> bool:
+        """
+        Use the inflight request slot reserved for this provider when the request has been admitted by the admission
+        queue, so the request is not counted twice. The slot is released as any inflight request once forwarded.
+
+        Returns:
+            bool: True if a reserved slot has been used, False if the request must be counted.
+        """
+        reservations = request_context.get().inflight_reservations
+        if self.id not in reservations:
+            return False
+
+        reservations.remove(self.id)
+
+        return True
 
     @staticmethod
     def _elapsed_ms(start_time: float) -> int:
@@ -286,10 +338,12 @@ class BaseModelProvider(ABC):
         request_content = self._format_request(request_content=request_content)
 
         inflight_key = f"{PREFIX__REDIS_METRIC_GAUGE}:{Metric.INFLIGHT.value}:{self.id}"
+        latency = None
         try:
-            await redis_retry(redis_client.incr, name=inflight_key, max_retries=2)
+            if not self._use_inflight_reservation():
+                await redis_retry(redis_client.incr, name=inflight_key, max_retries=2)
 
-            async with httpx.AsyncClient(timeout=self.timeout) as async_client:
+            async with get_http_client(url=self.url) as async_client:
                 try:
                     start_time = time.perf_counter()
                     response = await async_client.request(
@@ -299,6 +353,7 @@ class BaseModelProvider(ABC):
                         json=request_content.body,
                         files=request_content.files,
                         data=request_content.form,
+                        timeout=self.timeout,
                     )
                 except (
                     httpx.TimeoutException,
@@ -328,23 +383,52 @@ class BaseModelProvider(ABC):
                         logger.debug(traceback.format_exc())
                         message = response.text
                     raise HTTPException(status_code=response.status_code, detail=message)
+                latency = self._elapsed_ms(start_time=start_time)
         finally:
-            await redis_retry(redis_client.decr, name=inflight_key, max_retries=2)
+            self._log_performance_metric(redis_client=redis_client, ttft=None, latency=latency, inflight_key=inflight_key)
 
         # add additional data to the response
-        latency = self._elapsed_ms(start_time=start_time)
         response = self._format_response(request_content=request_content, response=response, request_latency=latency)
-        await self._log_performance_metric(redis_client=redis_client, ttft=None, latency=latency)
 
         return response
 
-    def _get_extra_stream_chunk(self, request_content: RequestContent, buffer: list[dict], latency: float | None = None) -> dict | None:
+    def _count_chunk_completion_tokens(self, request_content: RequestContent, chunk: dict) -> int:
+        """
+        Count the completion tokens of a chunk of a streamed response, to not keep the chunks until the end of the stream.
+
+        Args:
+            request_content (RequestContent): The request content.
+            chunk (dict): The parsed chunk.
+
+        Returns:
+            int: The completion tokens of the chunk.
+        """
+        tokenizer = getattr(global_context, "tokenizer", None)
+        if not tokenizer or request_content.endpoint not in tokenizer.USAGE_ENDPOINTS:
+            return 0
+
+        try:
+            return tokenizer.get_chunk_completion_tokens(endpoint=request_content.endpoint, chunk=chunk)
+        except Exception as e:
+            logger.exception(msg=f"Failed to count completion tokens for endpoint {request_content.endpoint}: {e}.")
+            return 0
+
+    def _get_extra_stream_chunk(
+        self,
+        request_content: RequestContent,
+        first_chunk_id: str | None,
+        last_chunk: dict | None,
+        completion_tokens: int,
+        latency: float | None = None,
+    ) -> dict | None:
         """
         Get the extra chunk for a streaming response with usage and additional data.
 
         Args:
             request_content (RequestContent): The request content.
-            buffer (list[dict]): List of response parsed chunks.
+            first_chunk_id (str | None): The ID of the first parsed chunk of the response.
+            last_chunk (dict | None): The last parsed chunk of the response.
+            completion_tokens (int): The completion tokens counted over the parsed chunks.
             latency (float | None): The latency in milliseconds.
 
         Returns:
@@ -353,24 +437,49 @@ class BaseModelProvider(ABC):
         if request_content.endpoint != EndpointRoute.CHAT_COMPLETIONS:
             return
 
-        if len(buffer) == 0:
+        if last_chunk is None:
             return
 
-        usage = self._get_usage(request_content=request_content, response_data=buffer, request_latency=latency)
+        usage = self._get_usage(request_content=request_content, request_latency=latency, completion_tokens=completion_tokens)
         if request_context.get().id is None:
-            request_id = buffer[0].get("id", generate_request_id())
+            request_id = first_chunk_id or generate_request_id()
             request_context.get().id = request_id
         else:
             request_id = request_context.get().id
 
         additional_data = request_content.additional_data
         additional_data.update({"model": self.model_name, "id": request_id, "usage": usage.model_dump()})
-        extra_chunk = buffer[-1].copy()
+        extra_chunk = last_chunk.copy()
         extra_chunk["choices"] = []
         extra_chunk.update(additional_data)
 
         return extra_chunk
 
+    @staticmethod
+    async def _aiter_stream_events(response: httpx.Response):
+        """
+        Split a streamed response into server-sent events, without decoding them. Yield the complete events of each
+        received bytes chunk together, so they are forwarded in a single write.
+
+        Args:
+            response (httpx.Response): The streamed response.
+
+        Yields:
+            list[bytes]: The non-empty events, without their trailing blank line.
+        """
+        buffer = b""
+        async for data in response.aiter_bytes():
+            buffer += data
+            if b"\r" in buffer:
+                buffer = buffer.replace(b"\r\n", b"\n")
+            *events, buffer = buffer.split(b"\n\n")
+            events = [event for event in map(bytes.strip, events) if event]
+            if events:
+                yield events
+
+        if buffer.strip():
+            yield [buffer.strip()]
+
     async def forward_stream(self, request_content: RequestContent, redis_client: AsyncRedis):
         """
         Forward a stream request to a provider model and add model name to the response. Optionally, add additional data to the response.
@@ -384,10 +493,13 @@ class BaseModelProvider(ABC):
 
         inflight_key = f"{PREFIX__REDIS_METRIC_GAUGE}:{Metric.INFLIGHT.value}:{self.id}"
         inflight_incremented = False
+        ttft: int | None = None
+        latency: int | None = None
 
-        async with httpx.AsyncClient(timeout=self.timeout) as async_client:
+        async with get_http_client(url=self.url) as async_client:
             try:
-                await redis_retry(redis_client.incr, name=inflight_key, max_retries=2)
+                if not self._use_inflight_reservation():
+                    await redis_retry(redis_client.incr, name=inflight_key, max_retries=2)
                 inflight_incremented = True
             except Exception:
                 logger.error("Unable to increment redis requests inflight key")
@@ -400,51 +512,51 @@ class BaseModelProvider(ABC):
                     json=request_content.body,
                     files=request_content.files,
                     data=request_content.form,
+                    timeout=self.timeout,
                 ) as response:
-                    buffer: list[dict] = []
+                    # only keep what the extra chunk needs, the completion tokens are counted chunk by chunk
+                    first_chunk_id: str | None = None
+                    last_chunk: dict | None = None
+                    completion_tokens: int = 0
                     start_time = time.perf_counter()
-                    ttft: int | None = None
-                    latency: int | None = None
                     done_chunk: bool = False
 
-                    async for chunk in response.aiter_lines():
-                        # error case
-                        if response.status_code // 100 != 2:
-                            done_chunk = True
-                            yield chunk, response.status_code
-                            break
-
-                        # normal case
-                        if chunk.strip() == "":
-                            continue
-
-                        parsed_chunk = ChatCompletionChunk.parse_chunk(chunk=chunk)
-                        if parsed_chunk != "[DONE]":
-                            if parsed_chunk is not None:  # exclude empty or malformed chunks to the buffer (for usage computation)
-                                buffer.append(parsed_chunk)
+                    # error case
+                    if response.status_code // 100 != 2:
+                        done_chunk = True
+                        yield await response.aread(), response.status_code
+                        return
+
+                    # normal case: events are forwarded as received, they are only parsed to compute metrics and usage
+                    async for events in self._aiter_stream_events(response=response):
+                        output = []
+                        for event in events:
+                            parsed_chunk = ChatCompletionChunk.parse_chunk(chunk=event)
+                            if parsed_chunk == "[DONE]":  # end of the stream
+                                done_chunk = True
+                                latency = self._elapsed_ms(start_time=start_time)
+                                extra_chunk = self._get_extra_stream_chunk(request_content=request_content, first_chunk_id=first_chunk_id, last_chunk=last_chunk, completion_tokens=completion_tokens, latency=latency)  # fmt: off
+                                if extra_chunk is not None:
+                                    output.append(b"data: " + orjson.dumps(extra_chunk))
+
+                            elif parsed_chunk is not None:  # exclude empty or malformed chunks (for usage computation)
+                                if last_chunk is None:
+                                    first_chunk_id = parsed_chunk.get("id")
+                                last_chunk = parsed_chunk
+                                completion_tokens += self._count_chunk_completion_tokens(request_content=request_content, chunk=parsed_chunk)
                                 if ttft is None and ChatCompletionChunk.extract_chunk_content(chunk=parsed_chunk):
                                     ttft = self._elapsed_ms(start_time=start_time)
 
-                            yield chunk + "\n\n", response.status_code
+                            output.append(event)
 
-                        # end of the stream
-                        else:
-                            done_chunk = True
-                            latency = self._elapsed_ms(start_time=start_time)
-                            extra_chunk = self._get_extra_stream_chunk(request_content=request_content, buffer=buffer, latency=latency)
-                            if extra_chunk is not None:
-                                yield f"data: {dumps(extra_chunk)}\n\n", response.status_code
-
-                            yield chunk + "\n\n", response.status_code
+                        yield b"\n\n".join(output) + b"\n\n", response.status_code
 
                 # edge case: stream ended without a [DONE] chunk
                 if not done_chunk:
                     latency = self._elapsed_ms(start_time=start_time)
-                    extra_chunk = self._get_extra_stream_chunk(request_content=request_content, buffer=buffer, latency=latency)
+                    extra_chunk = self._get_extra_stream_chunk(request_content=request_content, first_chunk_id=first_chunk_id, last_chunk=last_chunk, completion_tokens=completion_tokens, latency=latency)  # fmt: off
                     if extra_chunk is not None:
-                        yield f"data: {dumps(extra_chunk)}\n\n", response.status_code
-
-                await self._log_performance_metric(redis_client=redis_client, ttft=ttft, latency=latency)
+                        yield b"data: " + orjson.dumps(extra_chunk) + b"\n\n", response.status_code
 
             except (
                 httpx.TimeoutException,
@@ -461,8 +573,4 @@ class BaseModelProvider(ABC):
                 logger.exception(msg=f"Failed to forward stream request to {self.model_name}: {e}.")
                 yield dumps({"detail": type(e).__name__}), 500
             finally:
-                if inflight_incremented:
-                    try:
-                        await redis_retry(redis_client.decr, name=inflight_key, max_retries=2)
-                    except Exception:
-                        logger.error("Unable to decrement redis requests inflight key")
+                self._log_performance_metric(redis_client=redis_client, ttft=ttft, latency=latency, inflight_key=inflight_key if inflight_incremented else None)  # fmt: off
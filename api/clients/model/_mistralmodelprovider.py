@@ -1,8 +1,7 @@
 import logging
 from urllib.parse import urljoin
 
-import httpx
-
+from api.clients.http import get_http_client
 from api.schemas.admin.providers import ProviderType
 from api.schemas.core.models import ProviderEndpoints
 from api.utils.variables import EndpointRoute
@@ -50,7 +49,7 @@ class MistralModelProvider(BaseModelProvider):
         url = urljoin(base=str(self.url), url=self.ENDPOINT_TABLE.get_endpoint(endpoint=EndpointRoute.MODELS).lstrip("/"))
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with get_http_client(url=self.url) as client:
                 response = await client.get(url=url, headers=self.headers, timeout=self.timeout)
                 response.raise_for_status()
 
@@ -1,10 +1,9 @@
-from io import BytesIO
 import json
 import re
 
 from fastapi import HTTPException, UploadFile
-import httpx
 
+from api.clients.http import get_http_client
 from api.schemas.parse import ParsedDocument, ParsedDocumentMetadata, ParsedDocumentPage
 
 from ._baseparserclient import BaseParserClient
@@ -26,7 +25,7 @@ class MarkerParserClient(BaseParserClient):
 
         Returns True on success, raises an exception for non-2xx responses or network errors.
         """
-        async with httpx.AsyncClient() as client:
+        async with get_http_client(url=self.url) as client:
             try:
                 response = await client.get(f"{self.url}/health", headers=self.headers, timeout=self.timeout)
                 response.raise_for_status()
@@ -53,12 +52,12 @@ class MarkerParserClient(BaseParserClient):
         return pages
 
     async def parse(self, file: UploadFile, force_ocr: bool | None = None, page_range: str = "") -> ParsedDocument:
-        file_content = await file.read()
+        # the upload is streamed from its spooled file by the multipart encoder, without being loaded in memory
+        await file.seek(0)
 
         data = []
-        async with httpx.AsyncClient() as client:
-            # Create a fresh BytesIO object for each request to avoid stream consumption issues
-            files = {"file": (file.filename, BytesIO(file_content), "application/pdf")}
+        async with get_http_client(url=self.url) as client:
+            files = {"file": (file.filename, file.file, "application/pdf")}
             response = await client.post(
                 url=f"{self.url}/marker/upload",
                 files=files,
@@ -42,14 +42,13 @@ async def audio_transcriptions(
         request_context=request_context,
     )
 
-    file_content = await data.file.read()
-
+    # the upload is streamed from its spooled file by the multipart encoder, without being loaded in memory
     response = await model_provider.forward_request(
         request_content=RequestContent(
             method="POST",
             model=data.model,
             endpoint=EndpointRoute.AUDIO_TRANSCRIPTIONS,
-            files={"file": (data.file.filename, file_content, data.file.content_type)},
+            files={"file": (data.file.filename, data.file.file, data.file.content_type)},
             form=data.model_dump(mode="json", exclude="file"),
         ),
         redis_client=redis_client,
@@ -4,13 +4,13 @@ from http import HTTPMethod
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import APIRouter, Depends, Request, Security
-from fastapi.responses import JSONResponse
 from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
+from api.helpers._rawjsonresponse import RawJSONResponse
 from api.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
 from api.helpers.models import ModelRegistry
 from api.schemas.chat import ChatCompletion, ChatCompletionChunk, CreateChatCompletion
@@ -20,11 +20,11 @@ from api.schemas.exception import HTTPExceptionModel
 from api.utils.dependencies import (
     get_document_manager,
     get_elasticsearch_client,
-    get_elasticsearch_vector_store,
     get_model_registry,
     get_postgres_session,
     get_redis_client,
     get_request_context,
+    get_vector_store,
 )
 from api.utils.exceptions import CollectionNotFoundException, ModelIsTooBusyException, ModelNotFoundException, WrongModelTypeException
 from api.utils.hooks_decorator import hooks
@@ -53,10 +53,10 @@ async def chat_completions(
     document_manager: DocumentManager = Depends(get_document_manager),
     postgres_session: AsyncSession = Depends(get_postgres_session),
     redis_client: AsyncRedis = Depends(get_redis_client),
-    elasticsearch_vector_store: ElasticsearchVectorStore | None = Depends(partial(get_elasticsearch_vector_store, required=False)),
+    vector_store: BaseVectorStore | None = Depends(partial(get_vector_store, required=False)),
     elasticsearch_client: AsyncElasticsearch | None = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
-) -> JSONResponse | StreamingResponseWithStatusCode:
+) -> RawJSONResponse | StreamingResponseWithStatusCode:
     """Creates a model response for the given chat conversation."""
     model_provider = await model_registry.get_model_provider(
         model=body.model,
@@ -74,7 +74,7 @@ async def chat_completions(
         redis_client=redis_client,
         request_context=request_context,
         document_manager=document_manager,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
     )
 
@@ -83,4 +83,4 @@ async def chat_completions(
         return StreamingResponseWithStatusCode(content=stream_iter, media_type="text/event-stream")
 
     response = await model_provider.forward_request(request_content=request_content, redis_client=redis_client)
-    return JSONResponse(content=response.json(), status_code=response.status_code)
+    return RawJSONResponse(content=response.content, status_code=response.status_code)
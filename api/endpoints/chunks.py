@@ -3,11 +3,11 @@ from fastapi import APIRouter, Depends, Path, Query, Request, Security
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.schemas.chunks import Chunk, Chunks
 from api.utils.context import request_context
-from api.utils.dependencies import get_document_manager, get_elasticsearch_client, get_elasticsearch_vector_store, get_postgres_session
+from api.utils.dependencies import get_document_manager, get_elasticsearch_client, get_postgres_session, get_vector_store
 from api.utils.variables import EndpointRoute, RouterName
 
 router = APIRouter(prefix="/v1", tags=[RouterName.CHUNKS.title()])
@@ -19,7 +19,7 @@ async def get_chunk(
     document: int = Path(description="The document ID"),
     chunk: int = Path(description="The chunk ID"),
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     document_manager: DocumentManager = Depends(get_document_manager),
 ) -> Chunk:
@@ -28,7 +28,7 @@ async def get_chunk(
     """
     chunks = await document_manager.get_document_chunks(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document,
         chunk_id=chunk,
@@ -45,7 +45,7 @@ async def get_chunks(
     limit: int = Query(default=10, ge=1, le=100, description="The number of documents to return"),
     offset: int = Query(default=0, description="The offset of the first document to return"),
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     document_manager: DocumentManager = Depends(get_document_manager),
 ) -> Chunks:
@@ -54,7 +54,7 @@ async def get_chunks(
     """
     data = await document_manager.get_document_chunks(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document,
         limit=limit,
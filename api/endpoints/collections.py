@@ -6,11 +6,11 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.schemas.collections import Collection, CollectionRequest, Collections, CollectionUpdateRequest, CollectionVisibility
 from api.utils.context import request_context
-from api.utils.dependencies import get_document_manager, get_elasticsearch_client, get_elasticsearch_vector_store, get_postgres_session
+from api.utils.dependencies import get_document_manager, get_elasticsearch_client, get_postgres_session, get_vector_store
 from api.utils.variables import EndpointRoute, RouterName
 
 router = APIRouter(prefix="/v1", tags=[RouterName.COLLECTIONS.title()])
@@ -95,7 +95,7 @@ async def delete_collection(
     request: Request,
     collection_id: int = Path(..., description="The collection ID"),
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     document_manager: DocumentManager = Depends(get_document_manager),
 ) -> Response:
@@ -104,7 +104,7 @@ async def delete_collection(
     """
     await document_manager.delete_collection(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         user_id=request_context.get().user_info.id,
         collection_id=collection_id,
@@ -119,6 +119,8 @@ async def update_collection(
     collection_id: int = Path(..., description="The collection ID"),
     body: CollectionUpdateRequest = Body(..., description="The collection to update."),
     postgres_session: AsyncSession = Depends(get_postgres_session),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
+    elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     document_manager: DocumentManager = Depends(get_document_manager),
 ) -> Response:
     """
@@ -126,6 +128,8 @@ async def update_collection(
     """
     await document_manager.update_collection(
         postgres_session=postgres_session,
+        vector_store=vector_store,
+        elasticsearch_client=elasticsearch_client,
         user_id=request_context.get().user_info.id,
         collection_id=collection_id,
         name=body.name,
@@ -9,20 +9,22 @@ from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
+from api.helpers._ingestionworker import IngestionWorker
 from api.helpers.models import ModelRegistry
 from api.schemas.chunks import Chunks, ChunksResponse, CreateChunks
 from api.schemas.core.context import RequestContext
-from api.schemas.documents import CreateDocumentForm, Document, DocumentResponse, Documents
+from api.schemas.documents import CreateDocumentForm, Document, DocumentResponse, Documents, DocumentStatus
 from api.utils.dependencies import (
     get_document_manager,
     get_elasticsearch_client,
-    get_elasticsearch_vector_store,
+    get_ingestion_worker,
     get_model_registry,
     get_postgres_session,
     get_redis_client,
     get_request_context,
+    get_vector_store,
 )
 from api.utils.variables import EndpointRoute, RouterName
 
@@ -34,15 +36,18 @@ async def create_document(
     request: Request,
     data: Annotated[CreateDocumentForm, Depends(CreateDocumentForm.as_form)],
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     redis_client: AsyncRedis = Depends(get_redis_client),
     model_registry: ModelRegistry = Depends(get_model_registry),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
+    ingestion_worker: IngestionWorker | None = Depends(get_ingestion_worker),
 ) -> JSONResponse:
     """
     Upload a file, parse and split it into chunks, then create a document. If no file is provided, the document will be created without content, use POST `/v1/documents/{document_id}/chunks` to fill it.
+
+    If the background ingestion is enabled, the document is returned with `pending` status once the file is stored, use GET `/v1/documents/{document_id}` to follow its ingestion.
     """
     document_id = await document_manager.create_document(
         file=data.file,
@@ -57,14 +62,16 @@ async def create_document(
         preset_separators=data.preset_separators,
         metadata=data.metadata,
         request_context=request_context,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         postgres_session=postgres_session,
         redis_client=redis_client,
         model_registry=model_registry,
+        ingestion_worker=ingestion_worker,
     )
+    status = DocumentStatus.PENDING if data.file is not None and ingestion_worker is not None else DocumentStatus.COMPLETED
 
-    return JSONResponse(content=DocumentResponse(id=document_id).model_dump(), status_code=201)
+    return JSONResponse(content=DocumentResponse(id=document_id, status=status).model_dump(), status_code=201)
 
 
 @router.get(path=EndpointRoute.DOCUMENTS + "/{document_id}", dependencies=[Security(dependency=AccessController())], status_code=200, response_model=Document)  # fmt: off
@@ -72,17 +79,17 @@ async def get_document(
     request: Request,
     document_id: Annotated[int, Path(ge=0, description="The document ID")],
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
 ) -> JSONResponse:
     """
-    Get a document by ID.
+    Get a document by ID, with its ingestion status, progress and failure reason.
     """
     documents = await document_manager.get_documents(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document_id,
         user_id=request_context.get().user_info.id,
@@ -101,7 +108,7 @@ async def get_documents(
     order_by: Literal["id", "name", "created"] = Query(default="id", description="The order by field to sort the documents by."),
     order_direction: Literal["asc", "desc"] = Query(default="asc", description="The direction to order the documents by."),
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
@@ -111,7 +118,7 @@ async def get_documents(
     """
     data = await document_manager.get_documents(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         collection_id=collection_id,
         document_name=name,
@@ -130,7 +137,7 @@ async def delete_document(
     request: Request,
     document_id: Annotated[int, Path(gt=0, description="The document ID")],
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
@@ -140,7 +147,7 @@ async def delete_document(
     """
     await document_manager.delete_document(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document_id,
         user_id=request_context.get().user_info.id,
@@ -155,7 +162,7 @@ async def create_document_chunks(
     document_id: Annotated[int, Path(gt=0, description="The document ID")],
     body: CreateChunks,
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     redis_client: AsyncRedis = Depends(get_redis_client),
     model_registry: ModelRegistry = Depends(get_model_registry),
@@ -170,7 +177,7 @@ async def create_document_chunks(
         document_id=document_id,
         chunks=body.chunks,
         user_id=request_context.get().user_info.id,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         redis_client=redis_client,
         model_registry=model_registry,
@@ -186,7 +193,7 @@ async def delete_document_chunk(
     document_id: Annotated[int, Path(gt=0, description="The document ID")],
     chunk_id: Annotated[int, Path(ge=0, description="The chunk ID")],
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
@@ -196,7 +203,7 @@ async def delete_document_chunk(
     """
     await document_manager.delete_document_chunk(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document_id,
         chunk_id=chunk_id,
@@ -212,7 +219,7 @@ async def get_document_chunks(
     limit: int = Query(ge=1, le=100, default=10, description="The number of chunks to return"),
     offset: int = Query(default=0, description="The offset of the first chunk to return"),
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
@@ -222,7 +229,7 @@ async def get_document_chunks(
     """
     chunks = await document_manager.get_document_chunks(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document_id,
         limit=limit,
@@ -239,7 +246,7 @@ async def get_document_chunk(
     document_id: Annotated[int, Path(gt=0, description="The document ID")],
     chunk_id: Annotated[int, Path(ge=0, description="The chunk ID")],
     postgres_session: AsyncSession = Depends(get_postgres_session),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
     document_manager: DocumentManager = Depends(get_document_manager),
@@ -249,7 +256,7 @@ async def get_document_chunk(
     """
     chunks = await document_manager.get_document_chunk(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         document_id=document_id,
         chunk_id=chunk_id,
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, Request, Security
-from fastapi.responses import JSONResponse
 from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._rawjsonresponse import RawJSONResponse
 from api.helpers.models import ModelRegistry
 from api.schemas.core.models import RequestContent
 from api.schemas.embeddings import Embeddings, EmbeddingsRequest
@@ -23,7 +23,7 @@ async def embeddings(
     model_registry: ModelRegistry = Depends(get_model_registry),
     redis_client: AsyncRedis = Depends(get_redis_client),
     postgres_session: AsyncSession = Depends(get_postgres_session),
-) -> JSONResponse:
+) -> RawJSONResponse:
     """
     Creates an embedding vector representing the input text.
     """
@@ -40,4 +40,5 @@ async def embeddings(
         redis_client=redis_client,
     )
 
-    return JSONResponse(content=Embeddings(**response.json()).model_dump(), status_code=response.status_code)
+    # the response has already been formatted by the provider, the vectors are not parsed again
+    return RawJSONResponse(content=response.content, status_code=response.status_code)
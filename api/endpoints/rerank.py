@@ -1,11 +1,11 @@
 from contextvars import ContextVar
 
 from fastapi import APIRouter, Depends, Request, Security
-from fastapi.responses import JSONResponse
 from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._rawjsonresponse import RawJSONResponse
 from api.helpers.models import ModelRegistry
 from api.schemas.core.context import RequestContext
 from api.schemas.core.models import RequestContent
@@ -26,7 +26,7 @@ async def rerank(
     redis_client: AsyncRedis = Depends(get_redis_client),
     postgres_session: AsyncSession = Depends(get_postgres_session),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
-) -> JSONResponse:
+) -> RawJSONResponse:
     """
     Creates an ordered array with each text assigned a relevance score, based on the query.
     """
@@ -42,4 +42,5 @@ async def rerank(
         redis_client=redis_client,
     )
 
-    return JSONResponse(content=Reranks(**response.json()).model_dump(), status_code=response.status_code)
+    # the response has already been formatted to Reranks by the provider
+    return RawJSONResponse(content=response.content, status_code=response.status_code)
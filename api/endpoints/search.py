@@ -7,19 +7,19 @@ from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._accesscontroller import AccessController
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.helpers.models import ModelRegistry
 from api.schemas.core.context import RequestContext
 from api.schemas.search import CreateSearch, Searches
 from api.utils.dependencies import (
     get_document_manager,
     get_elasticsearch_client,
-    get_elasticsearch_vector_store,
     get_model_registry,
     get_postgres_session,
     get_redis_client,
     get_request_context,
+    get_vector_store,
 )
 from api.utils.hooks_decorator import hooks
 from api.utils.variables import EndpointRoute, RouterName
@@ -34,7 +34,7 @@ async def search(
     body: CreateSearch,
     postgres_session: AsyncSession = Depends(get_postgres_session),
     redis_client: AsyncRedis = Depends(get_redis_client),
-    elasticsearch_vector_store: ElasticsearchVectorStore = Depends(get_elasticsearch_vector_store),
+    vector_store: BaseVectorStore = Depends(get_vector_store),
     elasticsearch_client: AsyncElasticsearch = Depends(get_elasticsearch_client),
     model_registry: ModelRegistry = Depends(get_model_registry),
     request_context: ContextVar[RequestContext] = Depends(get_request_context),
@@ -45,7 +45,7 @@ async def search(
     """
     data = await document_manager.search_chunks(
         postgres_session=postgres_session,
-        elasticsearch_vector_store=elasticsearch_vector_store,
+        vector_store=vector_store,
         elasticsearch_client=elasticsearch_client,
         redis_client=redis_client,
         model_registry=model_registry,
@@ -101,13 +101,24 @@ class AccessController:
             key_id = 0
             key_name = "master"
         else:
-            user_id, key_id, key_name = await global_context.identity_access_manager.check_token(
-                postgres_session=postgres_session, token=api_key.credentials
-            )
-            if not user_id:
+            claims = global_context.identity_access_manager.get_token_claims(token=api_key.credentials)
+            if claims is None:
                 raise InvalidAPIKeyException()
 
-            user_info = await global_context.identity_access_manager.get_user_info(postgres_session=postgres_session, user_id=user_id)
+            async def load_token() -> tuple[int, str | None, UserInfo] | None:
+                user_id, _, key_name = await global_context.identity_access_manager.check_token(
+                    postgres_session=postgres_session, token=api_key.credentials
+                )
+                if not user_id:
+                    return None
+                user_info = await global_context.identity_access_manager.get_user_info(postgres_session=postgres_session, user_id=user_id)
+                return user_id, key_name, user_info
+
+            token = await global_context.auth_cache.get_or_load(token_id=claims["token_id"], expires=claims.get("expires"), loader=load_token)
+            if token is None:
+                raise InvalidAPIKeyException()
+            _, key_name, user_info = token
+            key_id = claims["token_id"]
 
             # invalid token if user is expired, except for /me and /me/role endpoints
             if user_info.expires and user_info.expires < time.time() and not request.url.path.endswith(EndpointRoute.ME_INFO):
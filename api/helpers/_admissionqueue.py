@@ -0,0 +1,300 @@
+import asyncio
+from collections import defaultdict
+import logging
+from uuid import uuid4
+
+from redis.asyncio import ConnectionPool, RedisError
+from redis.asyncio import Redis as AsyncRedis
+
+from api.schemas.admin.providers import Provider
+from api.schemas.admin.routers import RouterLoadBalancingStrategy
+from api.schemas.core.models import Metric
+from api.utils.exceptions import ModelIsTooBusyException, ProviderNotFoundException
+from api.utils.load_balancing import apply_async_load_balancing
+from api.utils.variables import PREFIX__REDIS_ADMISSION_QUEUE, PREFIX__REDIS_METRIC_GAUGE, REDIS__ADMISSION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Add a ticket in the queue of a router.
+# KEYS[1]: queue, KEYS[2]: heartbeats, KEYS[3]: virtual times of the users
+# ARGV[1]: ticket, ARGV[2]: user ID, ARGV[3]: priority rank (0 is the highest priority), ARGV[4]: heartbeat TTL (ms), ARGV[5]: fairness quantum (ms)
+# Tickets are sorted by priority, then by virtual time: each queued request of a user delays the next one by the
+# quantum, so a user flooding the queue does not starve the other users of the same priority.
+ENQUEUE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local virtual_time = math.max(now, tonumber(redis.call('HGET', KEYS[3], ARGV[2]) or '0'))
+redis.call('HSET', KEYS[3], ARGV[2], string.format('%d', virtual_time + tonumber(ARGV[5])))
+redis.call('PEXPIRE', KEYS[3], 86400000)
+redis.call('ZADD', KEYS[1], tonumber(ARGV[3]) * 1e13 + virtual_time, ARGV[1])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), ARGV[1])
+return 1
+"""
+
+# Admit a ticket if it is within the first free slots of the provider, otherwise refresh its heartbeat. The slot of an
+# admitted ticket is reserved by incrementing the inflight requests of the provider in the same atomic call, so
+# concurrent waiters never see the same free slots.
+# KEYS[1]: queue, KEYS[2]: heartbeats, KEYS[3]: inflight requests of the provider
+# ARGV[1]: ticket, ARGV[2]: heartbeat TTL (ms), ARGV[3]: inflight requests limit of the provider (-1 if no limit)
+# Returns 1 if admitted, 0 if the ticket must wait and -1 if the ticket has expired.
+ADMIT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+-- drop the tickets of the waiters that are gone
+for _, expired in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 100)) do
+    redis.call('ZREM', KEYS[1], expired)
+    redis.call('ZREM', KEYS[2], expired)
+end
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+if not rank then
+    return -1
+end
+local limit = tonumber(ARGV[3])
+local free = math.huge
+if limit >= 0 then
+    -- requests are forwarded while the inflight requests do not exceed the limit
+    free = math.max(0, math.floor(limit) - tonumber(redis.call('GET', KEYS[3]) or '0') + 1)
+end
+if rank < free then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('INCR', KEYS[3])
+    return 1
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[1])
+return 0
+"""
+
+
+class AdmissionQueue:
+    """
+    Priority admission queue of the requests of each router, shared by all the workers in Redis, as an alternative to
+    the Celery routing tasks.
+
+    Only routers with at least one provider limited by a QoS policy are queued. A request is admitted when it is
+    within the first free slots of its router queue, the free slots being the number of requests the chosen provider
+    can still handle according to its QoS policy. Requests are ordered by user priority, then fairly across users.
+    The admission reserves an inflight request slot of the provider: the provider does not count the request again
+    when it is forwarded, and a slot not used by the request is released when the request ends, see `release`.
+
+    Waiters are woken up through Redis pub/sub when a request of the router is admitted or leaves the queue and when
+    a request to one of its providers ends, and poll the queue every `POLL_INTERVAL` seconds as fallback.
+    A waiter refreshes the heartbeat of its ticket while waiting, so the tickets of a dead worker expire and do not
+    block the queue.
+
+    Args:
+        max_priority(int): The maximum priority of the requests
+        max_retries(int): The maximum number of retries, the maximum wait time is `max_retries * retry_countdown`
+        retry_countdown(int): Number of seconds between two retries
+    """
+
+    POLL_INTERVAL = 1.0
+    HEARTBEAT_TTL = 5000
+    FAIRNESS_QUANTUM = 100
+
+    def __init__(self, max_priority: int, max_retries: int, retry_countdown: int) -> None:
+        self.max_priority = max_priority
+        self.max_wait_time = max_retries * retry_countdown
+        self.redis_client: AsyncRedis | None = None
+
+        # router ID -> events of the local waiters, provider ID -> router IDs of the local waiters
+        self.waiters: dict[int, set[asyncio.Event]] = defaultdict(set)
+        self.providers: dict[int, set[int]] = defaultdict(set)
+
+        self._listener: asyncio.Task | None = None
+
+    async def setup(self, redis_pool: ConnectionPool) -> None:
+        """
+        Start to listen the admission channel. Run in lifespan context.
+
+        Args:
+            redis_pool(ConnectionPool): The Redis connection pool
+        """
+        self.redis_client = AsyncRedis(connection_pool=redis_pool)
+        self.enqueue_script = self.redis_client.register_script(ENQUEUE_SCRIPT)
+        self.admit_script = self.redis_client.register_script(ADMIT_SCRIPT)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        """
+        Stop the listener.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+            self.redis_client = None
+
+    async def admit(
+        self,
+        router_id: int,
+        providers: list[Provider],
+        load_balancing_strategy: RouterLoadBalancingStrategy,
+        load_balancing_metric: Metric,
+        user_id: int,
+        priority: int,
+    ) -> tuple[int, bool]:
+        """
+        Wait until a request is admitted and return the ID of the provider to forward it to, and whether an inflight
+        request slot of this provider has been reserved for the request.
+        Raise ModelIsTooBusyException (503) if the request is not admitted within the maximum wait time.
+
+        Args:
+            router_id(int): The router ID
+            providers(list[Provider]): The providers of the router
+            load_balancing_strategy(RouterLoadBalancingStrategy): The load balancing strategy of the router
+            load_balancing_metric(Metric): The metric used by the load balancing strategy
+            user_id(int): The user ID
+            priority(int): The priority of the request, between 0 and `max_priority`
+        """
+        if all(provider.qos_metric != Metric.INFLIGHT or provider.qos_limit is None for provider in providers):
+            provider_id, _ = await self._choose_provider(providers=providers, load_balancing_strategy=load_balancing_strategy, load_balancing_metric=load_balancing_metric)  # fmt: off
+            return provider_id, False
+
+        keys = self._get_keys(router_id=router_id)
+        ticket = uuid4().hex
+        event = asyncio.Event()
+        self.waiters[router_id].add(event)
+        for provider in providers:
+            self.providers[provider.id].add(router_id)
+
+        admitted = False
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        status = -1
+        try:
+            while True:
+                event.clear()
+                provider_id, provider = await self._choose_provider(providers=providers, load_balancing_strategy=load_balancing_strategy, load_balancing_metric=load_balancing_metric)  # fmt: off
+                try:
+                    if status == -1:  # new ticket, or its heartbeat has not been refreshed in time
+                        await self._enqueue(keys=keys, ticket=ticket, user_id=user_id, priority=priority)
+                    limit = provider.qos_limit if provider.qos_metric == Metric.INFLIGHT and provider.qos_limit is not None else -1
+                    status = await self.admit_script(keys=[*keys[:2], self._get_inflight_key(provider_id=provider_id)], args=[ticket, self.HEARTBEAT_TTL, limit])  # fmt: off
+                except RedisError:
+                    # fail open, as the rate limiter
+                    logger.error(msg=f"Redis error during admission of router {router_id}.", exc_info=True)
+                    return provider_id, False
+
+                if status == 1:
+                    admitted = True
+                    await self._notify(message=f"r:{router_id}")
+                    return provider_id, True
+
+                if loop.time() - start_time > self.max_wait_time:
+                    raise ModelIsTooBusyException(detail=f"Model is too busy after {self.max_wait_time} seconds")
+
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self.POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+        finally:
+            self.waiters[router_id].discard(event)
+            if not self.waiters[router_id]:
+                del self.waiters[router_id]
+            if not admitted:
+                await self._cancel(keys=keys, ticket=ticket, router_id=router_id)
+
+    async def release(self, provider_id: int) -> None:
+        """
+        Release an inflight request slot reserved at admission and not used by the request, e.g. when the request
+        fails before being forwarded to the provider.
+
+        Args:
+            provider_id(int): The provider ID
+        """
+        try:
+            await self.redis_client.decr(self._get_inflight_key(provider_id=provider_id))
+        except Exception as e:
+            logger.error(f"Failed to release inflight request of provider {provider_id}: {e}")
+            return
+        await self.notify(provider_id=provider_id)
+
+    async def notify(self, provider_id: int) -> None:
+        """
+        Wake up the waiters of the routers of a provider, after a request to this provider ends.
+
+        Args:
+            provider_id(int): The provider ID
+        """
+        await self._notify(message=f"p:{provider_id}")
+
+    async def _choose_provider(
+        self,
+        providers: list[Provider],
+        load_balancing_strategy: RouterLoadBalancingStrategy,
+        load_balancing_metric: Metric,
+    ) -> tuple[int, Provider]:
+        if len(providers) == 1:
+            return providers[0].id, providers[0]
+
+        provider_id, _ = await apply_async_load_balancing(
+            candidates=[provider.id for provider in providers],
+            load_balancing_strategy=load_balancing_strategy,
+            load_balancing_metric=load_balancing_metric,
+            redis_client=self.redis_client,
+        )
+
+        provider = next((provider for provider in providers if provider.id == provider_id), None)
+        if provider is None:
+            raise ProviderNotFoundException()
+
+        return provider_id, provider
+
+    async def _enqueue(self, keys: list[str], ticket: str, user_id: int, priority: int) -> None:
+        priority = max(0, min(priority, self.max_priority))
+        await self.enqueue_script(keys=keys, args=[ticket, user_id, self.max_priority - priority, self.HEARTBEAT_TTL, self.FAIRNESS_QUANTUM])
+
+    async def _cancel(self, keys: list[str], ticket: str, router_id: int) -> None:
+        try:
+            await self.redis_client.pipeline(transaction=True).zrem(keys[0], ticket).zrem(keys[1], ticket).execute()
+        except Exception as e:
+            logger.warning(f"Failed to remove ticket from admission queue of router {router_id}: {e}")
+            return
+        await self._notify(message=f"r:{router_id}")
+
+    async def _notify(self, message: str) -> None:
+        if self.redis_client is None:
+            return
+
+        try:
+            await self.redis_client.publish(REDIS__ADMISSION_CHANNEL, message)
+        except Exception as e:
+            logger.warning(f"Failed to notify admission queue: {e}")
+
+    def _wake_up(self, message: str) -> None:
+        kind, id = message.split(":")
+        router_ids = {int(id)} if kind == "r" else self.providers.get(int(id), set())
+        for router_id in router_ids:
+            for event in self.waiters.get(router_id, ()):
+                event.set()
+
+    def _get_keys(self, router_id: int) -> list[str]:
+        prefix = f"{PREFIX__REDIS_ADMISSION_QUEUE}:{router_id}"
+        return [prefix, f"{prefix}:heartbeats", f"{prefix}:users"]
+
+    def _get_inflight_key(self, provider_id: int) -> str:
+        return f"{PREFIX__REDIS_METRIC_GAUGE}:{Metric.INFLIGHT.value}:{provider_id}"
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(REDIS__ADMISSION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = message["data"]
+                        self._wake_up(message=data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # waiters fall back to polling while disconnected
+                logger.warning(f"Admission queue listener disconnected: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+import json
+import logging
+import time
+
+from api.helpers._versionedcache import VersionedCache
+from api.schemas.me.info import UserInfo
+from api.sql.models import Limit as LimitTable
+from api.sql.models import Permission as PermissionTable
+from api.sql.models import Role as RoleTable
+from api.sql.models import Router as RouterTable
+from api.sql.models import Token as TokenTable
+from api.sql.models import User as UserTable
+from api.utils.variables import PREFIX__REDIS_AUTH_CACHE, REDIS__AUTH_CACHE_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+class AuthCache(VersionedCache):
+    """
+    Cache of the resolved API keys (user ID, key name and user info) by token ID, to skip the token and user info
+    queries for repeated calls with the same key.
+
+    Entries are kept in a bounded local LRU (L1) for `local_ttl` seconds and shared across workers in Redis (L2) for
+    `ttl` seconds. Redis entries are namespaced by the cache version, so any committed write on the tokens, users,
+    roles, permissions or limits drops the entries of every worker immediately.
+
+    Args:
+        ttl(int): Time to live of the entries in Redis in seconds, 0 disables the cache
+        local_ttl(int): Time to live of the entries in the local cache in seconds
+        max_size(int): Maximum number of entries in the local cache
+    """
+
+    WATCHED_TABLES = {
+        TokenTable.__tablename__: {"update", "delete"},
+        UserTable.__tablename__: {"update", "delete"},
+        RoleTable.__tablename__: {"update", "delete"},
+        PermissionTable.__tablename__: {"insert", "update", "delete"},
+        LimitTable.__tablename__: {"insert", "update", "delete"},
+        RouterTable.__tablename__: {"delete"},  # limits are deleted in cascade with their router
+    }
+
+    def __init__(self, ttl: int, local_ttl: int, max_size: int) -> None:
+        super().__init__(version_key=REDIS__AUTH_CACHE_VERSION)
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.max_size = max_size
+        self.entries: OrderedDict[int, tuple[float, int, str | None, UserInfo]] = OrderedDict()
+
+        self._generation = 0
+
+    async def get_or_load(
+        self,
+        token_id: int,
+        expires: int | None,
+        loader: Callable[[], Awaitable[tuple[int, str | None, UserInfo] | None]],
+    ) -> tuple[int, str | None, UserInfo] | None:
+        """
+        Get the cached user ID, key name and user info of a token, or load and cache them on cache miss.
+
+        Args:
+            token_id(int): The token ID
+            expires(int | None): The token expiration timestamp, the entry does not outlive the token
+            loader(Callable[[], Awaitable[tuple[int, str | None, UserInfo] | None]]): Coroutine resolving the token from the database, return None if the token is invalid
+        """
+        cached = await self.get(token_id=token_id)
+        if cached is not None:
+            return cached
+
+        generation = self._generation
+        loaded = await loader()
+
+        # an invalidation received while loading may not be reflected in the loaded user info, do not cache it
+        if loaded is not None and generation == self._generation:
+            user_id, key_name, user_info = loaded
+            await self.set(token_id=token_id, user_id=user_id, key_name=key_name, user_info=user_info, expires=expires)
+
+        return loaded
+
+    async def get(self, token_id: int) -> tuple[int, str | None, UserInfo] | None:
+        """
+        Get the cached user ID, key name and user info of a token, return None if the token is not cached.
+
+        Args:
+            token_id(int): The token ID
+        """
+        if self.ttl == 0:
+            return None
+
+        entry = self.entries.get(token_id)
+        if entry is not None:
+            expires_at, user_id, key_name, user_info = entry
+            if time.monotonic() < expires_at:
+                self.entries.move_to_end(token_id)
+                return user_id, key_name, user_info
+            del self.entries[token_id]
+
+        if self.redis_client is None:
+            return None
+
+        try:
+            key = self._get_key(token_id=token_id)
+            value, ttl = await self.redis_client.pipeline(transaction=False).get(key).ttl(key).execute()
+        except Exception as e:
+            logger.warning(f"Failed to get API key from auth cache: {e}")
+            return None
+
+        if value is None:
+            return None
+
+        value = json.loads(value)
+        user_info = UserInfo.model_validate(value["user_info"])
+        self._set_local(token_id=token_id, user_id=value["user_id"], key_name=value["key_name"], user_info=user_info, ttl=ttl)
+
+        return value["user_id"], value["key_name"], user_info
+
+    async def set(self, token_id: int, user_id: int, key_name: str | None, user_info: UserInfo, expires: int | None = None) -> None:
+        """
+        Cache the user ID, key name and user info of a token.
+
+        Args:
+            token_id(int): The token ID
+            user_id(int): The user ID
+            key_name(str | None): The token name
+            user_info(UserInfo): The user info
+            expires(int | None): The token expiration timestamp, the entry does not outlive the token
+        """
+        ttl = self.ttl
+        if expires is not None:
+            ttl = min(ttl, int(expires - time.time()))
+        if ttl <= 0:
+            return
+
+        self._set_local(token_id=token_id, user_id=user_id, key_name=key_name, user_info=user_info, ttl=ttl)
+
+        if self.redis_client is None:
+            return
+
+        value = json.dumps({"user_id": user_id, "key_name": key_name, "user_info": user_info.model_dump(mode="json")})
+        try:
+            await self.redis_client.set(self._get_key(token_id=token_id), value, ex=ttl)
+        except Exception as e:
+            logger.warning(f"Failed to set API key in auth cache: {e}")
+
+    def invalidate(self) -> None:
+        """
+        Clear the local cache. Redis entries of the previous version are no longer read and expire with their TTL.
+        """
+        self._generation += 1
+        self.entries.clear()
+
+    def _get_key(self, token_id: int) -> str:
+        return f"{PREFIX__REDIS_AUTH_CACHE}:{self.version}:{token_id}"
+
+    def _set_local(self, token_id: int, user_id: int, key_name: str | None, user_info: UserInfo, ttl: int) -> None:
+        if ttl <= 0:
+            return
+
+        self.entries[token_id] = (time.monotonic() + min(self.local_ttl, ttl), user_id, key_name, user_info)
+        self.entries.move_to_end(token_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
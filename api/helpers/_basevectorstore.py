@@ -0,0 +1,144 @@
+from abc import ABC, abstractmethod
+import time
+from typing import Any
+
+from prometheus_client import Histogram
+
+from api.schemas.chunks import Chunk
+from api.schemas.collections import CollectionVisibility
+from api.schemas.core.vectorstore import VectorStoreChunk
+from api.schemas.search import ComparisonFilter, CompoundFilter, Search, SearchMethod
+
+SEARCH_DURATION_SECONDS = Histogram(
+    "ogl_search_duration_seconds",
+    "Duration of the vector store searches in seconds, by phase (lexical and semantic are the processing times of the vector store).",
+    labelnames=("method", "phase"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10),
+)
+
+
+class BaseVectorStore(ABC):
+    """
+    Interface of the vector stores of the chunks. Each method takes the client of the backend, which is None for the
+    backends running in the API process.
+    """
+
+    default_method = SearchMethod.HYBRID
+
+    @abstractmethod
+    async def setup(self, client: Any, vector_size: int) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def upsert(self, client: Any, chunks: list[VectorStoreChunk]) -> None:
+        pass
+
+    @abstractmethod
+    async def search(
+        self,
+        client: Any,
+        method: SearchMethod,
+        collection_ids: list[int],
+        document_ids: list[int],
+        metadata_filters: ComparisonFilter | CompoundFilter | None,
+        query_prompt: str,
+        query_vector: list[float] | None,
+        limit: int,
+        offset: int,
+        rff_k: int | None = 20,
+        score_threshold: float = 0.0,
+        user_id: int | None = None,
+    ) -> list[Search]:
+        """
+        Search the chunks of the given collections, or of the collections owned by the user and the public collections if
+        no collection is given.
+        """
+        pass
+
+    @abstractmethod
+    async def delete_collection(self, client: Any, collection_id: int) -> None:
+        pass
+
+    @abstractmethod
+    async def update_collection(self, client: Any, collection_id: int, user_id: int, visibility: CollectionVisibility) -> None:
+        """
+        Set the owner and the visibility of the chunks of a collection.
+        """
+        pass
+
+    @abstractmethod
+    async def delete_user(self, client: Any, user_id: int) -> None:
+        """
+        Delete the chunks of the collections owned by a user.
+        """
+        pass
+
+    @abstractmethod
+    async def get_collection_assignments(
+        self, client: Any, after: int = 0, size: int = 1000
+    ) -> dict[int, set[tuple[int | None, CollectionVisibility | None]]]:
+        """
+        Get the owners and visibilities of the indexed chunks of the collections with an ID greater than `after`, by
+        collection ID in ascending order. The chunks indexed before these fields were added have no owner nor visibility.
+        """
+        pass
+
+    @abstractmethod
+    async def delete_document(self, client: Any, document_id: int) -> None:
+        pass
+
+    @abstractmethod
+    async def delete_chunk(self, client: Any, document_id: int, chunk_id: int) -> None:
+        pass
+
+    @abstractmethod
+    async def get_chunk_counts(self, client: Any, document_ids: list[int]) -> dict[int, int]:
+        """
+        Get the number of chunks of several documents, the documents without chunks are omitted.
+        """
+        pass
+
+    @abstractmethod
+    async def get_chunks(self, client: Any, document_id: int, offset: int = 0, limit: int = 10, chunk_id: int | None = None) -> list[Chunk]:
+        pass
+
+    @abstractmethod
+    async def get_last_chunk_id(self, client: Any, document_id: int) -> int | None:
+        pass
+
+    @staticmethod
+    def _fuse_searches(lexical_searches: list[Search], semantic_searches: list[Search], limit: int, offset: int, rff_k: int) -> list[Search]:
+        """
+        Combine the ranked results of a lexical and a semantic search with Reciprocal Rank Fusion (RRF).
+
+        Args:
+            lexical_searches(list[Search]): The results of the lexical search, ranked up to the requested page
+            semantic_searches(list[Search]): The results of the semantic search, ranked up to the requested page
+            limit(int): The number of results to return
+            offset(int): The offset of the results to return
+            rff_k(int): The constant k in the RRF formula
+        """
+        start = time.perf_counter()
+        combined_scores: dict[tuple[int, int], float] = {}
+        search_map: dict[tuple[int, int], Search] = {}
+        for searches in [lexical_searches, semantic_searches]:
+            for rank, search in enumerate(searches):
+                key = (search.chunk.document_id, search.chunk.id)
+                if key not in combined_scores:
+                    combined_scores[key] = 0
+                    search_map[key] = search
+                    search_map[key].method = SearchMethod.HYBRID
+                combined_scores[key] += 1 / (rff_k + rank + 1)
+
+        ranked_scores = sorted(combined_scores.items(), key=lambda item: item[1], reverse=True)
+        reranked_searches = []
+        for key, rrf_score in ranked_scores[offset : offset + limit]:
+            search = search_map[key]
+            search.score = rrf_score
+            reranked_searches.append(search)
+        SEARCH_DURATION_SECONDS.labels(method=SearchMethod.HYBRID.value, phase="fusion").observe(time.perf_counter() - start)
+
+        return reranked_searches
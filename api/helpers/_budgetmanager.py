@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import uuid
+
+from redis.asyncio import ConnectionPool, Redis, ResponseError
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from api.sql.models import User as UserTable
+from api.utils.variables import PREFIX__REDIS_BUDGET, REDIS__BUDGET_DIRTY_USERS, REDIS__BUDGET_RECONCILIATION_LOCK
+
+logger = logging.getLogger(__name__)
+
+# Decrease the budget of a user without going below 0 and mark the user as dirty, in a single atomic call.
+# KEYS[1]: budget key, KEYS[2]: dirty users set
+# ARGV[1]: cost, ARGV[2]: budget used if the key does not exist yet, ARGV[3]: user ID
+# Returns the new budget.
+CONSUME_BUDGET_SCRIPT = """
+local budget = tonumber(redis.call('GET', KEYS[1]) or ARGV[2])
+budget = math.max(0, budget - tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], string.format('%d', budget))
+redis.call('SADD', KEYS[2], ARGV[3])
+return budget
+"""
+
+# Release the reconciliation lock only if it is still held by the caller, the lock may have expired and been taken by
+# another worker.
+# KEYS[1]: lock key
+# ARGV[1]: token of the caller
+# Returns 1 if the lock has been released.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class BudgetManager:
+    """
+    Budgets of the users held as atomic counters in Redis, to decrease them without locking the user row in the
+    PostgreSQL database for each paid request.
+
+    A counter is initialized from the user budget stored in the PostgreSQL database at the first request of the user.
+    Budgets are stored in millionths, the precision of the budgets in the database. The users whose budget has been
+    decreased are journaled in a Redis set; a background reconciler periodically writes their current budget in the
+    database in a single batched update. The journal is renamed before being flushed and only deleted after the commit,
+    so an interrupted reconciliation is replayed by the next one, and since the absolute budgets are written, replaying
+    it is harmless.
+
+    Args:
+        redis_pool(ConnectionPool): The Redis connection pool
+        session_factory(async_sessionmaker): The session factory used to write the budgets
+        reconciliation_interval(int): Interval in seconds between two reconciliations
+    """
+
+    UNIT = 1_000_000
+    FLUSHING_USERS = f"{REDIS__BUDGET_DIRTY_USERS}:flushing"
+
+    def __init__(self, redis_pool: ConnectionPool, session_factory: async_sessionmaker, reconciliation_interval: int) -> None:
+        self.redis_client = Redis(connection_pool=redis_pool)
+        self.session_factory = session_factory
+        self.reconciliation_interval = reconciliation_interval
+        self.script = self.redis_client.register_script(CONSUME_BUDGET_SCRIPT)
+        self.release_lock_script = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+        self._task: asyncio.Task | None = None
+
+    def setup(self) -> None:
+        """
+        Start the background reconciler. Run in lifespan context.
+        """
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the background reconciler and write the pending budgets in the database.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.error(f"Failed to reconcile budgets: {e}")
+
+    async def get(self, user_id: int, budget: float | None) -> float | None:
+        """
+        Get the current budget of a user.
+
+        Args:
+            user_id(int): The user ID
+            budget(float | None): The user budget stored in the database, returned if the counter does not exist yet. If None, the user has unlimited budget.
+        """
+        if budget is None:
+            return None
+
+        try:
+            value = await self.redis_client.get(self._get_key(user_id=user_id))
+        except Exception as e:
+            logger.warning(f"Failed to get budget of user {user_id}: {e}")
+            return budget
+
+        return budget if value is None else int(value) / self.UNIT
+
+    async def consume(self, user_id: int, cost: float, budget: float | None) -> float | None:
+        """
+        Decrease the budget of a user by the cost of a request, the budget does not go below 0.
+
+        Args:
+            user_id(int): The user ID
+            cost(float): The cost of the request
+            budget(float | None): The user budget stored in the database, used to initialize the counter. If None, the user has unlimited budget.
+
+        Returns:
+            float | None: The new budget of the user, None if the user has unlimited budget or if the budget could not be decreased.
+        """
+        if budget is None:
+            return None
+
+        try:
+            value = await self.script(
+                keys=[self._get_key(user_id=user_id), REDIS__BUDGET_DIRTY_USERS],
+                args=[round(cost * self.UNIT), round(budget * self.UNIT), user_id],
+            )
+        except Exception as e:
+            logger.error(f"Failed to update budget for user {user_id}: {e}")
+            return None
+
+        return int(value) / self.UNIT
+
+    async def set(self, user_id: int, budget: float | None) -> None:
+        """
+        Overwrite the budget of a user, after the budget has been updated in the database.
+
+        Args:
+            user_id(int): The user ID
+            budget(float | None): The new user budget. If None, the user has unlimited budget.
+        """
+        key = self._get_key(user_id=user_id)
+        try:
+            if budget is None:
+                await self.redis_client.delete(key)
+            else:
+                # the user is journaled in case a running reconciliation writes the previous budget after this update
+                await self.redis_client.pipeline(transaction=True).set(key, round(budget * self.UNIT)).sadd(REDIS__BUDGET_DIRTY_USERS, user_id).execute()  # fmt: off
+        except Exception as e:
+            logger.error(f"Failed to set budget for user {user_id}: {e}")
+
+    async def delete(self, user_id: int) -> None:
+        """
+        Delete the budget of a user and remove it from the journal, after the user has been deleted from the database.
+
+        Args:
+            user_id(int): The user ID
+        """
+        try:
+            await self.redis_client.pipeline(transaction=True).delete(self._get_key(user_id=user_id)).srem(REDIS__BUDGET_DIRTY_USERS, user_id).srem(self.FLUSHING_USERS, user_id).execute()  # fmt: off
+        except Exception as e:
+            logger.error(f"Failed to delete budget for user {user_id}: {e}")
+
+    async def reconcile(self) -> None:
+        """
+        Write the current budget of the journaled users in the database. Only one worker reconciles at a time.
+        """
+        token = uuid.uuid4().hex
+        if not await self.redis_client.set(REDIS__BUDGET_RECONCILIATION_LOCK, token, nx=True, ex=max(60, self.reconciliation_interval * 2)):
+            return
+
+        try:
+            # the journal of an interrupted reconciliation is flushed again before taking the new one
+            if not await self.redis_client.exists(self.FLUSHING_USERS):
+                try:
+                    await self.redis_client.rename(REDIS__BUDGET_DIRTY_USERS, self.FLUSHING_USERS)
+                except ResponseError:  # no user to reconcile
+                    return
+
+            user_ids = [int(user_id) for user_id in await self.redis_client.smembers(self.FLUSHING_USERS)]
+            values = await self.redis_client.mget([self._get_key(user_id=user_id) for user_id in user_ids]) if user_ids else []
+            rows = [{"user_id": user_id, "user_budget": int(value) / self.UNIT} for user_id, value in zip(user_ids, values) if value is not None]
+
+            if rows:
+                # core executemany: unlike the ORM bulk update by primary key, the users deleted since they have been
+                # journaled are skipped instead of failing the whole reconciliation
+                table = UserTable.__table__
+                statement = update(table).where(table.c.id == bindparam("user_id")).values(budget=bindparam("user_budget"))
+                async with self.session_factory() as session:
+                    # cached user info are not refreshed by the reconciliation, budgets are read from Redis
+                    await session.execute(statement.execution_options(cache_invalidation=False), rows)
+                    await session.commit()
+
+            await self.redis_client.delete(self.FLUSHING_USERS)
+        finally:
+            await self.release_lock_script(keys=[REDIS__BUDGET_RECONCILIATION_LOCK], args=[token])
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconciliation_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Failed to reconcile budgets: {e}")
+
+    def _get_key(self, user_id: int) -> str:
+        return f"{PREFIX__REDIS_BUDGET}:{user_id}"
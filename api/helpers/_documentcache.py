@@ -0,0 +1,217 @@
+import asyncio
+from collections import OrderedDict
+import hashlib
+import logging
+import time
+import unicodedata
+import zlib
+
+from fastapi import UploadFile
+import numpy as np
+from redis.asyncio import ConnectionPool, Redis
+
+from api.schemas.core.documents import FileType
+from api.utils.embeddings import EMBEDDING_DTYPE
+from api.utils.variables import PREFIX__REDIS_DOCUMENT_CACHE
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCache:
+    """
+    Content addressed cache of the document ingestion, shared by all the workers in Redis: the parsed markdown of the
+    files by SHA-256 of their content, and the embeddings of the chunks by SHA-256 of the embeddings model and the chunk
+    text. Re-ingesting a known file skips the parser, and known chunks skip the embeddings provider.
+
+    Entries expire after `ttl` seconds, parsed documents are compressed and not cached above `max_size` bytes. The cache
+    uses a Redis instance dedicated to it, whose memory is bounded to `max_memory` MB by evicting the least recently used
+    entries. The cache is best effort: a Redis failure is handled as a cache miss.
+
+    The embeddings requested as `local` (e.g. the search queries, repeated by the users of a public collection) are also
+    kept in a bounded LRU of the worker for `local_ttl` seconds, so a repeated query does not read Redis.
+
+    Args:
+        redis_pool(ConnectionPool): The connection pool of the Redis instance dedicated to the cache, closed with the cache
+        ttl(int): Time to live of the entries in seconds
+        max_size(int): Maximum size in bytes of a cached parsed document, once compressed
+        max_memory(int | None): Maximum memory in MB of the Redis instance, if None the instance limit is not changed
+        local_ttl(int): Time to live of the local embeddings in seconds, if 0 the embeddings are not cached locally
+        local_max_size(int): Maximum number of local embeddings
+    """
+
+    READ_CHUNK_SIZE = 1024 * 1024
+    EVICTION_POLICY = "allkeys-lru"
+
+    def __init__(self, redis_pool: ConnectionPool, ttl: int, max_size: int, max_memory: int | None = None, local_ttl: int = 0, local_max_size: int = 10000) -> None:  # fmt: off
+        self.redis_client = Redis(connection_pool=redis_pool)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_memory = max_memory
+        self.local_ttl = min(local_ttl, ttl)
+        self.local_max_size = local_max_size
+        self.local_entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+
+    async def setup(self) -> None:
+        """
+        Bound the memory of the cache Redis instance. Run in lifespan context.
+        """
+        if self.max_memory is None:
+            return
+
+        try:
+            await self.redis_client.config_set("maxmemory", f"{self.max_memory}mb")
+            await self.redis_client.config_set("maxmemory-policy", self.EVICTION_POLICY)
+        except Exception as e:
+            # e.g. CONFIG command disabled by a managed Redis, the limit must be set on the instance
+            logger.warning(f"Failed to set the maximum memory of the document cache, the Redis instance must be configured with a `maxmemory` limit: {e}")  # fmt: off
+
+    async def close(self) -> None:
+        await self.redis_client.aclose(close_connection_pool=True)
+
+    async def get_file_digest(self, file: UploadFile, file_type: FileType) -> str:
+        """
+        Get the SHA-256 of an uploaded file, read by chunks. The file type is hashed with the content, as the same content is
+        not parsed the same way for each file type.
+
+        Args:
+            file(UploadFile): The uploaded file
+            file_type(FileType): The detected type of the file
+        """
+
+        def digest() -> str:
+            hash = hashlib.sha256(file_type.value.encode())
+            file.file.seek(0)
+            while chunk := file.file.read(self.READ_CHUNK_SIZE):
+                hash.update(chunk)
+            file.file.seek(0)
+
+            return hash.hexdigest()
+
+        return await asyncio.to_thread(digest)
+
+    async def get_content(self, digest: str) -> str | None:
+        """
+        Get the cached parsed markdown of a file.
+
+        Args:
+            digest(str): The SHA-256 of the file (see `get_file_digest`)
+        """
+        try:
+            value = await self.redis_client.get(f"{PREFIX__REDIS_DOCUMENT_CACHE}:content:{digest}")
+        except Exception as e:
+            logger.warning(f"Failed to get cached parsed document: {e}")
+            return None
+
+        return zlib.decompress(value).decode() if value is not None else None
+
+    async def set_content(self, digest: str, content: str) -> None:
+        """
+        Cache the parsed markdown of a file.
+
+        Args:
+            digest(str): The SHA-256 of the file (see `get_file_digest`)
+            content(str): The parsed markdown
+        """
+        value = zlib.compress(content.encode())
+        if len(value) > self.max_size:
+            return
+
+        try:
+            await self.redis_client.set(f"{PREFIX__REDIS_DOCUMENT_CACHE}:content:{digest}", value, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache parsed document: {e}")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize a text, so the texts differing only by their unicode form or their whitespaces (e.g. search queries) share
+        the same embedding.
+
+        Args:
+            text(str): The text to embed
+        """
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    async def get_embeddings(self, model: str, texts: list[str], local: bool = False) -> list[np.ndarray | None]:
+        """
+        Get the cached embeddings of texts.
+
+        Args:
+            model(str): The embeddings model
+            texts(list[str]): The embedded texts
+            local(bool): Whether to look up the local embeddings of the worker before Redis
+
+        Returns:
+            list[np.ndarray | None]: The float32 embedding of each text, None if it is not cached.
+        """
+        keys = [self._get_embedding_key(model=model, text=text) for text in texts]
+        embeddings = [self._get_local(key=key) if local else None for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+
+        try:
+            values = await self.redis_client.mget([keys[i] for i in missing])
+        except Exception as e:
+            logger.warning(f"Failed to get cached embeddings: {e}")
+            return embeddings
+
+        for i, value in zip(missing, values):
+            if value is None:
+                continue
+            embeddings[i] = np.frombuffer(value, dtype=EMBEDDING_DTYPE).astype(np.float32, copy=False)
+            if local:
+                self._set_local(key=keys[i], embedding=embeddings[i])
+
+        return embeddings
+
+    async def set_embeddings(self, model: str, texts: list[str], embeddings: np.ndarray, local: bool = False) -> None:
+        """
+        Cache the embeddings of texts.
+
+        Args:
+            model(str): The embeddings model
+            texts(list[str]): The embedded texts
+            embeddings(np.ndarray): The embeddings, of shape (number of texts, dimensions)
+            local(bool): Whether to also keep the embeddings in the local embeddings of the worker
+        """
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for text, embedding in zip(texts, embeddings):
+            key, embedding = self._get_embedding_key(model=model, text=text), np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+            pipeline.set(key, embedding.tobytes(), ex=self.ttl)
+            if local:
+                self._set_local(key=key, embedding=embedding)
+
+        try:
+            await pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache embeddings: {e}")
+
+    @staticmethod
+    def _get_embedding_key(model: str, text: str) -> str:
+        digest = hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+        return f"{PREFIX__REDIS_DOCUMENT_CACHE}:embedding:{digest}"
+
+    def _get_local(self, key: str) -> np.ndarray | None:
+        entry = self.local_entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, embedding = entry
+        if time.monotonic() >= expires_at:
+            del self.local_entries[key]
+            return None
+
+        self.local_entries.move_to_end(key)
+
+        return embedding
+
+    def _set_local(self, key: str, embedding: np.ndarray) -> None:
+        if self.local_ttl <= 0:
+            return
+
+        self.local_entries[key] = (time.monotonic() + self.local_ttl, embedding)
+        self.local_entries.move_to_end(key)
+        while len(self.local_entries) > self.local_max_size:
+            self.local_entries.popitem(last=False)
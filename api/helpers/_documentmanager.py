@@ -1,30 +1,35 @@
+import asyncio
+from collections.abc import Callable
 from contextvars import ContextVar
 from datetime import datetime
-from itertools import batched
 import logging
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import UploadFile
 from langchain_text_splitters import RecursiveCharacterTextSplitter as LangChainRecursiveCharacterTextSplitter
+import numpy as np
+import orjson
 from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy import Integer, cast, delete, distinct, func, insert, or_, select, text, update
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.clients.model import BaseModelProvider as ModelProvider
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers.models import ModelRegistry
 from api.schemas.chunks import Chunk, ChunkMetadata, InputChunk
 from api.schemas.collections import Collection, CollectionVisibility
 from api.schemas.core.context import RequestContext
-from api.schemas.core.elasticsearch import ElasticsearchChunk
-from api.schemas.core.models import RequestContent
-from api.schemas.documents import Document, PresetSeparators
+from api.schemas.core.models import Metric, RequestContent
+from api.schemas.core.vectorstore import VectorStoreChunk
+from api.schemas.documents import Document, DocumentIngestionJob, DocumentStatus, PresetSeparators
 from api.schemas.search import ComparisonFilter, CompoundFilter, Search, SearchMethod
 from api.sql.models import Collection as CollectionTable
 from api.sql.models import Document as DocumentTable
 from api.sql.models import User as UserTable
+from api.utils.context import global_context
+from api.utils.embeddings import decode_embeddings
 from api.utils.exceptions import (
     ChunkingFailedException,
     CollectionNotFoundException,
@@ -35,17 +40,29 @@ from api.utils.exceptions import (
 )
 from api.utils.variables import EndpointRoute
 
+from ._documentcache import DocumentCache
 from ._parsermanager import ParserManager
 
+if TYPE_CHECKING:
+    from ._ingestionworker import IngestionWorker
+
 logger = logging.getLogger(__name__)
 
 
 class DocumentManager:
     BATCH_SIZE = 32
+    BATCH_MAX_TOKENS = 16384  # default maximum batch tokens of text-embeddings-inference
+    EMBEDDING_CONCURRENCY = 4
 
-    def __init__(self, vector_store_model: str | None, parser_manager: ParserManager) -> None:
+    def __init__(
+        self,
+        vector_store_model: str | None,
+        parser_manager: ParserManager,
+        document_cache: DocumentCache | None = None,
+    ) -> None:
         self.vector_store_model = vector_store_model
         self.parser_manager = parser_manager
+        self.document_cache = document_cache
 
     @staticmethod
     async def create_collection(postgres_session: AsyncSession, user_id: int, name: str, visibility: CollectionVisibility, description: str | None = None) -> int:  # fmt: off
@@ -66,8 +83,8 @@ class DocumentManager:
     @staticmethod
     async def delete_collection(
         postgres_session: AsyncSession,
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
         user_id: int,
         collection_id: int,
     ) -> None:
@@ -85,10 +102,19 @@ class DocumentManager:
         await postgres_session.commit()
 
         # delete the collection from vector store
-        await elasticsearch_vector_store.delete_collection(client=elasticsearch_client, collection_id=collection_id)
+        await vector_store.delete_collection(client=elasticsearch_client, collection_id=collection_id)
 
     @staticmethod
-    async def update_collection(postgres_session: AsyncSession, user_id: int, collection_id: int, name: str | None = None, visibility: CollectionVisibility | None = None, description: str | None = None) -> None:  # fmt: off
+    async def update_collection(
+        postgres_session: AsyncSession,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
+        user_id: int,
+        collection_id: int,
+        name: str | None = None,
+        visibility: CollectionVisibility | None = None,
+        description: str | None = None,
+    ) -> None:
         # check if collection exists
         result = await postgres_session.execute(
             statement=select(CollectionTable)
@@ -105,13 +131,20 @@ class DocumentManager:
         visibility = visibility if visibility is not None else collection.visibility
         description = description if description is not None else collection.description
 
+        # the update synchronizes the loaded collection and the commit expires it, the previous values are read before
+        previous_visibility, owner_id = collection.visibility, collection.user_id
+
         await postgres_session.execute(
             statement=update(table=CollectionTable)
             .values(name=name, visibility=visibility, description=description)
-            .where(CollectionTable.id == collection.id)
+            .where(CollectionTable.id == collection_id)
         )
         await postgres_session.commit()
 
+        # the visibility of the chunks is used to search the public collections
+        if visibility != previous_visibility:
+            await vector_store.update_collection(client=elasticsearch_client, collection_id=collection_id, user_id=owner_id, visibility=visibility)
+
     @staticmethod
     async def get_collections(
         postgres_session: AsyncSession,
@@ -178,8 +211,9 @@ class DocumentManager:
         redis_client: AsyncRedis,
         model_registry: ModelRegistry,
         request_context: ContextVar[RequestContext],
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
+        ingestion_worker: "IngestionWorker | None" = None,
     ) -> int:
         # check if collection exists and prepare document chunks in a single transaction
         result = await postgres_session.execute(
@@ -195,29 +229,23 @@ class DocumentManager:
         # get document name
         document_name = name or file.filename.strip() if file else name
 
-        if file:
-            # parse the file
-            try:
-                content = await self.parser_manager.parse(file=file)
-            except Exception as e:
-                logger.exception(f"failed to parse {document_name} ({e}).")
-                raise ParsingDocumentFailedException()
+        # the file is ingested in background, after the document creation
+        ingest_in_background = file is not None and ingestion_worker is not None
 
-            # split the content into chunks
-            if disable_chunking:
-                chunks: list[str] = [content]
-            else:
-                chunks: list[str] = self._split(
-                    content=content,
-                    chunk_size=chunk_size,
-                    chunk_overlap=chunk_overlap,
-                    is_separator_regex=is_separator_regex,
-                    separators=separators,
-                    chunk_min_size=chunk_min_size,
-                    preset_separators=preset_separators,
-                )
-                if len(chunks) == 0:
-                    raise ChunkingFailedException(detail="No chunks were extracted from the document.")
+        if ingest_in_background:
+            self.parser_manager.check_file_type(file=file)
+        elif file:
+            chunks = await self._parse_and_split(
+                file=file,
+                document_name=document_name,
+                disable_chunking=disable_chunking,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                chunk_min_size=chunk_min_size,
+                is_separator_regex=is_separator_regex,
+                separators=separators,
+                preset_separators=preset_separators,
+            )
 
         # insert the document into the database
         try:
@@ -226,6 +254,8 @@ class DocumentManager:
                 .values(
                     name=document_name,
                     collection_id=collection_id,
+                    status=DocumentStatus.PENDING if ingest_in_background else DocumentStatus.COMPLETED,
+                    progress=0 if ingest_in_background else 100,
                 )
                 .returning(DocumentTable.id)
             )
@@ -234,26 +264,40 @@ class DocumentManager:
                 raise CollectionNotFoundException(detail=f"Collection {collection_id} no longer exists")
             raise
         document_id = result.scalar_one()
-        await postgres_session.commit()
 
-        if file:
-            # index the chunks into the vector store
-            chunks: list[Chunk] = [
-                Chunk(
-                    id=i,
-                    collection_id=collection_id,
-                    document_id=document_id,
-                    content=content,
-                    metadata=metadata,
-                )
-                for i, content in enumerate(chunks)
-            ]
+        if not ingest_in_background:
+            await postgres_session.commit()
 
+        if ingest_in_background:
+            job = DocumentIngestionJob(
+                filename=file.filename,
+                content_type=file.content_type,
+                disable_chunking=disable_chunking,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                chunk_min_size=chunk_min_size,
+                is_separator_regex=is_separator_regex,
+                separators=separators,
+                preset_separators=preset_separators,
+                metadata=metadata,
+            )
+            # the upload is stored before the document is committed, so a pending document is never claimed without its file
+            try:
+                await ingestion_worker.store(document_id=document_id, file=file, job=job)
+                await postgres_session.commit()
+            except Exception as e:
+                logger.exception(msg=f"Error during document upload storage: {e}")
+                await postgres_session.rollback()
+                await ingestion_worker.discard(document_id=document_id)
+                raise
+            ingestion_worker.submit()
+
+        elif file:
             try:
                 await self._upsert_document_chunks(
-                    chunks=chunks,
+                    chunks=self._get_chunks(contents=chunks, collection_id=collection_id, document_id=document_id, metadata=metadata),
                     redis_client=redis_client,
-                    elasticsearch_vector_store=elasticsearch_vector_store,
+                    vector_store=vector_store,
                     elasticsearch_client=elasticsearch_client,
                     postgres_session=postgres_session,
                     model_registry=model_registry,
@@ -265,18 +309,64 @@ class DocumentManager:
                     postgres_session=postgres_session,
                     user_id=request_context.get().user_info.id,
                     document_id=document_id,
-                    elasticsearch_vector_store=elasticsearch_vector_store,
+                    vector_store=vector_store,
                     elasticsearch_client=elasticsearch_client,
                 )
                 raise VectorizationFailedException(detail=f"Vectorization failed: {e}")
 
         return document_id
 
+    async def ingest_document(
+        self,
+        document_id: int,
+        collection_id: int,
+        file: UploadFile,
+        job: DocumentIngestionJob,
+        postgres_session: AsyncSession,
+        redis_client: AsyncRedis,
+        model_registry: ModelRegistry,
+        request_context: ContextVar[RequestContext],
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> None:
+        """
+        Parse, split and index the file of a document created with `pending` status, run by the ingestion worker.
+
+        Args:
+            document_id(int): The document ID
+            collection_id(int): The collection ID of the document
+            file(UploadFile): The stored upload of the document
+            job(DocumentIngestionJob): The chunking parameters of the upload request
+            progress(Callable[[int, int], None] | None): Called with the number of indexed chunks and the total number of chunks after each indexed batch
+        """
+        contents = await self._parse_and_split(
+            file=file,
+            document_name=job.filename,
+            disable_chunking=job.disable_chunking,
+            chunk_size=job.chunk_size,
+            chunk_overlap=job.chunk_overlap,
+            chunk_min_size=job.chunk_min_size,
+            is_separator_regex=job.is_separator_regex,
+            separators=job.separators,
+            preset_separators=job.preset_separators,
+        )
+        await self._upsert_document_chunks(
+            chunks=self._get_chunks(contents=contents, collection_id=collection_id, document_id=document_id, metadata=job.metadata),
+            redis_client=redis_client,
+            vector_store=vector_store,
+            elasticsearch_client=elasticsearch_client,
+            postgres_session=postgres_session,
+            model_registry=model_registry,
+            request_context=request_context,
+            progress=progress,
+        )
+
     @staticmethod
     async def get_documents(
         postgres_session: AsyncSession,
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
         user_id: int,
         collection_id: int | None = None,
         document_id: int | None = None,
@@ -292,6 +382,9 @@ class DocumentManager:
                 DocumentTable.name,
                 DocumentTable.collection_id,
                 cast(func.extract("epoch", DocumentTable.created), Integer).label("created"),
+                DocumentTable.status,
+                DocumentTable.progress,
+                DocumentTable.error,
             )
             .offset(offset=offset)
             .limit(limit=limit)
@@ -312,16 +405,17 @@ class DocumentManager:
         if document_id and len(documents) == 0:
             raise DocumentNotFoundException()
 
+        chunk_counts = await vector_store.get_chunk_counts(client=elasticsearch_client, document_ids=[document.id for document in documents])
         for document in documents:
-            document.chunks = await elasticsearch_vector_store.get_chunk_count(client=elasticsearch_client, document_id=document.id)
+            document.chunks = chunk_counts.get(document.id, 0)
 
         return documents
 
     @staticmethod
     async def delete_document(
         postgres_session: AsyncSession,
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
         user_id: int,
         document_id: int,
     ) -> None:
@@ -340,7 +434,7 @@ class DocumentManager:
         await postgres_session.execute(statement=delete(table=DocumentTable).where(DocumentTable.id == document_id))
         await postgres_session.commit()
 
-        await elasticsearch_vector_store.delete_document(client=elasticsearch_client, document_id=document_id)
+        await vector_store.delete_document(client=elasticsearch_client, document_id=document_id)
 
     async def create_document_chunks(
         self,
@@ -351,8 +445,8 @@ class DocumentManager:
         redis_client: AsyncRedis,
         model_registry: ModelRegistry,
         request_context: ContextVar[RequestContext],
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
     ) -> list[int]:
         query = (
             select(CollectionTable.id)
@@ -370,7 +464,7 @@ class DocumentManager:
         except NoResultFound:
             raise DocumentNotFoundException()
 
-        last_chunk_id: int | None = await elasticsearch_vector_store.get_last_chunk_id(client=elasticsearch_client, document_id=document_id)
+        last_chunk_id: int | None = await vector_store.get_last_chunk_id(client=elasticsearch_client, document_id=document_id)
         start = 0 if last_chunk_id is None else last_chunk_id + 1
 
         chunks: list[Chunk] = [
@@ -387,7 +481,7 @@ class DocumentManager:
             await self._upsert_document_chunks(
                 chunks=chunks,
                 redis_client=redis_client,
-                elasticsearch_vector_store=elasticsearch_vector_store,
+                vector_store=vector_store,
                 elasticsearch_client=elasticsearch_client,
                 postgres_session=postgres_session,
                 model_registry=model_registry,
@@ -403,8 +497,8 @@ class DocumentManager:
     async def delete_document_chunk(
         self,
         postgres_session: AsyncSession,
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
         user_id: int,
         document_id: int,
         chunk_id: int,
@@ -421,15 +515,15 @@ class DocumentManager:
         except NoResultFound:
             raise DocumentNotFoundException()
 
-        await elasticsearch_vector_store.delete_chunk(client=elasticsearch_client, document_id=document_id, chunk_id=chunk_id)
+        await vector_store.delete_chunk(client=elasticsearch_client, document_id=document_id, chunk_id=chunk_id)
 
         await postgres_session.commit()
 
     @staticmethod
     async def get_document_chunks(
         postgres_session: AsyncSession,
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
         user_id: int,
         document_id: int,
         chunk_id: int | None = None,
@@ -447,7 +541,7 @@ class DocumentManager:
         except NoResultFound:
             raise DocumentNotFoundException()
 
-        chunks = await elasticsearch_vector_store.get_chunks(
+        chunks = await vector_store.get_chunks(
             client=elasticsearch_client,
             document_id=document_id,
             offset=offset,
@@ -469,43 +563,47 @@ class DocumentManager:
         rff_k: int,
         score_threshold: float,
         postgres_session: AsyncSession,
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
         redis_client: AsyncRedis,
         model_registry: ModelRegistry,
         request_context: ContextVar[RequestContext],
     ) -> list[Search]:
-        # get collections ids
-        result = await postgres_session.execute(
-            statement=select(CollectionTable.id).where(
-                or_(
-                    CollectionTable.user_id == request_context.get().user_info.id,
-                    CollectionTable.visibility == CollectionVisibility.PUBLIC,
-                )
-            )
-        )
-        user_collections_ids = [row.id for row in result.all()]
+        user_id = request_context.get().user_info.id
+        is_authorized = or_(CollectionTable.user_id == user_id, CollectionTable.visibility == CollectionVisibility.PUBLIC)
+
+        # check the requested collections, without requested collections all the collections of the user and the public
+        # collections are searched by their owner and visibility indexed with the chunks
         if collection_ids:
+            result = await postgres_session.execute(
+                statement=select(CollectionTable.id).where(CollectionTable.id.in_(collection_ids)).where(is_authorized)
+            )
+            authorized_collection_ids = {row.id for row in result.all()}
             for collection_id in collection_ids:
-                if collection_id not in user_collections_ids:
+                if collection_id not in authorized_collection_ids:
                     raise CollectionNotFoundException(detail=f"Collection {collection_id} not found.")
-        else:
-            collection_ids = user_collections_ids
 
-        provider = await model_registry.get_model_provider(
-            model=self.vector_store_model,
-            endpoint=EndpointRoute.EMBEDDINGS,
-            postgres_session=postgres_session,
-            redis_client=redis_client,
-            request_context=request_context,
-        )
         if method == SearchMethod.LEXICAL:
+            # the search is still accounted to the vector store model in the request usage
+            await model_registry.get_model_provider(
+                model=self.vector_store_model,
+                endpoint=EndpointRoute.EMBEDDINGS,
+                postgres_session=postgres_session,
+                redis_client=redis_client,
+                request_context=request_context,
+            )
             query_vector = None
         else:
-            response = await self._create_embeddings(provider=provider, input_texts=[query], redis_client=redis_client)
-            query_vector = response[0]
+            embedding = await self._get_query_embedding(
+                query=query,
+                postgres_session=postgres_session,
+                redis_client=redis_client,
+                model_registry=model_registry,
+                request_context=request_context,
+            )
+            query_vector = embedding.tolist()
 
-        searches = await elasticsearch_vector_store.search(
+        searches = await vector_store.search(
             client=elasticsearch_client,
             method=method,
             query_prompt=query,
@@ -517,10 +615,159 @@ class DocumentManager:
             offset=offset,
             rff_k=rff_k,
             score_threshold=score_threshold,
+            user_id=user_id,
         )
 
+        # the indexed visibility of the chunks is updated after the collection, check the collections of the results
+        if not collection_ids and searches:
+            result_collection_ids = {search.chunk.collection_id for search in searches}
+            result = await postgres_session.execute(
+                statement=select(CollectionTable.id).where(CollectionTable.id.in_(result_collection_ids)).where(is_authorized)
+            )
+            authorized_collection_ids = {row.id for row in result.all()}
+            searches = [search for search in searches if search.chunk.collection_id in authorized_collection_ids]
+
         return searches
 
+    @staticmethod
+    async def sync_collection_chunks(
+        postgres_session: AsyncSession,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
+    ) -> None:
+        """
+        Set the owner and the visibility of the collections on their chunks indexed without them (e.g. before these fields
+        were added) or with stale ones (e.g. the update of the chunks failed after a visibility change), so they are found
+        by the searches without requested collections. The chunks of deleted collections are deleted.
+        """
+        after = 0
+        while assignments := await vector_store.get_collection_assignments(client=elasticsearch_client, after=after):
+            result = await postgres_session.execute(
+                statement=select(CollectionTable.id, CollectionTable.user_id, CollectionTable.visibility).where(
+                    CollectionTable.id.in_(list(assignments))
+                )
+            )
+            collections = {row.id: row for row in result.all()}
+
+            synced = 0
+            for collection_id, collection_assignments in assignments.items():
+                collection = collections.get(collection_id)
+                if collection is None:
+                    await vector_store.delete_collection(client=elasticsearch_client, collection_id=collection_id)
+                    synced += 1
+                elif collection_assignments != {(collection.user_id, collection.visibility)}:
+                    await vector_store.update_collection(
+                        client=elasticsearch_client, collection_id=collection_id, user_id=collection.user_id, visibility=collection.visibility
+                    )
+                    synced += 1
+            logger.info(f"Synchronized the owner and visibility of the chunks of {synced} of {len(assignments)} collections.")
+            after = max(assignments)
+
+    async def _get_query_embedding(
+        self,
+        query: str,
+        postgres_session: AsyncSession,
+        redis_client: AsyncRedis,
+        model_registry: ModelRegistry,
+        request_context: ContextVar[RequestContext],
+    ) -> np.ndarray:
+        """
+        Embed a search query, unless the same query has already been embedded.
+        """
+        if self.document_cache is not None:
+            query = self.document_cache.normalize(text=query)
+            [embedding] = await self.document_cache.get_embeddings(model=self.vector_store_model, texts=[query], local=True)
+            if embedding is not None:
+                return embedding
+
+        provider = await model_registry.get_model_provider(
+            model=self.vector_store_model,
+            endpoint=EndpointRoute.EMBEDDINGS,
+            postgres_session=postgres_session,
+            redis_client=redis_client,
+            request_context=request_context,
+        )
+        embeddings = await self._create_embeddings(provider=provider, input_texts=[query], redis_client=redis_client)
+
+        if self.document_cache is not None:
+            await self.document_cache.set_embeddings(model=self.vector_store_model, texts=[query], embeddings=embeddings, local=True)
+
+        return embeddings[0]
+
+    async def _parse_and_split(
+        self,
+        file: UploadFile,
+        document_name: str,
+        disable_chunking: bool,
+        chunk_size: int,
+        chunk_overlap: int,
+        chunk_min_size: int,
+        is_separator_regex: bool,
+        separators: list[str],
+        preset_separators: PresetSeparators,
+    ) -> list[str]:
+        # parse the file, unless the same content has already been parsed
+        content, digest = None, None
+        if self.document_cache is not None:
+            file_type = self.parser_manager.check_file_type(file=file)
+            digest = await self.document_cache.get_file_digest(file=file, file_type=file_type)
+            content = await self.document_cache.get_content(digest=digest)
+
+        if content is None:
+            try:
+                content = await self.parser_manager.parse(file=file)
+            except Exception as e:
+                logger.exception(f"failed to parse {document_name} ({e}).")
+                raise ParsingDocumentFailedException()
+
+            if digest is not None:
+                await self.document_cache.set_content(digest=digest, content=content)
+
+        # split the content into chunks
+        if disable_chunking:
+            return [content]
+
+        chunks = self._split(
+            content=content,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            is_separator_regex=is_separator_regex,
+            separators=separators,
+            chunk_min_size=chunk_min_size,
+            preset_separators=preset_separators,
+        )
+        if len(chunks) == 0:
+            raise ChunkingFailedException(detail="No chunks were extracted from the document.")
+
+        return chunks
+
+    @staticmethod
+    def _get_chunks(contents: list[str], collection_id: int, document_id: int, metadata: ChunkMetadata | None) -> list[Chunk]:
+        return [
+            Chunk(
+                id=i,
+                collection_id=collection_id,
+                document_id=document_id,
+                content=content,
+                metadata=metadata,
+            )
+            for i, content in enumerate(contents)
+        ]
+
+    @staticmethod
+    def _to_vector_store_chunk(chunk: Chunk, embedding: np.ndarray, user_id: int, visibility: CollectionVisibility) -> VectorStoreChunk:
+        return VectorStoreChunk(
+            id=chunk.id,
+            collection_id=chunk.collection_id,
+            document_id=chunk.document_id,
+            user_id=user_id,
+            visibility=visibility,
+            content=chunk.content,
+            embedding=embedding,
+            metadata=chunk.metadata,
+            created=datetime.now(),
+        )
+
     @staticmethod
     def _split(
         content: str,
@@ -552,17 +799,55 @@ class DocumentManager:
 
         return chunks
 
-    async def _create_embeddings(self, provider: ModelProvider, input_texts: list[str], redis_client: AsyncRedis) -> list[float]:
+    async def _create_embeddings(self, provider: ModelProvider, input_texts: list[str], redis_client: AsyncRedis) -> np.ndarray:
+        # embeddings are requested in base64 to be decoded straight into a float32 array, without parsing floats
         response = await provider.forward_request(
             request_content=RequestContent(
                 method="POST",
                 endpoint=EndpointRoute.EMBEDDINGS,
-                body={"input": input_texts, "model": self.vector_store_model, "encoding_format": "float"},
+                body={"input": input_texts, "model": self.vector_store_model, "encoding_format": "base64"},
                 model=self.vector_store_model,
             ),
             redis_client=redis_client,
         )
-        return [vector["embedding"] for vector in response.json()["data"]]
+        data = sorted(orjson.loads(response.content)["data"], key=lambda vector: vector.get("index", 0))
+
+        return decode_embeddings(embeddings=[vector["embedding"] for vector in data])
+
+    def _get_batches(self, chunks: list[Chunk], max_tokens: int) -> list[list[Chunk]]:
+        """
+        Group the chunks in embedding batches of at most `BATCH_SIZE` chunks and `max_tokens` tokens, a chunk larger than
+        `max_tokens` is embedded alone.
+
+        Args:
+            chunks(list[Chunk]): The chunks to embed
+            max_tokens(int): The maximum number of tokens of a batch
+        """
+        # without tokenizer (e.g. in a Celery worker), a token is estimated to 4 characters
+        tokenizer = getattr(global_context, "tokenizer", None)
+        batches, batch, batch_tokens = [], [], 0
+        for chunk in chunks:
+            tokens = len(tokenizer.tokenizer.encode(chunk.content)) if tokenizer else len(chunk.content) // 4
+            if batch and (len(batch) == self.BATCH_SIZE or batch_tokens + tokens > max_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(chunk)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def _get_embedding_concurrency(self, provider: ModelProvider) -> int:
+        """
+        Get the number of concurrent embedding requests, limited by the inflight QoS policy of the provider so a document
+        ingestion does not take all the slots of the provider.
+        """
+        if provider.qos_metric == Metric.INFLIGHT and provider.qos_limit is not None:
+            return max(1, min(self.EMBEDDING_CONCURRENCY, int(provider.qos_limit)))
+
+        return self.EMBEDDING_CONCURRENCY
 
     async def _upsert_document_chunks(
         self,
@@ -571,31 +856,90 @@ class DocumentManager:
         postgres_session: AsyncSession,
         model_registry: ModelRegistry,
         request_context: ContextVar[RequestContext],
-        elasticsearch_vector_store: ElasticsearchVectorStore,
-        elasticsearch_client: AsyncElasticsearch,
+        vector_store: BaseVectorStore,
+        elasticsearch_client: AsyncElasticsearch | None,
+        progress: Callable[[int, int], None] | None = None,
     ) -> None:
-        provider = await model_registry.get_model_provider(
-            model=self.vector_store_model,
-            endpoint=EndpointRoute.EMBEDDINGS,
-            postgres_session=postgres_session,
-            request_context=request_context,
-            redis_client=redis_client,
+        """
+        Embed and index the chunks of a document. Batches are embedded concurrently and indexed in the vector store while
+        the next batches are embedded. The chunks with cached embeddings are indexed without calling the embeddings
+        provider.
+
+        Args:
+            chunks(list[Chunk]): The chunks to index
+            progress(Callable[[int, int], None] | None): Called with the number of indexed chunks and the total number of chunks after each indexed batch
+        """
+        if not chunks:
+            return
+
+        # the chunks of a document belong to a single collection
+        result = await postgres_session.execute(
+            statement=select(CollectionTable.user_id, CollectionTable.visibility).where(CollectionTable.id == chunks[0].collection_id)
         )
-        batches = batched(iterable=chunks, n=self.BATCH_SIZE)
-        for batch in batches:
+        user_id, visibility = result.one()
+
+        def to_vector_store_chunk(chunk: Chunk, embedding: np.ndarray) -> VectorStoreChunk:
+            return self._to_vector_store_chunk(chunk=chunk, embedding=embedding, user_id=user_id, visibility=visibility)
+
+        cached_batches: list[list[VectorStoreChunk]] = []
+        missing_chunks = chunks
+        if self.document_cache is not None:
+            embeddings = await self.document_cache.get_embeddings(model=self.vector_store_model, texts=[chunk.content for chunk in chunks])
+            cached_chunks = [to_vector_store_chunk(chunk=chunk, embedding=embedding) for chunk, embedding in zip(chunks, embeddings) if embedding is not None]  # fmt: off
+            cached_batches = [cached_chunks[i : i + self.BATCH_SIZE] for i in range(0, len(cached_chunks), self.BATCH_SIZE)]
+            missing_chunks = [chunk for chunk, embedding in zip(chunks, embeddings) if embedding is None]
+
+        batches, concurrency = [], 1
+        if missing_chunks:
+            provider = await model_registry.get_model_provider(
+                model=self.vector_store_model,
+                endpoint=EndpointRoute.EMBEDDINGS,
+                postgres_session=postgres_session,
+                request_context=request_context,
+                redis_client=redis_client,
+            )
+            # the batch tokens are summed over the inputs, unlike the context length of the router, which limits each input
+            batches = self._get_batches(chunks=missing_chunks, max_tokens=self.BATCH_MAX_TOKENS)
+            concurrency = self._get_embedding_concurrency(provider=provider)
+        semaphore = asyncio.Semaphore(concurrency)
+        # embedded batches waiting to be indexed, bounded to not embed too far ahead of the indexing
+        embedded_batches: asyncio.Queue[list[VectorStoreChunk]] = asyncio.Queue(maxsize=concurrency)
+
+        async def embed(batch: list[Chunk]) -> None:
             input_texts = [chunk.content for chunk in batch]
-            batch_chunks = []
-            embeddings = await self._create_embeddings(provider=provider, input_texts=input_texts, redis_client=redis_client)
-            for chunk, embedding in zip(batch, embeddings):
-                batch_chunks.append(
-                    ElasticsearchChunk(
-                        id=chunk.id,
-                        collection_id=chunk.collection_id,
-                        document_id=chunk.document_id,
-                        content=chunk.content,
-                        embedding=embedding,
-                        metadata=chunk.metadata,
-                        created=datetime.now(),
-                    )
-                )
-            await elasticsearch_vector_store.upsert(client=elasticsearch_client, chunks=batch_chunks)
+            async with semaphore:
+                embeddings = await self._create_embeddings(provider=provider, input_texts=input_texts, redis_client=redis_client)
+            if self.document_cache is not None:
+                await self.document_cache.set_embeddings(model=self.vector_store_model, texts=input_texts, embeddings=embeddings)
+            await embedded_batches.put([to_vector_store_chunk(chunk=chunk, embedding=embedding) for chunk, embedding in zip(batch, embeddings)])
+
+        indexed = 0
+
+        async def index(batch_chunks: list[VectorStoreChunk]) -> None:
+            nonlocal indexed
+            await vector_store.upsert(client=elasticsearch_client, chunks=batch_chunks)
+            indexed += len(batch_chunks)
+            if progress is not None:
+                progress(indexed, len(chunks))
+
+        async def index_all() -> None:
+            for batch_chunks in cached_batches:
+                await index(batch_chunks=batch_chunks)
+            for _ in range(len(batches)):
+                await index(batch_chunks=await embedded_batches.get())
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(index_all())
+                for batch in batches:
+                    task_group.create_task(embed(batch=batch))
+        except ExceptionGroup as e:
+            # the first failure cancels the other batches
+            raise e.exceptions[0]
+
+        # the visibility may have changed during the indexing, after the update of the chunks already indexed
+        result = await postgres_session.execute(statement=select(CollectionTable.visibility).where(CollectionTable.id == chunks[0].collection_id))
+        if (current_visibility := result.scalar_one()) != visibility:
+            await vector_store.update_collection(
+                client=elasticsearch_client, collection_id=chunks[0].collection_id, user_id=user_id, visibility=current_visibility
+            )
@@ -1,22 +1,31 @@
 import hashlib
 import logging
 import re
+import time
 
 from elasticsearch import AsyncElasticsearch, helpers
 from elasticsearch.helpers import BulkIndexError
 
+from api.helpers._basevectorstore import SEARCH_DURATION_SECONDS, BaseVectorStore
 from api.schemas.chunks import Chunk
-from api.schemas.core.elasticsearch import ElasticsearchChunk, ElasticsearchIndexLanguage
+from api.schemas.collections import CollectionVisibility
+from api.schemas.core.elasticsearch import ElasticsearchIndexLanguage
+from api.schemas.core.vectorstore import VectorStoreChunk
 from api.schemas.search import ComparisonFilter, ComparisonFilterType, CompoundFilter, CompoundFilterOperator, Search, SearchMethod
 
 logger = logging.getLogger(__name__)
 
+# licenses of the Elasticsearch clusters supporting the Reciprocal Rank Fusion retriever
+RRF_LICENSE_TYPES = {"enterprise", "trial"}
 
-class ElasticsearchVectorStore:
-    default_method = SearchMethod.HYBRID
+
+class ElasticsearchVectorStore(BaseVectorStore):
+    # the collection owner and visibility are only used to filter the searches, they are not returned with the chunks
+    SOURCE_EXCLUDES = ["embedding", "user_id", "visibility"]
 
     def __init__(self, index_name: str):
         self.index_name = index_name
+        self.native_rrf = False
 
     async def setup(
         self,
@@ -36,6 +45,7 @@ class ElasticsearchVectorStore:
             number_of_replicas(int): The number of replicas for the index
             vector_size(int): The size of the vector to be used for the index
         """
+        self.native_rrf = await self._has_native_rrf(client=client)
 
         settings = {
             "number_of_shards": number_of_shards,
@@ -60,6 +70,9 @@ class ElasticsearchVectorStore:
                 "id": {"type": "integer"},
                 "collection_id": {"type": "integer"},
                 "document_id": {"type": "integer"},
+                # collection owner and visibility, to search all the collections of a user without listing them
+                "user_id": {"type": "integer"},
+                "visibility": {"type": "keyword"},
                 "embedding": {"type": "dense_vector", "dims": vector_size, "index": True, "similarity": "cosine"},
                 "content": {"type": "text", "analyzer": "content_analyzer"},
                 "metadata": {"type": "flattened"},
@@ -72,15 +85,82 @@ class ElasticsearchVectorStore:
             existing_vector_size = existing_mapping[self.index_name]["mappings"]["properties"]["embedding"]["dims"]
             assert existing_vector_size == vector_size, f"Index has incorrect vector size for index {self.index_name} ({existing_vector_size} != {vector_size})"  # fmt: off
 
+            # fields added after the index creation
+            await client.indices.put_mapping(
+                index=self.index_name, properties={key: mappings["properties"][key] for key in ("user_id", "visibility")}
+            )
             return
 
         await client.indices.create(index=self.index_name, mappings=mappings, settings=settings)
 
+    @staticmethod
+    async def _has_native_rrf(client: AsyncElasticsearch) -> bool:
+        """
+        Check if the hybrid searches can be fused by Elasticsearch with the RRF retriever, which requires an enterprise license.
+        """
+        try:
+            result = await client.license.get()
+        except Exception as e:
+            logger.info(f"Failed to get Elasticsearch license, hybrid search results are fused by the API ({e}).")
+            return False
+
+        return result["license"]["type"] in RRF_LICENSE_TYPES and result["license"]["status"] == "active"
+
     async def delete_collection(self, client: AsyncElasticsearch, collection_id: int) -> None:
         query = {"bool": {"must": [{"term": {"collection_id": collection_id}}]}}
 
         await client.delete_by_query(index=self.index_name, query=query, conflicts="proceed")
 
+    async def delete_user(self, client: AsyncElasticsearch, user_id: int) -> None:
+        """
+        Delete the chunks of the collections owned by a user.
+        """
+        query = {"bool": {"must": [{"term": {"user_id": user_id}}]}}
+
+        await client.delete_by_query(index=self.index_name, query=query, conflicts="proceed")
+
+    async def update_collection(self, client: AsyncElasticsearch, collection_id: int, user_id: int, visibility: CollectionVisibility) -> None:
+        """
+        Set the owner and the visibility of the chunks of a collection.
+        """
+        query = {"bool": {"must": [{"term": {"collection_id": collection_id}}]}}
+        script = {
+            "source": "ctx._source.user_id = params.user_id; ctx._source.visibility = params.visibility",
+            "params": {"user_id": user_id, "visibility": visibility.value},
+        }
+
+        # run as a task: the update of a large collection outlasts the request timeout
+        await client.update_by_query(index=self.index_name, query=query, script=script, conflicts="proceed", refresh=True, wait_for_completion=False)  # fmt: off
+
+    async def get_collection_assignments(
+        self, client: AsyncElasticsearch, after: int = 0, size: int = 1000
+    ) -> dict[int, set[tuple[int | None, CollectionVisibility | None]]]:
+        """
+        Get the owners and visibilities of the indexed chunks of the collections with an ID greater than `after`.
+        """
+        owners = {"field": "user_id", "missing": -1}
+        visibilities = {"field": "visibility", "missing": ""}
+        result = await client.search(
+            index=self.index_name,
+            size=0,
+            query={"range": {"collection_id": {"gt": after}}},
+            aggs={
+                "collection_ids": {
+                    "terms": {"field": "collection_id", "size": size, "order": {"_key": "asc"}},
+                    "aggs": {"assignments": {"multi_terms": {"terms": [owners, visibilities], "size": 10}}},
+                }
+            },
+        )
+
+        assignments = {}
+        for bucket in result["aggregations"]["collection_ids"]["buckets"]:
+            assignments[int(bucket["key"])] = {
+                (int(user_id) if int(user_id) != -1 else None, CollectionVisibility(visibility) if visibility else None)
+                for user_id, visibility in (assignment["key"] for assignment in bucket["assignments"]["buckets"])
+            }
+
+        return assignments
+
     async def delete_document(self, client: AsyncElasticsearch, document_id: int) -> None:
         query = {"bool": {"must": [{"term": {"document_id": document_id}}]}}
 
@@ -91,11 +171,21 @@ class ElasticsearchVectorStore:
 
         await client.delete_by_query(index=self.index_name, query=query, conflicts="proceed")
 
-    async def get_chunk_count(self, client: AsyncElasticsearch, document_id: int) -> int | None:
-        query = {"bool": {"must": [{"term": {"document_id": document_id}}]}}
-        result = await client.count(index=self.index_name, query=query)
+    async def get_chunk_counts(self, client: AsyncElasticsearch, document_ids: list[int]) -> dict[int, int]:
+        """
+        Get the number of chunks of several documents in a single aggregation, the documents without chunks are omitted.
+        """
+        if not document_ids:
+            return {}
+
+        result = await client.search(
+            index=self.index_name,
+            size=0,
+            query={"bool": {"filter": [{"terms": {"document_id": document_ids}}]}},
+            aggs={"document_ids": {"terms": {"field": "document_id", "size": len(document_ids)}}},
+        )
 
-        return result["count"]
+        return {int(bucket["key"]): bucket["doc_count"] for bucket in result["aggregations"]["document_ids"]["buckets"]}
 
     async def get_chunks(
         self,
@@ -113,7 +203,7 @@ class ElasticsearchVectorStore:
                     ]
                 },
             },
-            "_source": {"excludes": ["embedding"]},
+            "_source": {"excludes": self.SOURCE_EXCLUDES},
             "from": offset,
             "size": limit,
         }
@@ -138,7 +228,7 @@ class ElasticsearchVectorStore:
 
         return value
 
-    async def upsert(self, client: AsyncElasticsearch, chunks: list[ElasticsearchChunk]) -> None:
+    async def upsert(self, client: AsyncElasticsearch, chunks: list[VectorStoreChunk]) -> None:
         actions = [
             {
                 "_index": self.index_name,
@@ -177,11 +267,15 @@ class ElasticsearchVectorStore:
         collection_ids: list[int],
         document_ids: list[int],
         metadata_filters: ComparisonFilter | CompoundFilter | None,
+        user_id: int | None = None,
     ) -> list[dict]:
         filters = []
 
         if collection_ids:
             filters.append({"terms": {"collection_id": collection_ids}})
+        elif user_id is not None:
+            visibility_filters = [{"term": {"user_id": user_id}}, {"term": {"visibility": CollectionVisibility.PUBLIC.value}}]
+            filters.append({"bool": {"should": visibility_filters, "minimum_should_match": 1}})
         if document_ids:
             filters.append({"terms": {"document_id": document_ids}})
         if metadata_filters:
@@ -209,11 +303,13 @@ class ElasticsearchVectorStore:
         offset: int,
         rff_k: int | None = 20,
         score_threshold: float = 0.0,
+        user_id: int | None = None,
     ) -> list[Search]:
         assert method is SearchMethod.LEXICAL or query_vector, "Query vector must not be None for semantic and hybrid search methods"
         assert rff_k is not None or method is not SearchMethod.HYBRID, "rff_k must not be None for hybrid search method"
 
-        filters = self._build_filters(collection_ids, document_ids, metadata_filters)
+        start = time.perf_counter()
+        filters = self._build_filters(collection_ids, document_ids, metadata_filters, user_id=user_id)
         if method == SearchMethod.SEMANTIC:
             searches = await self._semantic_search(
                 client=client,
@@ -237,18 +333,12 @@ class ElasticsearchVectorStore:
                 offset=offset,
                 rff_k=rff_k,
             )
+        SEARCH_DURATION_SECONDS.labels(method=method.value, phase="total").observe(time.perf_counter() - start)
 
         return searches
 
-    async def _lexical_search(
-        self,
-        client: AsyncElasticsearch,
-        query_prompt: str,
-        filters: dict,
-        limit: int,
-        offset: int,
-    ) -> list[Search]:
-        body = {
+    def _get_lexical_body(self, query_prompt: str, filters: list[dict], limit: int, offset: int) -> dict:
+        return {
             "query": {
                 "bool": {
                     "must": [{"multi_match": {"query": query_prompt, "fuzziness": "AUTO"}}],
@@ -257,11 +347,53 @@ class ElasticsearchVectorStore:
             },
             "size": limit,
             "from": offset,
-            "_source": {"excludes": ["embedding"]},
+            "_source": {"excludes": self.SOURCE_EXCLUDES},
             "sort": [{"_score": {"order": "desc"}}],
         }
+
+    def _get_semantic_body(self, query_vector: list[float], filters: list[dict], limit: int, offset: int) -> dict:
+        return {
+            "knn": {
+                "field": "embedding",
+                "query_vector": query_vector,
+                "k": limit,
+                "num_candidates": max(limit * 10, 100),
+                "filter": filters,
+            },
+            "size": limit,
+            "from": offset,
+            "_source": {"excludes": self.SOURCE_EXCLUDES},
+        }
+
+    @staticmethod
+    def _get_searches(results: dict, method: SearchMethod, search_method: SearchMethod | None = None) -> list[Search]:
+        """
+        Get the searches of an Elasticsearch response, and record its processing time.
+
+        Args:
+            results(dict): The response of the search
+            method(SearchMethod): The method of the search
+            search_method(SearchMethod | None): The method of the search request, if the search is a phase of a hybrid search
+        """
+        if "error" in results:
+            raise RuntimeError(f"Elasticsearch {method.value} search failed: {results['error']}")
+
+        if "took" in results:
+            SEARCH_DURATION_SECONDS.labels(method=(search_method or method).value, phase=method.value).observe(results["took"] / 1000)
+
+        return [Search(method=method.value, score=hit["_score"], chunk=Chunk(**hit["_source"])) for hit in results["hits"]["hits"]]
+
+    async def _lexical_search(
+        self,
+        client: AsyncElasticsearch,
+        query_prompt: str,
+        filters: list[dict],
+        limit: int,
+        offset: int,
+    ) -> list[Search]:
+        body = self._get_lexical_body(query_prompt=query_prompt, filters=filters, limit=limit, offset=offset)
         results = await client.search(index=self.index_name, body=body)
-        searches = [Search(method=SearchMethod.LEXICAL.value, score=hit["_score"], chunk=Chunk(**hit["_source"])) for hit in results["hits"]["hits"]]
+        searches = self._get_searches(results=results, method=SearchMethod.LEXICAL)
 
         return searches
 
@@ -274,21 +406,9 @@ class ElasticsearchVectorStore:
         offset: int,
         score_threshold: float = 0.0,
     ) -> list[Search]:
-        body = {
-            "knn": {
-                "field": "embedding",
-                "query_vector": query_vector,
-                "k": limit,
-                "num_candidates": max(limit * 10, 100),
-                "filter": filters,
-            },
-            "size": limit,
-            "from": offset,
-            "_source": {"excludes": ["embedding"]},
-        }
-
+        body = self._get_semantic_body(query_vector=query_vector, filters=filters, limit=limit, offset=offset)
         results = await client.search(index=self.index_name, body=body)
-        searches = [Search(method=SearchMethod.SEMANTIC.value, score=hit["_score"], chunk=Chunk(**hit["_source"])) for hit in results["hits"]["hits"]]
+        searches = self._get_searches(results=results, method=SearchMethod.SEMANTIC)
         searches = [search for search in searches if search.score >= score_threshold]
         searches = sorted(searches, key=lambda x: x.score, reverse=True)
 
@@ -299,20 +419,22 @@ class ElasticsearchVectorStore:
         client: AsyncElasticsearch,
         query_prompt: str,
         query_vector: list[float],
-        filters: dict,
+        filters: list[dict],
         limit: int,
         offset: int,
         rff_k: int,
         expansion_factor: int = 2,
     ) -> list[Search]:
         """
-        Hybrid search combines lexical and semantic search results using Reciprocal Rank Fusion (RRF).
+        Hybrid search combines lexical and semantic search results using Reciprocal Rank Fusion (RRF). Both searches are
+        run in a single request: fused by Elasticsearch with the RRF retriever when the cluster license supports it,
+        otherwise sent in a multi search and fused by the API.
 
         Args:
             client: AsyncElasticsearch: The Elasticsearch client
             query_prompt (str): The search prompt
             query_vector (list[float]): The query vector
-            collection_ids (list[int]): The collection ids
+            filters (list[dict]): The filters of both searches
             offset (int): The offset of the results to return
             limit (int): The number of results to return
             rff_k (int): The constant k in the RRF formula
@@ -321,39 +443,44 @@ class ElasticsearchVectorStore:
         Returns:
             A combined list of searches with updated scores
         """
-        lexical_searches = await self._lexical_search(
-            client=client,
-            query_prompt=query_prompt,
-            filters=filters,
-            limit=int(limit * expansion_factor),
-            offset=offset,
-        )
-        semantic_searches = await self._semantic_search(
-            client=client,
-            query_vector=query_vector,
-            filters=filters,
-            limit=int(limit * expansion_factor),
-            offset=offset,
-        )
+        # both searches rank the results up to the requested page, so the fused pages are consistent
+        window = (offset + limit) * expansion_factor
+
+        # the RRF retriever requires a rank constant of at least 1
+        if self.native_rrf and rff_k >= 1:
+            body = {
+                "retriever": {
+                    "rrf": {
+                        "retrievers": [
+                            {
+                                "standard": {
+                                    "query": self._get_lexical_body(query_prompt=query_prompt, filters=filters, limit=window, offset=0)["query"]
+                                }
+                            },
+                            {"knn": self._get_semantic_body(query_vector=query_vector, filters=filters, limit=window, offset=0)["knn"]},
+                        ],
+                        "rank_constant": rff_k,
+                        "rank_window_size": window,
+                    }
+                },
+                "size": limit,
+                "from": offset,
+                "_source": {"excludes": self.SOURCE_EXCLUDES},
+            }
+            results = await client.search(index=self.index_name, body=body)
+            return self._get_searches(results=results, method=SearchMethod.HYBRID)
 
-        combined_scores = {}
-        search_map = {}
-        for searches in [lexical_searches, semantic_searches]:
-            for rank, search in enumerate(searches):
-                chunk_id = search.chunk.document_id + search.chunk.id
-                if chunk_id not in combined_scores:
-                    combined_scores[chunk_id] = 0
-                    search_map[chunk_id] = search
-                    search_map[chunk_id].method = SearchMethod.HYBRID
-                combined_scores[chunk_id] += 1 / (rff_k + rank + 1)
-
-        ranked_scores = sorted(combined_scores.items(), key=lambda item: item[1], reverse=True)
-        reranked_searches = []
-        for chunk_id, rrf_score in ranked_scores:
-            search = search_map[chunk_id]
-            search.score = rrf_score
-            reranked_searches.append(search)
-
-        searches = reranked_searches[:limit]
+        results = await client.msearch(
+            index=self.index_name,
+            searches=[
+                {},
+                self._get_lexical_body(query_prompt=query_prompt, filters=filters, limit=window, offset=0),
+                {},
+                self._get_semantic_body(query_vector=query_vector, filters=filters, limit=window, offset=0),
+            ],
+        )
+        lexical_results, semantic_results = results["responses"]
+        lexical_searches = self._get_searches(results=lexical_results, method=SearchMethod.LEXICAL, search_method=SearchMethod.HYBRID)
+        semantic_searches = self._get_searches(results=semantic_results, method=SearchMethod.SEMANTIC, search_method=SearchMethod.HYBRID)
 
-        return searches
+        return self._fuse_searches(lexical_searches=lexical_searches, semantic_searches=semantic_searches, limit=limit, offset=offset, rff_k=rff_k)
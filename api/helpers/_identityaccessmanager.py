@@ -312,6 +312,13 @@ class IdentityAccessManager:
         await postgres_session.execute(statement=delete(table=UserTable).where(UserTable.id == user_id))
         await postgres_session.commit()
 
+        if global_context.budget_manager is not None:
+            await global_context.budget_manager.delete(user_id=user_id)
+
+        # the collections of the user are deleted with the user, their chunks are only referenced by owner
+        if global_context.vector_store is not None:
+            await global_context.vector_store.delete_user(client=global_context.elasticsearch_client, user_id=user_id)
+
     async def update_user(
         self,
         postgres_session: AsyncSession,
@@ -410,6 +417,9 @@ class IdentityAccessManager:
         )
         await postgres_session.commit()
 
+        if global_context.budget_manager is not None:
+            await global_context.budget_manager.set(user_id=user.id, budget=budget)
+
     @staticmethod
     async def get_users(
         postgres_session: AsyncSession,
@@ -672,12 +682,23 @@ class IdentityAccessManager:
 
         return tokens
 
-    async def check_token(self, postgres_session: AsyncSession, token: str) -> tuple[int | None, int | None, str | None]:
+    def get_token_claims(self, token: str) -> dict | None:
+        """
+        Decode a token and return its claims (user_id, token_id and expires), return None if the token is invalid.
+
+        Args:
+            token(str): The token
+        """
         try:
-            claims = self._decode_token(token=token)
+            return self._decode_token(token=token)
         except JWTError:
-            return None, None, None
+            return None
         except IndexError:  # malformed token (no token prefix)
+            return None
+
+    async def check_token(self, postgres_session: AsyncSession, token: str) -> tuple[int | None, int | None, str | None]:
+        claims = self.get_token_claims(token=token)
+        if claims is None:
             return None, None, None
 
         try:
@@ -755,12 +776,17 @@ class IdentityAccessManager:
             # user cannot see limits on models that are not accessible by the role
             limits = [limit for limit in role.limits if limit.value is None or limit.value > 0]
 
+            # the budget stored in the database is only periodically updated, the current budget is held by the budget manager
+            budget = user.budget
+            if global_context.budget_manager is not None:
+                budget = await global_context.budget_manager.get(user_id=user.id, budget=budget)
+
             user = UserInfo(
                 id=user.id,
                 email=user.email,
                 name=user.name,
                 organization=user.organization,
-                budget=user.budget,
+                budget=budget,
                 permissions=role.permissions,
                 limits=limits,
                 expires=user.expires,
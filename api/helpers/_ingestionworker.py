@@ -0,0 +1,301 @@
+import asyncio
+import datetime as dt
+import logging
+import os
+import shutil
+from typing import BinaryIO
+import uuid
+
+from fastapi import HTTPException, UploadFile
+from redis.asyncio import ConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.datastructures import Headers
+
+from api.schemas.core.context import RequestContext
+from api.schemas.documents import DocumentIngestionJob, DocumentStatus
+from api.schemas.usage import Usage
+from api.sql.models import Collection as CollectionTable
+from api.sql.models import Document as DocumentTable
+from api.utils.context import global_context, request_context
+from api.utils.exceptions import ChunkingFailedException
+from api.utils.hooks_decorator import release_inflight_reservations
+from api.utils.variables import EndpointRoute
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionWorker:
+    """
+    Per worker pool of background document ingestions. The uploads are stored in the ingestion directory and their
+    documents are created with `pending` status, then each task of the pool claims the oldest pending document of the
+    database (rows are locked with `SKIP LOCKED`, so a document is ingested by a single worker across all the API
+    instances), parses, splits and indexes its file. Failed ingestions are retried `max_retries` times, and documents
+    without progress for `timeout` seconds (e.g. the worker has been restarted) are claimed again.
+
+    Args:
+        session_factory(async_sessionmaker): The session factory used to claim and update the documents
+        redis_pool(ConnectionPool): The Redis connection pool used by the embeddings requests
+        directory(str): Directory where the uploads are stored until they are ingested, shared by all the workers
+        concurrency(int): Maximum number of documents ingested concurrently by the worker
+        max_retries(int): Maximum number of retries of a failed ingestion
+        timeout(int): Time in seconds without progress after which an ingestion is considered lost
+    """
+
+    POLL_INTERVAL = 5  # seconds between two lookups of documents submitted by other workers
+    RETRY_DELAY = 10  # seconds before a failed ingestion is retried
+
+    def __init__(self, session_factory: async_sessionmaker, redis_pool: ConnectionPool, directory: str, concurrency: int, max_retries: int, timeout: int) -> None:  # fmt: off
+        self.session_factory = session_factory
+        self.redis_pool = redis_pool
+        self.directory = directory
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._closing = False
+        self._submitted = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def setup(self) -> None:
+        """
+        Start the ingestion tasks. Run in lifespan context.
+        """
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def close(self) -> None:
+        """
+        Stop the ingestion tasks, the interrupted ingestions are released to be claimed by another worker.
+        """
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def store(self, document_id: int, file: UploadFile, job: DocumentIngestionJob) -> None:
+        """
+        Store the upload of a pending document. Must be called before the document is committed, so a claimed
+        document always has its upload stored.
+
+        Args:
+            document_id(int): The ID of the document created with `pending` status
+            file(UploadFile): The uploaded file
+            job(DocumentIngestionJob): The chunking parameters of the upload request
+        """
+        await file.seek(0)
+        await asyncio.to_thread(self._store, document_id=document_id, file=file.file, job=job)
+
+    async def discard(self, document_id: int) -> None:
+        """
+        Remove the stored upload of a document which has not been committed.
+
+        Args:
+            document_id(int): The ID of the document
+        """
+        await asyncio.to_thread(self._remove, document_id=document_id)
+
+    def submit(self) -> None:
+        """
+        Wake up an ingestion task once a pending document has been committed.
+        """
+        self._submitted.set()
+
+    def _get_paths(self, document_id: int) -> tuple[str, str]:
+        path = os.path.join(self.directory, str(document_id))
+
+        return f"{path}.upload", f"{path}.json"
+
+    def _store(self, document_id: int, file: BinaryIO, job: DocumentIngestionJob) -> None:
+        upload_path, job_path = self._get_paths(document_id=document_id)
+        with open(f"{upload_path}.tmp", mode="wb") as output:
+            shutil.copyfileobj(file, output)
+        with open(f"{job_path}.tmp", mode="w", encoding="utf-8") as output:
+            output.write(job.model_dump_json())
+
+        # the job file is written last, a job is complete once its file exists
+        os.replace(f"{upload_path}.tmp", upload_path)
+        os.replace(f"{job_path}.tmp", job_path)
+
+    def _remove(self, document_id: int) -> None:
+        for path in self._get_paths(document_id=document_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                claimed = await self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim a document to ingest: {e}")
+                claimed = None
+
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._submitted.wait(), timeout=self.POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+                self._submitted.clear()
+                continue
+
+            await self._ingest(*claimed)
+
+    async def _claim(self) -> tuple[int, int, int] | None:
+        """
+        Claim the oldest pending document, or a processing document without progress since `timeout` seconds.
+
+        Returns:
+            tuple[int, int, int] | None: The document ID, collection ID and number of attempts, None if there is no document to ingest.
+        """
+        now = func.now()
+        pending = and_(
+            DocumentTable.status == DocumentStatus.PENDING,
+            or_(DocumentTable.attempts == 0, DocumentTable.updated < now - dt.timedelta(seconds=self.RETRY_DELAY)),
+        )
+        lost = and_(DocumentTable.status == DocumentStatus.PROCESSING, DocumentTable.updated < now - dt.timedelta(seconds=self.timeout))
+        document_id = select(DocumentTable.id).where(or_(pending, lost)).order_by(DocumentTable.id).limit(1).with_for_update(skip_locked=True)
+        statement = (
+            update(DocumentTable)
+            .where(DocumentTable.id == document_id.scalar_subquery())
+            .values(status=DocumentStatus.PROCESSING, progress=0, attempts=DocumentTable.attempts + 1)
+            .returning(DocumentTable.id, DocumentTable.collection_id, DocumentTable.attempts)
+        )
+        async with self.session_factory() as postgres_session:
+            result = await postgres_session.execute(statement=statement)
+            row = result.first()
+            await postgres_session.commit()
+
+        return tuple(row) if row is not None else None
+
+    async def _ingest(self, document_id: int, collection_id: int, attempts: int) -> None:
+        if attempts > self.max_retries + 1:  # lost during its last attempt
+            await self._finish(document_id=document_id, status=DocumentStatus.FAILED, error="Ingestion timed out.")
+            return
+
+        upload_path, job_path = self._get_paths(document_id=document_id)
+        try:
+            with open(job_path, encoding="utf-8") as file:
+                job = DocumentIngestionJob.model_validate_json(file.read())
+        except FileNotFoundError:
+            # the shared directory may be temporarily unavailable, the upload is stored before the document is committed
+            error = "Uploaded file not found."
+            if attempts <= self.max_retries:
+                await self._retry(document_id=document_id, error=error)
+            else:
+                await self._finish(document_id=document_id, status=DocumentStatus.FAILED, error=error)
+            return
+
+        progress = {"value": 0}
+
+        def set_progress(indexed: int, total: int) -> None:
+            progress["value"] = int(100 * indexed / total)
+
+        heartbeat = asyncio.create_task(self._heartbeat(document_id=document_id, progress=progress))
+        redis_client = AsyncRedis(connection_pool=self.redis_pool)
+        token = None
+        try:
+            async with self.session_factory() as postgres_session:
+                result = await postgres_session.execute(statement=select(CollectionTable.user_id).where(CollectionTable.id == collection_id))
+                user_id = result.scalar_one()
+                user_info = await global_context.identity_access_manager.get_user_info(postgres_session=postgres_session, user_id=user_id)
+                token = request_context.set(RequestContext(id=str(uuid.uuid4()), method="POST", endpoint=EndpointRoute.DOCUMENTS, user_info=user_info, usage=Usage()))  # fmt: off
+
+                with open(upload_path, mode="rb") as file:
+                    upload = UploadFile(file=file, filename=job.filename, headers=Headers({"content-type": job.content_type or ""}))
+                    await global_context.document_manager.ingest_document(
+                        document_id=document_id,
+                        collection_id=collection_id,
+                        file=upload,
+                        job=job,
+                        postgres_session=postgres_session,
+                        redis_client=redis_client,
+                        model_registry=global_context.model_registry,
+                        request_context=request_context,
+                        vector_store=global_context.vector_store,
+                        elasticsearch_client=global_context.elasticsearch_client,
+                        progress=set_progress,
+                    )
+        except asyncio.CancelledError:
+            await self._release(document_id=document_id)
+            raise
+        except Exception as e:
+            logger.exception(f"Failed to ingest document {document_id} (attempt {attempts}): {e}")
+            error = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+            # parsing and chunking errors are not retried, the result would be the same
+            retry = not isinstance(e, ChunkingFailedException) and not (isinstance(e, HTTPException) and e.status_code < 500)
+            if retry and attempts <= self.max_retries:
+                await self._retry(document_id=document_id, error=error)
+            else:
+                await self._finish(document_id=document_id, status=DocumentStatus.FAILED, error=error)
+        else:
+            await self._finish(document_id=document_id, status=DocumentStatus.COMPLETED)
+        finally:
+            heartbeat.cancel()
+            await redis_client.aclose()
+            if token is not None:
+                await release_inflight_reservations()
+                request_context.reset(token)
+
+    async def _heartbeat(self, document_id: int, progress: dict) -> None:
+        """
+        Write the progress of an ingestion, which also keeps the document from being considered lost.
+        """
+        while True:
+            await asyncio.sleep(self.timeout / 3)
+            try:
+                await self._update(document_id=document_id, progress=progress["value"])
+            except Exception as e:
+                logger.error(f"Failed to update progress of document {document_id}: {e}")
+
+    async def _update(self, document_id: int, **values) -> bool:
+        """
+        Update a document being ingested.
+
+        Returns:
+            bool: False if the document is no longer being ingested (e.g. it has been deleted).
+        """
+        statement = (
+            update(DocumentTable).where(DocumentTable.id == document_id).where(DocumentTable.status == DocumentStatus.PROCESSING).values(**values)
+        )
+        async with self.session_factory() as postgres_session:
+            result = await postgres_session.execute(statement=statement)
+            await postgres_session.commit()
+
+        return result.rowcount > 0
+
+    async def _release(self, document_id: int) -> None:
+        try:
+            await self._update(document_id=document_id, status=DocumentStatus.PENDING, attempts=DocumentTable.attempts - 1)
+        except Exception as e:
+            logger.error(f"Failed to release document {document_id}: {e}")
+
+    async def _retry(self, document_id: int, error: str) -> None:
+        try:
+            await self._update(document_id=document_id, status=DocumentStatus.PENDING, error=error)
+        except Exception as e:
+            logger.error(f"Failed to retry document {document_id}: {e}")
+
+    async def _finish(self, document_id: int, status: DocumentStatus, error: str | None = None) -> None:
+        try:
+            updated = await self._update(
+                document_id=document_id, status=status, progress=100 if status == DocumentStatus.COMPLETED else 0, error=error
+            )
+        except Exception as e:
+            # the document remains processing and will be claimed again once considered lost
+            logger.error(f"Failed to update status of document {document_id}: {e}")
+            return
+
+        self._remove(document_id=document_id)
+
+        # remove the chunks indexed before a failure, or indexed after the document deletion
+        if status == DocumentStatus.FAILED or not updated:
+            try:
+                await global_context.vector_store.delete_document(client=global_context.elasticsearch_client, document_id=document_id)
+            except Exception as e:
+                logger.error(f"Failed to delete chunks of document {document_id}: {e}")
@@ -1,7 +1,6 @@
 import logging
+import time
 
-from limits import RateLimitItemPerDay, RateLimitItemPerMinute
-from limits.aio import storage, strategies
 from redis.asyncio import ConnectionPool, Redis, RedisError
 
 from api.schemas.admin.roles import LimitType
@@ -12,135 +11,163 @@ from api.utils.variables import PREFIX__REDIS_RATE_LIMIT
 
 logger = logging.getLogger(__name__)
 
+# Check all the limits of a request and consume them only if none is exceeded, in a single atomic call.
+# All the keys are computed by the client and passed in KEYS, so the script is Redis Cluster safe (the keys of a
+# user and a router share the same hash tag).
+# KEYS[i * 2 - 1], KEYS[i * 2]: for the fixed and sliding windows, key of the current and of the previous window of the
+# limit i, for the moving window, key of the limit i (twice)
+# ARGV[1]: strategy, ARGV[2]: current time (in seconds), then for each limit i: amount, window (in seconds) and cost
+# Returns the index of the first exceeded limit (0 if none) followed by the remaining amount of each limit.
+CHECK_LIMITS_SCRIPT = """
+local strategy = ARGV[1]
+local now = tonumber(ARGV[2])
+local count = #KEYS / 2
+local exceeded = 0
+local reply = {0}
+
+local function used(current_key, previous_key, window)
+    if strategy == 'fixed_window' then
+        return tonumber(redis.call('GET', current_key) or '0')
+    elseif strategy == 'sliding_window' then
+        local current = tonumber(redis.call('GET', current_key) or '0')
+        local previous = tonumber(redis.call('GET', previous_key) or '0')
+        return previous * (window - (now - math.floor(now / window) * window)) / window + current
+    else
+        redis.call('ZREMRANGEBYSCORE', current_key, '-inf', now - window)
+        local total = 0
+        for _, member in ipairs(redis.call('ZRANGE', current_key, 0, -1)) do
+            total = total + tonumber(string.match(member, ':(%d+)$'))
+        end
+        return total
+    end
+end
+
+local function consume(current_key, window, cost)
+    if strategy == 'fixed_window' or strategy == 'sliding_window' then
+        redis.call('INCRBY', current_key, cost)
+        -- the sliding window also reads the previous window
+        redis.call('EXPIRE', current_key, window * 2)
+    else
+        redis.call('ZADD', current_key, now, now .. ':' .. redis.call('ZCARD', current_key) .. ':' .. cost)
+        redis.call('EXPIRE', current_key, window)
+    end
+end
+
+for i = 1, count do
+    local amount, window, cost = tonumber(ARGV[i * 3]), tonumber(ARGV[i * 3 + 1]), tonumber(ARGV[i * 3 + 2])
+    local remaining = amount - used(KEYS[i * 2 - 1], KEYS[i * 2], window)
+    if exceeded == 0 and remaining < cost then
+        exceeded = i
+    end
+    reply[i + 1] = math.max(0, math.floor(remaining))
+end
+
+if exceeded == 0 then
+    for i = 1, count do
+        local window, cost = tonumber(ARGV[i * 3 + 1]), tonumber(ARGV[i * 3 + 2])
+        consume(KEYS[i * 2 - 1], window, cost)
+        reply[i + 1] = math.max(0, reply[i + 1] - cost)
+    end
+end
+
+reply[1] = exceeded
+return reply
+"""
+
 
 class Limiter:
+    WINDOWS = {LimitType.RPM: 60, LimitType.TPM: 60, LimitType.RPD: 86400, LimitType.TPD: 86400}
+
     def __init__(self, redis_pool: ConnectionPool, strategy: LimitingStrategy):
         self.redis_pool = redis_pool
-        self.redis_storage = storage.RedisStorage(uri=self.redis_pool.url, connection_pool=self.redis_pool, implementation="redispy")
         self.redis_client = Redis(connection_pool=redis_pool)
-
-        if strategy == LimitingStrategy.MOVING_WINDOW:
-            self.strategy = strategies.MovingWindowRateLimiter(storage=self.redis_storage)
-        elif strategy == LimitingStrategy.FIXED_WINDOW:
-            self.strategy = strategies.FixedWindowRateLimiter(storage=self.redis_storage)
-        else:  # SLIDING_WINDOW
-            self.strategy = strategies.SlidingWindowCounterRateLimiter(storage=self.redis_storage)
+        self.strategy = strategy
+        self.script = self.redis_client.register_script(CHECK_LIMITS_SCRIPT)
 
     async def reset(self) -> None:
         """
         Reset the limits when starting the API.
         """
         try:
-            await self.redis_storage.reset()
+            async for key in self.redis_client.scan_iter(match=f"{PREFIX__REDIS_RATE_LIMIT}:*", count=1000):
+                await self.redis_client.delete(key)
         except RedisError:
             logger.error(msg="Redis error during rate limit reset.", exc_info=True)
 
-    async def _get_limit(self, type: LimitType, value: int | None = None) -> RateLimitItemPerMinute | RateLimitItemPerDay | None:
-        if value is None:
-            return None
-
-        match type:
-            case LimitType.TPM | LimitType.RPM:
-                return RateLimitItemPerMinute(amount=value)
-            case LimitType.TPD | LimitType.RPD:
-                return RateLimitItemPerDay(amount=value)
-
-    async def hit(self, user_id: int, router_id: int, type: LimitType, value: int | None = None, cost: int = 1) -> bool:
+    async def hit(
+        self, user_id: int, router_id: int, limits: dict[LimitType, int | None], costs: dict[LimitType, int]
+    ) -> tuple[LimitType | None, dict[LimitType, int]]:
         """
-        Check if the user has reached the limit for the given type and router.
+        Check the limits of a user for a router and consume them only if none of them is exceeded, in a single Redis call.
 
         Args:
-            user_id(int): The user ID to check the limit for.
-            router_id (int): The router ID to check the limit for.
-            type(LimitType): The type of limit to check.
-            value(Optional[int]): The value of the limit. If not provided, the limit will be hit.
-            cost(int): The cost of the limit, defaults to 1.
+            user_id(int): The user ID to check the limits for.
+            router_id(int): The router ID to check the limits for.
+            limits(dict[LimitType, int | None]): The value of each limit, None means no limit.
+            costs(dict[LimitType, int]): The cost of the request for each limit to check.
 
         Returns:
-            bool: True if the limit has been hit, False otherwise.
+            tuple[LimitType | None, dict[LimitType, int]]: The first exceeded limit (None if no limit has been exceeded) and the remaining amount of each checked limit.
         """
+        types = [type for type in costs if limits.get(type) is not None]
+        if not types:
+            return None, {}
 
-        limit = await self._get_limit(type=type, value=value)
-        if limit is None:
-            return True
+        now = time.time()
+        keys, args = [], [self.strategy.value, now]
+        for type in types:
+            keys.extend(self._get_keys(type=type, user_id=user_id, router_id=router_id, now=now))
+            args.extend([limits[type], self.WINDOWS[type], costs[type]])
 
         try:
-            key = f"{PREFIX__REDIS_RATE_LIMIT}:{type.value}:{user_id}:{router_id}"
-            result = await self.strategy.hit(limit, key, cost=cost)
-            if result:
-                full_key = f"LIMITS:LIMITER/{key}/{value}/1/{limit.GRANULARITY.name}"
-                res = await self.redis_client.ttl(full_key)
-                if res == -1:  # no TTL, cleanup
-                    await self.redis_client.delete(full_key)
-                    return True
-
-            return result
-
+            exceeded, *remaining = await self.script(keys=keys, args=args)
         except Exception:
             logger.error(msg="Error during rate limit hit.", exc_info=True)
+            return None, {}
 
-        return True
+        exceeded = types[exceeded - 1] if exceeded > 0 else None
 
-    async def remaining(self, user_id: int, router_id: int, type: LimitType, value: int | None = None) -> int | None:
-        try:
-            limit = await self._get_limit(type=type, value=value)
-            if limit is None:
-                return
+        return exceeded, dict(zip(types, remaining))
 
-            window = await self.strategy.get_window_stats(limit, f"{PREFIX__REDIS_RATE_LIMIT}:{type.value}:{user_id}:{router_id}")
-            return window.remaining
+    def _get_keys(self, type: LimitType, user_id: int, router_id: int, now: float) -> tuple[str, str]:
+        # the hash tag keeps all the keys of a user and a router in the same Redis Cluster slot
+        key = f"{PREFIX__REDIS_RATE_LIMIT}:{type.value}:{{{user_id}:{router_id}}}"
+        if self.strategy == LimitingStrategy.MOVING_WINDOW:
+            return key, key
 
-        except Exception:
-            logger.debug(msg="Error during rate limit remaining.", exc_info=True)
+        index = int(now // self.WINDOWS[type])
+
+        return f"{key}:{index}", f"{key}:{index - 1}"
 
     async def check_user_limits(self, user_info: UserInfo, router_id: int, prompt_tokens: int | None = None) -> None:
         if user_info.id == 0:
             return
 
         has_access = False
-        tpm, tpd, rpm, rpd = 0, 0, 0, 0
+        limits = {LimitType.TPM: 0, LimitType.TPD: 0, LimitType.RPM: 0, LimitType.RPD: 0}
         for limit in user_info.limits:
             if limit.router == router_id:
                 has_access = True
-                match limit.type:
-                    case LimitType.TPM:
-                        tpm = limit.value
-                    case LimitType.TPD:
-                        tpd = limit.value
-                    case LimitType.RPM:
-                        rpm = limit.value
-                    case LimitType.RPD:
-                        rpd = limit.value
+                limits[limit.type] = limit.value
 
         if not has_access:
             raise ModelNotFoundException()
 
-        if 0 in [tpm, tpd, rpm, rpd]:
+        if 0 in limits.values():
             raise InsufficientPermissionException(detail="Insufficient permissions to access the model.")
 
-        # RPM
-        check = await self.hit(user_id=user_info.id, router_id=router_id, type=LimitType.RPM, value=rpm)
-        if not check:
-            remaining = await self.remaining(user_id=user_info.id, router_id=router_id, type=LimitType.RPM, value=rpm)
-            raise RateLimitExceeded(detail=f"{str(rpm)} requests per minute exceeded (remaining: {remaining}).")
-
-        # RPD
-        check = await self.hit(user_id=user_info.id, router_id=router_id, type=LimitType.RPD, value=rpd)
-        if not check:
-            remaining = await self.remaining(user_id=user_info.id, router_id=router_id, type=LimitType.RPD, value=rpd)
-            raise RateLimitExceeded(detail=f"{str(rpd)} requests per day exceeded (remaining: {remaining}).")
-
-        if not prompt_tokens:
-            return
-
-        # TPM
-        check = await self.hit(user_id=user_info.id, router_id=router_id, type=LimitType.TPM, value=tpm, cost=prompt_tokens)
-        if not check:
-            remaining = await self.remaining(user_id=user_info.id, router_id=router_id, type=LimitType.TPM, value=tpm)
-            raise RateLimitExceeded(detail=f"{str(tpm)} input tokens per minute exceeded (remaining: {remaining}).")
-
-        # TPD
-        check = await self.hit(user_id=user_info.id, router_id=router_id, type=LimitType.TPD, value=tpd, cost=prompt_tokens)
-        if not check:
-            remaining = await self.remaining(user_id=user_info.id, router_id=router_id, type=LimitType.TPD, value=tpd)
-            raise RateLimitExceeded(detail=f"{str(tpd)} input tokens per day exceeded (remaining: {remaining}).")
+        costs = {LimitType.RPM: 1, LimitType.RPD: 1}
+        if prompt_tokens:
+            costs.update({LimitType.TPM: prompt_tokens, LimitType.TPD: prompt_tokens})
+
+        exceeded, remaining = await self.hit(user_id=user_info.id, router_id=router_id, limits=limits, costs=costs)
+
+        match exceeded:
+            case LimitType.RPM:
+                raise RateLimitExceeded(detail=f"{str(limits[exceeded])} requests per minute exceeded (remaining: {remaining[exceeded]}).")
+            case LimitType.RPD:
+                raise RateLimitExceeded(detail=f"{str(limits[exceeded])} requests per day exceeded (remaining: {remaining[exceeded]}).")
+            case LimitType.TPM:
+                raise RateLimitExceeded(detail=f"{str(limits[exceeded])} input tokens per minute exceeded (remaining: {remaining[exceeded]}).")
+            case LimitType.TPD:
+                raise RateLimitExceeded(detail=f"{str(limits[exceeded])} input tokens per day exceeded (remaining: {remaining[exceeded]}).")
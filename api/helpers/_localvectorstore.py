@@ -0,0 +1,604 @@
+from collections import Counter
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import time
+from typing import Any
+import unicodedata
+
+import numpy as np
+
+from api.helpers._basevectorstore import SEARCH_DURATION_SECONDS, BaseVectorStore
+from api.schemas.chunks import Chunk
+from api.schemas.collections import CollectionVisibility
+from api.schemas.core.vectorstore import VectorStoreChunk
+from api.schemas.search import ComparisonFilter, ComparisonFilterType, CompoundFilter, CompoundFilterOperator, Search, SearchMethod
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class LocalVectorStore(BaseVectorStore):
+    """
+    Vector store running in the API process, persisted in a local directory, for the deployments without Elasticsearch.
+
+    The directory contains the normalized embeddings of the chunks in a memory-mapped float32 matrix, and the log of the
+    upserts, deletions and collection updates, replayed at startup to rebuild the chunks and their BM25 index. At
+    startup, the deleted chunks are removed by writing a new generation of both files, switched atomically in the
+    metadata file.
+
+    Semantic searches matching less than `hnsw_threshold` chunks are computed exactly with a matrix product, larger ones
+    are searched in an HNSW index if the `hnswlib` package (`hnsw` extra) is installed. The HNSW index is saved on
+    shutdown, and is rebuilt at startup if the chunks changed since. As with Elasticsearch, the semantic score is
+    `(1 + cosine) / 2`. Lexical searches are scored with BM25 on the lowercased words of the chunks, without stemming nor fuzziness.
+
+    The directory is locked by the process: the store is not shared between workers.
+
+    Args:
+        directory(str): The directory where the chunks and their embeddings are stored
+        hnsw_threshold(int): Minimum number of chunks matching the filters of a semantic search to use the HNSW index
+        hnsw_m(int): Number of neighbors of each chunk in the HNSW index
+        hnsw_ef_construction(int): Number of candidates explored when a chunk is added in the HNSW index
+        hnsw_ef_search(int): Number of candidates explored by a search in the HNSW index
+    """
+
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    INITIAL_CAPACITY = 1024
+    HNSW_BATCH_SIZE = 10000
+
+    def __init__(self, directory: str, hnsw_threshold: int = 10000, hnsw_m: int = 16, hnsw_ef_construction: int = 200, hnsw_ef_search: int = 100) -> None:  # fmt: off
+        self.directory = directory
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+
+        self.vector_size: int | None = None
+        self.generation = 0
+        self.hnsw_size: int | None = None  # number of rows of the saved HNSW index
+        self.hnsw_available = True
+        self.hnsw_index = None
+
+        self._lock = None
+        self._log = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.size = 0  # number of rows, including the deleted chunks
+        self.capacity = 0
+        self.embeddings: np.memmap | None = None
+        self.chunk_ids = np.zeros(0, dtype=np.int64)
+        self.document_ids = np.zeros(0, dtype=np.int64)
+        self.collection_ids = np.zeros(0, dtype=np.int64)
+        self.user_ids = np.zeros(0, dtype=np.int64)  # -1 if the chunk is indexed without owner
+        self.public = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.total_length = 0
+        self.chunks: list[dict | None] = []
+        self.rows: dict[tuple[int, int], int] = {}  # row of each chunk by document ID and chunk ID
+        self.postings: dict[str, dict[int, int]] = {}  # frequency of each token by row
+
+    async def setup(self, client: Any, vector_size: int) -> None:
+        """
+        Lock the directory, load the chunks and remove the deleted ones.
+
+        Args:
+            client(Any): Unused, the store runs in the API process
+            vector_size(int): The size of the embeddings
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = open(os.path.join(self.directory, "lock"), "w")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            self._lock = None
+            raise RuntimeError(f"Local vector store directory {self.directory} is used by another process, the API must run with a single worker.")  # fmt: off
+
+        meta = self._read_meta()
+        if meta is not None:
+            assert meta["vector_size"] == vector_size, f"Local vector store has incorrect vector size ({meta['vector_size']} != {vector_size})"  # fmt: off
+            self.generation = meta["generation"]
+            self.hnsw_size = meta.get("hnsw_size")
+        self.vector_size = vector_size
+
+        self._load()
+        if np.count_nonzero(self.alive[: self.size]) < self.size:
+            self._compact()
+        self._write_meta()
+        self._log = open(self._get_path(name="chunks", extension="jsonl"), "a", encoding="utf-8")
+
+        if np.count_nonzero(self.alive[: self.size]) >= self.hnsw_threshold:
+            self._get_hnsw_index()
+
+    async def close(self) -> None:
+        if self.hnsw_index is not None:
+            self.hnsw_index.save_index(os.path.join(self.directory, "hnsw.bin"))
+            self.hnsw_size = self.size
+            self._write_meta()
+
+        if self.embeddings is not None:
+            self.embeddings.flush()
+
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+        if self._lock is not None:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+            self._lock.close()
+            self._lock = None
+
+    async def delete_collection(self, client: Any, collection_id: int) -> None:
+        rows = np.flatnonzero(self.alive[: self.size] & (self.collection_ids[: self.size] == collection_id))
+        self._commit(records=[{"op": "delete", "rows": rows.tolist()}] if len(rows) else [])
+
+    async def update_collection(self, client: Any, collection_id: int, user_id: int, visibility: CollectionVisibility) -> None:
+        self._commit(records=[{"op": "update", "collection_id": collection_id, "user_id": user_id, "visibility": visibility.value}])
+
+    async def delete_user(self, client: Any, user_id: int) -> None:
+        rows = np.flatnonzero(self.alive[: self.size] & (self.user_ids[: self.size] == user_id))
+        self._commit(records=[{"op": "delete", "rows": rows.tolist()}] if len(rows) else [])
+
+    async def get_collection_assignments(
+        self, client: Any, after: int = 0, size: int = 1000
+    ) -> dict[int, set[tuple[int | None, CollectionVisibility | None]]]:
+        rows = np.flatnonzero(self.alive[: self.size] & (self.collection_ids[: self.size] > after))
+        collection_ids = np.unique(self.collection_ids[rows])[:size]
+
+        assignments = {int(collection_id): set() for collection_id in collection_ids}
+        for row in rows[np.isin(self.collection_ids[rows], collection_ids)]:
+            chunk = self.chunks[row]
+            visibility = CollectionVisibility(chunk["visibility"]) if chunk.get("visibility") is not None else None
+            assignments[chunk["collection_id"]].add((chunk.get("user_id"), visibility))
+
+        return assignments
+
+    async def delete_document(self, client: Any, document_id: int) -> None:
+        rows = np.flatnonzero(self.alive[: self.size] & (self.document_ids[: self.size] == document_id))
+        self._commit(records=[{"op": "delete", "rows": rows.tolist()}] if len(rows) else [])
+
+    async def delete_chunk(self, client: Any, document_id: int, chunk_id: int) -> None:
+        row = self.rows.get((document_id, chunk_id))
+        self._commit(records=[{"op": "delete", "rows": [row]}] if row is not None else [])
+
+    async def get_chunk_counts(self, client: Any, document_ids: list[int]) -> dict[int, int]:
+        if not document_ids:
+            return {}
+
+        mask = self.alive[: self.size] & np.isin(self.document_ids[: self.size], document_ids)
+        values, counts = np.unique(self.document_ids[: self.size][mask], return_counts=True)
+
+        return {int(value): int(count) for value, count in zip(values, counts)}
+
+    async def get_chunks(self, client: Any, document_id: int, offset: int = 0, limit: int = 10, chunk_id: int | None = None) -> list[Chunk]:
+        mask = self.alive[: self.size] & (self.document_ids[: self.size] == document_id)
+        if chunk_id is not None:
+            mask &= self.chunk_ids[: self.size] == chunk_id
+
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(self.chunk_ids[rows], kind="stable")]
+
+        return [self._get_chunk(row=row) for row in rows[offset : offset + limit]]
+
+    async def get_last_chunk_id(self, client: Any, document_id: int) -> int | None:
+        mask = self.alive[: self.size] & (self.document_ids[: self.size] == document_id)
+        if not mask.any():
+            return None
+
+        return int(self.chunk_ids[: self.size][mask].max())
+
+    async def upsert(self, client: Any, chunks: list[VectorStoreChunk]) -> None:
+        if not chunks:
+            return
+
+        # the embeddings are written before the log, so the rows of the log always have their embedding
+        start = self.size
+        self._reserve(rows=start + len(chunks))
+        embeddings = np.asarray([chunk.embedding for chunk in chunks], dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), np.finfo(np.float32).tiny)
+        self.embeddings[start : start + len(chunks)] = embeddings
+        self.embeddings.flush()
+
+        records = [
+            {"op": "upsert", "row": start + i, "chunk": chunk.model_dump(mode="json", exclude={"embedding"})} for i, chunk in enumerate(chunks)
+        ]
+        self._commit(records=records)
+
+        if self.hnsw_index is not None:
+            self.hnsw_index.add_items(embeddings, np.arange(start, start + len(chunks)))
+
+    async def search(
+        self,
+        client: Any,
+        method: SearchMethod,
+        collection_ids: list[int],
+        document_ids: list[int],
+        metadata_filters: ComparisonFilter | CompoundFilter | None,
+        query_prompt: str,
+        query_vector: list[float] | None,
+        limit: int,
+        offset: int,
+        rff_k: int | None = 20,
+        score_threshold: float = 0.0,
+        user_id: int | None = None,
+    ) -> list[Search]:
+        assert method is SearchMethod.LEXICAL or query_vector, "Query vector must not be None for semantic and hybrid search methods"
+        assert rff_k is not None or method is not SearchMethod.HYBRID, "rff_k must not be None for hybrid search method"
+
+        start = time.perf_counter()
+        mask = self._build_mask(collection_ids=collection_ids, document_ids=document_ids, metadata_filters=metadata_filters, user_id=user_id)
+        if method == SearchMethod.SEMANTIC:
+            searches = self._semantic_search(query_vector=query_vector, mask=mask, limit=limit, offset=offset, score_threshold=score_threshold)
+
+        elif method == SearchMethod.LEXICAL:
+            searches = self._lexical_search(query_prompt=query_prompt, mask=mask, limit=limit, offset=offset)
+
+        else:
+            # both searches rank the results up to the requested page, so the fused pages are consistent
+            window = (offset + limit) * 2
+            lexical_searches = self._lexical_search(query_prompt=query_prompt, mask=mask, limit=window, offset=0, search_method=SearchMethod.HYBRID)  # fmt: off
+            semantic_searches = self._semantic_search(query_vector=query_vector, mask=mask, limit=window, offset=0, search_method=SearchMethod.HYBRID)  # fmt: off
+            searches = self._fuse_searches(
+                lexical_searches=lexical_searches, semantic_searches=semantic_searches, limit=limit, offset=offset, rff_k=rff_k
+            )
+        SEARCH_DURATION_SECONDS.labels(method=method.value, phase="total").observe(time.perf_counter() - start)
+
+        return searches
+
+    def _lexical_search(
+        self,
+        query_prompt: str,
+        mask: np.ndarray,
+        limit: int,
+        offset: int,
+        search_method: SearchMethod = SearchMethod.LEXICAL,
+    ) -> list[Search]:
+        start = time.perf_counter()
+        scores = np.zeros(self.size, dtype=np.float32)
+        count = int(np.count_nonzero(self.alive[: self.size]))
+        average_length = max(self.total_length / max(count, 1), 1)
+        for token in set(self._tokenize(text=query_prompt)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            norms = self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * self.lengths[rows] / average_length)
+            scores[rows] += idf * frequencies * (self.BM25_K1 + 1) / (frequencies + norms)
+
+        candidates = np.flatnonzero(mask & (scores > 0))
+        rows = candidates[self._top_k(scores=scores[candidates], k=offset + limit)][offset:]
+        searches = [Search(method=SearchMethod.LEXICAL.value, score=float(scores[row]), chunk=self._get_chunk(row=row)) for row in rows]
+        SEARCH_DURATION_SECONDS.labels(method=search_method.value, phase=SearchMethod.LEXICAL.value).observe(time.perf_counter() - start)
+
+        return searches
+
+    def _semantic_search(
+        self,
+        query_vector: list[float],
+        mask: np.ndarray,
+        limit: int,
+        offset: int,
+        score_threshold: float = 0.0,
+        search_method: SearchMethod = SearchMethod.SEMANTIC,
+    ) -> list[Search]:
+        start = time.perf_counter()
+        query = np.array(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), np.finfo(np.float32).tiny)
+        candidates = np.flatnonzero(mask)
+
+        rows, similarities = None, None
+        if len(candidates) >= self.hnsw_threshold:
+            rows, similarities = self._hnsw_search(query=query, mask=mask, k=offset + limit)
+
+        if rows is None:
+            # a product with the whole matrix avoids copying the embeddings of most of the chunks
+            if len(candidates) * 4 < self.size:
+                similarities = self.embeddings[candidates] @ query
+            else:
+                similarities = (self.embeddings[: self.size] @ query)[candidates]
+            top = self._top_k(scores=similarities, k=offset + limit)
+            rows, similarities = candidates[top], similarities[top]
+
+        scores = (1 + similarities[offset:]) / 2
+        searches = [
+            Search(method=SearchMethod.SEMANTIC.value, score=float(score), chunk=self._get_chunk(row=row))
+            for row, score in zip(rows[offset:], scores)
+            if score >= score_threshold
+        ]
+        SEARCH_DURATION_SECONDS.labels(method=search_method.value, phase=SearchMethod.SEMANTIC.value).observe(time.perf_counter() - start)
+
+        return searches
+
+    def _hnsw_search(self, query: np.ndarray, mask: np.ndarray, k: int) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """
+        Search the nearest chunks in the HNSW index, return None if the index is not available or if less than k chunks are found.
+        """
+        index = self._get_hnsw_index()
+        if index is None:
+            return None, None
+
+        index.set_ef(max(self.hnsw_ef_search, k))
+        try:
+            labels, distances = index.knn_query(query, k=k, filter=lambda label: bool(mask[label]))
+        except RuntimeError:
+            return None, None
+
+        return labels[0].astype(np.int64), 1 - distances[0]
+
+    def _get_hnsw_index(self):
+        if self.hnsw_index is not None or not self.hnsw_available:
+            return self.hnsw_index
+
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("The `hnswlib` package is not installed (`hnsw` extra), the local vector store is searched exhaustively.")
+            self.hnsw_available = False
+            return None
+
+        index = hnswlib.Index(space="cosine", dim=self.vector_size)
+        path = os.path.join(self.directory, "hnsw.bin")
+        if self.hnsw_size == self.size and os.path.exists(path):
+            index.load_index(path, max_elements=self.capacity)
+        else:
+            logger.info(f"Building the HNSW index of the local vector store ({self.size} chunks).")
+            index.init_index(max_elements=self.capacity, ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+            rows = np.flatnonzero(self.alive[: self.size])
+            for i in range(0, len(rows), self.HNSW_BATCH_SIZE):
+                batch = rows[i : i + self.HNSW_BATCH_SIZE]
+                index.add_items(self.embeddings[batch], batch)
+        self.hnsw_index = index
+
+        return index
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Get the indices of the k highest scores, sorted by decreasing score.
+        """
+        indices = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+
+        return indices[np.argsort(-scores[indices], kind="stable")]
+
+    @staticmethod
+    def _tokenize(text: str) -> list[str]:
+        return TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+
+    @staticmethod
+    def _to_keyword(value: Any) -> str:
+        # metadata are compared as the keywords of the Elasticsearch flattened fields
+        if isinstance(value, bool):
+            return "true" if value else "false"
+
+        return str(value)
+
+    def _match_comparison_filter(self, metadata: dict | None, filter: ComparisonFilter) -> bool:
+        value = (metadata or {}).get(filter.key)
+        if value is None:
+            return False
+
+        value, expected = self._to_keyword(value), self._to_keyword(filter.value)
+        if filter.type == ComparisonFilterType.EQ:
+            return value == expected
+        if filter.type == ComparisonFilterType.SW:
+            return value.startswith(expected)
+        if filter.type == ComparisonFilterType.EW:
+            return value.endswith(expected)
+        if filter.type == ComparisonFilterType.CO:
+            return expected in value
+
+        return False
+
+    def _match_metadata_filters(self, metadata: dict | None, metadata_filters: ComparisonFilter | CompoundFilter) -> bool:
+        if isinstance(metadata_filters, ComparisonFilter):
+            return self._match_comparison_filter(metadata=metadata, filter=metadata_filters)
+
+        matches = (self._match_comparison_filter(metadata=metadata, filter=filter) for filter in metadata_filters.filters)
+        if metadata_filters.operator == CompoundFilterOperator.AND:
+            return all(matches)
+
+        return any(matches)
+
+    def _build_mask(
+        self,
+        collection_ids: list[int],
+        document_ids: list[int],
+        metadata_filters: ComparisonFilter | CompoundFilter | None,
+        user_id: int | None = None,
+    ) -> np.ndarray:
+        mask = self.alive[: self.size].copy()
+
+        if collection_ids:
+            mask &= np.isin(self.collection_ids[: self.size], collection_ids)
+        elif user_id is not None:
+            mask &= (self.user_ids[: self.size] == user_id) | self.public[: self.size]
+        if document_ids:
+            mask &= np.isin(self.document_ids[: self.size], document_ids)
+        if metadata_filters:
+            for row in np.flatnonzero(mask):
+                mask[row] = self._match_metadata_filters(metadata=self.chunks[row]["metadata"], metadata_filters=metadata_filters)
+
+        return mask
+
+    def _get_chunk(self, row: int) -> Chunk:
+        chunk = self.chunks[row]
+
+        return Chunk(
+            id=chunk["id"],
+            collection_id=chunk["collection_id"],
+            document_id=chunk["document_id"],
+            content=chunk["content"],
+            metadata=chunk["metadata"],
+            created=chunk["created"],
+        )
+
+    def _commit(self, records: list[dict]) -> None:
+        """
+        Apply records to the chunks and append them to the log.
+        """
+        for record in records:
+            self._apply(record=record)
+
+        if records:
+            self._log.write("".join(json.dumps(record) + "\n" for record in records))
+            self._log.flush()
+
+    def _apply(self, record: dict) -> None:
+        if record["op"] == "upsert":
+            self._add_row(row=record["row"], chunk=record["chunk"])
+        elif record["op"] == "delete":
+            for row in record["rows"]:
+                self._delete_row(row=row)
+        elif record["op"] == "update":
+            rows = np.flatnonzero(self.alive[: self.size] & (self.collection_ids[: self.size] == record["collection_id"]))
+            self.user_ids[rows] = record["user_id"]
+            self.public[rows] = record["visibility"] == CollectionVisibility.PUBLIC.value
+            for row in rows:
+                self.chunks[row]["user_id"] = record["user_id"]
+                self.chunks[row]["visibility"] = record["visibility"]
+
+    def _add_row(self, row: int, chunk: dict) -> None:
+        self._reserve(rows=row + 1)
+        key = (chunk["document_id"], chunk["id"])
+        if key in self.rows:
+            self._delete_row(row=self.rows[key])
+
+        tokens = self._tokenize(text=chunk["content"])
+        for token, frequency in Counter(tokens).items():
+            self.postings.setdefault(token, {})[row] = frequency
+
+        self.size = max(self.size, row + 1)
+        self.chunk_ids[row] = chunk["id"]
+        self.document_ids[row] = chunk["document_id"]
+        self.collection_ids[row] = chunk["collection_id"]
+        self.user_ids[row] = chunk["user_id"] if chunk.get("user_id") is not None else -1
+        self.public[row] = chunk.get("visibility") == CollectionVisibility.PUBLIC.value
+        self.alive[row] = True
+        self.lengths[row] = len(tokens)
+        self.total_length += len(tokens)
+        self.chunks.extend([None] * (row + 1 - len(self.chunks)))
+        self.chunks[row] = chunk
+        self.rows[key] = row
+
+    def _delete_row(self, row: int) -> None:
+        if not self.alive[row]:
+            return
+
+        chunk = self.chunks[row]
+        for token in set(self._tokenize(text=chunk["content"])):
+            postings = self.postings[token]
+            postings.pop(row, None)
+            if not postings:
+                del self.postings[token]
+
+        self.alive[row] = False
+        self.total_length -= int(self.lengths[row])
+        self.chunks[row] = None
+        del self.rows[(chunk["document_id"], chunk["id"])]
+
+        if self.hnsw_index is not None:
+            self.hnsw_index.mark_deleted(row)
+
+    def _reserve(self, rows: int) -> None:
+        """
+        Grow the embeddings matrix and the arrays of the chunks to store at least the given number of rows.
+        """
+        if rows <= self.capacity:
+            return
+
+        capacity = max(rows, 2 * self.capacity, self.INITIAL_CAPACITY)
+        path = self._get_path(name="embeddings", extension="f32")
+        if self.embeddings is not None:
+            self.embeddings.flush()
+        with open(path, "ab"):
+            pass
+        if os.path.getsize(path) < capacity * self.vector_size * 4:
+            os.truncate(path, capacity * self.vector_size * 4)
+        self.embeddings = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.vector_size))
+
+        for name in ("chunk_ids", "document_ids", "collection_ids", "user_ids", "public", "alive", "lengths"):
+            array = getattr(self, name)
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[: len(array)] = array
+            setattr(self, name, resized)
+
+        if self.hnsw_index is not None:
+            self.hnsw_index.resize_index(capacity)
+        self.capacity = capacity
+
+    def _load(self) -> None:
+        """
+        Map the embeddings of the current generation and replay its log.
+        """
+        path = self._get_path(name="embeddings", extension="f32")
+        rows = os.path.getsize(path) // (self.vector_size * 4) if os.path.exists(path) else 0
+        self._reserve(rows=max(rows, 1))
+
+        path = self._get_path(name="chunks", extension="jsonl")
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # last record of a process stopped while writing it
+                    logger.warning(f"Skipping invalid record of the local vector store log {path}.")
+                    continue
+                self._apply(record=record)
+
+    def _compact(self) -> None:
+        """
+        Write a new generation of the embeddings and of the log without the deleted chunks, then reload it.
+        """
+        rows = np.flatnonzero(self.alive[: self.size])
+        logger.info(f"Removing {self.size - len(rows)} deleted chunks from the local vector store.")
+
+        generation = self.generation + 1
+        path = self._get_path(name="embeddings", extension="f32", generation=generation)
+        with open(path, "wb") as file:
+            for i in range(0, len(rows), self.HNSW_BATCH_SIZE):
+                file.write(np.ascontiguousarray(self.embeddings[rows[i : i + self.HNSW_BATCH_SIZE]]).tobytes())
+
+        with open(self._get_path(name="chunks", extension="jsonl", generation=generation), "w", encoding="utf-8") as file:
+            for i, row in enumerate(rows):
+                file.write(json.dumps({"op": "upsert", "row": i, "chunk": self.chunks[row]}) + "\n")
+
+        previous_generation = self.generation
+        self.generation = generation
+        self.hnsw_size = None
+        self._write_meta()
+        os.remove(self._get_path(name="embeddings", extension="f32", generation=previous_generation))
+        os.remove(self._get_path(name="chunks", extension="jsonl", generation=previous_generation))
+
+        self._reset()
+        self._load()
+
+    def _get_path(self, name: str, extension: str, generation: int | None = None) -> str:
+        generation = self.generation if generation is None else generation
+
+        return os.path.join(self.directory, f"{name}.{generation}.{extension}")
+
+    def _read_meta(self) -> dict | None:
+        path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_meta(self) -> None:
+        path = os.path.join(self.directory, "meta.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump({"vector_size": self.vector_size, "generation": self.generation, "hnsw_size": self.hnsw_size}, file)
+        os.replace(f"{path}.tmp", path)
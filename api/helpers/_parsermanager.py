@@ -1,6 +1,16 @@
 import asyncio
+from collections.abc import AsyncIterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 import logging
+import multiprocessing
+import os
 from pathlib import Path
+import resource
+import shutil
+import signal
+import tempfile
 
 from fastapi import UploadFile
 from html_to_markdown import convert_to_markdown
@@ -13,7 +23,50 @@ from api.utils.exceptions import UnsupportedFileTypeException
 logger = logging.getLogger(__name__)
 
 
+def _raise_timeout(signum, frame) -> None:
+    raise TimeoutError("PDF conversion timed out.")
+
+
+def _init_conversion_process(max_memory: int | None) -> None:
+    """
+    Initialize a PDF conversion process: a conversion exceeding the memory limit fails with a MemoryError, instead of
+    the process being killed by the system.
+    """
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    if max_memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory * 1024 * 1024, max_memory * 1024 * 1024))
+
+
+def _convert_pdf_pages(path: str, start: int, end: int, timeout: int | None) -> str:
+    """
+    Convert a page range of a PDF file to markdown, run in a conversion process.
+    """
+    if timeout is not None:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with pymupdf.open(path, filetype="pdf") as doc:
+            return pymupdf4llm.to_markdown(doc, pages=list(range(start, end)))
+    finally:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
 class ParserManager:
+    """
+    Convert the uploaded files to markdown. The PDF are converted in a thread, or by a pool of conversion processes
+    (`processes` > 0) converting page ranges of a PDF in parallel, not limited by the GIL of the worker.
+
+    Args:
+        max_concurrent(int): Maximum number of documents converted concurrently
+        processes(int): Number of PDF conversion processes, if 0 the PDF are converted in a thread
+        pages_per_task(int): Number of pages of a PDF converted at once by a conversion process
+        timeout(int | None): Maximum time in seconds of a PDF conversion by the conversion processes
+        max_memory(int | None): Maximum memory in MB of a conversion process
+        spool_directory(str | None): Directory where the uploads are copied to be read by PyMuPDF, if None the system temporary directory is used
+    """
+
+    SPOOL_CHUNK_SIZE = 1024 * 1024
+
     EXTENSION_MAP: dict[str, FileType] = {
         ".pdf": FileType.PDF,
         ".html": FileType.HTML,
@@ -49,8 +102,53 @@ class ParserManager:
         },
     }
 
-    def __init__(self, max_concurrent: int = 10):
+    def __init__(self, max_concurrent: int = 10, processes: int = 0, pages_per_task: int = 16, timeout: int | None = None, max_memory: int | None = None, spool_directory: str | None = None):  # fmt: off
         self.conversion_semaphore = asyncio.Semaphore(value=max_concurrent)
+        self.processes = processes
+        self.pages_per_task = pages_per_task
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.spool_directory = spool_directory
+
+        self._executor: Executor | None = None
+
+    def setup(self) -> None:
+        """
+        Start the PDF conversion processes. Run in lifespan context.
+        """
+        if self.processes == 0:
+            return
+
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> Executor:
+        # spawn to not fork the event loop and the connections of the worker
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_conversion_process,
+            initargs=(self.max_memory,),
+        )
+
+    def _restart_executor(self, executor: Executor) -> None:
+        """
+        Replace a broken pool of conversion processes (e.g. a process killed by the system), so only the documents being
+        converted by the broken pool fail. The pool is replaced once, by the first conversion noticing it is broken.
+        """
+        if self._executor is not executor:
+            return
+
+        logger.error("PDF conversion process terminated abruptly, restarting the conversion processes.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._create_executor()
+
+    def close(self) -> None:
+        """
+        Stop the PDF conversion processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     async def parse(self, file: UploadFile) -> str:
         file_type = self.check_file_type(file=file)
@@ -58,10 +156,13 @@ class ParserManager:
 
         match file_type:
             case FileType.PDF:
-                async with self.conversion_semaphore:
-                    file_content = await file.read()
-                    doc = pymupdf.open(stream=file_content, filetype="pdf")
-                    content = await asyncio.to_thread(pymupdf4llm.to_markdown, doc)
+                async with self.conversion_semaphore, self._get_path(file=file) as path:
+                    if self._executor is None:
+                        doc = pymupdf.open(path, filetype="pdf")
+                        content = await asyncio.to_thread(pymupdf4llm.to_markdown, doc)
+                        doc.close()
+                    else:
+                        content = await self._convert_pdf(path=path)
 
             case FileType.HTML:
                 file_content = await self._read_content(file=file)
@@ -77,6 +178,50 @@ class ParserManager:
 
         return content
 
+    @asynccontextmanager
+    async def _get_path(self, file: UploadFile) -> AsyncIterator[str]:
+        """
+        Get the path of an uploaded file, so the file is read from the disk by PyMuPDF instead of being loaded in memory.
+        The uploads without path (e.g. spooled by Starlette) are copied by chunks in a temporary file.
+        """
+        name = getattr(file.file, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            yield name
+            return
+
+        await file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", dir=self.spool_directory) as spool:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, spool, self.SPOOL_CHUNK_SIZE)
+            spool.flush()
+            yield spool.name
+
+    async def _convert_pdf(self, path: str) -> str:
+        """
+        Convert a PDF to markdown with the conversion processes: the pages are split in ranges converted in parallel,
+        then the markdown of each range is concatenated in the page order.
+        """
+        with pymupdf.open(path, filetype="pdf") as doc:
+            page_count = doc.page_count
+        ranges = [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+
+        # a document uses at most half of the processes, so a large PDF does not delay the conversion of the other documents
+        semaphore = asyncio.Semaphore(value=max(1, self.processes // 2))
+        loop = asyncio.get_running_loop()
+
+        # the PDF is read from its file by the processes, instead of being sent to each of them
+        async def convert(start: int, end: int) -> str:
+            async with semaphore:
+                executor = self._executor
+                try:
+                    return await loop.run_in_executor(executor, _convert_pdf_pages, path, start, end, self.timeout)
+                except BrokenProcessPool:
+                    self._restart_executor(executor=executor)
+                    raise
+
+        parts = await asyncio.wait_for(asyncio.gather(*[convert(start=start, end=end) for start, end in ranges]), timeout=self.timeout)
+
+        return "".join(parts)
+
     def check_file_type(self, file: UploadFile, type: FileType | None = None) -> FileType:
         """
         Detect file type by extension, then check content-type.
@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi.responses import Response
+import orjson
+
+
+class RawJSONResponse(Response):
+    """
+    JSON response sending the already serialized body of a provider response as is, without parsing it again.
+    Other contents are serialized with orjson.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+
+        return orjson.dumps(content)
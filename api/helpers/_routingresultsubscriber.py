@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+from typing import Any
+from uuid import uuid4
+
+from redis.asyncio import ConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+
+from api.utils.variables import PREFIX__CELERY_ROUTING_RESULT
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingResultSubscriber:
+    """
+    Receive the results of the routing tasks sent by the current worker, to await them instead of polling the Celery
+    result backend.
+
+    Each worker subscribes to its own Redis channel, passed to the routing tasks as `reply_channel`. The routing task
+    publishes its result on this channel as soon as it returns, and the subscriber resolves the future of the task.
+    Pub/sub messages are not persisted, so a result published while the subscriber is disconnected is lost: waiters
+    must keep polling the result backend as fallback.
+    """
+
+    def __init__(self) -> None:
+        self.channel = f"{PREFIX__CELERY_ROUTING_RESULT}:{uuid4().hex}"
+        self.futures: dict[str, asyncio.Future] = {}
+        self.redis_client: AsyncRedis | None = None
+
+        self._listener: asyncio.Task | None = None
+        self._subscribed = asyncio.Event()
+
+    async def setup(self, redis_pool: ConnectionPool) -> None:
+        """
+        Subscribe to the reply channel of the worker. Run in lifespan context.
+
+        Args:
+            redis_pool(ConnectionPool): The Redis connection pool
+        """
+        self.redis_client = AsyncRedis(connection_pool=redis_pool)
+        self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=5)
+        except TimeoutError:
+            logger.warning("Routing result subscriber not subscribed yet, routing results are polled from the result backend.")
+
+    async def close(self) -> None:
+        """
+        Stop the listener.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+            self.redis_client = None
+
+    def register(self, task_id: str) -> asyncio.Future:
+        """
+        Get the future resolved with the result of a routing task. Must be called before sending the task.
+
+        Args:
+            task_id(str): The ID of the routing task
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.futures[task_id] = future
+
+        return future
+
+    def discard(self, task_id: str) -> None:
+        """
+        Stop waiting for the result of a routing task.
+
+        Args:
+            task_id(str): The ID of the routing task
+        """
+        self.futures.pop(task_id, None)
+
+    def _resolve(self, task_id: str, result: dict[str, Any]) -> None:
+        future = self.futures.pop(task_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self._subscribed.set()
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = json.loads(message["data"])
+                        self._resolve(task_id=data["task_id"], result=data["result"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # results published while disconnected are lost, waiters fall back to the result backend
+                logger.warning(f"Routing result subscriber disconnected: {e}")
+                self._subscribed.clear()
+                await asyncio.sleep(1)
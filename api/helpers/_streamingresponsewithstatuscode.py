@@ -3,8 +3,11 @@ import json
 import logging
 import traceback
 
+import anyio
 from fastapi.responses import StreamingResponse
-from starlette.types import Send
+from starlette.types import Receive, Scope, Send
+
+from api.utils.context import request_context
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +23,29 @@ class StreamingResponseWithStatusCode(StreamingResponse):
     body_iterator: AsyncIterator[str | bytes]
     response_started: bool = False
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # listen for the client disconnection whatever the ASGI spec version of the server, so an abandoned stream is
+        # cancelled while waiting for the provider and not at the next chunk, which closes the upstream request and
+        # releases the provider inflight slot
+        async with anyio.create_task_group() as task_group:
+
+            async def stream_response() -> None:
+                try:
+                    await self.stream_response(send)
+                except OSError:
+                    logger.debug("Client disconnected during streaming.")
+                task_group.cancel_scope.cancel()
+
+            async def listen_for_disconnect() -> None:
+                await self.listen_for_disconnect(receive)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(stream_response)
+            await listen_for_disconnect()
+
+        if self.background is not None:
+            await self.background()
+
     async def stream_response(self, send: Send) -> None:
         more_body = True
         try:
@@ -42,6 +68,7 @@ class StreamingResponseWithStatusCode(StreamingResponse):
                     content, status_code = chunk
                     if status_code // 100 != 2:
                         # an error occurred mid-stream
+                        request_context.get().status_code = status_code
                         if not isinstance(content, bytes):
                             content = content.encode(self.charset)
                         more_body = False
@@ -57,6 +84,7 @@ class StreamingResponseWithStatusCode(StreamingResponse):
 
         except Exception:
             logger.error(traceback.format_exc())
+            request_context.get().status_code = 500
             more_body = False
             error_resp = {"error": {"message": "Internal Server Error"}}
             error_event = f"event: error\ndata: {json.dumps(error_resp)}\n\n".encode(self.charset)
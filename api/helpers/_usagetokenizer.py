@@ -51,19 +51,31 @@ class UsageTokenizer:
 
         return prompt_tokens
 
-    def get_completion_tokens(self, endpoint: str, response_data: dict | list[dict]) -> int:
+    def get_completion_tokens(self, endpoint: str, response_data: dict) -> int:
         """
         Get the completion tokens for the given endpoint and body.
 
         Args:
             endpoint (str): The endpoint to get the completion tokens for.
-            response_data (dict | list[dict]): The response data of the request (must be a ChatCompletion or a list of ChatCompletionChunk).
+            response_data (dict): The response data of the request (must be a ChatCompletion).
         """
         completion_tokens = 0
         if endpoint == EndpointRoute.CHAT_COMPLETIONS:
-            if isinstance(response_data, list):
-                completion_tokens = sum([len(self.tokenizer.encode(ChatCompletionChunk.extract_chunk_content(chunk=chunk))) for chunk in response_data])  # fmt: off
-            else:
-                completion_tokens = len(self.tokenizer.encode(ChatCompletion.extract_response_content(response=response_data)))
+            completion_tokens = len(self.tokenizer.encode(ChatCompletion.extract_response_content(response=response_data)))
+
+        return completion_tokens
+
+    def get_chunk_completion_tokens(self, endpoint: str, chunk: dict) -> int:
+        """
+        Get the completion tokens of a chunk of a streamed response, to count the completion tokens while streaming.
+
+        Args:
+            endpoint (str): The endpoint to get the completion tokens for.
+            chunk (dict): The parsed chunk of the response (must be a ChatCompletionChunk).
+        """
+        completion_tokens = 0
+        if endpoint == EndpointRoute.CHAT_COMPLETIONS:
+            content = ChatCompletionChunk.extract_chunk_content(chunk=chunk)
+            completion_tokens = len(self.tokenizer.encode(content)) if content else 0
 
         return completion_tokens
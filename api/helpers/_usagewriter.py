@@ -0,0 +1,260 @@
+import asyncio
+import datetime as dt
+import json
+import logging
+import os
+import threading
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from api.sql.models import Usage as UsageTable
+
+logger = logging.getLogger(__name__)
+
+USAGE_QUEUE_SIZE = Gauge("ogl_usage_queue_size", "Number of usage logs waiting to be written in the database.", multiprocess_mode="livesum")  # fmt: off
+USAGE_WRITTEN_TOTAL = Counter("ogl_usage_written_total", "Total number of usage logs written in the database.")
+USAGE_SPILLED_TOTAL = Counter("ogl_usage_spilled_total", "Total number of usage logs written in the spill directory.")
+USAGE_DROPPED_TOTAL = Counter("ogl_usage_dropped_total", "Total number of usage logs dropped (queue full or database unavailable).")
+
+
+class UsageWriter:
+    """
+    Per worker sink of the usage logs: the usages are queued in memory and a background task bulk-inserts them every
+    `batch_size` rows or `flush_interval` milliseconds. When the queue is full or the database is unavailable, usages are
+    written as JSON lines in the spill directory (if provided) and inserted back after the next successful write,
+    otherwise they are dropped.
+
+    Args:
+        session_factory(async_sessionmaker): The session factory used to write the usages
+        queue_size(int): Maximum number of usages waiting to be written
+        batch_size(int): Maximum number of usages inserted per query
+        flush_interval(int): Maximum time in milliseconds a usage waits in the queue before being written
+        spill_directory(str | None): Directory where usages are written when they cannot be inserted, if None usages are dropped
+    """
+
+    SPILL_FILE_PREFIX = "usage-"
+    SPILL_FILE_SUFFIX = ".jsonl"
+    REPLAY_FILE_SUFFIX = ".replay"
+    QUARANTINE_FILE_SUFFIX = ".corrupt"
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: int,
+        spill_directory: str | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval / 1000
+        self.spill_directory = spill_directory
+
+        self._closing = False
+        self._task: asyncio.Task | None = None
+        self._spills: set[asyncio.Task] = set()
+        self._spill_lock = threading.Lock()
+
+        if self.spill_directory is not None:
+            os.makedirs(self.spill_directory, exist_ok=True)
+
+    @property
+    def spill_file(self) -> str:
+        return os.path.join(self.spill_directory, f"{self.SPILL_FILE_PREFIX}{os.getpid()}{self.SPILL_FILE_SUFFIX}")
+
+    def setup(self) -> None:
+        """
+        Start the background writer. Run in lifespan context.
+        """
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the background writer once all the queued usages are written.
+        """
+        self._closing = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._spills:
+            await asyncio.gather(*self._spills, return_exceptions=True)
+
+    def put(self, usage: UsageTable) -> None:
+        """
+        Queue a usage to be written, never blocks the request.
+
+        Args:
+            usage(UsageTable): The usage to write
+        """
+        row = {column.key: getattr(usage, column.key) for column in UsageTable.__table__.columns if column.key != "id"}
+        if row["created"] is None:
+            row["created"] = dt.datetime.now()
+
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            logger.warning("Usage queue is full.")
+            task = asyncio.create_task(self._spill(rows=[row]))
+            self._spills.add(task)
+            task.add_done_callback(self._spills.discard)
+        USAGE_QUEUE_SIZE.set(self.queue.qsize())
+
+    async def _run(self) -> None:
+        while not (self._closing and self.queue.empty()):
+            try:
+                batch = await self._get_batch()
+                if batch:
+                    await self._write(rows=batch)
+            except Exception:
+                logger.exception("Unexpected error in the usage writer.")
+
+    async def _get_batch(self) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            if self._closing and self.queue.empty():
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=timeout))
+            except TimeoutError:
+                break
+        USAGE_QUEUE_SIZE.set(self.queue.qsize())
+
+        return batch
+
+    async def _insert(self, rows: list[dict]) -> None:
+        async with self.session_factory() as session:
+            await session.execute(insert(UsageTable), rows)
+            await session.commit()
+        USAGE_WRITTEN_TOTAL.inc(len(rows))
+
+    async def _write(self, rows: list[dict]) -> None:
+        try:
+            await self._insert(rows=rows)
+        except Exception as e:
+            logger.error(f"Failed to log {len(rows)} usages: {e}")
+            await self._spill(rows=rows)
+            return
+
+        await self._replay()
+
+    async def _spill(self, rows: list[dict]) -> bool:
+        """
+        Returns:
+            bool: False if the usages have been dropped.
+        """
+        if self.spill_directory is None:
+            USAGE_DROPPED_TOTAL.inc(len(rows))
+            return False
+
+        try:
+            await asyncio.to_thread(self._write_spill_file, rows=rows)
+            USAGE_SPILLED_TOTAL.inc(len(rows))
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to spill {len(rows)} usages: {e}")
+            USAGE_DROPPED_TOTAL.inc(len(rows))
+            return False
+
+        return True
+
+    def _write_spill_file(self, rows: list[dict]) -> None:
+        lines = "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        # spills of the queue overflow and of the writer may run in concurrent threads
+        with self._spill_lock, open(self.spill_file, mode="a", encoding="utf-8") as file:
+            file.write(lines)
+
+    async def _replay(self) -> None:
+        """
+        Insert back the spilled usages of all the workers. Each spill file is claimed by renaming it, so a file is
+        replayed by a single worker, and is removed once its usages are inserted or spilled again. The claimed files of
+        a worker stopped during the replay are claimed again, so their usages may be inserted twice but are not lost.
+        A spill file that cannot be read is moved aside with the `.corrupt` suffix and skipped.
+        """
+        if self.spill_directory is None:
+            return
+
+        for name in await asyncio.to_thread(os.listdir, self.spill_directory):
+            if not name.startswith(self.SPILL_FILE_PREFIX):
+                continue
+            if name.endswith(self.REPLAY_FILE_SUFFIX):
+                # claimed by a worker, abandoned if the worker is not running anymore
+                pid = name.removesuffix(self.REPLAY_FILE_SUFFIX).rsplit(".", 1)[-1]
+                if not pid.isdigit() or self._is_running(pid=int(pid)):
+                    continue
+            elif not name.endswith(self.SPILL_FILE_SUFFIX):
+                continue
+
+            path = os.path.join(self.spill_directory, name)
+            try:
+                claimed = await asyncio.to_thread(self._read_spill_file, path=path)
+            except OSError as e:
+                logger.error(f"Failed to read spilled usages from {path}: {e}")
+                continue
+
+            if claimed is None:  # claimed by another worker or quarantined
+                continue
+
+            claimed_path, rows = claimed
+            for i in range(0, len(rows), self.batch_size):
+                try:
+                    await self._insert(rows=rows[i : i + self.batch_size])
+                except Exception as e:
+                    logger.error(f"Failed to replay spilled usages: {e}")
+                    # the claimed file is kept to be replayed again if the usages cannot be spilled
+                    if await self._spill(rows=rows[i:]):
+                        await asyncio.to_thread(os.remove, claimed_path)
+                    return
+
+            await asyncio.to_thread(os.remove, claimed_path)
+
+    @staticmethod
+    def _is_running(pid: int) -> bool:
+        if pid == os.getpid():  # a previous replay of this worker has been interrupted
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:  # running as another user
+            pass
+
+        return True
+
+    def _read_spill_file(self, path: str) -> tuple[str, list[dict]] | None:
+        """
+        Claim and read a spill file, the claimed file must be removed once its usages are inserted.
+
+        Returns:
+            tuple[str, list[dict]] | None: The path of the claimed file and its usages, None if the file has been claimed by another worker or quarantined.
+        """
+        suffix = f".{os.getpid()}{self.REPLAY_FILE_SUFFIX}"
+        claimed = path if path.endswith(suffix) else f"{path}{suffix}"
+        try:
+            if path == self.spill_file:
+                # the queue overflow of this worker may be appending to its spill file
+                with self._spill_lock:
+                    os.replace(path, claimed)
+            elif path != claimed:
+                os.replace(path, claimed)
+        except FileNotFoundError:  # claimed by another worker
+            return None
+
+        try:
+            with open(claimed, encoding="utf-8") as file:
+                rows = [json.loads(line) for line in file if line.strip()]
+            for row in rows:
+                row["created"] = dt.datetime.fromisoformat(row["created"])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Invalid spill file {path}, moved to {claimed}{self.QUARANTINE_FILE_SUFFIX}: {e}")
+            os.replace(claimed, f"{claimed}{self.QUARANTINE_FILE_SUFFIX}")
+            return None
+
+        return claimed, rows
@@ -0,0 +1,157 @@
+from abc import ABC, abstractmethod
+import asyncio
+import logging
+
+from redis.asyncio import ConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import ORMExecuteState, Session
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache(ABC):
+    """
+    Base class of the in-process caches invalidated by a version stored and published in Redis.
+
+    Subclasses declare the tables they depend on. Any committed write on these tables invalidates the cache of the
+    current worker, bumps the version in Redis and publishes it, so every other worker invalidates its own cache
+    immediately. A statement can opt out with the `cache_invalidation=False` execution option.
+
+    Args:
+        version_key(str): Redis key of the version, also used as pub/sub channel
+    """
+
+    # table name -> statements types ("insert", "update", "delete") invalidating the cache
+    WATCHED_TABLES: dict[str, set[str]] = {}
+
+    def __init__(self, version_key: str) -> None:
+        self.version_key = version_key
+        self.version = 0
+        self.redis_client: AsyncRedis | None = None
+
+        self._session_info_key = f"{version_key}_dirty"
+        self._listener: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @abstractmethod
+    def invalidate(self) -> None:
+        """
+        Invalidate the cache of the current worker.
+        """
+        pass
+
+    def watch(self, session_factory: async_sessionmaker) -> None:
+        """
+        Listen the sessions created by the session factory to invalidate the cache after each committed write on the
+        watched tables. The session factory must be created with a dedicated `sync_session_class`, otherwise all the
+        sessions of the process are listened.
+
+        Args:
+            session_factory(async_sessionmaker): The session factory used by the API
+        """
+        sync_session_class = session_factory.kw.get("sync_session_class", Session)
+        event.listen(sync_session_class, "do_orm_execute", self._on_execute)
+        event.listen(sync_session_class, "after_commit", self._on_commit)
+        event.listen(sync_session_class, "after_rollback", self._on_rollback)
+
+    async def setup(self, redis_pool: ConnectionPool) -> None:
+        """
+        Start to listen the version channel to invalidate the cache when another worker writes on the watched tables.
+        Run in lifespan context.
+
+        Args:
+            redis_pool(ConnectionPool): The Redis connection pool
+        """
+        self.redis_client = AsyncRedis(connection_pool=redis_pool)
+        self.version = int(await self.redis_client.get(self.version_key) or 0)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        """
+        Stop the listener and wait for the pending version publications.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+            self.redis_client = None
+
+    async def publish(self) -> None:
+        """
+        Invalidate the cache of the current worker and of all the other workers.
+        """
+        self.invalidate()
+        await self._publish_version()
+
+    async def _publish_version(self) -> None:
+        if self.redis_client is None:
+            return
+
+        try:
+            self.version = await self.redis_client.incr(self.version_key)
+            await self.redis_client.publish(self.version_key, self.version)
+        except Exception as e:
+            logger.warning(f"Failed to publish {self.version_key} version: {e}")
+
+    def _on_execute(self, orm_execute_state: ORMExecuteState) -> None:
+        if orm_execute_state.is_insert:
+            statement_type = "insert"
+        elif orm_execute_state.is_update:
+            statement_type = "update"
+        elif orm_execute_state.is_delete:
+            statement_type = "delete"
+        else:
+            return
+
+        if not orm_execute_state.execution_options.get("cache_invalidation", True):
+            return
+
+        table = getattr(getattr(orm_execute_state.statement, "table", None), "name", None)
+        if statement_type in self.WATCHED_TABLES.get(table, set()):
+            orm_execute_state.session.info[self._session_info_key] = True
+
+    def _on_commit(self, session: Session) -> None:
+        if not session.info.pop(self._session_info_key, False):
+            return
+
+        self.invalidate()
+        try:
+            task = asyncio.get_running_loop().create_task(self._publish_version())
+        except RuntimeError:  # no running event loop
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_rollback(self, session: Session) -> None:
+        session.info.pop(self._session_info_key, None)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.version_key)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        version = int(message["data"])
+                        if version != self.version:
+                            self.version = version
+                            self.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # messages may have been missed while disconnected
+                logger.warning(f"{self.version_key} listener disconnected: {e}")
+                self.invalidate()
+                await asyncio.sleep(1)
@@ -1,6 +1,4 @@
-from datetime import datetime, timedelta
 import logging
-import math
 import random
 
 from redis import Redis
@@ -9,7 +7,7 @@ from redis.asyncio import Redis as AsyncRedis
 from api.helpers.load_balancing import BaseLoadBalancingStrategy
 from api.schemas.core.models import Metric
 from api.utils.redis import safe_redis_reset
-from api.utils.variables import PREFIX__REDIS_METRIC_TIMESERIE, REDIS__TIMESERIE_RETENTION_SECONDS
+from api.utils.sketch import get_sketch_keys, get_sketch_quantile
 
 logger = logging.getLogger(__name__)
 
@@ -33,57 +31,44 @@ class LeastBusyLoadBalancingStrategy(BaseLoadBalancingStrategy):
         self.percentile = 0.95
 
     def apply_sync_strategy(self, candidates: list[int]) -> tuple[int, float]:
-        scores = {}
-        for provider_id in candidates:
-            cutoff = datetime.now() - timedelta(seconds=REDIS__TIMESERIE_RETENTION_SECONDS)
-            key = f"{PREFIX__REDIS_METRIC_TIMESERIE}:{self.metric}:{provider_id}"  # currently only TTFT is supported
-            try:
-                result = self.redis_client.ts().range(key, from_time=int(cutoff.timestamp() * 1000) if cutoff else 0, to_time="+")
-                series = [(ts, val) for ts, val in result]
-
-            except Exception as e:
-                logger.error(f"Failed to fetch timeseries for {key}: {e}", exc_info=True)
-                self.redis_client.reset()
-                series = []
-
-            if not series:
-                scores[provider_id] = float("inf")
-                continue
-
-            values = [v for _, v in series]
-            values.sort()
-
-            idx = math.ceil(self.percentile * len(values)) - 1
-            scores[provider_id] = values[idx]
-
-        min_value = min(scores.values())
-        candidates = [k for k, v in scores.items() if v == min_value]
-
-        return random.choice(candidates), min_value
+        keys = {provider_id: get_sketch_keys(metric=Metric(self.metric).value, provider_id=provider_id) for provider_id in candidates}
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for provider_keys in keys.values():
+                for key in provider_keys:
+                    pipeline.hgetall(key)
+            slots = pipeline.execute()
+        except Exception as e:
+            logger.error(f"Failed to fetch metric sketches: {e}", exc_info=True)
+            self.redis_client.reset()
+            slots = []
+
+        return self._choose(keys=keys, slots=slots)
 
     async def apply_async_strategy(self, candidates: list[int]) -> tuple[int, float]:
+        keys = {provider_id: get_sketch_keys(metric=Metric(self.metric).value, provider_id=provider_id) for provider_id in candidates}
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for provider_keys in keys.values():
+                for key in provider_keys:
+                    pipeline.hgetall(key)
+            slots = await pipeline.execute()
+        except Exception as e:
+            logger.debug(f"Failed to fetch metric sketches: {e}", exc_info=True)
+            await safe_redis_reset(self.redis_client)
+            slots = []
+
+        return self._choose(keys=keys, slots=slots)
+
+    def _choose(self, keys: dict[int, list[str]], slots: list[dict]) -> tuple[int, float]:
         scores = {}
-        for provider_id in candidates:
-            cutoff = datetime.now() - timedelta(seconds=REDIS__TIMESERIE_RETENTION_SECONDS)
-            key = f"{PREFIX__REDIS_METRIC_TIMESERIE}:{self.metric}:{provider_id}"  # currently only TTFT is supported
-            try:
-                result = await self.redis_client.ts().range(key, from_time=int(cutoff.timestamp() * 1000) if cutoff else 0, to_time="+")
-                series = [(ts, val) for ts, val in result]
-
-            except Exception as e:
-                logger.debug(f"Failed to fetch timeseries for {key}: {e}", exc_info=True)
-                await safe_redis_reset(self.redis_client)
-                series = []
-
-            if not series:
-                scores[provider_id] = float("inf")
-                continue
-
-            values = [v for _, v in series]
-            values.sort()
+        offset = 0
+        for provider_id, provider_keys in keys.items():
+            provider_slots = slots[offset : offset + len(provider_keys)]
+            offset += len(provider_keys)
 
-            idx = math.ceil(self.percentile * len(values)) - 1
-            scores[provider_id] = values[idx]
+            score = get_sketch_quantile(slots=provider_slots, quantile=self.percentile)
+            scores[provider_id] = score if score is not None else float("inf")
 
         min_value = min(scores.values())
         candidates = [k for k, v in scores.items() if v == min_value]
@@ -3,11 +3,12 @@ import logging
 from typing import Literal
 
 from redis.asyncio import Redis as AsyncRedis
-from sqlalchemy import Integer, and_, cast, delete, func, insert, or_, select, text, update
+from sqlalchemy import Integer, and_, cast, delete, func, insert, select, text, update
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.clients.model import BaseModelProvider as ModelProvider
+from api.helpers.models._routingtable import RoutingTable
 from api.schemas.admin.providers import Provider, ProviderCarbonFootprintZone, ProviderType
 from api.schemas.admin.routers import Router, RouterLoadBalancingStrategy
 from api.schemas.core.configuration import Model as ModelConfiguration
@@ -21,6 +22,7 @@ from api.sql.models import Router as RouterTable
 from api.sql.models import RouterAlias as RouterAliasTable
 from api.sql.models import User as UserTable
 from api.tasks import add_model_queue_to_running_worker
+from api.utils.context import global_context
 from api.utils.exceptions import (
     InconsistentModelMaxContextLengthException,
     InconsistentModelVectorSizeException,
@@ -91,12 +93,14 @@ class ModelRegistry:
         max_priority: int,
         max_retries: int,
         retry_countdown: int,
+        routing_table_ttl: int = 0,
     ) -> None:
         self.app_title = app_title
         self.queuing_enabled = queuing_enabled
         self.max_priority = max_priority
         self.max_retries = max_retries
         self.retry_countdown = retry_countdown
+        self.routing_table = RoutingTable(ttl=routing_table_ttl, loader=self._load_routing_table)
 
     async def setup(self, models: list[ModelConfiguration], postgres_session: AsyncSession) -> None:
         """
@@ -779,25 +783,24 @@ class ModelRegistry:
 
         return models
 
-    @staticmethod
-    async def get_router_id_from_model_name(model_name: str, postgres_session: AsyncSession) -> int | None:
+    async def _load_routing_table(self, postgres_session: AsyncSession) -> tuple[list[Router], list[Provider]]:
+        routers = await self.get_routers(router_id=None, name=None, postgres_session=postgres_session)
+        providers = await self.get_providers(router_id=None, provider_id=None, postgres_session=postgres_session)
+
+        return routers, providers
+
+    async def get_router_id_from_model_name(self, model_name: str, postgres_session: AsyncSession) -> int | None:
         """
         Retrieve the router ID from a model name, return None if the model name is not found.
 
         Args:
             model_name(str): The model name
+            postgres_session(AsyncSession): Database postgres_session, only used if the routing table must be reloaded
 
         Returns:
             The router ID
         """
-        query = (
-            select(RouterTable.id)
-            .outerjoin(RouterAliasTable, RouterAliasTable.router_id == RouterTable.id)
-            .where(or_(RouterTable.name == model_name, RouterAliasTable.value == model_name))
-            .limit(1)
-        )
-        result = await postgres_session.execute(query)
-        router_id = result.scalar_one_or_none()
+        router_id = await self.routing_table.get_router_id(name=model_name, postgres_session=postgres_session)
 
         return router_id
 
@@ -821,26 +824,42 @@ class ModelRegistry:
         Returns:
             ModelProvider: The chosen provider
         """
-        try:
-            routers = await self.get_routers(router_id=None, name=model, postgres_session=postgres_session)
-        except RouterNotFoundException:
+        router = await self.routing_table.get_router(name=model, postgres_session=postgres_session)
+        if router is None:
             raise ModelNotFoundException()
 
-        router = routers[0]
         request_context.get().router_id = router.id
         request_context.get().router_name = router.name
 
         if router.type not in self.ENDPOINT_MODEL_TYPE_TABLE[endpoint]:
             raise WrongModelTypeException()
 
-        if (router.cost_prompt_tokens != 0 or router.cost_completion_tokens != 0) and request_context.get().user_info.budget == 0:
-            raise InsufficientBudgetException()
+        if router.cost_prompt_tokens != 0 or router.cost_completion_tokens != 0:
+            user_info = request_context.get().user_info
+            budget = user_info.budget
+            if global_context.budget_manager is not None:
+                budget = await global_context.budget_manager.get(user_id=user_info.id, budget=budget)
+            if budget == 0:
+                raise InsufficientBudgetException()
 
-        providers = await self.get_providers(router_id=router.id, provider_id=None, postgres_session=postgres_session)
+        providers = await self.routing_table.get_providers(router_id=router.id, postgres_session=postgres_session)
 
         if len(providers) == 0:
             raise ModelNotFoundException()
 
+        elif global_context.admission_queue is not None:
+            user_info = request_context.get().user_info
+            provider_id, reserved = await global_context.admission_queue.admit(
+                router_id=router.id,
+                providers=providers,
+                load_balancing_strategy=router.load_balancing_strategy,
+                load_balancing_metric=Metric.TTFT,
+                user_id=user_info.id,
+                priority=int(user_info.priority),
+            )
+            if reserved:
+                request_context.get().inflight_reservations.append(provider_id)
+
         elif self.queuing_enabled:
             # ensure priority is between 0 and max_priority
             priority = max(0, min(int(request_context.get().user_info.priority), self.max_priority))
@@ -852,6 +871,7 @@ class ModelRegistry:
                 max_retries=self.max_retries,
                 queue_name=f"{PREFIX__CELERY_QUEUE_ROUTING}.{router.id}",
                 priority=priority,
+                result_subscriber=global_context.routing_result_subscriber,
             )
 
         else:
@@ -864,8 +884,9 @@ class ModelRegistry:
                 redis_client=redis_client,
             )
 
-        providers = await self.get_providers(router_id=router.id, provider_id=provider_id, postgres_session=postgres_session)
-        provider = providers[0]
+        provider = next((provider for provider in providers if provider.id == provider_id), None)
+        if provider is None:
+            raise ProviderNotFoundException()
 
         model_provider = ModelProvider.import_module(type=provider.type)(
             url=provider.url,
@@ -879,6 +900,9 @@ class ModelRegistry:
         model_provider.id = provider.id
         model_provider.cost_prompt_tokens = router.cost_prompt_tokens
         model_provider.cost_completion_tokens = router.cost_completion_tokens
+        model_provider.max_context_length = router.max_context_length
+        model_provider.qos_metric = provider.qos_metric
+        model_provider.qos_limit = provider.qos_limit
 
         request_context.get().provider_id = provider.id
         request_context.get().provider_model_name = provider.model_name
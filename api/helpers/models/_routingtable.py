@@ -0,0 +1,126 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.helpers._versionedcache import VersionedCache
+from api.schemas.admin.providers import Provider
+from api.schemas.admin.routers import Router
+from api.sql.models import Provider as ProviderTable
+from api.sql.models import Router as RouterTable
+from api.sql.models import RouterAlias as RouterAliasTable
+from api.sql.models import User as UserTable
+from api.utils.variables import REDIS__ROUTING_TABLE_VERSION
+
+
+class RoutingTable(VersionedCache):
+    """
+    In-process cache of the routing table (model name or alias -> router -> providers), kept per worker.
+
+    The table is loaded lazily and reloaded after `ttl` seconds. Any committed write on the router, alias or provider
+    tables (from the model registry or from the admin use cases) drops the table of every worker immediately instead
+    of waiting for the TTL.
+
+    Args:
+        ttl(int): Time to live of the table in seconds, 0 disables caching (table reloaded on every lookup)
+        loader(Callable[[AsyncSession], Awaitable[tuple[list[Router], list[Provider]]]]): Coroutine loading all routers and providers
+    """
+
+    WATCHED_TABLES = {
+        RouterTable.__tablename__: {"insert", "update", "delete"},
+        RouterAliasTable.__tablename__: {"insert", "update", "delete"},
+        ProviderTable.__tablename__: {"insert", "update", "delete"},
+        UserTable.__tablename__: {"delete"},  # routers and providers are deleted in cascade with their owner
+    }
+
+    def __init__(self, ttl: int, loader: Callable[[AsyncSession], Awaitable[tuple[list[Router], list[Provider]]]]) -> None:
+        super().__init__(version_key=REDIS__ROUTING_TABLE_VERSION)
+        self.ttl = ttl
+        self.loader = loader
+
+        self.routers: dict[int, Router] = {}
+        self.names: dict[str, int] = {}
+        self.providers: dict[int, list[Provider]] = {}
+        self.expires_at = 0.0
+
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def get_router(self, name: str, postgres_session: AsyncSession) -> Router | None:
+        """
+        Get a router by its name or one of its aliases, return None if the model name is not found.
+
+        Args:
+            name(str): The model name or alias
+            postgres_session(AsyncSession): Database postgres_session, only used if the table must be reloaded
+        """
+        await self.refresh(postgres_session=postgres_session)
+        router_id = self.names.get(name)
+
+        return self.routers.get(router_id) if router_id is not None else None
+
+    async def get_router_id(self, name: str, postgres_session: AsyncSession) -> int | None:
+        """
+        Get a router ID by its name or one of its aliases, return None if the model name is not found.
+
+        Args:
+            name(str): The model name or alias
+            postgres_session(AsyncSession): Database postgres_session, only used if the table must be reloaded
+        """
+        await self.refresh(postgres_session=postgres_session)
+
+        return self.names.get(name)
+
+    async def get_providers(self, router_id: int, postgres_session: AsyncSession) -> list[Provider]:
+        """
+        Get the providers of a router.
+
+        Args:
+            router_id(int): The router ID
+            postgres_session(AsyncSession): Database postgres_session, only used if the table must be reloaded
+        """
+        await self.refresh(postgres_session=postgres_session)
+
+        return self.providers.get(router_id, [])
+
+    async def refresh(self, postgres_session: AsyncSession) -> None:
+        """
+        Reload the table from the database if it expired or has been invalidated.
+
+        Args:
+            postgres_session(AsyncSession): Database postgres_session
+        """
+        if self.ttl > 0 and time.monotonic() < self.expires_at:
+            return
+
+        async with self._lock:
+            if self.ttl > 0 and time.monotonic() < self.expires_at:
+                return
+
+            generation = self._generation
+            routers, providers = await self.loader(postgres_session)
+
+            names, providers_by_router = {}, {}
+            for router in routers:
+                names[router.name] = router.id
+                for alias in router.aliases or []:
+                    names[alias] = router.id
+                providers_by_router[router.id] = []
+            for provider in providers:
+                providers_by_router.setdefault(provider.router_id, []).append(provider)
+
+            self.routers = {router.id: router for router in routers}
+            self.names = names
+            self.providers = providers_by_router
+
+            # an invalidation received while loading may not be reflected in the loaded rows, keep the table expired
+            if generation == self._generation:
+                self.expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        """
+        Mark the table as expired, the next lookup will reload it from the database.
+        """
+        self._generation += 1
+        self.expires_at = 0.0
@@ -1,9 +1,8 @@
-import json
-from json import JSONDecodeError
 from typing import Annotated, Any, Literal
 
 from mistralai.models import ChatCompletionRequest
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
+import orjson
 from pydantic import Field, field_validator, model_validator
 
 from api.schemas import BaseModel
@@ -154,18 +153,32 @@ class ChatCompletionChunk(ChatCompletionChunk):
     search_results: list[Search] = []
 
     @staticmethod
-    def parse_chunk(chunk: str) -> Literal["[DONE]"] | dict | None:
-        if not chunk.startswith("data: "):
-            return None
+    def parse_chunk(chunk: bytes) -> Literal["[DONE]"] | dict | None:
+        """
+        Parse a server-sent event of a streamed response, without decoding it to a string. Only the `data:` lines of the
+        event are parsed, the other fields (`event:`, `id:`, `retry:`) and the comments are ignored.
+
+        Args:
+            chunk (bytes): The event, without its trailing blank line.
 
-        chunk = chunk.split("data: ")[1].strip()
-        if not chunk:
+        Returns:
+            Literal["[DONE]"] | dict | None: "[DONE]" for the end of the stream, the parsed data or None for empty, malformed or non-data events.
+        """
+        if b"\n" not in chunk:  # single line event, the most common case
+            if not chunk.startswith(b"data:"):
+                return None
+            data = chunk[5:].strip()
+        else:
+            # the data of an event spread over several lines are joined with a line feed
+            data = b"\n".join(line[5:].strip() for line in chunk.split(b"\n") if line.startswith(b"data:")).strip()
+
+        if not data:
             return None
-        if chunk == "[DONE]":
-            return chunk
+        if data == b"[DONE]":
+            return "[DONE]"
         try:
-            return json.loads(chunk)
-        except JSONDecodeError:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
             return None
 
     @staticmethod
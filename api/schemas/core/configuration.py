@@ -170,6 +170,7 @@ class DependencyType(StrEnum):
     ALBERT = "albert"
     CELERY = "celery"
     ELASTICSEARCH = "elasticsearch"
+    LOCAL_VECTOR_STORE = "local_vector_store"
     MARKER = "marker"
     POSTGRES = "postgres"
     REDIS = "redis"
@@ -199,6 +200,18 @@ class CeleryDependency(ConfigBaseModel):
     enable_utc: bool = Field(default=True, description="Enable UTC.", examples=[True])  # fmt: off
 
 
+@custom_validation_error()
+class DocumentCacheDependency(ConfigBaseModel):
+    """
+    The document cache is an optional dependency of OpenGateLLM. If this dependency is provided, the parsed content of the uploaded files and the embeddings of the chunks are cached in a Redis instance dedicated to the cache, see the `document_cache_*` settings.
+    The instance memory is bounded with an LRU eviction policy, so it must not be the Redis dependency, where the eviction would remove the rate limiting counters, the budgets and the admission queues.
+    Pass all `from_url()` method arguments of `redis.asyncio.connection.ConnectionPool` class, see https://redis.readthedocs.io/en/stable/connections.html#redis.asyncio.connection.ConnectionPool.from_url for more information.
+    """
+
+    url: constr(strip_whitespace=True, min_length=1) = Field(..., pattern=r"^redis://", description="Redis connection url of the instance dedicated to the document cache.", examples=["redis://:changeme@localhost:6380"])  # fmt: off
+    max_memory: int | None = Field(default=1024, ge=1, description="Maximum memory in MB of the document cache, set on the Redis instance with the `allkeys-lru` eviction policy when the API starts. If not provided, the instance must be configured with its own `maxmemory` limit.", examples=[1024])  # fmt: off
+
+
 @custom_validation_error()
 class ElasticsearchDependency(ConfigBaseModel):
     """
@@ -213,6 +226,21 @@ class ElasticsearchDependency(ConfigBaseModel):
     number_of_replicas: int = Field(default=1, ge=0, description="Number of replicas for the Elasticsearch index.", examples=[1])  # fmt: off
 
 
+@custom_validation_error()
+class LocalVectorStoreDependency(ConfigBaseModel):
+    """
+    The local vector store is an optional dependency of OpenGateLLM, an alternative to Elasticsearch for small deployments and tests. If this dependency is provided, all documents endpoint are enabled.
+    The chunks are searched in the API process and persisted in a local directory: the embeddings in a memory-mapped matrix, searched exhaustively or with an HNSW index for the large searches, and the content in a BM25 index.
+    The directory is locked by the API process, so the API must run with a single worker.
+    """
+
+    directory: constr(strip_whitespace=True, min_length=1) = Field(..., description="Directory where the chunks and their embeddings are stored.", examples=["/data/vector_store"])  # fmt: off
+    hnsw_threshold: int = Field(default=10000, ge=1, description="Minimum number of chunks matching the filters of a semantic search to search them with the HNSW index instead of exhaustively. The HNSW index requires the `hnswlib` package (`hnsw` extra: pip install '.[hnsw]'), otherwise the chunks are always searched exhaustively.", examples=[10000])  # fmt: off
+    hnsw_m: int = Field(default=16, ge=2, description="Number of neighbors of each chunk in the HNSW index.", examples=[16])  # fmt: off
+    hnsw_ef_construction: int = Field(default=200, ge=1, description="Number of candidates explored when a chunk is added in the HNSW index.", examples=[200])  # fmt: off
+    hnsw_ef_search: int = Field(default=100, ge=1, description="Number of candidates explored by a search in the HNSW index.", examples=[100])  # fmt: off
+
+
 @custom_validation_error()
 class MarkerDependency(ConfigBaseModel):
     """
@@ -271,7 +299,9 @@ class EmptyDepencency(ConfigBaseModel):
 class Dependencies(ConfigBaseModel):
     albert: AlbertDependency | None = Field(default=None, description="**[DEPRECATED]** See the [AlbertDependency section](#albertdependency) for more information.")  # fmt: off
     celery: CeleryDependency | None = Field(default=None, description="**[DEPRECATED]** See the [CeleryDependency section](#celerydependency) for more information.")  # fmt: off
+    document_cache: DocumentCacheDependency | None = Field(default=None, description="See the [DocumentCacheDependency section](#documentcachedependency) for more information.")  # fmt: off
     elasticsearch: ElasticsearchDependency | None = Field(default=None, description="See the [ElasticsearchDependency section](#elasticsearchdependency) for more information.")  # fmt: off
+    local_vector_store: LocalVectorStoreDependency | None = Field(default=None, description="See the [LocalVectorStoreDependency section](#localvectorstoredependency) for more information.")  # fmt: off
     marker: MarkerDependency | None = Field(default=None, description="**[DEPRECATED]** See the [MarkerDependency section](#markerdependency) for more information.")  # fmt: off
     postgres: PostgresDependency = Field(..., description="See the [PostgresDependency section](#postgresdependency) for more information.")  # fmt: off
     redis: RedisDependency  = Field(..., description="See the [RedisDependency section](#redisdependency) for more information.")  # fmt: off
@@ -326,6 +356,12 @@ class Dependencies(ConfigBaseModel):
 
         self = create_attribute(name="parser", type=ParserType, values=self)
 
+        if self.elasticsearch is not None and self.local_vector_store is not None:
+            raise ValueError("Only one vector store is allowed (provided: elasticsearch, local_vector_store).")
+
+        if self.document_cache is not None and self.document_cache.url == self.redis.url:
+            raise ValueError("Document cache must use a Redis instance distinct from the Redis dependency.")
+
         return self
 
 
@@ -336,6 +372,11 @@ class LimitingStrategy(StrEnum):
     SLIDING_WINDOW = "sliding_window"
 
 
+class QueuingStrategy(StrEnum):
+    CELERY = "celery"
+    REDIS = "redis"
+
+
 class Tokenizer(StrEnum):
     TIKTOKEN_GPT2 = "tiktoken_gpt2"
     TIKTOKEN_R50K_BASE = "tiktoken_r50k_base"
@@ -360,6 +401,14 @@ class Settings(ConfigBaseModel):
     routing_max_retries: int = Field(default=3, ge=1, description="Maximum number of retries for routing tasks.")  # fmt: off
     routing_retry_countdown: int = Field(default=3, ge=1, description="Number of seconds before retrying a failed routing task.")  # fmt: off
     routing_max_priority: int = Field(default=4, ge=0, le=10, description="Maximum allowed priority in routing tasks.")  # fmt: off
+    routing_queuing_strategy: QueuingStrategy = Field(default=QueuingStrategy.CELERY, description="Strategy to queue the requests of the models whose providers have a QoS policy. If `celery`, requests are queued in Celery if the Celery dependency is provided, otherwise they are not queued. If `redis`, requests are queued by the API in a Redis priority queue per model, without Celery worker.")  # fmt: off
+    routing_cache_ttl: int = Field(default=60, ge=0, description="Time in seconds during which the routing table (models, aliases and providers) is cached in memory by each worker. The cache is invalidated immediately through Redis when a router or a provider is created, updated or deleted. Set to 0 to disable the cache.")  # fmt: off
+
+    # providers http clients
+    providers_max_connections: int = Field(default=100, ge=1, description="Maximum number of concurrent connections per model provider (and parser) origin, shared by all requests of a worker.")  # fmt: off
+    providers_max_keepalive_connections: int = Field(default=20, ge=0, description="Maximum number of idle keep-alive connections kept open per model provider (and parser) origin.")  # fmt: off
+    providers_keepalive_expiry: float = Field(default=5.0, ge=0.0, description="Time in seconds after which an idle keep-alive connection to a model provider is closed.")  # fmt: off
+    providers_http2: bool = Field(default=False, description="If true, use HTTP/2 to connect to the model providers when supported by the provider. Requires `h2` package (`pip install httpx[http2]`).")  # fmt: off
 
     # usage tokenizer
     usage_tokenizer: Tokenizer = Field(default=Tokenizer.TIKTOKEN_GPT2, description="Tokenizer used to compute usage of the API.")  # fmt: off
@@ -384,19 +433,47 @@ class Settings(ConfigBaseModel):
     auth_master_key: constr(strip_whitespace=True, min_length=1) = Field(default="changeme", description="Master key for the API. It should be a random string with at least 32 characters. This key has all permissions and cannot be modified or deleted. This key is used to create the first role and the first user. This key is also used to encrypt user tokens, watch out if you modify the master key, you'll need to update all user API keys.")  # fmt: off
     auth_key_max_expiration_days: int | None = Field(default=None, ge=1, description="Maximum number of days for a new API key to be valid.")  # fmt: off
     auth_playground_session_duration: int = Field(default=3600, ge=1, description="Duration of the playground postgres_session in seconds.")  # fmt: off
+    auth_cache_ttl: int = Field(default=60, ge=0, description="Time in seconds during which a resolved API key (user, role, permissions and limits) is cached in Redis and shared by all workers. The cache is invalidated immediately when a key is revoked, or a user, a role or a limit is updated. The cached budget is only refreshed when it is exhausted. Set to 0 to disable the cache.")  # fmt: off
+    auth_cache_local_ttl: int = Field(default=5, ge=0, description="Time in seconds during which a resolved API key is also cached in the memory of each worker, in addition to Redis.")  # fmt: off
+    auth_cache_max_size: int = Field(default=10000, ge=1, description="Maximum number of resolved API keys cached in the memory of each worker.")  # fmt: off
+
+    # budget
+    budget_reconciliation_interval: int = Field(default=10, ge=1, description="Interval in seconds between two writes in the PostgreSQL database of the user budgets. Budgets are decreased in Redis by each paid request and periodically written in the database.")  # fmt: off
 
     # rate_limiting
     rate_limiting_strategy: LimitingStrategy = Field(default=LimitingStrategy.FIXED_WINDOW, description="Rate limiting strategy for the API.")  # fmt: off
 
     # monitoring
     monitoring_postgres_enabled: bool = Field(default=True, description="If true, the log usage will be written in the PostgreSQL database.")  # fmt: off
+    monitoring_postgres_queue_size: int = Field(default=10000, ge=1, description="Maximum number of usage logs waiting to be written in the PostgreSQL database per worker. When the queue is full, usage logs are written in the spill directory if provided, otherwise they are dropped.")  # fmt: off
+    monitoring_postgres_batch_size: int = Field(default=500, ge=1, description="Maximum number of usage logs written in the PostgreSQL database in a single insert.")  # fmt: off
+    monitoring_postgres_flush_interval: int = Field(default=1000, ge=1, description="Maximum time in milliseconds a usage log waits before being written in the PostgreSQL database.")  # fmt: off
+    monitoring_postgres_spill_directory: str | None = Field(default=None, description="Directory where usage logs are written when the queue is full or the PostgreSQL database is unavailable. They are written back in the database after the next successful insert. If not provided, these usage logs are dropped.")  # fmt: off
     monitoring_prometheus_enabled: bool = Field(default=True, description="If true, Prometheus metrics will be exposed in the `/metrics` endpoint.")  # fmt: off
 
     # vector_store
-    vector_store_model: str | None = Field(default=None, description="Model used to vectorize the text in the vector store database. Is required if a vector store dependency is provided (Elasticsearch). This model must be defined in the `models` section and have type `text-embeddings-inference`.")  # fmt: off
+    vector_store_model: str | None = Field(default=None, description="Model used to vectorize the text in the vector store database. Is required if a vector store dependency is provided (Elasticsearch or local vector store). This model must be defined in the `models` section and have type `text-embeddings-inference`.")  # fmt: off
+
+    search_query_cache_local_ttl: int = Field(default=60, ge=0, description="Time in seconds during which the embedding of a search query is also cached in the memory of each worker, in addition to the document cache. The search queries are normalized (unicode form and whitespaces) and their embeddings are cached only if the document cache is enabled. If 0, the embeddings are only cached in the document cache.")  # fmt: off
+    search_query_cache_max_size: int = Field(default=10000, ge=1, description="Maximum number of search query embeddings cached in the memory of each worker.")  # fmt: off
 
     # document_parsing
     document_parsing_max_concurrent: int = Field(default=10, ge=1, description="Maximum number of concurrent document parsing tasks per worker.")  # fmt: off
+    document_parsing_processes: int = Field(default=0, ge=0, description="Number of PDF conversion processes per worker. If greater than 0, the pages of a PDF are split in ranges converted in parallel by these processes, otherwise PDF are converted in a thread of the worker.")  # fmt: off
+    document_parsing_pages_per_task: int = Field(default=16, ge=1, description="Number of pages of a PDF converted at once by a conversion process.")  # fmt: off
+    document_parsing_timeout: int = Field(default=600, ge=1, description="Maximum time in seconds of a PDF conversion by the conversion processes, after which the parsing of the document fails.")  # fmt: off
+    document_parsing_max_memory: int | None = Field(default=None, ge=1, description="Maximum memory in MB of a PDF conversion process, a conversion exceeding it fails instead of exhausting the memory of the worker. If not provided, the memory is not limited.")  # fmt: off
+    document_parsing_spool_directory: str | None = Field(default=None, description="Directory where the uploaded PDF are copied to be read from the disk by the parser, instead of being loaded in memory. Can be a tmpfs mount. If not provided, the system temporary directory is used.")  # fmt: off
+
+    # document_ingestion
+    document_ingestion_workers: int = Field(default=0, ge=0, description="Number of documents ingested concurrently in background per worker. If greater than 0, uploaded files are stored in the ingestion directory and the document is returned with `pending` status, then the file is parsed, split and indexed by the first available worker. If 0, the files are ingested during the upload request.")  # fmt: off
+    document_ingestion_directory: str | None = Field(default=None, description="Directory where the uploaded files are stored until they are ingested. Required if `document_ingestion_workers` is greater than 0. Must be a storage shared by all the API workers and instances (e.g. a network file system), since a document can be ingested by any of them.")  # fmt: off
+    document_ingestion_max_retries: int = Field(default=3, ge=0, description="Maximum number of retries of a failed document ingestion. Parsing errors are not retried.")  # fmt: off
+    document_ingestion_timeout: int = Field(default=300, ge=10, description="Time in seconds without progress after which a document ingestion is considered lost (e.g. worker restart) and is retried.")  # fmt: off
+
+    # document_cache
+    document_cache_ttl: int = Field(default=86400, ge=0, description="Time to live in seconds of the document ingestion cache, shared by all the workers in the Redis instance of the document cache dependency: the parsed content of the uploaded files by hash of their content, and the embeddings of the chunks and of the search queries by hash of the embeddings model and the text. Re-uploading a known file skips the parsing, and known chunks and queries skip the embeddings requests. The cache is disabled if the document cache dependency is not provided or if 0.")  # fmt: off
+    document_cache_max_size: int = Field(default=10 * 1024 * 1024, ge=0, description="Maximum size in bytes of a cached parsed document, once compressed. Larger documents are parsed again on each upload. The total size of the cache is bounded by the `max_memory` of the document cache dependency.")  # fmt: off
 
     # session
     session_secret_key: str | None = Field(default=None, description='Secret key for postgres_session middleware. If not provided, the master key will be used.', examples=["knBnU1foGtBEwnOGTOmszldbSwSYLTcE6bdibC8bPGM"])  # fmt: off
@@ -408,6 +485,9 @@ class Settings(ConfigBaseModel):
         if self.session_secret_key is None:
             self.session_secret_key = self.auth_master_key
 
+        if self.document_ingestion_workers > 0 and self.document_ingestion_directory is None:
+            raise ValueError("Document ingestion directory is required if document ingestion workers is greater than 0.")
+
         return self
 
 
@@ -451,7 +531,7 @@ class ConfigFile(ConfigBaseModel):
             models["all"].extend(models[model_type.value])
 
         # check for interdependencies
-        if self.dependencies.elasticsearch and self.settings.vector_store_model:
+        if (self.dependencies.elasticsearch or self.dependencies.local_vector_store) and self.settings.vector_store_model:
             assert self.settings.vector_store_model in models["all"], "Vector store model must be defined in models section."
             assert self.settings.vector_store_model in models[ModelType.TEXT_EMBEDDINGS_INFERENCE.value], f"The vector store model must have type {ModelType.TEXT_EMBEDDINGS_INFERENCE}."  # fmt: off
 
@@ -12,31 +12,45 @@ if TYPE_CHECKING:
     from redis.asyncio import ConnectionPool
     from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 
+    from api.clients.http import HttpClientPool
     from api.clients.parser._baseparserclient import BaseParserClient
+    from api.helpers._admissionqueue import AdmissionQueue
+    from api.helpers._authcache import AuthCache
+    from api.helpers._basevectorstore import BaseVectorStore
+    from api.helpers._budgetmanager import BudgetManager
     from api.helpers._documentmanager import DocumentManager
-    from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
     from api.helpers._identityaccessmanager import IdentityAccessManager
+    from api.helpers._ingestionworker import IngestionWorker
     from api.helpers._limiter import Limiter
     from api.helpers._parsermanager import ParserManager
+    from api.helpers._routingresultsubscriber import RoutingResultSubscriber
     from api.helpers._usagemanager import UsageManager
     from api.helpers._usagetokenizer import UsageTokenizer
+    from api.helpers._usagewriter import UsageWriter
     from api.helpers.models import ModelRegistry
 
 
 class GlobalContext(BaseModel):
     model_config = ConfigDict(extra="allow", arbitrary_types_allowed=True)
 
+    admission_queue: AdmissionQueue | None = None
+    auth_cache: AuthCache | None = None
+    budget_manager: BudgetManager | None = None
     document_manager: DocumentManager | None = None
     identity_access_manager: IdentityAccessManager | None = None
+    ingestion_worker: IngestionWorker | None = None
     limiter: Limiter | None = None
     usage_manager: UsageManager | None = None
+    usage_writer: UsageWriter | None = None
     model_registry: ModelRegistry | None = None
     parser_manager: ParserManager | None = None
-    elasticsearch_vector_store: ElasticsearchVectorStore | None = None
+    routing_result_subscriber: RoutingResultSubscriber | None = None
+    vector_store: BaseVectorStore | None = None
     tokenizer: UsageTokenizer | None = None
     parser: BaseParserClient | None = None
 
     elasticsearch_client: AsyncElasticsearch | None = None
+    http_client_pool: HttpClientPool | None = None
     redis_pool: ConnectionPool | None = None
     postgres_session_factory: async_sessionmaker | None = None
     postgres_engine: AsyncEngine | None = None
@@ -56,6 +70,7 @@ class RequestContext(BaseModel):
     key_name: str | None = None
     router_id: int | None = None
     provider_id: int | None = None
+    inflight_reservations: list[int] = []  # providers with an inflight request slot reserved at admission and not used yet
 
     # request body
     router_name: str | None = None
@@ -65,3 +80,5 @@ class RequestContext(BaseModel):
     usage: Usage | None = None
     ttft: int | None = None
     latency: int | None = None
+    status_code: int | None = None  # status code of an error occurring after the response has started (e.g. mid-stream)
+    log_usage: bool = False  # set by the hooks decorator, the usage is logged by the hooks middleware once the response is sent
@@ -1,8 +1,5 @@
-from datetime import datetime
 from enum import StrEnum
 
-from pydantic import BaseModel
-
 
 class ElasticsearchIndexLanguage(StrEnum):
     """
@@ -25,13 +22,3 @@ class ElasticsearchIndexLanguage(StrEnum):
         obj.stemmer = stemmer
 
         return obj
-
-
-class ElasticsearchChunk(BaseModel):
-    id: int
-    collection_id: int
-    document_id: int
-    content: str
-    embedding: list[float]
-    metadata: dict | None
-    created: datetime
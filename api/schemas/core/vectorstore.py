@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+from api.schemas.collections import CollectionVisibility
+
+
+class VectorStoreChunk(BaseModel):
+    """
+    A chunk with its embedding, as indexed in the vector store.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    id: int
+    collection_id: int
+    document_id: int
+    user_id: int | None = None  # collection owner, missing for the chunks indexed before this field was added
+    visibility: CollectionVisibility | None = None
+    content: str
+    embedding: list[float] | np.ndarray  # float32 arrays are serialized as is by the orjson serializer of the Elasticsearch client
+    metadata: dict | None
+    created: datetime
@@ -14,6 +14,13 @@ from api.utils.exceptions import FileSizeLimitExceededException
 PresetSeparators = StrEnum("PresetSeparators", {**{m.name: m.value for m in Language}})
 
 
+class DocumentStatus(StrEnum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class Document(BaseModel):
     object: Annotated[Literal["document"], Field(default="document", description="The type of the object.")]
     id: Annotated[int, Field(gt=0, default=..., description="The ID of the document.")]
@@ -21,6 +28,15 @@ class Document(BaseModel):
     collection_id: Annotated[int, Field(gt=0, default=..., description="The ID of the collection the document belongs to.")]
     created: Annotated[int, Field(default=..., description="The date of the document creation.")]
     chunks: Annotated[int, Field(ge=0, default=0, description="The number of chunks the document has.")]
+    status: Annotated[
+        DocumentStatus,
+        Field(
+            default=DocumentStatus.COMPLETED,
+            description="The ingestion status of the document. Uploaded files are parsed, split and indexed in background when the ingestion workers are enabled.",
+        ),
+    ]
+    progress: Annotated[int, Field(ge=0, le=100, default=100, description="The percentage of the document chunks indexed.")]
+    error: Annotated[str | None, Field(default=None, description="The reason of the last ingestion failure, if any.")]
 
 
 class Documents(BaseModel):
@@ -107,5 +123,22 @@ class CreateDocumentForm(BaseModel):
             raise RequestValidationError(exc.errors())
 
 
+class DocumentIngestionJob(BaseModel):
+    filename: str
+    content_type: str | None = None
+    disable_chunking: bool
+    chunk_size: int
+    chunk_overlap: int
+    chunk_min_size: int
+    is_separator_regex: bool
+    separators: list[str]
+    preset_separators: PresetSeparators
+    metadata: ChunkMetadata | None = None
+
+
 class DocumentResponse(BaseModel):
     id: Annotated[int, Field(ge=0, default=..., description="The ID of the document created.")]
+    status: Annotated[
+        DocumentStatus,
+        Field(default=DocumentStatus.COMPLETED, description="The ingestion status of the document, `pending` if the file is ingested in background."),
+    ]
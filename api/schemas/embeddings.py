@@ -11,7 +11,7 @@ class EmbeddingsRequest(BaseModel):
     input: list[int] | list[list[int]] | str | list[str] = Field(default=..., description="Input text to embed, encoded as a string or array of tokens. To embed multiple inputs in a single request, pass an array of strings or array of token arrays. The input must not exceed the max input tokens for the model (call `/v1/models` endpoint to get the `max_context_length` by model) and cannot be an empty string.")  # fmt: off
     model: str = Field(default=..., description="ID of the model to use. Call `/v1/models` endpoint to get the list of available models, only `text-embeddings-inference` model type is supported.")  # fmt: off
     dimensions: int | None = Field(default=None, description="The number of dimensions the resulting output embeddings should have.")  # fmt: off
-    encoding_format: Literal["float"] | None = Field(default="float", description="The format of the output embeddings. Only `float` is supported.")  # fmt: off
+    encoding_format: Literal["float", "base64"] | None = Field(default="float", description="The format of the output embeddings, either a list of floats or the little-endian float32 vector encoded in base64.")  # fmt: off
 
     @field_validator("input")
     def validate_input(cls, input):
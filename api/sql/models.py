@@ -10,6 +10,7 @@ from api.schemas.admin.roles import LimitType, PermissionType
 from api.schemas.admin.routers import RouterLoadBalancingStrategy
 from api.schemas.collections import CollectionVisibility
 from api.schemas.core.models import Metric
+from api.schemas.documents import DocumentStatus
 from api.schemas.models import ModelType
 from api.utils.variables import DEFAULT_TIMEOUT
 
@@ -176,7 +177,12 @@ class Document(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     collection_id: Mapped[int] = mapped_column(ForeignKey(column="collection.id", ondelete="CASCADE"))
     name: Mapped[str]
+    status: Mapped[DocumentStatus] = mapped_column(default=DocumentStatus.COMPLETED, server_default=DocumentStatus.COMPLETED.name, index=True)
+    progress: Mapped[int] = mapped_column(default=100, server_default="100")
+    error: Mapped[str | None]
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0")
     created: Mapped[dt.datetime] = mapped_column(insert_default=func.now())
+    updated: Mapped[dt.datetime] = mapped_column(insert_default=func.now(), onupdate=func.now(), server_default=func.now())
 
     collection: Mapped["Collection"] = relationship(back_populates="document", passive_deletes=True)
 
@@ -1,8 +1,11 @@
+import json
 import logging
 from typing import Any
 
 from billiard.exceptions import SoftTimeLimitExceeded
+from celery import states
 from celery.exceptions import MaxRetriesExceededError, Retry
+from celery.signals import task_postrun
 
 from api.schemas.admin.routers import RouterLoadBalancingStrategy
 from api.schemas.core.models import Metric
@@ -21,6 +24,7 @@ def apply_routing(
     load_balancing_metric: Metric,
     task_retry_countdown: int,
     task_max_retries: int,
+    reply_channel: str | None = None,
 ) -> dict[str, Any]:
     """
     Apply load balancing and qos policy to the candidates.
@@ -32,6 +36,7 @@ def apply_routing(
         load_balancing_metric (Metric): The metric type to use for performance evaluation
         task_retry_countdown (int): The countdown to wait before retrying the task
         task_max_retries (int): The maximum number of retries
+        reply_channel (str | None): The Redis channel where the result is published when the task returns, see `notify_routing_result`
 
     Returns:
         dict[str, Any]: A dictionary containing the status code and the provider ID
@@ -65,3 +70,23 @@ def apply_routing(
     except Exception as e:  # pragma: no cover - defensive
         logger.exception(f"Task {self.request.id}: An unexpected error occurred", exc_info=True)
         return {"status_code": 500, "body": {"detail": type(e).__name__}}
+
+
+@task_postrun.connect(sender=apply_routing)
+def notify_routing_result(task_id: str, kwargs: dict[str, Any], retval: Any, state: str, **_) -> None:
+    """
+    Publish the result of a routing task on its reply channel, so the API does not have to poll the result backend.
+    Retried tasks are notified when their last attempt returns.
+    """
+    reply_channel = kwargs.get("reply_channel")
+    if reply_channel is None or state not in states.READY_STATES:
+        return
+
+    if state != states.SUCCESS:
+        retval = {"status_code": 500, "body": {"detail": type(retval).__name__}}
+
+    try:
+        get_redis_client().publish(reply_channel, json.dumps({"task_id": task_id, "result": retval}))
+    except Exception:
+        # the API falls back to the result backend
+        logger.warning(f"Task {task_id}: Failed to publish result", exc_info=True)
@@ -0,0 +1,17 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@pytest.fixture
+def postgres_session():
+    return AsyncMock(spec=AsyncSession)
+
+
+@pytest.fixture
+def session_factory(postgres_session: AsyncMock):
+    """Session factory of the helpers running outside of a request (e.g. background workers), opening `postgres_session`."""
+    context = MagicMock(__aenter__=AsyncMock(return_value=postgres_session), __aexit__=AsyncMock(return_value=False))
+
+    return MagicMock(return_value=context)
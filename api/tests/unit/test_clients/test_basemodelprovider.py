@@ -0,0 +1,239 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from redis.exceptions import RedisError, ResponseError
+
+from api.clients.model import OpenaiModelProvider
+import api.clients.model._basemodelprovider as basemodelprovider_module
+from api.schemas.chat import ChatCompletionChunk
+from api.schemas.core.context import RequestContext
+from api.schemas.core.models import RequestContent
+from api.schemas.usage import CarbonFootprintUsage, Usage
+from api.utils.context import request_context
+from api.utils.embeddings import encode_embedding
+from api.utils.variables import PREFIX__REDIS_METRIC_GAUGE, PREFIX__REDIS_METRIC_TIMESERIE, EndpointRoute
+
+
+def _create_provider() -> OpenaiModelProvider:
+    provider = OpenaiModelProvider(url="http://vllm:8000/", key=None, timeout=10, model_name="model", model_hosting_zone=None, model_total_params=None, model_active_params=None)  # fmt: off
+    provider.id = 1
+
+    return provider
+
+
+def _create_redis_client(execute: AsyncMock) -> MagicMock:
+    pipeline = MagicMock(execute=execute)
+    redis_client = MagicMock(incr=AsyncMock(), decr=AsyncMock())
+    redis_client.pipeline.return_value = pipeline
+
+    return redis_client
+
+
+async def _wait_background_tasks() -> None:
+    await asyncio.gather(*basemodelprovider_module._background_tasks)
+
+
+@pytest.mark.asyncio
+async def test_metrics_and_inflight_release_are_written_in_one_pipeline():
+    """Test that the request metrics and the inflight release are written in a single Redis pipeline."""
+    provider = _create_provider()
+    redis_client = _create_redis_client(execute=AsyncMock())
+    pipeline = redis_client.pipeline.return_value
+    admission_queue = MagicMock(notify=AsyncMock())
+
+    with patch.object(basemodelprovider_module, "request_context"), patch.object(basemodelprovider_module.global_context, "admission_queue", admission_queue):  # fmt: off
+        provider._log_performance_metric(redis_client=redis_client, ttft=120, latency=800, inflight_key=f"{PREFIX__REDIS_METRIC_GAUGE}:inflight:1")
+        await _wait_background_tasks()
+
+    redis_client.pipeline.assert_called_once_with(transaction=False)
+    pipeline.decr.assert_called_once_with(f"{PREFIX__REDIS_METRIC_GAUGE}:inflight:1")
+    added_keys = [call.kwargs["key"] for call in pipeline.ts.return_value.add.call_args_list]
+    assert added_keys == [f"{PREFIX__REDIS_METRIC_TIMESERIE}:ttft:1", f"{PREFIX__REDIS_METRIC_TIMESERIE}:latency:1"]
+    assert all(call.kwargs["duplicate_policy"] == "LAST" for call in pipeline.ts.return_value.add.call_args_list)
+    assert pipeline.hincrby.call_count == 2  # one sketch sample per metric
+    pipeline.execute.assert_awaited_once()
+    admission_queue.notify.assert_awaited_once_with(provider_id=1)
+
+
+@pytest.mark.asyncio
+async def test_missing_metrics_are_not_written():
+    """Test that the metrics which are not measured are not written in Redis."""
+    provider = _create_provider()
+    redis_client = _create_redis_client(execute=AsyncMock())
+    pipeline = redis_client.pipeline.return_value
+
+    with patch.object(basemodelprovider_module, "request_context"), patch.object(basemodelprovider_module.global_context, "admission_queue", None):
+        provider._log_performance_metric(redis_client=redis_client, ttft=None, latency=None, inflight_key=f"{PREFIX__REDIS_METRIC_GAUGE}:inflight:1")
+        await _wait_background_tasks()
+
+    pipeline.decr.assert_called_once()
+    pipeline.ts.return_value.add.assert_not_called()
+    pipeline.hincrby.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_inflight_is_released_when_decrement_fails():
+    """Test that only a failed decrement of the pipeline is retried."""
+    provider = _create_provider()
+    redis_client = _create_redis_client(execute=AsyncMock(return_value=[ResponseError("busy"), 1]))
+
+    with patch.object(basemodelprovider_module, "request_context"), patch.object(basemodelprovider_module.global_context, "admission_queue", None):
+        provider._log_performance_metric(redis_client=redis_client, ttft=None, latency=800, inflight_key=f"{PREFIX__REDIS_METRIC_GAUGE}:inflight:1")
+        await _wait_background_tasks()
+
+    redis_client.pipeline.return_value.execute.assert_awaited_once_with(raise_on_error=False)
+    redis_client.decr.assert_awaited_once_with(name=f"{PREFIX__REDIS_METRIC_GAUGE}:inflight:1")
+
+
+@pytest.mark.asyncio
+async def test_inflight_is_not_released_twice_when_pipeline_fails():
+    """Test that the decrement is not replayed when the pipeline fails, since it may have been applied."""
+    provider = _create_provider()
+    redis_client = _create_redis_client(execute=AsyncMock(side_effect=RedisError("redis down")))
+
+    with (
+        patch.object(basemodelprovider_module, "request_context"),
+        patch.object(basemodelprovider_module.global_context, "admission_queue", None),
+        patch.object(basemodelprovider_module, "safe_redis_reset", AsyncMock()),
+    ):
+        provider._log_performance_metric(redis_client=redis_client, ttft=None, latency=800, inflight_key=f"{PREFIX__REDIS_METRIC_GAUGE}:inflight:1")
+        await _wait_background_tasks()
+
+    redis_client.decr.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_inflight_slot_reserved_at_admission_is_used_once():
+    """Test that a request admitted by the admission queue is not counted twice in the inflight requests."""
+    provider = _create_provider()
+
+    token = request_context.set(RequestContext(inflight_reservations=[1]))
+    try:
+        assert provider._use_inflight_reservation() is True
+        assert provider._use_inflight_reservation() is False
+        assert request_context.get().inflight_reservations == []
+    finally:
+        request_context.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_stream_usage_is_counted_chunk_by_chunk():
+    """Test that the usage of a streamed response is counted chunk by chunk."""
+    provider = _create_provider()
+    provider.cost_prompt_tokens = 0
+    provider.cost_completion_tokens = 0
+    events = b"".join(b'data: {"id": "chatcmpl-1", "choices": [{"delta": {"content": "token %d"}}]}\n\n' % i for i in range(3)) + b"data: [DONE]\n\n"
+    # events split across the received bytes chunks
+    received = [events[:10], events[10:100], events[100:]]
+
+    response = MagicMock(status_code=200)
+    response.aiter_bytes = lambda: _aiter(received)
+    async_client = MagicMock()
+    async_client.stream.return_value.__aenter__ = AsyncMock(return_value=response)
+    async_client.stream.return_value.__aexit__ = AsyncMock(return_value=False)
+    http_client = MagicMock(__aenter__=AsyncMock(return_value=async_client), __aexit__=AsyncMock(return_value=False))
+    tokenizer = MagicMock(USAGE_ENDPOINTS=[EndpointRoute.CHAT_COMPLETIONS])
+    tokenizer.get_prompt_tokens.return_value = 5
+    tokenizer.get_chunk_completion_tokens.return_value = 2
+
+    token = request_context.set(RequestContext(usage=Usage()))
+    try:
+        with (
+            patch.object(basemodelprovider_module, "get_http_client", return_value=http_client),
+            patch.object(basemodelprovider_module.global_context, "tokenizer", tokenizer),
+            patch.object(basemodelprovider_module.global_context, "admission_queue", None),
+            patch.object(basemodelprovider_module, "get_carbon_footprint", return_value=CarbonFootprintUsage()),
+        ):
+            request_content = RequestContent(method="POST", model="model", endpoint=EndpointRoute.CHAT_COMPLETIONS, body={"stream": True})
+            chunks = [chunk async for chunk, _ in provider.forward_stream(request_content=request_content, redis_client=_create_redis_client(execute=AsyncMock()))]  # fmt: off
+            await _wait_background_tasks()
+    finally:
+        request_context.reset(token)
+
+    stream = b"".join(chunks)
+    *forwarded_events, extra_event, done_event, _ = stream.split(b"\n\n")
+    assert b"\n\n".join(forwarded_events) + b"\n\n" == events[: -len(b"data: [DONE]\n\n")]
+    assert done_event == b"data: [DONE]"
+
+    extra_chunk = json.loads(extra_event.removeprefix(b"data: "))
+    assert extra_chunk["id"] == "chatcmpl-1"
+    assert extra_chunk["choices"] == []
+    assert extra_chunk["usage"]["prompt_tokens"] == 5
+    assert extra_chunk["usage"]["completion_tokens"] == 6
+    assert tokenizer.get_chunk_completion_tokens.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_events_are_split_without_decoding():
+    """Test that the events of a stream are split on their raw bytes, without decoding the stream."""
+    response = MagicMock()
+    response.aiter_bytes = lambda: _aiter([b"data: 1\r\n\r", b"\ndata: 2\n\n\n\n: ping\n\nda", b"ta: 3"])
+
+    events = [events async for events in OpenaiModelProvider._aiter_stream_events(response=response)]
+
+    assert events == [[b"data: 1", b"data: 2", b": ping"], [b"data: 3"]]
+
+
+@pytest.mark.parametrize(
+    "event, expected",
+    [
+        (b'data: {"id": "1"}', {"id": "1"}),
+        (b'event: message\nid: 7\ndata: {"id": "1"}', {"id": "1"}),
+        (b": keep-alive\ndata: [DONE]", "[DONE]"),
+        (b'data: {"id":\ndata: "1"}', {"id": "1"}),
+        (b"event: ping\nid: 8", None),
+        (b": ping", None),
+    ],
+)
+def test_data_lines_of_stream_events_are_parsed(event, expected):
+    """Test that only the data lines of a server-sent event are parsed."""
+    assert ChatCompletionChunk.parse_chunk(chunk=event) == expected
+
+
+async def _aiter(items: list):
+    for item in items:
+        yield item
+
+
+def test_response_is_formatted_from_raw_content():
+    """Test that the response is formatted from the raw content of the provider response."""
+    provider = _create_provider()
+    provider.cost_prompt_tokens = 0
+    provider.cost_completion_tokens = 0
+    response = httpx.Response(status_code=200, content=b'{"object": "list", "data": [{"index": 0, "embedding": [0.1, 0.2]}]}', headers={"Content-Type": "application/json"})  # fmt: off
+    request_content = RequestContent(method="POST", model="embeddings-model", endpoint=EndpointRoute.EMBEDDINGS, body={"input": ["hello"]})
+
+    token = request_context.set(RequestContext(id="request-1", usage=Usage()))
+    try:
+        with patch.object(basemodelprovider_module.global_context, "tokenizer", None):
+            formatted_response = provider._format_response(request_content=request_content, response=response, request_latency=10)
+    finally:
+        request_context.reset(token)
+
+    assert formatted_response.headers["Content-Type"] == "application/json"
+    response_data = json.loads(formatted_response.content)
+    assert response_data["data"] == [{"index": 0, "embedding": [0.1, 0.2]}]
+    assert response_data["id"] == "request-1"
+    assert response_data["model"] == "embeddings-model"
+    assert response_data["usage"]["prompt_tokens"] == 0
+
+
+def test_embeddings_are_packed_in_base64_when_provider_returns_floats():
+    """Test that the embeddings returned as floats by the provider are packed in base64 when requested."""
+    provider = _create_provider()
+    provider.cost_prompt_tokens = 0
+    provider.cost_completion_tokens = 0
+    response = httpx.Response(status_code=200, content=b'{"object": "list", "data": [{"index": 0, "embedding": [0.5, 1.0]}]}', headers={"Content-Type": "application/json"})  # fmt: off
+    request_content = RequestContent(method="POST", model="embeddings-model", endpoint=EndpointRoute.EMBEDDINGS, body={"input": ["hello"], "encoding_format": "base64"})  # fmt: off
+
+    token = request_context.set(RequestContext(id="request-1", usage=Usage()))
+    try:
+        with patch.object(basemodelprovider_module.global_context, "tokenizer", None):
+            formatted_response = provider._format_response(request_content=request_content, response=response, request_latency=10)
+    finally:
+        request_context.reset(token)
+
+    assert json.loads(formatted_response.content)["data"][0]["embedding"] == encode_embedding(embedding=[0.5, 1.0])
@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from api.clients.http import HttpClientPool, get_http_client
+
+
+@pytest.fixture
+def pool():
+    return HttpClientPool(max_connections=10, max_keepalive_connections=5, keepalive_expiry=5.0)
+
+
+@pytest.mark.parametrize(
+    "url, expected_key",
+    [
+        ("https://api.openai.com/", "https://api.openai.com:443"),
+        ("https://api.openai.com/v1/chat/completions", "https://api.openai.com:443"),
+        ("http://vllm:8000/v1/embeddings", "http://vllm:8000"),
+        ("http://VLLM:80/", "http://vllm:80"),
+        ("http://vllm/", "http://vllm:80"),
+    ],
+)
+def test_get_key(url, expected_key):
+    """Test that the key of a client is the origin of the URL."""
+    assert HttpClientPool.get_key(url=url) == expected_key
+
+
+@pytest.mark.asyncio
+async def test_get_client_is_shared_by_origin(pool):
+    """Test that a client is shared by the URLs of the same origin."""
+    client_1 = pool.get_client(url="http://vllm:8000/")
+    client_2 = pool.get_client(url="http://vllm:8000/v1/chat/completions")
+    client_3 = pool.get_client(url="http://tei:8000/")
+
+    assert client_1 is client_2
+    assert client_1 is not client_3
+    assert len(pool.clients) == 2
+
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_get_client_recreates_closed_client(pool):
+    """Test that a closed client is replaced by a new client."""
+    client = pool.get_client(url="http://vllm:8000/")
+    await client.aclose()
+
+    new_client = pool.get_client(url="http://vllm:8000/")
+
+    assert new_client is not client
+    assert not new_client.is_closed
+
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_close(pool):
+    """Test that close closes and removes all the clients of the pool."""
+    clients = [pool.get_client(url="http://vllm:8000/"), pool.get_client(url="http://tei:8000/")]
+
+    await pool.close()
+
+    assert pool.clients == {}
+    assert all(client.is_closed for client in clients)
+
+
+def test_http2_fallback_without_h2():
+    """Test that HTTP/2 is disabled if the h2 package is not installed."""
+    with patch.object(HttpClientPool, "_is_http2_available", return_value=False):
+        pool = HttpClientPool(max_connections=10, max_keepalive_connections=5, keepalive_expiry=5.0, http2=True)
+
+    assert pool.http2 is False
+
+
+@pytest.mark.asyncio
+async def test_get_http_client_uses_pool(pool):
+    """Test that get_http_client returns the client of the pool without closing it."""
+    with patch("api.clients.http._httpclientpool.global_context") as mock_global_context:
+        mock_global_context.http_client_pool = pool
+        async with get_http_client(url="http://vllm:8000/") as client:
+            assert client is pool.get_client(url="http://vllm:8000/")
+
+    assert not client.is_closed
+
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_get_http_client_without_pool():
+    """Test that get_http_client returns a new client closed after use if there is no pool."""
+    with patch("api.clients.http._httpclientpool.global_context") as mock_global_context:
+        mock_global_context.http_client_pool = None
+        async with get_http_client(url="http://vllm:8000/") as client:
+            assert isinstance(client, httpx.AsyncClient)
+
+    assert client.is_closed
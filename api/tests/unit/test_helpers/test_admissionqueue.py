@@ -0,0 +1,152 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from fakeredis import FakeAsyncRedis
+import pytest
+from redis.exceptions import RedisError
+
+from api.helpers._admissionqueue import ADMIT_SCRIPT, ENQUEUE_SCRIPT, AdmissionQueue
+from api.schemas.admin.routers import RouterLoadBalancingStrategy
+from api.schemas.core.models import Metric
+from api.utils.exceptions import ModelIsTooBusyException
+from api.utils.variables import PREFIX__REDIS_ADMISSION_QUEUE, PREFIX__REDIS_METRIC_GAUGE, REDIS__ADMISSION_CHANNEL
+
+
+def _create_admission_queue(admit_statuses: list[int], inflight: int = 0) -> AdmissionQueue:
+    admission_queue = AdmissionQueue(max_priority=4, max_retries=1, retry_countdown=1)
+    admission_queue.redis_client = MagicMock(get=AsyncMock(return_value=str(inflight).encode()), publish=AsyncMock())
+    pipeline = MagicMock(execute=AsyncMock())
+    pipeline.zrem.return_value = pipeline
+    admission_queue.redis_client.pipeline.return_value = pipeline
+    admission_queue.enqueue_script = AsyncMock(return_value=1)
+    admission_queue.admit_script = AsyncMock(side_effect=admit_statuses)
+
+    return admission_queue
+
+
+def _provider(provider_id: int = 1, qos_limit: float | None = 2) -> MagicMock:
+    return MagicMock(id=provider_id, qos_metric=Metric.INFLIGHT if qos_limit is not None else None, qos_limit=qos_limit)
+
+
+async def _admit(admission_queue: AdmissionQueue, providers: list[MagicMock], priority: int = 0) -> tuple[int, bool]:
+    return await admission_queue.admit(
+        router_id=9,
+        providers=providers,
+        load_balancing_strategy=RouterLoadBalancingStrategy.SHUFFLE,
+        load_balancing_metric=Metric.TTFT,
+        user_id=3,
+        priority=priority,
+    )
+
+
+@pytest.mark.asyncio
+async def test_providers_without_qos_are_not_queued():
+    """Test that the requests to a provider without QoS are admitted without queueing."""
+    admission_queue = _create_admission_queue(admit_statuses=[])
+
+    assert await _admit(admission_queue, providers=[_provider(qos_limit=None)]) == (1, False)
+
+    admission_queue.enqueue_script.assert_not_called()
+    admission_queue.admit_script.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_request_is_admitted_within_free_slots():
+    """Test that a request is admitted if the provider has free inflight slots."""
+    admission_queue = _create_admission_queue(admit_statuses=[1], inflight=1)
+
+    assert await _admit(admission_queue, providers=[_provider(qos_limit=2)], priority=3) == (1, True)
+
+    keys = [f"{PREFIX__REDIS_ADMISSION_QUEUE}:9", f"{PREFIX__REDIS_ADMISSION_QUEUE}:9:heartbeats", f"{PREFIX__REDIS_ADMISSION_QUEUE}:9:users"]
+    enqueue_args = admission_queue.enqueue_script.call_args.kwargs
+    assert enqueue_args["keys"] == keys
+    assert enqueue_args["args"][1:3] == [3, 1]  # user ID, priority rank
+    admit_kwargs = admission_queue.admit_script.call_args.kwargs
+    assert admit_kwargs["keys"] == [*keys[:2], f"{PREFIX__REDIS_METRIC_GAUGE}:{Metric.INFLIGHT.value}:1"]
+    assert admit_kwargs["args"][2] == 2  # inflight requests limit
+    admission_queue.redis_client.publish.assert_awaited_once_with(REDIS__ADMISSION_CHANNEL, "r:9")
+    assert admission_queue.waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_waiter_is_woken_up_when_provider_request_ends():
+    """Test that a waiting request is woken up when a request of the provider ends."""
+    admission_queue = _create_admission_queue(admit_statuses=[0, 1])
+    admission_queue.POLL_INTERVAL = 10
+
+    task = asyncio.create_task(_admit(admission_queue, providers=[_provider(provider_id=5)]))
+    await asyncio.sleep(0.01)
+    assert not task.done()
+
+    admission_queue._wake_up(message="p:5")
+
+    assert await asyncio.wait_for(task, timeout=1) == (5, True)
+    assert admission_queue.admit_script.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_ticket_is_enqueued_again():
+    """Test that the ticket of a waiting request is enqueued again once expired."""
+    admission_queue = _create_admission_queue(admit_statuses=[-1, 1])
+    admission_queue.POLL_INTERVAL = 0.01
+
+    await _admit(admission_queue, providers=[_provider()])
+
+    assert admission_queue.enqueue_script.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_request_not_admitted_in_time_leaves_queue():
+    """Test that a request not admitted in time leaves the queue."""
+    admission_queue = _create_admission_queue(admit_statuses=[0, 0, 0])
+    admission_queue.max_wait_time = 0.01
+    admission_queue.POLL_INTERVAL = 0.01
+
+    with pytest.raises(ModelIsTooBusyException):
+        await _admit(admission_queue, providers=[_provider()])
+
+    admission_queue.redis_client.pipeline.return_value.execute.assert_awaited_once()
+    admission_queue.redis_client.publish.assert_awaited_once_with(REDIS__ADMISSION_CHANNEL, "r:9")
+    assert admission_queue.waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_admit_request():
+    """Test that a request is admitted if Redis is unavailable."""
+    admission_queue = _create_admission_queue(admit_statuses=[RedisError("redis down")])
+
+    assert await _admit(admission_queue, providers=[_provider()]) == (1, False)
+
+
+@pytest.mark.asyncio
+async def test_burst_is_admitted_within_provider_limit():
+    """Test that the admission reserves the inflight slots, so a burst of waiters does not exceed the provider limit."""
+    redis_client = FakeAsyncRedis()
+    enqueue_script = redis_client.register_script(ENQUEUE_SCRIPT)
+    admit_script = redis_client.register_script(ADMIT_SCRIPT)
+    keys = [f"{PREFIX__REDIS_ADMISSION_QUEUE}:9", f"{PREFIX__REDIS_ADMISSION_QUEUE}:9:heartbeats", f"{PREFIX__REDIS_ADMISSION_QUEUE}:9:users"]
+    inflight_key = f"{PREFIX__REDIS_METRIC_GAUGE}:{Metric.INFLIGHT.value}:1"
+    tickets = [f"ticket-{i}" for i in range(5)]
+    for user_id, ticket in enumerate(tickets):
+        await enqueue_script(keys=keys, args=[ticket, user_id, 0, 5000, 100])
+
+    # every waiter polls the queue, in any order
+    statuses = [await admit_script(keys=[*keys[:2], inflight_key], args=[ticket, 5000, 2]) for ticket in reversed(tickets)]
+    statuses += [await admit_script(keys=[*keys[:2], inflight_key], args=[ticket, 5000, 2]) for ticket in tickets]
+
+    # requests are forwarded while the inflight requests do not exceed the limit
+    assert statuses.count(1) == 3
+    assert int(await redis_client.get(inflight_key)) == 3
+    assert await redis_client.zcard(keys[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_release_decrements_inflight_requests():
+    """Test that release frees an unused reserved slot and wakes up the waiters of the provider."""
+    admission_queue = _create_admission_queue(admit_statuses=[])
+    admission_queue.redis_client.decr = AsyncMock()
+
+    await admission_queue.release(provider_id=5)
+
+    admission_queue.redis_client.decr.assert_awaited_once_with(f"{PREFIX__REDIS_METRIC_GAUGE}:{Metric.INFLIGHT.value}:5")
+    admission_queue.redis_client.publish.assert_awaited_once_with(REDIS__ADMISSION_CHANNEL, "p:5")
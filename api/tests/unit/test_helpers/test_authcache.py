@@ -0,0 +1,155 @@
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from api.helpers._authcache import AuthCache
+from api.schemas.admin.roles import PermissionType
+from api.schemas.me.info import UserInfo
+from api.sql.models import User as UserTable
+from api.utils.variables import PREFIX__REDIS_AUTH_CACHE
+
+
+def _user_info(user_id: int = 1) -> UserInfo:
+    return UserInfo(
+        id=user_id,
+        email="user@example.com",
+        budget=10.0,
+        permissions=[PermissionType.ADMIN],
+        limits=[],
+        created=0,
+        updated=0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_caches_loaded_token():
+    """Test that a loaded token is cached and not loaded again."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+    loader = AsyncMock(return_value=(1, "my-key", _user_info()))
+
+    first = await cache.get_or_load(token_id=7, expires=None, loader=loader)
+    second = await cache.get_or_load(token_id=7, expires=None, loader=loader)
+
+    assert first == second == (1, "my-key", _user_info())
+    loader.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_does_not_cache_invalid_token():
+    """Test that an invalid token is not cached."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+    loader = AsyncMock(return_value=None)
+
+    assert await cache.get_or_load(token_id=7, expires=None, loader=loader) is None
+    assert await cache.get_or_load(token_id=7, expires=None, loader=loader) is None
+    assert loader.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_skips_cache_when_invalidated_while_loading():
+    """Test that a token is not cached if the cache has been invalidated while it was loading."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+
+    async def _load():
+        cache.invalidate()  # role updated while the user info was loading
+        return 1, "my-key", _user_info()
+
+    await cache.get_or_load(token_id=7, expires=None, loader=_load)
+
+    assert cache.entries == {}
+
+
+@pytest.mark.asyncio
+async def test_ttl_zero_disables_cache():
+    """Test that a TTL of 0 disables the cache."""
+    cache = AuthCache(ttl=0, local_ttl=5, max_size=10)
+    loader = AsyncMock(return_value=(1, "my-key", _user_info()))
+
+    await cache.get_or_load(token_id=7, expires=None, loader=loader)
+    await cache.get_or_load(token_id=7, expires=None, loader=loader)
+
+    assert loader.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_entry_does_not_outlive_token():
+    """Test that a cache entry expires with its token."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+    cache.redis_client = MagicMock(set=AsyncMock())
+
+    await cache.set(token_id=7, user_id=1, key_name="my-key", user_info=_user_info(), expires=int(time.time()) + 30)
+    await cache.set(token_id=8, user_id=1, key_name="my-key", user_info=_user_info(), expires=int(time.time()) - 1)
+
+    assert 29 <= cache.redis_client.set.await_args.kwargs["ex"] <= 30
+    cache.redis_client.set.assert_awaited_once()
+    assert list(cache.entries) == [7]
+
+
+@pytest.mark.asyncio
+async def test_local_cache_is_bounded():
+    """Test that the local cache keeps at most its maximum number of entries."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=2)
+
+    for token_id in range(3):
+        await cache.set(token_id=token_id, user_id=1, key_name="my-key", user_info=_user_info())
+    await cache.get(token_id=1)
+    await cache.set(token_id=3, user_id=1, key_name="my-key", user_info=_user_info())
+
+    assert list(cache.entries) == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_get_reads_redis_entry_of_current_version():
+    """Test that get reads the Redis entry of the current cache version."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+    cache.version = 4
+    value = json.dumps({"user_id": 1, "key_name": "my-key", "user_info": _user_info().model_dump(mode="json")})
+    pipeline = MagicMock()
+    pipeline.get.return_value = pipeline
+    pipeline.ttl.return_value = pipeline
+    pipeline.execute = AsyncMock(return_value=[value, 42])
+    cache.redis_client = MagicMock(pipeline=MagicMock(return_value=pipeline))
+
+    cached = await cache.get(token_id=7)
+
+    assert cached == (1, "my-key", _user_info())
+    pipeline.get.assert_called_once_with(f"{PREFIX__REDIS_AUTH_CACHE}:4:7")
+    assert 7 in cache.entries
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_loader():
+    """Test that the token is loaded if Redis is unavailable."""
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+    pipeline = MagicMock()
+    pipeline.get.return_value = pipeline
+    pipeline.ttl.return_value = pipeline
+    pipeline.execute = AsyncMock(side_effect=ConnectionError("redis down"))
+    cache.redis_client = MagicMock(pipeline=MagicMock(return_value=pipeline), set=AsyncMock(side_effect=ConnectionError("redis down")))
+    loader = AsyncMock(return_value=(1, "my-key", _user_info()))
+
+    assert await cache.get_or_load(token_id=7, expires=None, loader=loader) == (1, "my-key", _user_info())
+
+
+def test_budget_updates_can_skip_invalidation():
+    """Test that a budget update does not invalidate the cache when requested."""
+    engine = create_engine("sqlite://")
+    UserTable.__table__.create(bind=engine)
+    sync_session_class = sessionmaker()
+    cache = AuthCache(ttl=60, local_ttl=5, max_size=10)
+    cache.watch(session_factory=async_sessionmaker(sync_session_class=sync_session_class))
+
+    with sync_session_class(bind=engine) as session:
+        cache.entries[7] = (float("inf"), 1, "my-key", _user_info())
+        session.execute(update(UserTable).where(UserTable.id == 1).values(budget=5.0).execution_options(cache_invalidation=False))
+        session.commit()
+        assert 7 in cache.entries
+
+        session.execute(update(UserTable).where(UserTable.id == 1).values(budget=0.0))
+        session.commit()
+        assert cache.entries == {}
@@ -0,0 +1,183 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from redis.exceptions import ResponseError
+
+from api.helpers._budgetmanager import CONSUME_BUDGET_SCRIPT, RELEASE_LOCK_SCRIPT, BudgetManager
+from api.utils.variables import PREFIX__REDIS_BUDGET, REDIS__BUDGET_DIRTY_USERS, REDIS__BUDGET_RECONCILIATION_LOCK
+
+
+def _create_budget_manager(session_factory: MagicMock) -> tuple[BudgetManager, AsyncMock, AsyncMock]:
+    with patch("api.helpers._budgetmanager.Redis") as MockRedis:
+        mock_redis = AsyncMock()
+        mock_script = AsyncMock()
+        mock_redis.register_script = MagicMock(side_effect=lambda script: mock_script if script == CONSUME_BUDGET_SCRIPT else AsyncMock())
+        MockRedis.return_value = mock_redis
+
+        budget_manager = BudgetManager(redis_pool=MagicMock(), session_factory=session_factory, reconciliation_interval=10)
+
+    return budget_manager, mock_redis, mock_script
+
+
+def test_budget_manager_registers_scripts(session_factory):
+    """Test that the budget manager registers the consume and release lock scripts."""
+    budget_manager, mock_redis, mock_script = _create_budget_manager(session_factory)
+
+    assert [call.args[0] for call in mock_redis.register_script.call_args_list] == [CONSUME_BUDGET_SCRIPT, RELEASE_LOCK_SCRIPT]
+    assert budget_manager.script is mock_script
+
+
+@pytest.mark.asyncio
+async def test_get_returns_counter(session_factory):
+    """Test that get returns the budget counter of Redis, stored in millionths."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.get.return_value = b"1250000"
+
+    assert await budget_manager.get(user_id=1, budget=5.0) == 1.25
+    mock_redis.get.assert_awaited_once_with(f"{PREFIX__REDIS_BUDGET}:1")
+
+
+@pytest.mark.asyncio
+async def test_get_falls_back_to_database_budget(session_factory):
+    """Test that get returns the database budget if the counter is missing or Redis is unavailable."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+
+    mock_redis.get.return_value = None
+    assert await budget_manager.get(user_id=1, budget=5.0) == 5.0
+
+    mock_redis.get.side_effect = ConnectionError("redis down")
+    assert await budget_manager.get(user_id=1, budget=5.0) == 5.0
+
+
+@pytest.mark.asyncio
+async def test_unlimited_budget_is_not_stored(session_factory):
+    """Test that an unlimited budget is neither read nor consumed in Redis."""
+    budget_manager, mock_redis, mock_script = _create_budget_manager(session_factory)
+
+    assert await budget_manager.get(user_id=1, budget=None) is None
+    assert await budget_manager.consume(user_id=1, cost=1.0, budget=None) is None
+
+    mock_redis.get.assert_not_called()
+    mock_script.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_consume_decreases_counter_in_millionths(session_factory):
+    """Test that consume decreases the budget counter by the cost in millionths."""
+    budget_manager, _, mock_script = _create_budget_manager(session_factory)
+    mock_script.return_value = 3750000
+
+    assert await budget_manager.consume(user_id=1, cost=1.25, budget=5.0) == 3.75
+    mock_script.assert_awaited_once_with(keys=[f"{PREFIX__REDIS_BUDGET}:1", REDIS__BUDGET_DIRTY_USERS], args=[1250000, 5000000, 1])
+
+
+@pytest.mark.asyncio
+async def test_reconcile_writes_journaled_budgets(session_factory, postgres_session):
+    """Test that reconcile writes the budgets of the journaled users in the database and clears the journal."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.set.return_value = True
+    mock_redis.exists.return_value = 0
+    mock_redis.smembers.return_value = {b"1", b"2"}
+    mock_redis.mget.side_effect = lambda keys: [b"500000" if key.endswith(":1") else None for key in keys]
+
+    await budget_manager.reconcile()
+
+    mock_redis.rename.assert_awaited_once_with(REDIS__BUDGET_DIRTY_USERS, BudgetManager.FLUSHING_USERS)
+    postgres_session.execute.assert_awaited_once()
+    assert postgres_session.execute.await_args.args[1] == [{"user_id": 1, "user_budget": 0.5}]
+    postgres_session.commit.assert_awaited_once()
+    mock_redis.delete.assert_awaited_once_with(BudgetManager.FLUSHING_USERS)
+    token = mock_redis.set.await_args.args[1]
+    budget_manager.release_lock_script.assert_awaited_once_with(keys=[REDIS__BUDGET_RECONCILIATION_LOCK], args=[token])
+
+
+@pytest.mark.asyncio
+async def test_reconcile_replays_interrupted_reconciliation(session_factory, postgres_session):
+    """Test that reconcile writes again the journal of an interrupted reconciliation."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.set.return_value = True
+    mock_redis.exists.return_value = 1
+    mock_redis.smembers.return_value = {b"1"}
+    mock_redis.mget.return_value = [b"0"]
+
+    await budget_manager.reconcile()
+
+    mock_redis.rename.assert_not_called()
+    assert postgres_session.execute.await_args.args[1] == [{"user_id": 1, "user_budget": 0.0}]
+
+
+@pytest.mark.asyncio
+async def test_reconcile_skips_without_journaled_users(session_factory, postgres_session):
+    """Test that reconcile does not write in the database without journaled users."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.set.return_value = True
+    mock_redis.exists.return_value = 0
+    mock_redis.rename.side_effect = ResponseError("no such key")
+
+    await budget_manager.reconcile()
+
+    postgres_session.execute.assert_not_called()
+    budget_manager.release_lock_script.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_keeps_journal_on_database_error(session_factory, postgres_session):
+    """Test that reconcile keeps the journal if the budgets cannot be written in the database."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.set.return_value = True
+    mock_redis.exists.return_value = 0
+    mock_redis.smembers.return_value = {b"1"}
+    mock_redis.mget.return_value = [b"0"]
+    postgres_session.execute.side_effect = ConnectionError("database down")
+
+    with pytest.raises(ConnectionError):
+        await budget_manager.reconcile()
+
+    mock_redis.delete.assert_not_called()
+    budget_manager.release_lock_script.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_runs_in_a_single_worker(session_factory):
+    """Test that reconcile is skipped while another worker holds the reconciliation lock."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.set.return_value = None
+
+    await budget_manager.reconcile()
+
+    mock_redis.rename.assert_not_called()
+    mock_redis.delete.assert_not_called()
+    budget_manager.release_lock_script.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_locks_with_a_token_per_reconciliation(session_factory):
+    """Test that each reconciliation takes the lock with its own token, so it cannot release the lock of another worker."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    mock_redis.set.return_value = True
+    mock_redis.exists.return_value = 0
+    mock_redis.rename.side_effect = ResponseError("no such key")
+
+    await budget_manager.reconcile()
+    await budget_manager.reconcile()
+
+    tokens = [call.args[1] for call in mock_redis.set.await_args_list]
+    assert tokens[0] != tokens[1]
+    assert [call.kwargs["args"] for call in budget_manager.release_lock_script.await_args_list] == [[tokens[0]], [tokens[1]]]
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_counter_and_journal_entries(session_factory):
+    """Test that delete removes the budget counter of a deleted user and its journal entries."""
+    budget_manager, mock_redis, _ = _create_budget_manager(session_factory)
+    pipeline = MagicMock()
+    pipeline.delete.return_value = pipeline
+    pipeline.srem.return_value = pipeline
+    pipeline.execute = AsyncMock()
+    mock_redis.pipeline = MagicMock(return_value=pipeline)
+
+    await budget_manager.delete(user_id=1)
+
+    pipeline.delete.assert_called_once_with(f"{PREFIX__REDIS_BUDGET}:1")
+    assert [call.args for call in pipeline.srem.call_args_list] == [(REDIS__BUDGET_DIRTY_USERS, 1), (BudgetManager.FLUSHING_USERS, 1)]
+    pipeline.execute.assert_awaited_once()
@@ -0,0 +1,178 @@
+import io
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import UploadFile
+import numpy as np
+import pytest
+
+import api.helpers._documentcache as documentcache_module
+from api.helpers._documentcache import DocumentCache
+from api.schemas.core.documents import FileType
+
+
+def _create_cache(max_size: int = 1024 * 1024, local_ttl: int = 0, local_max_size: int = 10) -> tuple[DocumentCache, dict]:
+    store = {}
+
+    async def set(key, value, ex=None):
+        store[key] = value
+
+    async def get(key):
+        return store.get(key)
+
+    mget = AsyncMock(side_effect=lambda keys: [store.get(key) for key in keys])
+
+    pipeline = MagicMock()
+    pipeline.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+    pipeline.execute = AsyncMock()
+
+    cache = DocumentCache(redis_pool=MagicMock(), ttl=60, max_size=max_size, local_ttl=local_ttl, local_max_size=local_max_size)
+    cache.redis_client = MagicMock(set=set, get=get, mget=mget, pipeline=MagicMock(return_value=pipeline))
+
+    return cache, store
+
+
+@pytest.mark.asyncio
+async def test_file_digest_depends_on_content_and_type():
+    """Test that the digest of a file depends on its content and its content type."""
+    cache, _ = _create_cache()
+    file = UploadFile(file=io.BytesIO(b"hello world"), filename="document.txt")
+
+    digest = await cache.get_file_digest(file=file, file_type=FileType.TXT)
+
+    assert digest == await cache.get_file_digest(file=UploadFile(file=io.BytesIO(b"hello world")), file_type=FileType.TXT)
+    assert digest != await cache.get_file_digest(file=UploadFile(file=io.BytesIO(b"hello world")), file_type=FileType.MD)
+    assert digest != await cache.get_file_digest(file=UploadFile(file=io.BytesIO(b"hello world!")), file_type=FileType.TXT)
+    assert file.file.tell() == 0
+
+
+@pytest.mark.asyncio
+async def test_content_is_cached_compressed():
+    """Test that the parsed content is cached compressed and read back."""
+    cache, store = _create_cache()
+    content = "# Title\n\n" + "lorem ipsum " * 1000
+
+    await cache.set_content(digest="abc", content=content)
+
+    assert await cache.get_content(digest="abc") == content
+    assert await cache.get_content(digest="def") is None
+    assert len(next(iter(store.values()))) < len(content)
+
+
+@pytest.mark.asyncio
+async def test_large_content_is_not_cached():
+    """Test that a content larger than the maximum size is not cached."""
+    cache, store = _create_cache(max_size=16)
+
+    await cache.set_content(digest="abc", content="".join(chr(i) for i in range(1000)))
+
+    assert store == {}
+    assert await cache.get_content(digest="abc") is None
+
+
+@pytest.mark.asyncio
+async def test_embeddings_are_cached_by_model_and_text():
+    """Test that the embeddings are cached by model and text."""
+    cache, _ = _create_cache()
+    embeddings = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], dtype=np.float32)
+
+    await cache.set_embeddings(model="model-a", texts=["first", "second"], embeddings=embeddings)
+    cached = await cache.get_embeddings(model="model-a", texts=["second", "third", "first"])
+
+    np.testing.assert_array_equal(cached[0], embeddings[1])
+    assert cached[1] is None
+    np.testing.assert_array_equal(cached[2], embeddings[0])
+    assert await cache.get_embeddings(model="model-b", texts=["first"]) == [None]
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_cache_misses():
+    """Test that a Redis error is handled as a cache miss."""
+    cache, _ = _create_cache()
+    pipeline = MagicMock(execute=AsyncMock(side_effect=ConnectionError("redis down")))
+    cache.redis_client = MagicMock(
+        get=AsyncMock(side_effect=ConnectionError("redis down")),
+        set=AsyncMock(side_effect=ConnectionError("redis down")),
+        mget=AsyncMock(side_effect=ConnectionError("redis down")),
+        pipeline=MagicMock(return_value=pipeline),
+    )
+
+    await cache.set_content(digest="abc", content="content")
+    await cache.set_embeddings(model="model", texts=["text"], embeddings=np.zeros(shape=(1, 3), dtype=np.float32))
+
+    assert await cache.get_content(digest="abc") is None
+    assert await cache.get_embeddings(model="model", texts=["a", "b"]) == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_setup_bounds_memory_of_cache_instance():
+    """Test that setup bounds the memory of the cache Redis instance with an LRU eviction."""
+    cache = DocumentCache(redis_pool=MagicMock(), ttl=60, max_size=1024, max_memory=512)
+    cache.redis_client = MagicMock(config_set=AsyncMock())
+
+    await cache.setup()
+
+    assert [call.args for call in cache.redis_client.config_set.await_args_list] == [("maxmemory", "512mb"), ("maxmemory-policy", "allkeys-lru")]
+
+
+@pytest.mark.asyncio
+async def test_setup_does_not_fail_without_config_command():
+    """Test that setup does not fail if the CONFIG command is not allowed, nor changes the instance without maximum memory."""
+    cache = DocumentCache(redis_pool=MagicMock(), ttl=60, max_size=1024, max_memory=512)
+    cache.redis_client = MagicMock(config_set=AsyncMock(side_effect=ConnectionError("unknown command 'CONFIG'")))
+
+    await cache.setup()
+
+    cache = DocumentCache(redis_pool=MagicMock(), ttl=60, max_size=1024)
+    cache.redis_client = MagicMock(config_set=AsyncMock())
+
+    await cache.setup()
+
+    cache.redis_client.config_set.assert_not_called()
+
+
+def test_normalize_collapses_whitespaces_and_unicode_forms():
+    """Test that the texts differing only by their whitespaces or their unicode form are normalized the same way."""
+    assert DocumentCache.normalize("  what is\tthe\n\nbudget ? ") == "what is the budget ?"
+    assert DocumentCache.normalize("cafe\u0301") == DocumentCache.normalize("caf\u00e9")
+
+
+@pytest.mark.asyncio
+async def test_local_embeddings_do_not_read_redis():
+    """Test that the embeddings cached locally are returned without reading Redis, and only when requested as local."""
+    cache, _ = _create_cache(local_ttl=30)
+    await cache.set_embeddings(model="model", texts=["query"], embeddings=np.ones(shape=(1, 3), dtype=np.float32), local=True)
+    await cache.set_embeddings(model="model", texts=["chunk"], embeddings=np.ones(shape=(1, 3), dtype=np.float32))
+
+    [embedding] = await cache.get_embeddings(model="model", texts=["query"], local=True)
+
+    np.testing.assert_array_equal(embedding, np.ones(3, dtype=np.float32))
+    cache.redis_client.mget.assert_not_called()
+    assert len(cache.local_entries) == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_embeddings_are_cached_locally():
+    """Test that the embeddings read from Redis as local are cached locally."""
+    cache, _ = _create_cache(local_ttl=30)
+    await cache.set_embeddings(model="model", texts=["query"], embeddings=np.ones(shape=(1, 3), dtype=np.float32), local=True)
+    cache.local_entries.clear()
+
+    await cache.get_embeddings(model="model", texts=["query"], local=True)
+    await cache.get_embeddings(model="model", texts=["query"], local=True)
+
+    cache.redis_client.mget.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_local_embeddings_are_bounded_and_expire():
+    """Test that the local embeddings keep the most recent entries and expire after the local TTL."""
+    cache, _ = _create_cache(local_ttl=30, local_max_size=2)
+    for text in ["first", "second", "third"]:
+        await cache.set_embeddings(model="model", texts=[text], embeddings=np.ones(shape=(1, 3), dtype=np.float32), local=True)
+
+    assert len(cache.local_entries) == 2
+    assert cache._get_embedding_key(model="model", text="first") not in cache.local_entries
+
+    with patch.object(documentcache_module.time, "monotonic", return_value=documentcache_module.time.monotonic() + 60):
+        await cache.get_embeddings(model="model", texts=["third"], local=True)
+    cache.redis_client.mget.assert_awaited_once()
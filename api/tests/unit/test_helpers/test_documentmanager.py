@@ -1,8 +1,11 @@
+import asyncio
 from contextvars import ContextVar
 from io import BytesIO
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 from fastapi import UploadFile
+import numpy as np
+import orjson
 import pytest
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,9 +15,13 @@ from api.helpers._documentmanager import DocumentManager
 from api.schemas.chunks import Chunk
 from api.schemas.collections import CollectionVisibility
 from api.schemas.core.context import RequestContext
+from api.schemas.core.models import Metric
+from api.schemas.documents import PresetSeparators
 from api.schemas.me.info import UserInfo
-from api.schemas.search import SearchMethod
+from api.schemas.search import Search, SearchMethod
 from api.schemas.usage import Usage
+from api.utils.context import global_context
+from api.utils.embeddings import encode_embedding
 from api.utils.exceptions import (
     ChunkingFailedException,
     CollectionNotFoundException,
@@ -50,7 +57,7 @@ async def test_create_document_collection_no_longer_exists():
     mock_file = create_upload_file("#Test document content", "sample.md", "text/markdown")
     mock_redis_client = AsyncMock()
     mock_model_registry = AsyncMock()
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_request_context_obj = RequestContext(
         id="123",
@@ -79,7 +86,7 @@ async def test_create_document_collection_no_longer_exists():
             preset_separators="markdown",
             chunk_min_size=50,
             metadata=mock_metadata,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             postgres_session=mock_session,
             redis_client=mock_redis_client,
@@ -271,7 +278,7 @@ async def test_create_collection_success():
 @pytest.mark.asyncio
 async def test_delete_collection_not_found():
     mock_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -287,21 +294,21 @@ async def test_delete_collection_not_found():
     with pytest.raises(CollectionNotFoundException):
         await document_manager.delete_collection(
             postgres_session=mock_session,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             user_id=1,
             collection_id=99,
         )
 
-    mock_elasticsearch_vector_store.delete_collection.assert_not_called()
+    mock_vector_store.delete_collection.assert_not_called()
     mock_session.commit.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_delete_collection_success():
     mock_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store.delete_collection = AsyncMock()
+    mock_vector_store = AsyncMock()
+    mock_vector_store.delete_collection = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -317,7 +324,7 @@ async def test_delete_collection_success():
 
     await document_manager.delete_collection(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         user_id=1,
         collection_id=123,
@@ -325,12 +332,12 @@ async def test_delete_collection_success():
 
     assert mock_session.execute.await_count == 2
     mock_session.commit.assert_awaited_once()
-    mock_elasticsearch_vector_store.delete_collection.assert_awaited_once_with(client=mock_elasticsearch_client, collection_id=123)
+    mock_vector_store.delete_collection.assert_awaited_once_with(client=mock_elasticsearch_client, collection_id=123)
 
 
 @pytest.mark.asyncio
 async def test_create_document_success(monkeypatch):
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_parser.parse = AsyncMock(return_value="Test content for chunking")
@@ -371,7 +378,7 @@ async def test_create_document_success(monkeypatch):
         redis_client=mock_redis,
         model_registry=mock_model_registry,
         request_context=mock_request_context,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         collection_id=123,
         file=mock_file,
@@ -395,8 +402,8 @@ async def test_create_document_success(monkeypatch):
 @pytest.mark.asyncio
 async def test_get_documents_populates_chunk_count():
     mock_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store.get_chunk_count = AsyncMock(side_effect=[3, 7])
+    mock_vector_store = AsyncMock()
+    mock_vector_store.get_chunk_counts = AsyncMock(return_value={10: 3, 11: 7})
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -415,7 +422,7 @@ async def test_get_documents_populates_chunk_count():
     user = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[], expires=None, created=0, updated=0)
     documents = await document_manager.get_documents(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         user_id=user.id,
         collection_id=5,
@@ -424,14 +431,15 @@ async def test_get_documents_populates_chunk_count():
     assert len(documents) == 2
     assert documents[0].chunks == 3
     assert documents[1].chunks == 7
-    assert mock_elasticsearch_vector_store.get_chunk_count.await_count == 2
+    mock_vector_store.get_chunk_counts.assert_awaited_once_with(client=mock_elasticsearch_client, document_ids=[10, 11])
 
 
 @pytest.mark.asyncio
-async def test_search_chunks_with_empty_collection_ids_uses_user_collections():
+async def test_search_chunks_with_empty_collection_ids_searches_by_owner_and_visibility():
+    """Test that a search without collections is filtered by the owner and visibility of the chunks, and its results are checked."""
     mock_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store.search = AsyncMock()
+    mock_vector_store = AsyncMock()
+    mock_vector_store.search = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     document_manager = DocumentManager(vector_store_model="test-model", parser_manager=mock_parser)
@@ -441,7 +449,7 @@ async def test_search_chunks_with_empty_collection_ids_uses_user_collections():
     mock_model_registry = AsyncMock()
     mock_provider = AsyncMock()
     mock_response = MagicMock()
-    mock_response.json.return_value = {"data": [{"embedding": [0.1, 0.2, 0.3]}]}
+    mock_response.content = b'{"data": [{"embedding": [0.1, 0.2, 0.3]}]}'
     mock_provider.forward_request = AsyncMock(return_value=mock_response)
     mock_model_registry.get_model_provider = AsyncMock(return_value=mock_provider)
 
@@ -458,6 +466,7 @@ async def test_search_chunks_with_empty_collection_ids_uses_user_collections():
     mock_request_context = ContextVar("test_request_context", default=mock_request_context_obj)
     mock_request_context.set(mock_request_context_obj)
 
+    # collection 33 has been made private after the indexation of its chunks
     mock_collection_result = MagicMock()
     row1 = MagicMock()
     row1.id = 11
@@ -466,12 +475,15 @@ async def test_search_chunks_with_empty_collection_ids_uses_user_collections():
     mock_collection_result.all.return_value = [row1, row2]
     mock_session.execute.return_value = mock_collection_result
 
-    mock_search_results = [MagicMock(id=1, content="result 1", score=0.9)]
-    mock_elasticsearch_vector_store.search = AsyncMock(return_value=mock_search_results)
+    mock_search_results = [
+        Search(method=SearchMethod.SEMANTIC, score=0.9, chunk=Chunk(id=1, collection_id=11, document_id=1, content="result 1")),
+        Search(method=SearchMethod.SEMANTIC, score=0.8, chunk=Chunk(id=1, collection_id=33, document_id=2, content="result 2")),
+    ]
+    mock_vector_store.search = AsyncMock(return_value=mock_search_results)
 
     result = await document_manager.search_chunks(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         redis_client=mock_redis,
         model_registry=mock_model_registry,
@@ -487,12 +499,15 @@ async def test_search_chunks_with_empty_collection_ids_uses_user_collections():
         score_threshold=0.0,
     )
 
-    assert len(result) == 1
+    assert [search.chunk.collection_id for search in result] == [11]
     mock_model_registry.get_model_provider.assert_awaited_once()
     mock_provider.forward_request.assert_awaited_once()
-    mock_elasticsearch_vector_store.search.assert_awaited_once()
-    call_kwargs = mock_elasticsearch_vector_store.search.call_args.kwargs
-    assert call_kwargs["collection_ids"] == [11, 22]
+    mock_vector_store.search.assert_awaited_once()
+    call_kwargs = mock_vector_store.search.call_args.kwargs
+    assert call_kwargs["collection_ids"] == []
+    assert call_kwargs["user_id"] == 1
+    # only the collections of the results are checked
+    mock_session.execute.assert_awaited_once()
 
 
 @pytest.mark.asyncio
@@ -507,6 +522,7 @@ async def test_update_collection_success():
     select_result = MagicMock()
     mock_collection = MagicMock()
     mock_collection.id = 123
+    mock_collection.user_id = 1
     mock_collection.name = "Old Name"
     mock_collection.visibility = CollectionVisibility.PRIVATE
     mock_collection.description = "Old Description"
@@ -517,9 +533,13 @@ async def test_update_collection_success():
     mock_session.execute.side_effect = [select_result, update_result]
 
     document_manager = DocumentManager(vector_store_model="test-model", parser_manager=mock_parser)
+    mock_vector_store = AsyncMock()
+    mock_elasticsearch_client = AsyncMock()
 
     await document_manager.update_collection(
         postgres_session=mock_session,
+        vector_store=mock_vector_store,
+        elasticsearch_client=mock_elasticsearch_client,
         user_id=1,
         collection_id=123,
         name="New Name",
@@ -529,6 +549,38 @@ async def test_update_collection_success():
 
     assert mock_session.execute.await_count == 2
     mock_session.commit.assert_awaited_once()
+    mock_vector_store.update_collection.assert_awaited_once_with(
+        client=mock_elasticsearch_client, collection_id=123, user_id=1, visibility=CollectionVisibility.PUBLIC
+    )
+
+
+@pytest.mark.asyncio
+async def test_update_collection_compares_visibility_before_update(postgres_session):
+    """Test that the chunks are updated when the loaded collection is synchronized by the update, as done by the session."""
+    collection = MagicMock(id=123, user_id=1, visibility=CollectionVisibility.PRIVATE, description=None)
+    collection.name = "Name"
+    select_result = MagicMock()
+    select_result.scalar_one.return_value = collection
+
+    def execute(statement):
+        if statement.is_update:  # the session synchronizes the loaded collection with the updated values
+            collection.visibility = statement.compile().params["visibility"]
+            collection.user_id = None  # expired by the commit
+        return select_result
+
+    postgres_session.execute.side_effect = execute
+    vector_store = AsyncMock()
+
+    await DocumentManager.update_collection(
+        postgres_session=postgres_session,
+        vector_store=vector_store,
+        elasticsearch_client=None,
+        user_id=1,
+        collection_id=123,
+        visibility=CollectionVisibility.PUBLIC,
+    )
+
+    vector_store.update_collection.assert_awaited_once_with(client=None, collection_id=123, user_id=1, visibility=CollectionVisibility.PUBLIC)
 
 
 @pytest.mark.asyncio
@@ -547,7 +599,14 @@ async def test_update_collection_not_found():
     document_manager = DocumentManager(vector_store_model="test-model", parser_manager=mock_parser)
 
     with pytest.raises(CollectionNotFoundException):
-        await document_manager.update_collection(postgres_session=mock_session, user_id=1, collection_id=999, name="New Name")
+        await document_manager.update_collection(
+            postgres_session=mock_session,
+            vector_store=AsyncMock(),
+            elasticsearch_client=AsyncMock(),
+            user_id=1,
+            collection_id=999,
+            name="New Name",
+        )
 
     mock_session.commit.assert_not_called()
 
@@ -555,8 +614,8 @@ async def test_update_collection_not_found():
 @pytest.mark.asyncio
 async def test_delete_document_success():
     """Test successful document deletion from both Postgres and Elasticsearch."""
-    mock_elasticsearch_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store.delete_document = AsyncMock()
+    mock_vector_store = AsyncMock()
+    mock_vector_store.delete_document = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -578,7 +637,7 @@ async def test_delete_document_success():
 
     await document_manager.delete_document(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         user_id=1,
         document_id=456,
@@ -586,13 +645,13 @@ async def test_delete_document_success():
 
     assert mock_session.execute.await_count == 2
     mock_session.commit.assert_awaited_once()
-    mock_elasticsearch_vector_store.delete_document.assert_awaited_once_with(client=mock_elasticsearch_client, document_id=456)
+    mock_vector_store.delete_document.assert_awaited_once_with(client=mock_elasticsearch_client, document_id=456)
 
 
 @pytest.mark.asyncio
 async def test_delete_document_not_found():
     """Test deleting non-existent document raises DocumentNotFoundException."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -609,20 +668,20 @@ async def test_delete_document_not_found():
     with pytest.raises(DocumentNotFoundException):
         await document_manager.delete_document(
             postgres_session=mock_session,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             user_id=1,
             document_id=999,
         )
 
-    mock_elasticsearch_vector_store.delete_document.assert_not_called()
+    mock_vector_store.delete_document.assert_not_called()
     mock_session.commit.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_get_chunks_success():
     """Test retrieving chunks for a document."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -641,13 +700,13 @@ async def test_get_chunks_success():
         Chunk(id=1, collection_id=123, document_id=456, metadata={"my_tags": "tag1"}, content="chunk 1"),
         Chunk(id=2, collection_id=123, document_id=456, metadata={"my_tags": "tag2"}, content="chunk 2"),
     ]
-    mock_elasticsearch_vector_store.get_chunks = AsyncMock(return_value=mock_chunks)
+    mock_vector_store.get_chunks = AsyncMock(return_value=mock_chunks)
 
     document_manager = DocumentManager(vector_store_model="test-model", parser_manager=mock_parser)
 
     chunks = await document_manager.get_document_chunks(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         user_id=1,
         document_id=456,
@@ -658,15 +717,13 @@ async def test_get_chunks_success():
     assert len(chunks) == 2
     assert chunks[0].id == 1
     assert chunks[1].id == 2
-    mock_elasticsearch_vector_store.get_chunks.assert_awaited_once_with(
-        client=mock_elasticsearch_client, document_id=456, offset=0, limit=10, chunk_id=None
-    )
+    mock_vector_store.get_chunks.assert_awaited_once_with(client=mock_elasticsearch_client, document_id=456, offset=0, limit=10, chunk_id=None)
 
 
 @pytest.mark.asyncio
 async def test_get_chunks_document_not_found():
     """Test getting chunks for non-existent document raises DocumentNotFoundException."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -682,19 +739,19 @@ async def test_get_chunks_document_not_found():
     with pytest.raises(DocumentNotFoundException):
         await document_manager.get_document_chunks(
             postgres_session=mock_session,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             user_id=1,
             document_id=999,
         )
 
-    mock_elasticsearch_vector_store.get_chunks.assert_not_called()
+    mock_vector_store.get_chunks.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_search_chunks_with_similarity():
     """Test semantic search with vector embeddings."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -713,13 +770,13 @@ async def test_search_chunks_with_similarity():
     # Mock model provider and embeddings
     mock_provider = AsyncMock()
     mock_response = MagicMock()
-    mock_response.json.return_value = {"data": [{"embedding": [0.1, 0.2, 0.3]}]}
+    mock_response.content = orjson.dumps({"data": [{"index": 0, "embedding": encode_embedding(embedding=[0.1, 0.2, 0.3])}]})
     mock_provider.forward_request = AsyncMock(return_value=mock_response)
     mock_model_registry.get_model_provider = AsyncMock(return_value=mock_provider)
 
     # Mock search results
     mock_search_results = [MagicMock(id=1, content="result 1", score=0.95), MagicMock(id=2, content="result 2", score=0.85)]
-    mock_elasticsearch_vector_store.search = AsyncMock(return_value=mock_search_results)
+    mock_vector_store.search = AsyncMock(return_value=mock_search_results)
 
     mock_request_context_obj = RequestContext(
         id="123",
@@ -735,7 +792,7 @@ async def test_search_chunks_with_similarity():
 
     result = await document_manager.search_chunks(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         redis_client=mock_redis,
         model_registry=mock_model_registry,
@@ -754,13 +811,15 @@ async def test_search_chunks_with_similarity():
     assert len(result) == 2
     mock_model_registry.get_model_provider.assert_awaited_once()
     mock_provider.forward_request.assert_awaited_once()
-    mock_elasticsearch_vector_store.search.assert_awaited_once()
+    mock_vector_store.search.assert_awaited_once()
+    assert mock_provider.forward_request.call_args.kwargs["request_content"].body["encoding_format"] == "base64"
+    assert mock_vector_store.search.call_args.kwargs["query_vector"] == pytest.approx([0.1, 0.2, 0.3])
 
 
 @pytest.mark.asyncio
 async def test_search_chunks_with_lexical():
     """Test lexical search (BM25) without embedding creation."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -782,7 +841,7 @@ async def test_search_chunks_with_lexical():
 
     # Mock search results
     mock_search_results = [MagicMock(id=1, content="result 1", score=5.2), MagicMock(id=2, content="result 2", score=4.1)]
-    mock_elasticsearch_vector_store.search = AsyncMock(return_value=mock_search_results)
+    mock_vector_store.search = AsyncMock(return_value=mock_search_results)
 
     mock_request_context_obj = RequestContext(
         id="123",
@@ -798,7 +857,7 @@ async def test_search_chunks_with_lexical():
 
     result = await document_manager.search_chunks(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         redis_client=mock_redis,
         model_registry=mock_model_registry,
@@ -819,15 +878,15 @@ async def test_search_chunks_with_lexical():
     # Verify no embedding creation for lexical search - provider.forward_request should not be called
     mock_provider.forward_request.assert_not_called()
     # Verify search was called with None for query_vector
-    call_kwargs = mock_elasticsearch_vector_store.search.call_args.kwargs
+    call_kwargs = mock_vector_store.search.call_args.kwargs
     assert call_kwargs["query_vector"] is None
-    mock_elasticsearch_vector_store.search.assert_awaited_once()
+    mock_vector_store.search.assert_awaited_once()
 
 
 @pytest.mark.asyncio
 async def test_search_chunks_collection_not_found():
     """Test searching in non-existent collection raises CollectionNotFoundException."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -856,7 +915,7 @@ async def test_search_chunks_collection_not_found():
     with pytest.raises(CollectionNotFoundException):
         await document_manager.search_chunks(
             postgres_session=mock_session,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             redis_client=mock_redis,
             model_registry=mock_model_registry,
@@ -872,7 +931,7 @@ async def test_search_chunks_collection_not_found():
             score_threshold=0.0,
         )
 
-    mock_elasticsearch_vector_store.search.assert_not_called()
+    mock_vector_store.search.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -900,7 +959,7 @@ async def test_create_collection_master_user_forbidden():
 @pytest.mark.asyncio
 async def test_create_document_parsing_fails():
     """Test ParsingDocumentFailedException when parser fails."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_parser.parse = AsyncMock(side_effect=Exception("Parse error"))
@@ -937,7 +996,7 @@ async def test_create_document_parsing_fails():
             redis_client=mock_redis,
             model_registry=mock_model_registry,
             request_context=mock_request_context,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             collection_id=123,
             file=mock_file,
@@ -956,7 +1015,7 @@ async def test_create_document_parsing_fails():
 @pytest.mark.asyncio
 async def test_create_document_empty_chunks():
     """Test ChunkingFailedException when no chunks extracted."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_parser.parse = AsyncMock(return_value="Short content")
@@ -996,7 +1055,7 @@ async def test_create_document_empty_chunks():
             redis_client=mock_redis,
             model_registry=mock_model_registry,
             request_context=mock_request_context,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             collection_id=123,
             file=mock_file,
@@ -1017,7 +1076,7 @@ async def test_create_document_empty_chunks():
 @pytest.mark.asyncio
 async def test_create_document_vectorization_fails(monkeypatch):
     """Test cleanup when vectorization fails."""
-    mock_elasticsearch_vector_store = AsyncMock()
+    mock_vector_store = AsyncMock()
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_parser.parse = AsyncMock(return_value="Test content for chunking")
@@ -1070,7 +1129,7 @@ async def test_create_document_vectorization_fails(monkeypatch):
             redis_client=mock_redis,
             model_registry=mock_model_registry,
             request_context=mock_request_context,
-            elasticsearch_vector_store=mock_elasticsearch_vector_store,
+            vector_store=mock_vector_store,
             elasticsearch_client=mock_elasticsearch_client,
             collection_id=123,
             file=mock_file,
@@ -1088,14 +1147,14 @@ async def test_create_document_vectorization_fails(monkeypatch):
     assert "Vectorization failed" in str(exc_info.value.detail)
     # Verify document was attempted to be deleted from Postgres
     assert mock_session.execute.await_count == 4  # collection check, insert, delete check, delete
-    mock_elasticsearch_vector_store.delete_document.assert_awaited_once_with(client=mock_elasticsearch_client, document_id=555)
+    mock_vector_store.delete_document.assert_awaited_once_with(client=mock_elasticsearch_client, document_id=555)
 
 
 @pytest.mark.asyncio
 async def test_get_documents_with_filters():
     """Test filtering documents by document_name and document_id."""
-    mock_elasticsearch_vector_store = AsyncMock()
-    mock_elasticsearch_vector_store.get_chunk_count = AsyncMock(return_value=5)
+    mock_vector_store = AsyncMock()
+    mock_vector_store.get_chunk_counts = AsyncMock(return_value={100: 5})
     mock_elasticsearch_client = AsyncMock()
     mock_parser = AsyncMock()
     mock_session = AsyncMock(spec=AsyncSession)
@@ -1112,7 +1171,7 @@ async def test_get_documents_with_filters():
     # Test filtering by document_name
     documents = await document_manager.get_documents(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         user_id=1,
         collection_id=5,
@@ -1127,7 +1186,7 @@ async def test_get_documents_with_filters():
     mock_session.execute.return_value = mock_result
     documents = await document_manager.get_documents(
         postgres_session=mock_session,
-        elasticsearch_vector_store=mock_elasticsearch_vector_store,
+        vector_store=mock_vector_store,
         elasticsearch_client=mock_elasticsearch_client,
         user_id=1,
         collection_id=5,
@@ -1136,3 +1195,386 @@ async def test_get_documents_with_filters():
 
     assert len(documents) == 1
     assert documents[0].id == 100
+
+
+def _create_chunks(count: int, content: str = "chunk content") -> list[Chunk]:
+    return [Chunk(id=i, collection_id=1, document_id=1, content=content, metadata=None) for i in range(count)]
+
+
+def _create_collection_session(
+    user_id: int = 1, visibility: CollectionVisibility = CollectionVisibility.PRIVATE, indexed_visibility: CollectionVisibility | None = None
+) -> AsyncMock:
+    """Session of a collection whose visibility is `indexed_visibility` once the chunks are indexed, if given."""
+    session = AsyncMock(spec=AsyncSession)
+    session.execute.return_value = MagicMock(
+        one=MagicMock(return_value=(user_id, visibility)), scalar_one=MagicMock(return_value=indexed_visibility or visibility)
+    )
+
+    return session
+
+
+def test_get_batches_respects_size_and_tokens():
+    """Test that embedding batches are limited by number of chunks and tokens."""
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock())
+    document_manager.BATCH_SIZE = 3
+
+    with patch.object(global_context, "tokenizer", None):
+        batches = document_manager._get_batches(chunks=_create_chunks(count=7, content="x" * 40), max_tokens=25)  # 10 tokens per chunk
+        large_batches = document_manager._get_batches(chunks=_create_chunks(count=2, content="x" * 400), max_tokens=25)
+
+    assert [len(batch) for batch in batches] == [2, 2, 2, 1]
+    assert [len(batch) for batch in large_batches] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_embeds_concurrently_within_qos_limit():
+    """Test that batches are embedded concurrently, within the inflight QoS limit of the provider, and all indexed."""
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock())
+    document_manager.BATCH_SIZE = 2
+
+    provider = MagicMock(max_context_length=None, qos_metric=Metric.INFLIGHT, qos_limit=2)
+    inflight, max_inflight = 0, 0
+
+    async def create_embeddings(provider, input_texts, redis_client):
+        nonlocal inflight, max_inflight
+        inflight += 1
+        max_inflight = max(max_inflight, inflight)
+        await asyncio.sleep(0.01)
+        inflight -= 1
+        return np.zeros(shape=(len(input_texts), 3), dtype=np.float32)
+
+    document_manager._create_embeddings = create_embeddings
+    model_registry = AsyncMock()
+    model_registry.get_model_provider.return_value = provider
+    vector_store = AsyncMock()
+    progress = MagicMock()
+
+    await document_manager._upsert_document_chunks(
+        chunks=_create_chunks(count=9),
+        redis_client=AsyncMock(),
+        postgres_session=_create_collection_session(),
+        model_registry=model_registry,
+        request_context=MagicMock(),
+        vector_store=vector_store,
+        elasticsearch_client=AsyncMock(),
+        progress=progress,
+    )
+
+    assert max_inflight == 2
+    indexed_ids = sorted(chunk.id for call in vector_store.upsert.call_args_list for chunk in call.kwargs["chunks"])
+    assert indexed_ids == list(range(9))
+    assert progress.call_args_list[-1].args == (9, 9)
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_batches_are_not_raised_by_context_length():
+    """Test that the embedding batches stay within the batch tokens limit, whatever the context length of the router."""
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(return_value=np.zeros(shape=(1, 3), dtype=np.float32))
+    model_registry = AsyncMock()
+    model_registry.get_model_provider.return_value = MagicMock(max_context_length=131072, qos_metric=None, qos_limit=None)
+
+    with patch.object(document_manager, "_get_batches", wraps=document_manager._get_batches) as get_batches:
+        await document_manager._upsert_document_chunks(
+            chunks=_create_chunks(count=1),
+            redis_client=AsyncMock(),
+            postgres_session=_create_collection_session(),
+            model_registry=model_registry,
+            request_context=MagicMock(),
+            vector_store=AsyncMock(),
+            elasticsearch_client=AsyncMock(),
+        )
+
+    assert get_batches.call_args.kwargs["max_tokens"] == DocumentManager.BATCH_MAX_TOKENS
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_raises_first_embedding_error():
+    """Test that an embedding failure is raised as is and stops the ingestion."""
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(side_effect=ValueError("provider error"))
+    model_registry = AsyncMock()
+    model_registry.get_model_provider.return_value = MagicMock(max_context_length=None, qos_metric=None, qos_limit=None)
+    vector_store = AsyncMock()
+
+    with pytest.raises(ValueError, match="provider error"):
+        await document_manager._upsert_document_chunks(
+            chunks=_create_chunks(count=3),
+            redis_client=AsyncMock(),
+            postgres_session=_create_collection_session(),
+            model_registry=model_registry,
+            request_context=MagicMock(),
+            vector_store=vector_store,
+            elasticsearch_client=AsyncMock(),
+        )
+
+    vector_store.upsert.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_skips_provider_for_cached_embeddings():
+    """Test that chunks with cached embeddings are indexed without requesting the embeddings provider."""
+    document_cache = MagicMock(get_embeddings=AsyncMock(return_value=[np.ones(3, dtype=np.float32)] * 3), set_embeddings=AsyncMock())
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock(), document_cache=document_cache)
+    document_manager._create_embeddings = AsyncMock()
+    model_registry = AsyncMock()
+    vector_store = AsyncMock()
+
+    await document_manager._upsert_document_chunks(
+        chunks=_create_chunks(count=3),
+        redis_client=AsyncMock(),
+        postgres_session=_create_collection_session(),
+        model_registry=model_registry,
+        request_context=MagicMock(),
+        vector_store=vector_store,
+        elasticsearch_client=AsyncMock(),
+    )
+
+    model_registry.get_model_provider.assert_not_called()
+    document_manager._create_embeddings.assert_not_called()
+    indexed_ids = sorted(chunk.id for call in vector_store.upsert.call_args_list for chunk in call.kwargs["chunks"])
+    assert indexed_ids == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_embeds_and_caches_missing_embeddings():
+    """Test that only the chunks without cached embeddings are embedded, and their embeddings are cached."""
+    chunks = [Chunk(id=i, collection_id=1, document_id=1, content=f"chunk {i}", metadata=None) for i in range(3)]
+    cached = [np.ones(3, dtype=np.float32), None, np.ones(3, dtype=np.float32)]
+    document_cache = MagicMock(get_embeddings=AsyncMock(return_value=cached), set_embeddings=AsyncMock())
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock(), document_cache=document_cache)
+    document_manager._create_embeddings = AsyncMock(return_value=np.zeros(shape=(1, 3), dtype=np.float32))
+    model_registry = AsyncMock()
+    model_registry.get_model_provider.return_value = MagicMock(max_context_length=None, qos_metric=None, qos_limit=None)
+    vector_store = AsyncMock()
+    progress = MagicMock()
+
+    await document_manager._upsert_document_chunks(
+        chunks=chunks,
+        redis_client=AsyncMock(),
+        postgres_session=_create_collection_session(),
+        model_registry=model_registry,
+        request_context=MagicMock(),
+        vector_store=vector_store,
+        elasticsearch_client=AsyncMock(),
+        progress=progress,
+    )
+
+    assert document_manager._create_embeddings.await_args.kwargs["input_texts"] == ["chunk 1"]
+    assert document_cache.set_embeddings.await_args.kwargs["texts"] == ["chunk 1"]
+    indexed_ids = sorted(chunk.id for call in vector_store.upsert.call_args_list for chunk in call.kwargs["chunks"])
+    assert indexed_ids == [0, 1, 2]
+    assert progress.call_args_list[-1].args == (3, 3)
+
+
+@pytest.mark.asyncio
+async def test_parse_and_split_uses_cached_content():
+    """Test that a file already parsed is not parsed again."""
+    document_cache = MagicMock(get_file_digest=AsyncMock(return_value="digest"), get_content=AsyncMock(return_value="cached content"))
+    parser_manager = MagicMock(parse=AsyncMock())
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=parser_manager, document_cache=document_cache)
+
+    chunks = await document_manager._parse_and_split(
+        file=MagicMock(),
+        document_name="document.txt",
+        disable_chunking=True,
+        chunk_size=2048,
+        chunk_overlap=0,
+        chunk_min_size=0,
+        is_separator_regex=False,
+        separators=[],
+        preset_separators=PresetSeparators.MARKDOWN,
+    )
+
+    assert chunks == ["cached content"]
+    parser_manager.parse.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_query_embedding_skips_provider_on_cache_hit():
+    """Test that a cached query embedding is returned without resolving a provider."""
+    document_cache = MagicMock(normalize=MagicMock(return_value="test query"), get_embeddings=AsyncMock(return_value=[np.ones(3, dtype=np.float32)]))
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock(), document_cache=document_cache)
+    model_registry = AsyncMock()
+
+    embedding = await document_manager._get_query_embedding(
+        query=" test  query ",
+        postgres_session=AsyncMock(),
+        redis_client=AsyncMock(),
+        model_registry=model_registry,
+        request_context=MagicMock(),
+    )
+
+    np.testing.assert_array_equal(embedding, np.ones(3, dtype=np.float32))
+    document_cache.get_embeddings.assert_awaited_once_with(model="test-model", texts=["test query"], local=True)
+    model_registry.get_model_provider.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_query_embedding_caches_embedded_query():
+    """Test that the normalized query is embedded and cached on cache miss."""
+    document_cache = MagicMock(
+        normalize=MagicMock(return_value="test query"), get_embeddings=AsyncMock(return_value=[None]), set_embeddings=AsyncMock()
+    )
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock(), document_cache=document_cache)
+    document_manager._create_embeddings = AsyncMock(return_value=np.array([[0.1, 0.2, 0.3]], dtype=np.float32))
+
+    embedding = await document_manager._get_query_embedding(
+        query=" test  query ",
+        postgres_session=AsyncMock(),
+        redis_client=AsyncMock(),
+        model_registry=AsyncMock(),
+        request_context=MagicMock(),
+    )
+
+    assert document_manager._create_embeddings.await_args.kwargs["input_texts"] == ["test query"]
+    assert document_cache.set_embeddings.await_args.kwargs["texts"] == ["test query"]
+    assert document_cache.set_embeddings.await_args.kwargs["local"] is True
+    np.testing.assert_array_equal(document_cache.set_embeddings.await_args.kwargs["embeddings"][0], embedding)
+
+
+@pytest.mark.asyncio
+async def test_sync_collection_chunks_updates_stale_chunks_and_deletes_orphan_chunks():
+    """Test that chunks without owner or with a stale visibility get those of their collection, and chunks of deleted collections are deleted."""
+    collections = [
+        MagicMock(id=1, user_id=7, visibility=CollectionVisibility.PUBLIC),
+        MagicMock(id=2, user_id=7, visibility=CollectionVisibility.PUBLIC),
+        MagicMock(id=4, user_id=8, visibility=CollectionVisibility.PRIVATE),
+    ]
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.side_effect = [
+        MagicMock(all=MagicMock(return_value=collections[:2])),
+        MagicMock(all=MagicMock(return_value=collections[2:])),
+    ]
+    mock_vector_store = AsyncMock()
+    mock_vector_store.get_collection_assignments = AsyncMock(
+        side_effect=[
+            {1: {(None, None), (7, CollectionVisibility.PUBLIC)}, 2: {(7, CollectionVisibility.PUBLIC)}, 3: {(7, CollectionVisibility.PRIVATE)}},
+            {4: {(8, CollectionVisibility.PUBLIC)}},
+            {},
+        ]
+    )
+    mock_elasticsearch_client = AsyncMock()
+
+    await DocumentManager.sync_collection_chunks(
+        postgres_session=mock_session,
+        vector_store=mock_vector_store,
+        elasticsearch_client=mock_elasticsearch_client,
+    )
+
+    assert [call.kwargs["after"] for call in mock_vector_store.get_collection_assignments.await_args_list] == [0, 3, 4]
+    assert mock_vector_store.update_collection.await_args_list == [
+        call(client=mock_elasticsearch_client, collection_id=1, user_id=7, visibility=CollectionVisibility.PUBLIC),
+        call(client=mock_elasticsearch_client, collection_id=4, user_id=8, visibility=CollectionVisibility.PRIVATE),
+    ]
+    mock_vector_store.delete_collection.assert_awaited_once_with(client=mock_elasticsearch_client, collection_id=3)
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_indexes_collection_owner_and_visibility():
+    """Test that the chunks are indexed with the owner and the visibility of their collection."""
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(return_value=np.zeros(shape=(2, 3), dtype=np.float32))
+    model_registry = AsyncMock()
+    model_registry.get_model_provider.return_value = MagicMock(max_context_length=None, qos_metric=None, qos_limit=None)
+    vector_store = AsyncMock()
+
+    await document_manager._upsert_document_chunks(
+        chunks=_create_chunks(count=2),
+        redis_client=AsyncMock(),
+        postgres_session=_create_collection_session(user_id=7, visibility=CollectionVisibility.PUBLIC),
+        model_registry=model_registry,
+        request_context=MagicMock(),
+        vector_store=vector_store,
+        elasticsearch_client=AsyncMock(),
+    )
+
+    chunks = vector_store.upsert.await_args.kwargs["chunks"]
+    assert {(chunk.user_id, chunk.visibility) for chunk in chunks} == {(7, CollectionVisibility.PUBLIC)}
+    vector_store.update_collection.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upsert_document_chunks_updates_visibility_changed_during_indexing():
+    """Test that the chunks are updated if the visibility of their collection changed while they were indexed."""
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(return_value=np.zeros(shape=(2, 3), dtype=np.float32))
+    model_registry = AsyncMock()
+    model_registry.get_model_provider.return_value = MagicMock(max_context_length=None, qos_metric=None, qos_limit=None)
+    vector_store = AsyncMock()
+    elasticsearch_client = AsyncMock()
+
+    await document_manager._upsert_document_chunks(
+        chunks=_create_chunks(count=2),
+        redis_client=AsyncMock(),
+        postgres_session=_create_collection_session(user_id=7, indexed_visibility=CollectionVisibility.PUBLIC),
+        model_registry=model_registry,
+        request_context=MagicMock(),
+        vector_store=vector_store,
+        elasticsearch_client=elasticsearch_client,
+    )
+
+    vector_store.update_collection.assert_awaited_once_with(
+        client=elasticsearch_client, collection_id=1, user_id=7, visibility=CollectionVisibility.PUBLIC
+    )
+
+
+async def _create_document_in_background(postgres_session: AsyncMock, ingestion_worker: MagicMock) -> int:
+    check_collection = MagicMock()
+    check_collection.scalar_one.return_value = MagicMock()
+    insert_document = MagicMock()
+    insert_document.scalar_one.return_value = 555
+    postgres_session.execute.side_effect = [check_collection, insert_document]
+    user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[], expires=None, created=0, updated=0)
+    request_context = ContextVar("test_request_context", default=RequestContext(id="123", method="POST", endpoint="/v1/documents", user_info=user_info, usage=Usage()))  # fmt: off
+    document_manager = DocumentManager(vector_store_model="test-model", parser_manager=MagicMock())
+
+    return await document_manager.create_document(
+        postgres_session=postgres_session,
+        redis_client=AsyncMock(),
+        model_registry=AsyncMock(),
+        request_context=request_context,
+        vector_store=AsyncMock(),
+        elasticsearch_client=AsyncMock(),
+        ingestion_worker=ingestion_worker,
+        collection_id=123,
+        file=create_upload_file("Test content", "test.txt", "text/plain"),
+        metadata=None,
+        chunk_size=1000,
+        chunk_overlap=100,
+        chunk_min_size=50,
+        name=None,
+        disable_chunking=False,
+        separators=[],
+        preset_separators=PresetSeparators.MARKDOWN,
+        is_separator_regex=False,
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_document_stores_upload_before_committing_pending_document(postgres_session):
+    """Test that the upload of a document ingested in background is stored before the document is committed."""
+    calls = MagicMock()
+    postgres_session.commit.side_effect = lambda: calls.commit()
+    ingestion_worker = MagicMock(store=AsyncMock(side_effect=lambda **kwargs: calls.store()), discard=AsyncMock())
+    ingestion_worker.submit.side_effect = lambda: calls.submit()
+
+    document_id = await _create_document_in_background(postgres_session=postgres_session, ingestion_worker=ingestion_worker)
+
+    assert document_id == 555
+    assert [call[0] for call in calls.mock_calls] == ["store", "commit", "submit"]
+    ingestion_worker.discard.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_document_rolls_back_pending_document_if_upload_storage_fails(postgres_session):
+    """Test that the document is not committed if its upload cannot be stored."""
+    ingestion_worker = MagicMock(store=AsyncMock(side_effect=OSError("disk full")), discard=AsyncMock())
+
+    with pytest.raises(OSError):
+        await _create_document_in_background(postgres_session=postgres_session, ingestion_worker=ingestion_worker)
+
+    postgres_session.commit.assert_not_awaited()
+    postgres_session.rollback.assert_awaited_once()
+    ingestion_worker.discard.assert_awaited_once_with(document_id=555)
+    ingestion_worker.submit.assert_not_called()
@@ -5,6 +5,7 @@ import pytest
 
 from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.schemas.chunks import Chunk
+from api.schemas.collections import CollectionVisibility
 from api.schemas.search import Search, SearchArgs, SearchMethod
 
 # --- SearchArgs.rff_k validation tests ---
@@ -152,7 +153,8 @@ class TestSearch:
         store = ElasticsearchVectorStore(index_name="test-index")
         mock_client = AsyncMock()
 
-        mock_client.search = AsyncMock(return_value={"hits": {"hits": [_make_es_hit(1, 10, score=0.9)]}})
+        hits = {"hits": {"hits": [_make_es_hit(1, 10, score=0.9)]}}
+        mock_client.msearch = AsyncMock(return_value={"responses": [hits, hits]})
 
         results = await store.search(
             client=mock_client,
@@ -267,12 +269,14 @@ class TestHybridSearch:
         store = ElasticsearchVectorStore(index_name="test-index")
         mock_client = AsyncMock()
 
-        # First call returns lexical results, second call returns semantic results
-        mock_client.search = AsyncMock(
-            side_effect=[
-                {"hits": {"hits": [_make_es_hit(1, 10, score=5.0), _make_es_hit(2, 10, score=3.0)]}},
-                {"hits": {"hits": [_make_es_hit(2, 10, score=0.95), _make_es_hit(3, 10, score=0.80)]}},
-            ]
+        # First response has the lexical results, second response has the semantic results
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": [_make_es_hit(1, 10, score=5.0), _make_es_hit(2, 10, score=3.0)]}},
+                    {"hits": {"hits": [_make_es_hit(2, 10, score=0.95), _make_es_hit(3, 10, score=0.80)]}},
+                ]
+            }
         )
 
         results = await store._hybrid_search(
@@ -303,11 +307,13 @@ class TestHybridSearch:
         store = ElasticsearchVectorStore(index_name="test-index")
         mock_client = AsyncMock()
 
-        mock_client.search = AsyncMock(
-            side_effect=[
-                {"hits": {"hits": [_make_es_hit(1, 10, score=5.0), _make_es_hit(2, 10, score=3.0)]}},
-                {"hits": {"hits": [_make_es_hit(3, 10, score=0.95), _make_es_hit(4, 10, score=0.80)]}},
-            ]
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": [_make_es_hit(1, 10, score=5.0), _make_es_hit(2, 10, score=3.0)]}},
+                    {"hits": {"hits": [_make_es_hit(3, 10, score=0.95), _make_es_hit(4, 10, score=0.80)]}},
+                ]
+            }
         )
 
         results = await store._hybrid_search(
@@ -329,11 +335,13 @@ class TestHybridSearch:
         mock_client = AsyncMock()
 
         # Same chunk id but different document ids -> should be treated as different chunks
-        mock_client.search = AsyncMock(
-            side_effect=[
-                {"hits": {"hits": [_make_es_hit(1, 10, score=5.0)]}},
-                {"hits": {"hits": [_make_es_hit(1, 20, score=0.95)]}},
-            ]
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": [_make_es_hit(1, 10, score=5.0)]}},
+                    {"hits": {"hits": [_make_es_hit(1, 20, score=0.95)]}},
+                ]
+            }
         )
 
         results = await store._hybrid_search(
@@ -356,11 +364,13 @@ class TestHybridSearch:
         mock_client = AsyncMock()
 
         # Same chunk (id=1, document=10) appears in both lexical and semantic
-        mock_client.search = AsyncMock(
-            side_effect=[
-                {"hits": {"hits": [_make_es_hit(1, 10, score=5.0)]}},
-                {"hits": {"hits": [_make_es_hit(1, 10, score=0.95)]}},
-            ]
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": [_make_es_hit(1, 10, score=5.0)]}},
+                    {"hits": {"hits": [_make_es_hit(1, 10, score=0.95)]}},
+                ]
+            }
         )
 
         results = await store._hybrid_search(
@@ -384,11 +394,13 @@ class TestHybridSearch:
         store = ElasticsearchVectorStore(index_name="test-index")
         mock_client = AsyncMock()
 
-        mock_client.search = AsyncMock(
-            side_effect=[
-                {"hits": {"hits": []}},
-                {"hits": {"hits": []}},
-            ]
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": []}},
+                    {"hits": {"hits": []}},
+                ]
+            }
         )
 
         results = await store._hybrid_search(
@@ -413,7 +425,7 @@ class TestHybridSearch:
         hits_semantic = {"hits": {"hits": [_make_es_hit(1, 10, score=0.9)]}}
 
         # Run with rff_k=10
-        mock_client.search = AsyncMock(side_effect=[hits_lexical, hits_semantic])
+        mock_client.msearch = AsyncMock(return_value={"responses": [hits_lexical, hits_semantic]})
         results_k10 = await store._hybrid_search(
             client=mock_client,
             query_prompt="test",
@@ -425,7 +437,7 @@ class TestHybridSearch:
         )
 
         # Run with rff_k=100
-        mock_client.search = AsyncMock(side_effect=[hits_lexical, hits_semantic])
+        mock_client.msearch = AsyncMock(return_value={"responses": [hits_lexical, hits_semantic]})
         results_k100 = await store._hybrid_search(
             client=mock_client,
             query_prompt="test",
@@ -445,11 +457,13 @@ class TestHybridSearch:
         store = ElasticsearchVectorStore(index_name="test-index")
         mock_client = AsyncMock()
 
-        mock_client.search = AsyncMock(
-            side_effect=[
-                {"hits": {"hits": [_make_es_hit(1, 10, score=5.0)]}},
-                {"hits": {"hits": [_make_es_hit(2, 10, score=0.95)]}},
-            ]
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": [_make_es_hit(1, 10, score=5.0)]}},
+                    {"hits": {"hits": [_make_es_hit(2, 10, score=0.95)]}},
+                ]
+            }
         )
 
         results = await store._hybrid_search(
@@ -464,3 +478,237 @@ class TestHybridSearch:
 
         for result in results:
             assert result.method == SearchMethod.HYBRID
+
+    @pytest.mark.asyncio
+    async def test_hybrid_search_does_not_merge_chunks_with_same_id_sum(self):
+        """Test that chunks are fused by (document_id, chunk_id), not by the sum of both ids."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        # document 10 + chunk 2 and document 11 + chunk 1 have the same sum
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"hits": {"hits": [_make_es_hit(2, 10, score=5.0)]}},
+                    {"hits": {"hits": [_make_es_hit(1, 11, score=0.95)]}},
+                ]
+            }
+        )
+
+        results = await store._hybrid_search(
+            client=mock_client,
+            query_prompt="test query",
+            query_vector=[0.1, 0.2, 0.3],
+            filters=[],
+            limit=10,
+            offset=0,
+            rff_k=60,
+        )
+
+        assert sorted((result.chunk.document_id, result.chunk.id) for result in results) == [(10, 2), (11, 1)]
+
+    @pytest.mark.asyncio
+    async def test_hybrid_search_runs_both_searches_in_one_request(self):
+        """Test that lexical and semantic searches are sent in a single multi search, ranked up to the requested page."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        mock_client.msearch = AsyncMock(
+            return_value={
+                "responses": [
+                    {"took": 3, "hits": {"hits": [_make_es_hit(i, 10, score=10.0 - i) for i in range(6)]}},
+                    {"took": 5, "hits": {"hits": []}},
+                ]
+            }
+        )
+
+        results = await store._hybrid_search(
+            client=mock_client,
+            query_prompt="test query",
+            query_vector=[0.1, 0.2, 0.3],
+            filters=[],
+            limit=2,
+            offset=2,
+            rff_k=60,
+        )
+
+        mock_client.search.assert_not_called()
+        mock_client.msearch.assert_awaited_once()
+        _, lexical_body, _, semantic_body = mock_client.msearch.await_args.kwargs["searches"]
+        assert lexical_body["size"] == 8 and lexical_body["from"] == 0
+        assert semantic_body["knn"]["k"] == 8 and semantic_body["from"] == 0
+        assert [result.chunk.id for result in results] == [2, 3]
+
+    @pytest.mark.asyncio
+    async def test_hybrid_search_raises_failed_search(self):
+        """Test that a failed search of the multi search is raised."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        mock_client.msearch = AsyncMock(
+            return_value={"responses": [{"hits": {"hits": []}}, {"error": {"type": "search_phase_execution_exception"}, "status": 400}]}
+        )
+
+        with pytest.raises(RuntimeError, match="semantic search failed"):
+            await store._hybrid_search(
+                client=mock_client,
+                query_prompt="test query",
+                query_vector=[0.1, 0.2, 0.3],
+                filters=[],
+                limit=10,
+                offset=0,
+                rff_k=60,
+            )
+
+    @pytest.mark.asyncio
+    async def test_hybrid_search_uses_native_rrf(self):
+        """Test that results are fused by Elasticsearch with the RRF retriever when the license supports it."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        store.native_rrf = True
+        mock_client = AsyncMock()
+
+        mock_client.search = AsyncMock(return_value={"hits": {"hits": [_make_es_hit(1, 10, score=0.03)]}})
+
+        results = await store._hybrid_search(
+            client=mock_client,
+            query_prompt="test query",
+            query_vector=[0.1, 0.2, 0.3],
+            filters=[],
+            limit=10,
+            offset=5,
+            rff_k=60,
+        )
+
+        mock_client.msearch.assert_not_called()
+        body = mock_client.search.await_args.kwargs["body"]
+        assert body["retriever"]["rrf"]["rank_constant"] == 60
+        assert body["retriever"]["rrf"]["rank_window_size"] == 30
+        assert body["from"] == 5 and body["size"] == 10
+        assert results[0].method == SearchMethod.HYBRID
+        assert results[0].score == 0.03
+
+    @pytest.mark.asyncio
+    async def test_native_rrf_requires_enterprise_license(self):
+        """Test that the RRF retriever is only used with an active enterprise or trial license."""
+        mock_client = AsyncMock()
+
+        mock_client.license.get = AsyncMock(return_value={"license": {"type": "basic", "status": "active"}})
+        assert await ElasticsearchVectorStore._has_native_rrf(client=mock_client) is False
+
+        mock_client.license.get = AsyncMock(return_value={"license": {"type": "enterprise", "status": "active"}})
+        assert await ElasticsearchVectorStore._has_native_rrf(client=mock_client) is True
+
+        mock_client.license.get = AsyncMock(side_effect=Exception("security_exception"))
+        assert await ElasticsearchVectorStore._has_native_rrf(client=mock_client) is False
+
+
+# --- ElasticsearchVectorStore collection owner and visibility tests ---
+
+
+class TestCollectionVisibility:
+    """Tests for the searches of the collections of a user by owner and visibility of the chunks."""
+
+    def test_filters_without_collections_use_owner_and_visibility(self):
+        """Test that a search without collections is filtered by the chunks of the user and the public chunks."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+
+        filters = store._build_filters(collection_ids=[], document_ids=[], metadata_filters=None, user_id=7)
+
+        assert filters == [{"bool": {"should": [{"term": {"user_id": 7}}, {"term": {"visibility": "public"}}], "minimum_should_match": 1}}]
+
+    def test_filters_with_collections_ignore_owner(self):
+        """Test that a search of given collections is only filtered by these collections."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+
+        filters = store._build_filters(collection_ids=[1, 2], document_ids=[], metadata_filters=None, user_id=7)
+
+        assert filters == [{"terms": {"collection_id": [1, 2]}}]
+
+    @pytest.mark.asyncio
+    async def test_update_collection_sets_owner_and_visibility_of_chunks(self):
+        """Test that the owner and the visibility of the chunks of a collection are updated."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        await store.update_collection(client=mock_client, collection_id=3, user_id=7, visibility=CollectionVisibility.PUBLIC)
+
+        kwargs = mock_client.update_by_query.await_args.kwargs
+        assert kwargs["query"] == {"bool": {"must": [{"term": {"collection_id": 3}}]}}
+        assert kwargs["script"]["params"] == {"user_id": 7, "visibility": "public"}
+
+    @pytest.mark.asyncio
+    async def test_delete_user_deletes_chunks_of_owner(self):
+        """Test that the chunks of the collections owned by a user are deleted."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        await store.delete_user(client=mock_client, user_id=7)
+
+        mock_client.delete_by_query.assert_awaited_once_with(
+            index="test-index", query={"bool": {"must": [{"term": {"user_id": 7}}]}}, conflicts="proceed"
+        )
+
+    @pytest.mark.asyncio
+    async def test_update_collection_does_not_wait_for_completion(self):
+        """Test that the update of the chunks of a collection runs as a task, which cannot time out the request."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        await store.update_collection(client=mock_client, collection_id=3, user_id=7, visibility=CollectionVisibility.PUBLIC)
+
+        assert mock_client.update_by_query.await_args.kwargs["wait_for_completion"] is False
+
+    @pytest.mark.asyncio
+    async def test_get_collection_assignments(self):
+        """Test that the owners and visibilities of the chunks are returned by collection, the missing ones as None."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+        mock_client.search = AsyncMock(
+            return_value={
+                "aggregations": {
+                    "collection_ids": {
+                        "buckets": [
+                            {"key": 3, "assignments": {"buckets": [{"key": [-1, ""]}, {"key": [7, "public"]}]}},
+                            {"key": 5, "assignments": {"buckets": [{"key": [8, "private"]}]}},
+                        ]
+                    }
+                }
+            }
+        )
+
+        assignments = await store.get_collection_assignments(client=mock_client, after=2)
+
+        assert assignments == {3: {(None, None), (7, CollectionVisibility.PUBLIC)}, 5: {(8, CollectionVisibility.PRIVATE)}}
+        assert mock_client.search.await_args.kwargs["query"] == {"range": {"collection_id": {"gt": 2}}}
+
+
+# --- ElasticsearchVectorStore.get_chunk_counts tests ---
+
+
+class TestGetChunkCounts:
+    """Tests for the chunk counts of a page of documents."""
+
+    @pytest.mark.asyncio
+    async def test_chunk_counts_are_aggregated_in_one_request(self):
+        """Test that the chunks of all the documents are counted with a single terms aggregation."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+        buckets = [{"key": 10, "doc_count": 3}, {"key": 11, "doc_count": 7}]
+        mock_client.search = AsyncMock(return_value={"aggregations": {"document_ids": {"buckets": buckets}}})
+
+        counts = await store.get_chunk_counts(client=mock_client, document_ids=[10, 11, 12])
+
+        assert counts == {10: 3, 11: 7}
+        mock_client.search.assert_awaited_once()
+        kwargs = mock_client.search.await_args.kwargs
+        assert kwargs["query"] == {"bool": {"filter": [{"terms": {"document_id": [10, 11, 12]}}]}}
+        assert kwargs["aggs"]["document_ids"]["terms"]["size"] == 3
+
+    @pytest.mark.asyncio
+    async def test_no_documents_does_not_query(self):
+        """Test that an empty page of documents does not query Elasticsearch."""
+        store = ElasticsearchVectorStore(index_name="test-index")
+        mock_client = AsyncMock()
+
+        assert await store.get_chunk_counts(client=mock_client, document_ids=[]) == {}
+        mock_client.search.assert_not_called()
@@ -1,11 +1,12 @@
 import datetime as dt
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.helpers._identityaccessmanager import IdentityAccessManager
+from api.utils.context import global_context
 from api.utils.exceptions import (
     OrganizationNotFoundException,
     RoleNotFoundException,
@@ -107,6 +108,23 @@ async def test_delete_user_success(postgres_session: AsyncSession, iam: Identity
     postgres_session.commit.assert_awaited()
 
 
+@pytest.mark.asyncio
+async def test_delete_user_deletes_chunks(postgres_session: AsyncSession, iam: IdentityAccessManager):
+    """Test that the chunks of the collections of a deleted user are deleted from the vector store."""
+    postgres_session.execute = AsyncMock(side_effect=[_Result(scalar_one=1), None])
+    vector_store = MagicMock(delete_user=AsyncMock())
+    elasticsearch_client = MagicMock()
+
+    with (
+        patch.object(global_context, "budget_manager", None),
+        patch.object(global_context, "vector_store", vector_store),
+        patch.object(global_context, "elasticsearch_client", elasticsearch_client),
+    ):
+        await iam.delete_user(postgres_session, user_id=1)
+
+    vector_store.delete_user.assert_awaited_once_with(client=elasticsearch_client, user_id=1)
+
+
 @pytest.mark.asyncio
 async def test_update_user_success_all_fields(postgres_session: AsyncSession, iam: IdentityAccessManager):
     # select user with join role
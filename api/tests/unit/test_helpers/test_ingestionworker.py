@@ -0,0 +1,174 @@
+import io
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import UploadFile
+import pytest
+from sqlalchemy import Update
+
+import api.helpers._ingestionworker as ingestionworker_module
+from api.helpers._ingestionworker import IngestionWorker
+from api.schemas.documents import DocumentIngestionJob, DocumentStatus, PresetSeparators
+from api.schemas.me.info import UserInfo
+from api.utils.exceptions import ParsingDocumentFailedException
+
+
+def _job() -> DocumentIngestionJob:
+    return DocumentIngestionJob(
+        filename="document.txt",
+        content_type="text/plain",
+        disable_chunking=False,
+        chunk_size=2048,
+        chunk_overlap=0,
+        chunk_min_size=0,
+        is_separator_regex=False,
+        separators=[],
+        preset_separators=PresetSeparators.MARKDOWN,
+        metadata={"source": "test"},
+    )
+
+
+def _upload() -> UploadFile:
+    return UploadFile(file=io.BytesIO(b"hello world"), filename="document.txt")
+
+
+def _updated_values(execute: AsyncMock) -> list[dict]:
+    statements = [call.kwargs["statement"] for call in execute.await_args_list]
+    return [statement.compile().params for statement in statements if isinstance(statement, Update)]
+
+
+def _create_worker(tmp_path, session_factory: MagicMock, max_retries: int = 3) -> IngestionWorker:
+    return IngestionWorker(session_factory=session_factory, redis_pool=MagicMock(), directory=str(tmp_path), concurrency=1, max_retries=max_retries, timeout=60)  # fmt: off
+
+
+@pytest.fixture
+def context():
+    document_manager = MagicMock(ingest_document=AsyncMock())
+    identity_access_manager = MagicMock(
+        get_user_info=AsyncMock(return_value=UserInfo(id=1, email="user@example.com", budget=None, permissions=[], limits=[], created=0, updated=0))
+    )
+    vector_store = MagicMock(delete_document=AsyncMock())
+    with (
+        patch.object(ingestionworker_module.global_context, "document_manager", document_manager),
+        patch.object(ingestionworker_module.global_context, "identity_access_manager", identity_access_manager),
+        patch.object(ingestionworker_module.global_context, "vector_store", vector_store),
+        patch.object(ingestionworker_module, "AsyncRedis", return_value=MagicMock(aclose=AsyncMock())),
+    ):
+        yield document_manager, vector_store
+
+
+@pytest.mark.asyncio
+async def test_stored_upload_is_written_in_directory(tmp_path, session_factory):
+    """Test that a stored upload and its job are written in the ingestion directory."""
+    worker = _create_worker(tmp_path, session_factory=session_factory)
+
+    await worker.store(document_id=1, file=_upload(), job=_job())
+
+    upload_path, job_path = worker._get_paths(document_id=1)
+    assert open(upload_path, "rb").read() == b"hello world"
+    assert DocumentIngestionJob.model_validate_json(open(job_path).read()) == _job()
+    assert not worker._submitted.is_set()
+
+
+@pytest.mark.asyncio
+async def test_discarded_upload_is_removed(tmp_path, session_factory):
+    """Test that a discarded upload is removed from the ingestion directory."""
+    worker = _create_worker(tmp_path, session_factory=session_factory)
+    await worker.store(document_id=1, file=_upload(), job=_job())
+
+    await worker.discard(document_id=1)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_completed_ingestion_updates_progress_and_removes_upload(tmp_path, session_factory, postgres_session, context):
+    """Test that a completed ingestion marks the document as completed and removes its upload."""
+    document_manager, vector_store = context
+    postgres_session.execute.return_value = MagicMock(rowcount=1)
+    postgres_session.execute.return_value.scalar_one.return_value = 1  # collection owner
+    worker = _create_worker(tmp_path, session_factory=session_factory)
+    await worker.store(document_id=1, file=_upload(), job=_job())
+
+    await worker._ingest(document_id=1, collection_id=2, attempts=1)
+
+    kwargs = document_manager.ingest_document.await_args.kwargs
+    assert kwargs["document_id"] == 1 and kwargs["collection_id"] == 2
+    assert kwargs["job"] == _job()
+    assert _updated_values(postgres_session.execute)[-1]["status"] == DocumentStatus.COMPLETED
+    assert _updated_values(postgres_session.execute)[-1]["progress"] == 100
+    assert not any(os.path.exists(path) for path in worker._get_paths(document_id=1))
+    vector_store.delete_document.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failed_ingestion_is_retried(tmp_path, session_factory, postgres_session, context):
+    """Test that a failed ingestion is released as pending with its error, and its upload is kept."""
+    document_manager, _ = context
+    document_manager.ingest_document.side_effect = RuntimeError("embeddings provider unavailable")
+    postgres_session.execute.return_value = MagicMock(rowcount=1)
+    worker = _create_worker(tmp_path, session_factory=session_factory)
+    await worker.store(document_id=1, file=_upload(), job=_job())
+
+    await worker._ingest(document_id=1, collection_id=2, attempts=1)
+
+    assert _updated_values(postgres_session.execute)[-1]["status"] == DocumentStatus.PENDING
+    assert _updated_values(postgres_session.execute)[-1]["error"] == "embeddings provider unavailable"
+    assert all(os.path.exists(path) for path in worker._get_paths(document_id=1))
+
+
+@pytest.mark.asyncio
+async def test_parsing_failure_is_not_retried(tmp_path, session_factory, postgres_session, context):
+    """Test that a parsing failure fails the document without retry and removes its chunks."""
+    document_manager, vector_store = context
+    document_manager.ingest_document.side_effect = ParsingDocumentFailedException()
+    postgres_session.execute.return_value = MagicMock(rowcount=1)
+    worker = _create_worker(tmp_path, session_factory=session_factory)
+    await worker.store(document_id=1, file=_upload(), job=_job())
+
+    await worker._ingest(document_id=1, collection_id=2, attempts=1)
+
+    assert _updated_values(postgres_session.execute)[-1]["status"] == DocumentStatus.FAILED
+    assert _updated_values(postgres_session.execute)[-1]["error"] == "Parsing document failed."
+    vector_store.delete_document.assert_awaited_once()
+    assert not any(os.path.exists(path) for path in worker._get_paths(document_id=1))
+
+
+@pytest.mark.asyncio
+async def test_ingestion_fails_after_max_retries(tmp_path, session_factory, postgres_session, context):
+    """Test that a failed ingestion fails the document once the maximum number of retries is reached."""
+    document_manager, _ = context
+    document_manager.ingest_document.side_effect = RuntimeError("embeddings provider unavailable")
+    postgres_session.execute.return_value = MagicMock(rowcount=1)
+    worker = _create_worker(tmp_path, session_factory=session_factory, max_retries=1)
+    await worker.store(document_id=1, file=_upload(), job=_job())
+
+    await worker._ingest(document_id=1, collection_id=2, attempts=2)
+
+    assert _updated_values(postgres_session.execute)[-1]["status"] == DocumentStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_missing_upload_is_retried(tmp_path, session_factory, postgres_session, context):
+    """Test that an ingestion without its upload (e.g. shared directory unavailable) is retried."""
+    document_manager, _ = context
+    postgres_session.execute.return_value = MagicMock(rowcount=1)
+    worker = _create_worker(tmp_path, session_factory=session_factory)
+
+    await worker._ingest(document_id=1, collection_id=2, attempts=1)
+
+    document_manager.ingest_document.assert_not_called()
+    assert _updated_values(postgres_session.execute)[-1]["status"] == DocumentStatus.PENDING
+    assert _updated_values(postgres_session.execute)[-1]["error"] == "Uploaded file not found."
+
+
+@pytest.mark.asyncio
+async def test_missing_upload_fails_after_max_retries(tmp_path, session_factory, postgres_session, context):
+    """Test that an ingestion without its upload fails the document once the maximum number of retries is reached."""
+    postgres_session.execute.return_value = MagicMock(rowcount=1)
+    worker = _create_worker(tmp_path, session_factory=session_factory, max_retries=1)
+
+    await worker._ingest(document_id=1, collection_id=2, attempts=2)
+
+    assert _updated_values(postgres_session.execute)[-1]["status"] == DocumentStatus.FAILED
+    assert _updated_values(postgres_session.execute)[-1]["error"] == "Uploaded file not found."
@@ -0,0 +1,48 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from api.helpers.load_balancing import LeastBusyLoadBalancingStrategy
+from api.schemas.core.models import Metric
+from api.utils.sketch import get_sketch_bucket, get_sketch_keys
+
+
+def _redis_client(slots: dict[int, dict]) -> tuple[MagicMock, MagicMock]:
+    """Redis client returning the given buckets for the last slot of each provider sketch."""
+    pipeline = MagicMock()
+    keys = []
+    pipeline.hgetall.side_effect = keys.append
+
+    def execute():
+        return [slots.get(int(key.split(":")[2]), {}) if key in last_keys else {} for key in keys]
+
+    last_keys = {get_sketch_keys(metric=Metric.TTFT.value, provider_id=provider_id)[-1] for provider_id in slots}
+    pipeline.execute = MagicMock(side_effect=execute)
+    redis_client = MagicMock(pipeline=MagicMock(return_value=pipeline))
+
+    return redis_client, pipeline
+
+
+def test_apply_sync_strategy_chooses_lowest_quantile_in_one_call():
+    """Test that the provider with the lowest latency quantile is chosen with a single Redis call."""
+    redis_client, pipeline = _redis_client(slots={1: {get_sketch_bucket(value=900): 10}, 2: {get_sketch_bucket(value=300): 10}})
+    strategy = LeastBusyLoadBalancingStrategy(redis_client=redis_client, load_balancing_metric=Metric.TTFT)
+
+    provider_id, score = strategy.apply_sync_strategy(candidates=[1, 2, 3])
+
+    assert provider_id == 2
+    assert abs(score - 300) <= 0.02 * 300
+    pipeline.execute.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_apply_async_strategy_without_metrics_returns_any_candidate():
+    """Test that a candidate is returned when the providers have no metrics."""
+    pipeline = MagicMock(execute=AsyncMock(side_effect=ConnectionError("redis down")))
+    redis_client = MagicMock(pipeline=MagicMock(return_value=pipeline), reset=AsyncMock())
+    strategy = LeastBusyLoadBalancingStrategy(redis_client=redis_client, load_balancing_metric=Metric.TTFT)
+
+    provider_id, score = await strategy.apply_async_strategy(candidates=[1, 2])
+
+    assert provider_id in [1, 2]
+    assert score == float("inf")
@@ -1,115 +1,91 @@
 import logging
-from unittest.mock import AsyncMock, MagicMock, call, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from limits.aio import strategies
-from limits.aio.storage import RedisStorage
+from fakeredis import FakeAsyncRedis
 import pytest
 from redis.exceptions import RedisError
 
-from api.helpers._limiter import Limiter
+from api.helpers._limiter import CHECK_LIMITS_SCRIPT, Limiter
 from api.schemas.admin.roles import Limit, LimitType
 from api.schemas.core.configuration import LimitingStrategy
 from api.schemas.me.info import UserInfo
 from api.utils.exceptions import InsufficientPermissionException, ModelNotFoundException, RateLimitExceeded
+from api.utils.variables import PREFIX__REDIS_RATE_LIMIT
 
 logger = logging.getLogger(__name__)
 
-# =========================== STRATEGIES ============================
+ALL_STRATEGIES = [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW]
+ALL_LIMITS = [
+    Limit(router=1, type=LimitType.RPM, value=100),
+    Limit(router=1, type=LimitType.RPD, value=1000),
+    Limit(router=1, type=LimitType.TPM, value=500),
+    Limit(router=1, type=LimitType.TPD, value=5000),
+]
 
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "strategy, expected_class",
-    [
-        (LimitingStrategy.MOVING_WINDOW, strategies.MovingWindowRateLimiter),
-        (LimitingStrategy.FIXED_WINDOW, strategies.FixedWindowRateLimiter),
-        (LimitingStrategy.SLIDING_WINDOW, strategies.SlidingWindowCounterRateLimiter),
-    ],
-)
-async def test_limiter_initialization_strategies(strategy, expected_class):
-    """Test that Limiter initializes the correct strategy class."""
+def _create_limiter(strategy: LimitingStrategy) -> tuple[Limiter, AsyncMock, AsyncMock]:
     mock_redis_pool = MagicMock()
     mock_redis_pool.url = "redis://localhost:6379"
 
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis"):
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
+    with patch("api.helpers._limiter.Redis") as MockRedis:
+        mock_internal_redis = AsyncMock()
+        mock_script = AsyncMock()
+        mock_internal_redis.register_script = MagicMock(return_value=mock_script)
+        MockRedis.return_value = mock_internal_redis
 
         limiter = Limiter(mock_redis_pool, strategy=strategy)
-        assert isinstance(limiter.strategy, expected_class)
 
+    return limiter, mock_internal_redis, mock_script
 
-# =========================== RESET METHOD ============================
 
+# =========================== INITIALIZATION ============================
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "strategy",
-    [
-        LimitingStrategy.MOVING_WINDOW,
-        LimitingStrategy.FIXED_WINDOW,
-        LimitingStrategy.SLIDING_WINDOW,
-    ],
-)
-async def test_limiter_reset_success(strategy):
-    """Test that reset successfully calls redis_client.reset()."""
-    # Mock the Redis pool instead of using global_context
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
 
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        mock_storage_instance = AsyncMock(spec=RedisStorage)
-        MockStorage.return_value = mock_storage_instance
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
+async def test_limiter_initialization_registers_script(strategy):
+    """Test that Limiter registers the limits check script once."""
+    limiter, mock_internal_redis, mock_script = _create_limiter(strategy)
 
-        mock_internal_redis = AsyncMock()
-        MockRedis.return_value = mock_internal_redis
+    mock_internal_redis.register_script.assert_called_once_with(CHECK_LIMITS_SCRIPT)
+    assert limiter.script is mock_script
+    assert limiter.strategy == strategy
 
-        redis_state = ["LIMITS:key1", "LIMITS:key2"]
-        mock_internal_redis.keys.side_effect = lambda pattern: redis_state
-        # When storage.reset() is called, clear the state
 
-        async def simulate_reset():
-            redis_state.clear()
+# =========================== RESET METHOD ============================
 
-        mock_storage_instance.reset.side_effect = simulate_reset
 
-        limiter = Limiter(mock_redis_pool, strategy=strategy)
+@pytest.mark.asyncio
+async def test_limiter_reset_success():
+    """Test that reset deletes the rate limit keys."""
+    limiter, mock_internal_redis, _ = _create_limiter(LimitingStrategy.FIXED_WINDOW)
 
-        # Verify keys exist before reset
-        initial_keys = await limiter.redis_client.keys("LIMITS*")
-        assert len(initial_keys) == 2
+    async def scan_iter(match, count):
+        assert match == f"{PREFIX__REDIS_RATE_LIMIT}:*"
+        for key in [f"{PREFIX__REDIS_RATE_LIMIT}:rpm:1:1:1", f"{PREFIX__REDIS_RATE_LIMIT}:rpd:1:1:1"]:
+            yield key
 
-        await limiter.reset()
+    mock_internal_redis.scan_iter = scan_iter
 
-        mock_storage_instance.reset.assert_awaited_once()
+    await limiter.reset()
 
-        final_keys = await limiter.redis_client.keys("LIMITS*")
-        assert len(final_keys) == 0
+    assert mock_internal_redis.delete.await_count == 2
 
 
 @pytest.mark.asyncio
 async def test_limiter_reset_handles_redis_error():
     """Test that reset handles RedisError gracefully."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-    strategy = LimitingStrategy.FIXED_WINDOW
-
-    with (
-        patch("api.helpers._limiter.storage.RedisStorage") as MockStorage,
-        patch("api.helpers._limiter.Redis") as MockRedis,
-        patch("api.helpers._limiter.logger") as mock_logger,
-    ):
-        mock_storage_instance = AsyncMock(spec=RedisStorage)
-        mock_storage_instance.reset.side_effect = RedisError("Test Error")
-        MockStorage.return_value = mock_storage_instance
+    limiter, mock_internal_redis, _ = _create_limiter(LimitingStrategy.FIXED_WINDOW)
 
-        mock_internal_redis = AsyncMock()
-        MockRedis.return_value = mock_internal_redis
+    async def scan_iter(match, count):
+        raise RedisError("Test Error")
+        yield
 
-        limiter = Limiter(mock_redis_pool, strategy)
+    mock_internal_redis.scan_iter = scan_iter
 
+    with patch("api.helpers._limiter.logger") as mock_logger:
         await limiter.reset()
 
-        mock_storage_instance.reset.assert_awaited_once()
         mock_logger.error.assert_called_once()
         logged_msg = mock_logger.error.call_args[1]["msg"]
         assert "Redis error during rate limit reset." in logged_msg
@@ -119,479 +95,252 @@ async def test_limiter_reset_handles_redis_error():
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "strategy",
-    [
-        LimitingStrategy.MOVING_WINDOW,
-        LimitingStrategy.FIXED_WINDOW,
-        LimitingStrategy.SLIDING_WINDOW,
-    ],
-)
-async def test_limiter_hit_no_value(strategy):
-    """Test hit returns True immediately if value is None (no rate limit defined)."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy=strategy)
-
-        result = await limiter.hit(user_id=1, router_id=1, type=LimitType.RPM, value=None)
-        assert result is True
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
+async def test_limiter_hit_single_call(strategy):
+    """Test hit checks all the limits in a single script call."""
+    limiter, _, mock_script = _create_limiter(strategy)
+    mock_script.return_value = [0, 99, 999, 450, 4950]
+
+    limits = {LimitType.RPM: 100, LimitType.RPD: 1000, LimitType.TPM: 500, LimitType.TPD: 5000}
+    costs = {LimitType.RPM: 1, LimitType.RPD: 1, LimitType.TPM: 50, LimitType.TPD: 50}
+    with patch("api.helpers._limiter.time.time", return_value=86400 * 2 + 90):
+        exceeded, remaining = await limiter.hit(user_id=99, router_id=88, limits=limits, costs=costs)
+
+    mock_script.assert_awaited_once()
+    kwargs = mock_script.call_args.kwargs
+    if strategy == LimitingStrategy.MOVING_WINDOW:
+        expected_keys = []
+        for type in costs:
+            expected_keys.extend([f"{PREFIX__REDIS_RATE_LIMIT}:{type.value}:{{99:88}}"] * 2)
+    else:
+        expected_keys = [
+            f"{PREFIX__REDIS_RATE_LIMIT}:rpm:{{99:88}}:2881",
+            f"{PREFIX__REDIS_RATE_LIMIT}:rpm:{{99:88}}:2880",
+            f"{PREFIX__REDIS_RATE_LIMIT}:rpd:{{99:88}}:2",
+            f"{PREFIX__REDIS_RATE_LIMIT}:rpd:{{99:88}}:1",
+            f"{PREFIX__REDIS_RATE_LIMIT}:tpm:{{99:88}}:2881",
+            f"{PREFIX__REDIS_RATE_LIMIT}:tpm:{{99:88}}:2880",
+            f"{PREFIX__REDIS_RATE_LIMIT}:tpd:{{99:88}}:2",
+            f"{PREFIX__REDIS_RATE_LIMIT}:tpd:{{99:88}}:1",
+        ]
+    assert kwargs["keys"] == expected_keys
+    assert kwargs["args"] == [strategy.value, 86400 * 2 + 90, 100, 60, 1, 1000, 86400, 1, 500, 60, 50, 5000, 86400, 50]
+    assert exceeded is None
+    assert remaining == {LimitType.RPM: 99, LimitType.RPD: 999, LimitType.TPM: 450, LimitType.TPD: 4950}
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "strategy",
-    [
-        LimitingStrategy.MOVING_WINDOW,
-        LimitingStrategy.FIXED_WINDOW,
-        LimitingStrategy.SLIDING_WINDOW,
-    ],
-)
-@pytest.mark.parametrize(
-    "limit_type, expected_limit_class_name, granularity",
-    [
-        (LimitType.TPM, "RateLimitItemPerMinute", "minute"),
-        (LimitType.TPD, "RateLimitItemPerDay", "day"),
-        (LimitType.RPM, "RateLimitItemPerMinute", "minute"),
-        (LimitType.RPD, "RateLimitItemPerDay", "day"),
-    ],
-)
-async def test_limiter_hit_types(strategy, limit_type, expected_limit_class_name, granularity):
-    """Test hit with different limit types creates correct limit items."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy=strategy)
-        limiter.strategy.hit = AsyncMock(return_value=True)
-
-        user_id = 99
-        router_id = 88
-        value = 100
-        cost = 5
-
-        result = await limiter.hit(user_id=user_id, router_id=router_id, type=limit_type, value=value, cost=cost)
-
-        args, kwargs = limiter.strategy.hit.call_args
-        limit_item = args[0]
-        key = args[1]
-
-        assert type(limit_item).__name__ == expected_limit_class_name
-        assert limit_item.amount == value
+async def test_limiter_hit_skips_unlimited_types():
+    """Test hit does not check limits without value."""
+    limiter, _, mock_script = _create_limiter(LimitingStrategy.MOVING_WINDOW)
+    mock_script.return_value = [0, 9]
 
-        from api.utils.variables import PREFIX__REDIS_RATE_LIMIT
+    exceeded, remaining = await limiter.hit(
+        user_id=1, router_id=1, limits={LimitType.RPM: 10, LimitType.RPD: None}, costs={LimitType.RPM: 1, LimitType.RPD: 1}
+    )
 
-        assert key == f"{PREFIX__REDIS_RATE_LIMIT}:{limit_type.value}:{user_id}:{router_id}"
-        assert kwargs["cost"] == cost
-        assert result is True
+    assert mock_script.call_args.kwargs["keys"] == [f"{PREFIX__REDIS_RATE_LIMIT}:rpm:{{1:1}}"] * 2
+    assert exceeded is None
+    assert remaining == {LimitType.RPM: 9}
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_hit_limit_exceeded_with_ttl(strategy):
-    """Test hit returns False when limit exceeded and keys have TTL."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        mock_internal_redis = AsyncMock()
-        MockRedis.return_value = mock_internal_redis
+async def test_limiter_hit_no_value():
+    """Test hit does not call Redis if no limit is defined."""
+    limiter, _, mock_script = _create_limiter(LimitingStrategy.FIXED_WINDOW)
 
-        limiter = Limiter(mock_redis_pool, strategy)
-        limiter.strategy.hit = AsyncMock(return_value=False)
+    exceeded, remaining = await limiter.hit(user_id=1, router_id=1, limits={LimitType.RPM: None}, costs={LimitType.RPM: 1})
 
-        mock_internal_redis.ttl.return_value = 10
-
-        result = await limiter.hit(1, 1, LimitType.RPM, 100)
-
-        assert result is False
-        mock_internal_redis.delete.assert_not_called()
-        mock_internal_redis.reset.assert_not_called()
+    mock_script.assert_not_called()
+    assert exceeded is None
+    assert remaining == {}
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_hit_limit_exceeded_no_ttl_cleanup(strategy):
-    """Test cleanup when TTLs are missing (-1)."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with (
-        patch("api.helpers._limiter.storage.RedisStorage") as MockStorage,
-        patch("api.helpers._limiter.Redis") as MockRedis,
-        patch("api.helpers._limiter.logger") as mock_logger,
-    ):
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        mock_internal_redis = AsyncMock()
-        mock_internal_redis.ttl.return_value = -1
-        MockRedis.return_value = mock_internal_redis
-
-        limiter = Limiter(mock_redis_pool, strategy)
-        limiter.strategy.hit = AsyncMock(return_value=True)
-
-        user_id = 1
-        router_id = 2
-        value = 50
-        limit_type = LimitType.RPM
-
-        await limiter.hit(user_id, router_id, limit_type, value)
+async def test_limiter_hit_limit_exceeded():
+    """Test hit returns the first exceeded limit."""
+    limiter, _, mock_script = _create_limiter(LimitingStrategy.FIXED_WINDOW)
+    mock_script.return_value = [3, 99, 999, 20, 4000]
 
-        # Ensure no error occurred
-        mock_logger.error.assert_not_called()
+    limits = {LimitType.RPM: 100, LimitType.RPD: 1000, LimitType.TPM: 500, LimitType.TPD: 5000}
+    costs = {LimitType.RPM: 1, LimitType.RPD: 1, LimitType.TPM: 50, LimitType.TPD: 50}
+    exceeded, remaining = await limiter.hit(user_id=1, router_id=1, limits=limits, costs=costs)
 
-        from api.utils.variables import PREFIX__REDIS_RATE_LIMIT
-
-        # example of full Redis key : GET "LIMITS:LIMITER/ogl_rt:rpd:1:1/1000000/1/day"
-        key = f"{PREFIX__REDIS_RATE_LIMIT}:{limit_type.value}:{user_id}:{router_id}"
-        granularity = "minute"
-        real_key = f"LIMITS:LIMITER/{key}/{value}/1/{granularity}"
-
-        assert call(real_key) in mock_internal_redis.ttl.call_args_list
-        assert call(real_key) in mock_internal_redis.delete.call_args_list
+    assert exceeded == LimitType.TPM
+    assert remaining[LimitType.TPM] == 20
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_hit_exception(strategy):
+async def test_limiter_hit_exception():
     """Test fail-open behavior on exception."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with (
-        patch("api.helpers._limiter.storage.RedisStorage") as MockStorage,
-        patch("api.helpers._limiter.Redis") as MockRedis,
-        patch("api.helpers._limiter.logger") as mock_logger,
-    ):
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
+    limiter, _, mock_script = _create_limiter(LimitingStrategy.FIXED_WINDOW)
+    mock_script.side_effect = Exception("Boom")
 
-        limiter = Limiter(mock_redis_pool, strategy)
+    with patch("api.helpers._limiter.logger") as mock_logger:
+        exceeded, remaining = await limiter.hit(user_id=1, router_id=1, limits={LimitType.RPM: 100}, costs={LimitType.RPM: 1})
 
-        limiter.strategy.hit = AsyncMock(side_effect=Exception("Boom"))
-
-        result = await limiter.hit(1, 1, LimitType.RPM, 100)
-
-        assert result is True
+        assert exceeded is None
+        assert remaining == {}
         mock_logger.error.assert_called_once()
         logged_msg = mock_logger.error.call_args[1]["msg"]
         assert "Error during rate limit hit." in logged_msg
 
 
-# =========================== RESET METHOD ============================
+# =========================== CHECK LIMITS SCRIPT ============================
 
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_remaining_early_return(strategy):
-    """Test remaining returns None immediately if value is None."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy)
-
-        result = await limiter.remaining(user_id=1, router_id=1, type=LimitType.RPM, value=None)
+def _create_redis_limiter(strategy: LimitingStrategy) -> Limiter:
+    redis_client = FakeAsyncRedis()
 
-        assert result is None
+    return Limiter(redis_client.connection_pool, strategy=strategy)
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "limit_type, expected_limit_class_name, granularity",
-    [
-        (LimitType.TPM, "RateLimitItemPerMinute", "minute"),
-        (LimitType.TPD, "RateLimitItemPerDay", "day"),
-        (LimitType.RPM, "RateLimitItemPerMinute", "minute"),
-        (LimitType.RPD, "RateLimitItemPerDay", "day"),
-    ],
-)
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_remaining_success(limit_type, expected_limit_class_name, granularity, strategy):
-    """Test remaining returns correct window stats."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy)
-
-        # Mock strategy.get_window_stats
-        mock_window_stats = MagicMock()
-        mock_window_stats.remaining = 42
-        limiter.strategy.get_window_stats = AsyncMock(return_value=mock_window_stats)
-
-        user_id = 123
-        router_id = 456
-        value = 1000
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
+async def test_limiter_script_consumes_until_exceeded(strategy):
+    """Test that the script consumes the limits until one of them is exceeded."""
+    limiter = _create_redis_limiter(strategy)
+    limits = {LimitType.RPM: 3, LimitType.TPM: 100}
+    costs = {LimitType.RPM: 1, LimitType.TPM: 40}
 
-        result = await limiter.remaining(user_id=user_id, router_id=router_id, type=limit_type, value=value)
+    with patch("api.helpers._limiter.time.time", return_value=6000.0):
+        results = [await limiter.hit(user_id=1, router_id=1, limits=limits, costs=costs) for _ in range(3)]
 
-        assert result == 42
+    assert results[0] == (None, {LimitType.RPM: 2, LimitType.TPM: 60})
+    assert results[1] == (None, {LimitType.RPM: 1, LimitType.TPM: 20})
+    # the third request exceeds the TPM limit, nothing is consumed
+    assert results[2] == (LimitType.TPM, {LimitType.RPM: 1, LimitType.TPM: 20})
 
-        # Verify strategy.get_window_stats call
-        args, _ = limiter.strategy.get_window_stats.call_args
-        limit_item = args[0]
-        key = args[1]
 
-        assert type(limit_item).__name__ == expected_limit_class_name
-        assert limit_item.amount == value
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
+async def test_limiter_script_isolates_users_and_routers(strategy):
+    """Test that the script counts the limits of each user and router separately."""
+    limiter = _create_redis_limiter(strategy)
 
-        from api.utils.variables import PREFIX__REDIS_RATE_LIMIT
+    with patch("api.helpers._limiter.time.time", return_value=6000.0):
+        first = await limiter.hit(user_id=1, router_id=1, limits={LimitType.RPM: 1}, costs={LimitType.RPM: 1})
+        second = await limiter.hit(user_id=1, router_id=2, limits={LimitType.RPM: 1}, costs={LimitType.RPM: 1})
+        third = await limiter.hit(user_id=2, router_id=1, limits={LimitType.RPM: 1}, costs={LimitType.RPM: 1})
+        fourth = await limiter.hit(user_id=1, router_id=1, limits={LimitType.RPM: 1}, costs={LimitType.RPM: 1})
 
-        assert key == f"{PREFIX__REDIS_RATE_LIMIT}:{limit_type.value}:{user_id}:{router_id}"
+    assert first == second == third == (None, {LimitType.RPM: 0})
+    assert fourth == (LimitType.RPM, {LimitType.RPM: 0})
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_remaining_exception(strategy):
-    """Test exception handling in remaining."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with (
-        patch("api.helpers._limiter.storage.RedisStorage") as MockStorage,
-        patch("api.helpers._limiter.Redis") as MockRedis,
-        patch("api.helpers._limiter.logger") as mock_logger,
-    ):
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy)
+@pytest.mark.parametrize(
+    "strategy, remaining",
+    [(LimitingStrategy.FIXED_WINDOW, 10), (LimitingStrategy.SLIDING_WINDOW, 5), (LimitingStrategy.MOVING_WINDOW, 10)],
+)
+async def test_limiter_script_window_expiration(strategy, remaining):
+    """Test that the consumed amount is released by the next window, partially for the sliding window."""
+    limiter = _create_redis_limiter(strategy)
+    limits = {LimitType.RPM: 10}
 
-        limiter.strategy.get_window_stats = AsyncMock(side_effect=Exception("DB Error"))
+    with patch("api.helpers._limiter.time.time", return_value=6000.0):
+        await limiter.hit(user_id=1, router_id=1, limits=limits, costs={LimitType.RPM: 10})
 
-        result = await limiter.remaining(user_id=1, router_id=1, type=LimitType.RPM, value=100)
+    # half of the next window
+    with patch("api.helpers._limiter.time.time", return_value=6090.0):
+        exceeded, result = await limiter.hit(user_id=1, router_id=1, limits=limits, costs={LimitType.RPM: 0})
 
-        assert result is None
-        mock_logger.debug.assert_called()
+    assert exceeded is None
+    assert result == {LimitType.RPM: remaining}
 
 
 # =========================== CHECK USER LIMITS METHOD ============================
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
 async def test_limiter_check_user_limits_admin(strategy):
     """Test admin (id=0) bypasses all checks."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
+    limiter, _, _ = _create_limiter(strategy)
+    limiter.hit = AsyncMock(return_value=(None, {}))
 
-        limiter = Limiter(mock_redis_pool, strategy)
-        limiter.hit = AsyncMock(return_value=True)
+    user_info = UserInfo(id=0, email="admin@test.com", name="Admin", permissions=[], limits=[], expires=None, created=0, updated=0)
 
-        user_info = UserInfo(id=0, email="admin@test.com", name="Admin", permissions=[], limits=[], expires=None, created=0, updated=0)
+    await limiter.check_user_limits(user_info=user_info, router_id=1)
 
-        await limiter.check_user_limits(user_info=user_info, router_id=1)
-
-        limiter.hit.assert_not_called()
+    limiter.hit.assert_not_called()
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
 async def test_limiter_check_user_limits_no_access(strategy):
     """Test raises ModelNotFoundException when checks fail router access."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
+    limiter, _, _ = _create_limiter(strategy)
 
-        limiter = Limiter(mock_redis_pool, strategy)
+    # User limits do not contain router_id=999
+    user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[], expires=None, created=0, updated=0)
 
-        # User limits do not contain router_id=999
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[], expires=None, created=0, updated=0)
-
-        with pytest.raises(ModelNotFoundException):
-            await limiter.check_user_limits(user_info=user_info, router_id=999)
+    with pytest.raises(ModelNotFoundException):
+        await limiter.check_user_limits(user_info=user_info, router_id=999)
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
 async def test_limiter_check_user_limits_insufficient_permission(strategy):
     """Test raises InsufficientPermissionException when any limit value is 0."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy)
+    limiter, _, _ = _create_limiter(strategy)
 
-        # Mock limit with 0 value
-        limit_mock = Limit(router=1, type=LimitType.TPM, value=0)
+    user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[Limit(router=1, type=LimitType.TPM, value=0)], expires=None, created=0, updated=0)  # fmt: off
 
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[limit_mock], expires=None, created=0, updated=0)
-
-        with pytest.raises(InsufficientPermissionException):
-            await limiter.check_user_limits(user_info=user_info, router_id=1)
+    with pytest.raises(InsufficientPermissionException):
+        await limiter.check_user_limits(user_info=user_info, router_id=1)
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_check_user_limits_rpm_exceeded(strategy):
-    """Test raises RateLimitExceeded when RPM limit is hit."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
+async def test_limiter_check_user_limits_without_prompt_tokens(strategy):
+    """Test only request limits are checked without prompt tokens."""
+    limiter, _, _ = _create_limiter(strategy)
+    limiter.hit = AsyncMock(return_value=(None, {}))
 
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
+    user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=ALL_LIMITS, expires=None, created=0, updated=0)
 
-        limiter = Limiter(mock_redis_pool, strategy)
+    await limiter.check_user_limits(user_info=user_info, router_id=1)
 
-        # Mock limits
-        limits = [
-            Limit(router=1, type=LimitType.RPM, value=10),
-            Limit(router=1, type=LimitType.RPD, value=1000),
-            Limit(router=1, type=LimitType.TPM, value=500),
-            Limit(router=1, type=LimitType.TPD, value=5000),
-        ]
-
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=limits, expires=None, created=0, updated=0)
-
-        # Mock hit/remaining
-        # hit returns False for RPM check (first call is RPM check)
-        # Sequence of calls: hit(RPM), hit(RPD), [hit(TPM), hit(TPD)]
-        # We need to simulate hit call for RPM returning False
-
-        # Using side_effect to return False for specific call is safer
-        async def hit_side_effect(user_id, router_id, type, value, cost=1):
-            if type == LimitType.RPM:
-                return False
-            return True
-
-        limiter.hit = AsyncMock(side_effect=hit_side_effect)
-        limiter.remaining = AsyncMock(return_value=0)
-
-        with pytest.raises(RateLimitExceeded) as exc_info:
-            await limiter.check_user_limits(user_info=user_info, router_id=1)
-
-        assert "requests per minute exceeded" in str(exc_info.value.detail)
+    limiter.hit.assert_awaited_once()
+    assert limiter.hit.call_args.kwargs["costs"] == {LimitType.RPM: 1, LimitType.RPD: 1}
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
+@pytest.mark.parametrize("strategy", ALL_STRATEGIES)
 async def test_limiter_check_user_limits_with_prompt_tokens_success(strategy):
-    """Test success path with prompt tokens."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
+    """Test success path with prompt tokens checks the four limits at once."""
+    limiter, _, _ = _create_limiter(strategy)
+    limiter.hit = AsyncMock(return_value=(None, {}))
 
-        limiter = Limiter(mock_redis_pool, strategy)
+    user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=ALL_LIMITS, expires=None, created=0, updated=0)
 
-        # Mock limits: RPM, RPD, TPM, TPD
-        # We need at least one limit for router 1 so has_access=True
-        limit_rpm = Limit(router=1, type=LimitType.RPM, value=100)
+    await limiter.check_user_limits(user_info=user_info, router_id=1, prompt_tokens=50)
 
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=[limit_rpm], expires=None, created=0, updated=0)
-
-        limiter.hit = AsyncMock(return_value=True)
-
-        limits = [
-            Limit(router=1, type=LimitType.RPM, value=100),
-            Limit(router=1, type=LimitType.RPD, value=1000),
-            Limit(router=1, type=LimitType.TPM, value=500),
-            Limit(router=1, type=LimitType.TPD, value=5000),
-        ]
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=limits, expires=None, created=0, updated=0)
-
-        limiter.hit = AsyncMock(return_value=True)
-
-        await limiter.check_user_limits(user_info=user_info, router_id=1, prompt_tokens=50)
-
-        called_types = [call.kwargs["type"] for call in limiter.hit.call_args_list]
-        assert LimitType.RPM in called_types
-        assert LimitType.RPD in called_types
-        assert LimitType.TPM in called_types
-        assert LimitType.TPD in called_types
+    limiter.hit.assert_awaited_once()
+    kwargs = limiter.hit.call_args.kwargs
+    assert kwargs["costs"] == {LimitType.RPM: 1, LimitType.RPD: 1, LimitType.TPM: 50, LimitType.TPD: 50}
+    assert kwargs["limits"] == {LimitType.RPM: 100, LimitType.RPD: 1000, LimitType.TPM: 500, LimitType.TPD: 5000}
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_check_user_limits_rpd_exceeded(strategy):
-    """Test raises RateLimitExceeded when RPD limit is hit."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-
-        limiter = Limiter(mock_redis_pool, strategy)
-
-        limits = [
-            Limit(router=1, type=LimitType.RPM, value=100),
-            Limit(router=1, type=LimitType.RPD, value=1000),
-            Limit(router=1, type=LimitType.TPM, value=500),
-            Limit(router=1, type=LimitType.TPD, value=5000),
-        ]
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=limits, expires=None, created=0, updated=0)
-
-        async def hit_side_effect(user_id, router_id, type, value, cost=1):
-            if type == LimitType.RPD:
-                return False
-            return True
-
-        limiter.hit = AsyncMock(side_effect=hit_side_effect)
-        limiter.remaining = AsyncMock(return_value=0)
-
-        with pytest.raises(RateLimitExceeded) as exc_info:
-            await limiter.check_user_limits(user_info=user_info, router_id=1)
-
-        assert "requests per day exceeded" in str(exc_info.value.detail)
-
-
-@pytest.mark.asyncio
-@pytest.mark.parametrize("strategy", [LimitingStrategy.MOVING_WINDOW, LimitingStrategy.FIXED_WINDOW, LimitingStrategy.SLIDING_WINDOW])
-async def test_limiter_check_user_limits_tpd_exceeded(strategy):
-    """Test raises RateLimitExceeded when TPD limit is hit."""
-    mock_redis_pool = MagicMock()
-    mock_redis_pool.url = "redis://localhost:6379"
-
-    with patch("api.helpers._limiter.storage.RedisStorage") as MockStorage, patch("api.helpers._limiter.Redis") as MockRedis:
-        MockStorage.return_value = AsyncMock(spec=RedisStorage)
-        MockRedis.return_value = AsyncMock()
-        limiter = Limiter(mock_redis_pool, strategy)
-
-        limits = [
-            Limit(router=1, type=LimitType.RPM, value=100),
-            Limit(router=1, type=LimitType.RPD, value=1000),
-            Limit(router=1, type=LimitType.TPM, value=500),
-            Limit(router=1, type=LimitType.TPD, value=5000),
-        ]
-        user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=limits, expires=None, created=0, updated=0)
-
-        async def hit_side_effect(user_id, router_id, type, value, cost=1):
-            if type == LimitType.TPD:
-                return False
-            return True
+@pytest.mark.parametrize(
+    "limit_type, message",
+    [
+        (LimitType.RPM, "100 requests per minute exceeded (remaining: 0)."),
+        (LimitType.RPD, "1000 requests per day exceeded (remaining: 0)."),
+        (LimitType.TPM, "500 input tokens per minute exceeded (remaining: 0)."),
+        (LimitType.TPD, "5000 input tokens per day exceeded (remaining: 0)."),
+    ],
+)
+async def test_limiter_check_user_limits_exceeded(limit_type, message):
+    """Test raises RateLimitExceeded with the exceeded limit."""
+    limiter, _, _ = _create_limiter(LimitingStrategy.FIXED_WINDOW)
+    limiter.hit = AsyncMock(return_value=(limit_type, {limit_type: 0}))
 
-        limiter.hit = AsyncMock(side_effect=hit_side_effect)
-        limiter.remaining = AsyncMock(return_value=0)
+    user_info = UserInfo(id=1, email="u@test.com", name="User", permissions=[], limits=ALL_LIMITS, expires=None, created=0, updated=0)
 
-        with pytest.raises(RateLimitExceeded) as exc_info:
-            await limiter.check_user_limits(user_info=user_info, router_id=1, prompt_tokens=100)
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        await limiter.check_user_limits(user_info=user_info, router_id=1, prompt_tokens=100)
 
-        assert "input tokens per day exceeded" in str(exc_info.value.detail)
+    assert exc_info.value.detail == message
@@ -0,0 +1,284 @@
+from datetime import datetime
+import os
+
+import numpy as np
+import pytest
+
+from api.helpers._localvectorstore import LocalVectorStore
+from api.schemas.collections import CollectionVisibility
+from api.schemas.core.vectorstore import VectorStoreChunk
+from api.schemas.search import ComparisonFilter, ComparisonFilterType, CompoundFilter, CompoundFilterOperator, SearchMethod
+
+VECTOR_SIZE = 4
+
+
+def _make_chunk(
+    chunk_id: int,
+    document_id: int,
+    content: str,
+    embedding: list[float],
+    collection_id: int = 1,
+    user_id: int | None = 1,
+    visibility: CollectionVisibility | None = CollectionVisibility.PRIVATE,
+    metadata: dict | None = None,
+) -> VectorStoreChunk:
+    return VectorStoreChunk(
+        id=chunk_id,
+        collection_id=collection_id,
+        document_id=document_id,
+        user_id=user_id,
+        visibility=visibility,
+        content=content,
+        embedding=np.asarray(embedding, dtype=np.float32),
+        metadata=metadata,
+        created=datetime(2026, 1, 1),
+    )
+
+
+async def _create_store(directory: str, hnsw_threshold: int = 10000) -> LocalVectorStore:
+    store = LocalVectorStore(directory=directory, hnsw_threshold=hnsw_threshold)
+    await store.setup(client=None, vector_size=VECTOR_SIZE)
+
+    return store
+
+
+async def _search(store: LocalVectorStore, method: SearchMethod, **kwargs) -> list:
+    arguments = {
+        "client": None,
+        "method": method,
+        "collection_ids": [],
+        "document_ids": [],
+        "metadata_filters": None,
+        "query_prompt": "",
+        "query_vector": None,
+        "limit": 10,
+        "offset": 0,
+    }
+    arguments.update(kwargs)
+
+    return await store.search(**arguments)
+
+
+@pytest.mark.asyncio
+async def test_semantic_search_ranks_by_cosine_similarity(tmp_path):
+    """Test that the semantic search ranks the chunks by cosine similarity."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[
+            _make_chunk(chunk_id=1, document_id=1, content="first", embedding=[1, 0, 0, 0]),
+            _make_chunk(chunk_id=2, document_id=1, content="second", embedding=[0, 2, 0, 0]),
+            _make_chunk(chunk_id=3, document_id=1, content="third", embedding=[1, 1, 0, 0]),
+        ],
+    )
+
+    searches = await _search(store, method=SearchMethod.SEMANTIC, collection_ids=[1], query_vector=[0, 1, 0, 0], limit=2)
+
+    assert [search.chunk.id for search in searches] == [2, 3]
+    assert searches[0].score == pytest.approx(1.0)
+    assert searches[1].score == pytest.approx((1 + np.sqrt(0.5)) / 2)
+
+    searches = await _search(store, method=SearchMethod.SEMANTIC, collection_ids=[1], query_vector=[0, 1, 0, 0], score_threshold=0.9)
+    assert [search.chunk.id for search in searches] == [2]
+
+    searches = await _search(store, method=SearchMethod.SEMANTIC, collection_ids=[1], query_vector=[0, 1, 0, 0], limit=1, offset=1)
+    assert [search.chunk.id for search in searches] == [3]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_lexical_search_ranks_with_bm25(tmp_path):
+    """Test that the lexical search ranks the chunks with BM25."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[
+            _make_chunk(chunk_id=1, document_id=1, content="The cat sleeps on the sofa", embedding=[1, 0, 0, 0]),
+            _make_chunk(chunk_id=2, document_id=1, content="Cat, cat and CAT!", embedding=[0, 1, 0, 0]),
+            _make_chunk(chunk_id=3, document_id=1, content="A dog in the garden", embedding=[0, 0, 1, 0]),
+        ],
+    )
+
+    searches = await _search(store, method=SearchMethod.LEXICAL, query_prompt="cat")
+
+    assert [search.chunk.id for search in searches] == [2, 1]
+    assert all(search.method == SearchMethod.LEXICAL for search in searches)
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_fuses_both_rankings(tmp_path):
+    """Test that the hybrid search fuses the semantic and lexical rankings."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[
+            _make_chunk(chunk_id=1, document_id=1, content="cat", embedding=[1, 0, 0, 0]),
+            _make_chunk(chunk_id=2, document_id=1, content="dog", embedding=[0, 1, 0, 0]),
+            _make_chunk(chunk_id=3, document_id=1, content="cat and dog", embedding=[0.9, 0.1, 0, 0]),
+        ],
+    )
+
+    searches = await _search(store, method=SearchMethod.HYBRID, query_prompt="cat", query_vector=[1, 0, 0, 0], rff_k=20, limit=2)
+
+    assert {search.chunk.id for search in searches} == {1, 3}
+    assert all(search.method == SearchMethod.HYBRID for search in searches)
+    assert searches[0].score == pytest.approx(2 / 21)
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_search_filters_collections_visibility_and_metadata(tmp_path):
+    """Test that the search filters the chunks by collection, visibility and metadata."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[
+            _make_chunk(chunk_id=1, document_id=1, content="a", embedding=[1, 0, 0, 0], collection_id=1, user_id=1, metadata={"lang": "fr"}),
+            _make_chunk(chunk_id=1, document_id=2, content="b", embedding=[1, 0, 0, 0], collection_id=2, user_id=2, metadata={"lang": "en"}),
+            _make_chunk(
+                chunk_id=1,
+                document_id=3,
+                content="c",
+                embedding=[1, 0, 0, 0],
+                collection_id=3,
+                user_id=2,
+                visibility=CollectionVisibility.PUBLIC,
+                metadata={"lang": "english", "public": True},
+            ),
+        ],
+    )
+
+    async def search_document_ids(**kwargs) -> set[int]:
+        searches = await _search(store, method=SearchMethod.SEMANTIC, query_vector=[1, 0, 0, 0], **kwargs)
+        return {search.chunk.document_id for search in searches}
+
+    assert await search_document_ids(collection_ids=[2]) == {2}
+    assert await search_document_ids(user_id=1) == {1, 3}
+    assert await search_document_ids(document_ids=[1, 2]) == {1, 2}
+    assert await search_document_ids(metadata_filters=ComparisonFilter(key="lang", type=ComparisonFilterType.SW, value="en")) == {2, 3}
+    assert await search_document_ids(metadata_filters=ComparisonFilter(key="public", type=ComparisonFilterType.EQ, value=True)) == {3}
+
+    metadata_filters = CompoundFilter(
+        operator=CompoundFilterOperator.OR,
+        filters=[
+            ComparisonFilter(key="lang", type=ComparisonFilterType.EQ, value="fr"),
+            ComparisonFilter(key="lang", type=ComparisonFilterType.CO, value="glis"),
+        ],
+    )
+    assert await search_document_ids(metadata_filters=metadata_filters) == {1, 3}
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_replaced_deleted_and_counted(tmp_path):
+    """Test that the chunks are replaced, deleted and counted."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[_make_chunk(chunk_id=i, document_id=1, content=f"chunk {i}", embedding=[1, 0, 0, i]) for i in range(3)]
+        + [_make_chunk(chunk_id=0, document_id=2, content="other", embedding=[0, 1, 0, 0], collection_id=2)],
+    )
+    await store.upsert(client=None, chunks=[_make_chunk(chunk_id=1, document_id=1, content="updated", embedding=[0, 0, 1, 0])])
+
+    assert [chunk.content for chunk in await store.get_chunks(client=None, document_id=1)] == ["chunk 0", "updated", "chunk 2"]
+    assert await store.get_chunk_counts(client=None, document_ids=[1, 2, 3]) == {1: 3, 2: 1}
+    assert await store.get_last_chunk_id(client=None, document_id=1) == 2
+    assert await _search(store, method=SearchMethod.LEXICAL, query_prompt="chunk 1") != []
+
+    await store.delete_chunk(client=None, document_id=1, chunk_id=2)
+    assert [chunk.id for chunk in await store.get_chunks(client=None, document_id=1, offset=1)] == [1]
+    assert await store.get_last_chunk_id(client=None, document_id=1) == 1
+
+    await store.delete_collection(client=None, collection_id=2)
+    await store.delete_document(client=None, document_id=1)
+    assert await store.get_chunk_counts(client=None, document_ids=[1, 2]) == {}
+    assert await store.get_last_chunk_id(client=None, document_id=1) is None
+    assert await _search(store, method=SearchMethod.LEXICAL, query_prompt="chunk other updated") == []
+    assert store.postings == {}
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_chunks_of_deleted_user_are_deleted(tmp_path):
+    """Test that only the chunks owned by a deleted user are deleted."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[
+            _make_chunk(chunk_id=0, document_id=1, content="owned", embedding=[1, 0, 0, 0], user_id=1),
+            _make_chunk(chunk_id=0, document_id=2, content="other", embedding=[0, 1, 0, 0], collection_id=2, user_id=2),
+        ],
+    )
+
+    await store.delete_user(client=None, user_id=1)
+
+    assert await store.get_chunk_counts(client=None, document_ids=[1, 2]) == {2: 1}
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_persisted_and_compacted(tmp_path):
+    """Test that the chunks are persisted in the directory and compacted."""
+    store = await _create_store(directory=str(tmp_path))
+    await store.upsert(
+        client=None,
+        chunks=[
+            _make_chunk(chunk_id=i, document_id=1, content=f"chunk {i}", embedding=[1, i, 0, 0], user_id=None, visibility=None) for i in range(3)
+        ],  # fmt: off
+    )
+    await store.delete_chunk(client=None, document_id=1, chunk_id=0)
+    await store.close()
+
+    store = await _create_store(directory=str(tmp_path))
+
+    assert store.generation == 1
+    assert store.size == 2
+    assert sorted(os.listdir(tmp_path)) == ["chunks.1.jsonl", "embeddings.1.f32", "lock", "meta.json"]
+    assert await store.get_collection_assignments(client=None) == {1: {(None, None)}}
+
+    await store.update_collection(client=None, collection_id=1, user_id=3, visibility=CollectionVisibility.PUBLIC)
+    searches = await _search(store, method=SearchMethod.SEMANTIC, query_vector=[1, 2, 0, 0], user_id=4, limit=1)
+    assert [search.chunk.id for search in searches] == [2]
+    assert searches[0].score == pytest.approx(1.0)
+    await store.close()
+
+    store = await _create_store(directory=str(tmp_path))
+    assert await store.get_collection_assignments(client=None) == {1: {(3, CollectionVisibility.PUBLIC)}}
+    assert await store.get_collection_assignments(client=None, after=1) == {}
+    assert [chunk.id for chunk in await store.get_chunks(client=None, document_id=1)] == [1, 2]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_directory_is_locked_by_a_single_store(tmp_path):
+    """Test that the directory cannot be opened by a second store."""
+    store = await _create_store(directory=str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        await _create_store(directory=str(tmp_path))
+    await store.close()
+
+    with pytest.raises(AssertionError):
+        await LocalVectorStore(directory=str(tmp_path)).setup(client=None, vector_size=VECTOR_SIZE + 1)
+
+
+@pytest.mark.asyncio
+async def test_large_searches_fall_back_to_exhaustive_search_without_hnswlib(tmp_path, monkeypatch):
+    """Test that the large searches fall back to an exhaustive search if hnswlib is not installed."""
+    monkeypatch.setattr(LocalVectorStore, "_get_hnsw_index", lambda self: None)
+    store = await _create_store(directory=str(tmp_path), hnsw_threshold=2)
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(2000, VECTOR_SIZE)).astype(np.float32)
+    await store.upsert(
+        client=None,
+        chunks=[_make_chunk(chunk_id=i, document_id=1, content=f"chunk {i}", embedding=embedding) for i, embedding in enumerate(embeddings)],
+    )
+
+    searches = await _search(store, method=SearchMethod.SEMANTIC, query_vector=embeddings[42].tolist(), limit=3)
+
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ normalized[42]))[:3]
+    assert store.capacity >= 2000
+    assert [search.chunk.id for search in searches] == expected.tolist()
+    await store.close()
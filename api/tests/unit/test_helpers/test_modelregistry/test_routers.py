@@ -530,9 +530,28 @@ async def test_get_routers_master_user(postgres_session: AsyncSession, model_reg
     assert routers[0].user_id == 0
 
 
+def _routing_router() -> Router:
+    return Router(
+        id=42,
+        name="test-model",
+        user_id=0,
+        type=ModelType.TEXT_GENERATION,
+        aliases=["alias-name"],
+        load_balancing_strategy=RouterLoadBalancingStrategy.SHUFFLE,
+        vector_size=None,
+        max_context_length=4096,
+        cost_prompt_tokens=0.0,
+        cost_completion_tokens=0.0,
+        providers=0,
+        created=100,
+        updated=200,
+    )
+
+
 @pytest.mark.asyncio
 async def test_get_router_id_from_model_name_by_name(postgres_session: AsyncSession, model_registry: ModelRegistry):
-    postgres_session.execute = AsyncMock(return_value=_Result(scalar_one=42))
+    model_registry.get_routers = AsyncMock(return_value=[_routing_router()])
+    model_registry.get_providers = AsyncMock(return_value=[])
 
     router_id = await model_registry.get_router_id_from_model_name("test-model", postgres_session)
 
@@ -541,16 +560,18 @@ async def test_get_router_id_from_model_name_by_name(postgres_session: AsyncSess
 
 @pytest.mark.asyncio
 async def test_get_router_id_from_model_name_by_alias(postgres_session: AsyncSession, model_registry: ModelRegistry):
-    postgres_session.execute = AsyncMock(return_value=_Result(scalar_one=99))
+    model_registry.get_routers = AsyncMock(return_value=[_routing_router()])
+    model_registry.get_providers = AsyncMock(return_value=[])
 
     router_id = await model_registry.get_router_id_from_model_name("alias-name", postgres_session)
 
-    assert router_id == 99
+    assert router_id == 42
 
 
 @pytest.mark.asyncio
 async def test_get_router_id_from_model_name_not_found(postgres_session: AsyncSession, model_registry: ModelRegistry):
-    postgres_session.execute = AsyncMock(return_value=_Result(scalar_one=None))
+    model_registry.get_routers = AsyncMock(return_value=[_routing_router()])
+    model_registry.get_providers = AsyncMock(return_value=[])
 
     router_id = await model_registry.get_router_id_from_model_name("nonexistent", postgres_session)
 
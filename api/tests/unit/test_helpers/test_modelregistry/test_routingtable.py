@@ -0,0 +1,153 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from api.helpers.models._routingtable import RoutingTable
+from api.schemas.admin.providers import Provider, ProviderType
+from api.schemas.admin.routers import Router, RouterLoadBalancingStrategy
+from api.schemas.models import ModelType
+from api.sql.models import RouterAlias as RouterAliasTable
+from api.utils.variables import REDIS__ROUTING_TABLE_VERSION
+
+
+def _router(router_id: int, name: str, aliases: list[str]) -> Router:
+    return Router(
+        id=router_id,
+        name=name,
+        user_id=0,
+        type=ModelType.TEXT_GENERATION,
+        aliases=aliases,
+        load_balancing_strategy=RouterLoadBalancingStrategy.SHUFFLE,
+        vector_size=None,
+        max_context_length=4096,
+        cost_prompt_tokens=0.0,
+        cost_completion_tokens=0.0,
+        providers=1,
+        created=100,
+        updated=200,
+    )
+
+
+def _provider(provider_id: int, router_id: int) -> Provider:
+    return Provider(
+        id=provider_id,
+        router_id=router_id,
+        user_id=0,
+        type=ProviderType.OPENAI,
+        url="http://provider",
+        key=None,
+        timeout=10,
+        model_name="model",
+        qos_metric=None,
+    )
+
+
+@pytest.fixture
+def postgres_session():
+    return AsyncMock(spec=AsyncSession)
+
+
+@pytest.fixture
+def loader():
+    return AsyncMock(return_value=([_router(1, "model-a", ["alias-a"]), _router(2, "model-b", [])], [_provider(10, 1), _provider(11, 1)]))
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_served_from_memory_until_ttl(loader, postgres_session):
+    """Test that the lookups are served from memory until the TTL is elapsed."""
+    table = RoutingTable(ttl=60, loader=loader)
+
+    router = await table.get_router(name="alias-a", postgres_session=postgres_session)
+    router_id = await table.get_router_id(name="model-b", postgres_session=postgres_session)
+    providers = await table.get_providers(router_id=1, postgres_session=postgres_session)
+
+    assert router.id == 1
+    assert router_id == 2
+    assert [provider.id for provider in providers] == [10, 11]
+    assert await table.get_providers(router_id=2, postgres_session=postgres_session) == []
+    assert await table.get_router(name="unknown", postgres_session=postgres_session) is None
+    loader.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads_table(loader, postgres_session):
+    """Test that the table is reloaded after an invalidation."""
+    table = RoutingTable(ttl=60, loader=loader)
+    await table.get_router_id(name="model-a", postgres_session=postgres_session)
+
+    loader.return_value = ([_router(3, "model-c", [])], [])
+    table.invalidate()
+
+    assert await table.get_router_id(name="model-a", postgres_session=postgres_session) is None
+    assert await table.get_router_id(name="model-c", postgres_session=postgres_session) == 3
+    assert loader.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_zero_disables_cache(loader, postgres_session):
+    """Test that a TTL of 0 disables the cache."""
+    table = RoutingTable(ttl=0, loader=loader)
+
+    await table.get_router_id(name="model-a", postgres_session=postgres_session)
+    await table.get_router_id(name="model-a", postgres_session=postgres_session)
+
+    assert loader.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_keeps_table_expired(postgres_session):
+    """Test that a table invalidated while loading is kept expired."""
+    table = RoutingTable(ttl=60, loader=AsyncMock())
+
+    async def _load(session):
+        table.invalidate()  # concurrent write committed while loading
+        return [_router(1, "model-a", [])], []
+
+    table.loader = AsyncMock(side_effect=_load)
+    await table.refresh(postgres_session=postgres_session)
+
+    assert table.expires_at == 0.0
+    assert table.names == {"model-a": 1}
+
+
+def test_watch_invalidates_after_commit_on_routing_tables():
+    """Test that a commit on the routing tables invalidates the table."""
+    engine = create_engine("sqlite://")
+    RouterAliasTable.__table__.create(bind=engine)
+    sync_session_class = sessionmaker()
+    table = RoutingTable(ttl=60, loader=AsyncMock())
+    table.watch(session_factory=async_sessionmaker(sync_session_class=sync_session_class))
+
+    with sync_session_class(bind=engine) as session:
+        table.expires_at = float("inf")
+        session.execute(select(RouterAliasTable.value))
+        session.commit()
+        assert table.expires_at == float("inf")
+
+        session.execute(insert(RouterAliasTable).values(router_id=1, value="alias"))
+        session.rollback()
+        session.commit()
+        assert table.expires_at == float("inf")
+
+        session.execute(delete(RouterAliasTable).where(RouterAliasTable.router_id == 1))
+        session.commit()
+        assert table.expires_at == 0.0
+
+
+@pytest.mark.asyncio
+async def test_commit_publishes_to_version_channel():
+    """Test that a commit on the routing tables is published on the version channel."""
+    table = RoutingTable(ttl=60, loader=AsyncMock())
+    redis_client = MagicMock(incr=AsyncMock(return_value=3), publish=AsyncMock(), aclose=AsyncMock())
+    table.redis_client = redis_client
+
+    table._on_commit(MagicMock(info={table._session_info_key: True}))
+    await table.close()
+
+    redis_client.incr.assert_awaited_once_with(REDIS__ROUTING_TABLE_VERSION)
+    redis_client.publish.assert_awaited_once_with(REDIS__ROUTING_TABLE_VERSION, 3)
+    assert table.version == 3
+    assert table.expires_at == 0.0
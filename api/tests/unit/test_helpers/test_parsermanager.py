@@ -1,10 +1,14 @@
 import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+import os
 import threading
 import time
 from unittest.mock import MagicMock, patch
 
 from fastapi import UploadFile
+import pymupdf
 import pytest
 from starlette.datastructures import Headers
 
@@ -23,6 +27,14 @@ def create_binary_upload_file(content: bytes, filename: str, content_type: str)
     return UploadFile(filename=filename, file=BytesIO(content), headers=Headers({"content-type": content_type}))
 
 
+def create_pdf(pages: int) -> bytes:
+    """Helper function to create a PDF with one line of text per page."""
+    doc = pymupdf.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i}")
+    return doc.tobytes()
+
+
 class TestParserManagerDetectFileType:
     """Test file type detection logic."""
 
@@ -354,6 +366,143 @@ class TestParserManagerSemaphore:
         assert len(semaphore_used) == 0
 
 
+class TestParserManagerConversionProcesses:
+    """Test PDF conversion by page ranges in the conversion processes."""
+
+    @pytest.mark.asyncio
+    async def test_page_ranges_are_reassembled_in_order(self):
+        """Test that the markdown of the page ranges is concatenated in the page order, whatever the completion order."""
+        manager = ParserManager(processes=4, pages_per_task=2)
+        manager._executor = ThreadPoolExecutor(max_workers=4)
+        file = create_binary_upload_file(create_pdf(pages=5), "test.pdf", "application/pdf")
+
+        def mock_convert_pdf_pages(path, start, end, timeout):
+            time.sleep(0.05 * (5 - start))  # the last ranges are converted first
+            return f"[{start}-{end}]"
+
+        with patch("api.helpers._parsermanager._convert_pdf_pages", side_effect=mock_convert_pdf_pages):
+            result = await manager.parse(file=file)
+
+        assert result == "[0-2][2-4][4-5]"
+        manager._executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_document_uses_half_of_the_processes(self):
+        """Test that a document does not take all the conversion processes."""
+        manager = ParserManager(processes=4, pages_per_task=1)
+        manager._executor = ThreadPoolExecutor(max_workers=4)
+        file = create_binary_upload_file(create_pdf(pages=8), "test.pdf", "application/pdf")
+
+        concurrent_count = 0
+        max_concurrent_reached = 0
+        lock = threading.Lock()
+
+        def mock_convert_pdf_pages(path, start, end, timeout):
+            nonlocal concurrent_count, max_concurrent_reached
+            with lock:
+                concurrent_count += 1
+                max_concurrent_reached = max(max_concurrent_reached, concurrent_count)
+            time.sleep(0.05)
+            with lock:
+                concurrent_count -= 1
+            return ""
+
+        with patch("api.helpers._parsermanager._convert_pdf_pages", side_effect=mock_convert_pdf_pages):
+            await manager.parse(file=file)
+
+        assert max_concurrent_reached == 2
+        manager._executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_conversion_timeout(self):
+        """Test that a conversion exceeding the timeout fails."""
+        manager = ParserManager(processes=2, pages_per_task=1, timeout=0.1)
+        manager._executor = ThreadPoolExecutor(max_workers=2)
+        file = create_binary_upload_file(create_pdf(pages=2), "test.pdf", "application/pdf")
+
+        with patch("api.helpers._parsermanager._convert_pdf_pages", side_effect=lambda *args: time.sleep(0.5)):
+            with pytest.raises(TimeoutError):
+                await manager.parse(file=file)
+
+        manager._executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_pdf_is_converted_by_processes(self):
+        """Test the conversion of a PDF by the conversion processes."""
+        manager = ParserManager(processes=2, pages_per_task=1, timeout=60, max_memory=4096)
+        manager.setup()
+        file = create_binary_upload_file(create_pdf(pages=3), "test.pdf", "application/pdf")
+
+        try:
+            result = await manager.parse(file=file)
+        finally:
+            manager.close()
+
+        assert [line.strip() for line in result.split("\n\n") if line.strip()] == ["Page 0", "Page 1", "Page 2"]
+
+    @pytest.mark.asyncio
+    async def test_broken_pool_is_restarted(self):
+        """Test that a broken pool of conversion processes fails the document being converted and is replaced for the next documents."""
+        manager = ParserManager(processes=2, pages_per_task=1)
+        broken_executor = MagicMock(spec=ProcessPoolExecutor)
+        broken_executor.submit.side_effect = BrokenProcessPool("A process in the process pool was terminated abruptly.")
+        manager._executor = broken_executor
+        file = create_binary_upload_file(create_pdf(pages=2), "test.pdf", "application/pdf")
+
+        with patch.object(manager, "_create_executor", return_value=ThreadPoolExecutor(max_workers=2)):
+            with pytest.raises(BrokenProcessPool):
+                await manager.parse(file=file)
+
+        broken_executor.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        assert manager._executor is not broken_executor
+
+        with patch("api.helpers._parsermanager._convert_pdf_pages", side_effect=lambda path, start, end, timeout: f"[{start}-{end}]"):
+            assert await manager.parse(file=file) == "[0-1][1-2]"
+
+        manager._executor.shutdown()
+
+
+class TestParserManagerUploadPath:
+    """Test the path of the uploads read by PyMuPDF."""
+
+    @pytest.mark.asyncio
+    async def test_upload_in_memory_is_copied_in_spool_directory(self, tmp_path):
+        """Test that an upload without path is copied in a temporary file, removed after the parsing."""
+        manager = ParserManager(spool_directory=str(tmp_path))
+        file = create_binary_upload_file(b"%PDF-1.4 content", "test.pdf", "application/pdf")
+        file.file.read()  # the upload may have been read before
+
+        async with manager._get_path(file=file) as path:
+            assert os.path.dirname(path) == str(tmp_path)
+            assert open(path, "rb").read() == b"%PDF-1.4 content"
+
+        assert not os.path.exists(path)
+
+    @pytest.mark.asyncio
+    async def test_upload_stored_on_disk_is_not_copied(self, tmp_path):
+        """Test that an upload stored in a file is read from its path."""
+        manager = ParserManager(spool_directory=str(tmp_path / "spool"))
+        (tmp_path / "upload").write_bytes(b"%PDF-1.4 content")
+
+        with open(tmp_path / "upload", "rb") as upload:
+            file = UploadFile(filename="test.pdf", file=upload, headers=Headers({"content-type": "application/pdf"}))
+            async with manager._get_path(file=file) as path:
+                assert path == str(tmp_path / "upload")
+
+        assert os.path.exists(tmp_path / "upload")
+
+    @pytest.mark.asyncio
+    async def test_pdf_is_converted_from_disk(self):
+        """Test that the PDF is opened from its path, without reading the upload in memory."""
+        manager = ParserManager()
+        file = create_binary_upload_file(create_pdf(pages=2), "test.pdf", "application/pdf")
+
+        with patch.object(file, "read", side_effect=AssertionError("upload read in memory")):
+            result = await manager.parse(file=file)
+
+        assert "Page 0" in result and "Page 1" in result
+
+
 class TestParserManagerEdgeCases:
     """Test edge cases and integration scenarios."""
 
@@ -0,0 +1,39 @@
+import pytest
+
+from api.helpers._routingresultsubscriber import RoutingResultSubscriber
+from api.utils.variables import PREFIX__CELERY_ROUTING_RESULT
+
+
+class TestRoutingResultSubscriber:
+    def test_channel_is_unique_per_worker(self):
+        """Test that the reply channel is unique per worker."""
+        # Given
+        first, second = RoutingResultSubscriber(), RoutingResultSubscriber()
+        # Then
+        assert first.channel.startswith(f"{PREFIX__CELERY_ROUTING_RESULT}:")
+        assert first.channel != second.channel
+
+    @pytest.mark.asyncio
+    async def test_resolve_sets_result_of_registered_task(self):
+        """Test that resolve sets the result of a registered task."""
+        # Given
+        subscriber = RoutingResultSubscriber()
+        future = subscriber.register(task_id="task-1")
+        # When
+        subscriber._resolve(task_id="task-1", result={"status_code": 200, "provider_id": 1})
+        subscriber._resolve(task_id="task-2", result={"status_code": 200, "provider_id": 2})
+        # Then
+        assert future.result() == {"status_code": 200, "provider_id": 1}
+        assert subscriber.futures == {}
+
+    @pytest.mark.asyncio
+    async def test_discard_ignores_late_result(self):
+        """Test that the result of a discarded task is ignored."""
+        # Given
+        subscriber = RoutingResultSubscriber()
+        future = subscriber.register(task_id="task-1")
+        # When
+        subscriber.discard(task_id="task-1")
+        subscriber._resolve(task_id="task-1", result={"status_code": 200, "provider_id": 1})
+        # Then
+        assert not future.done()
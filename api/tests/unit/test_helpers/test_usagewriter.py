@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime
+import json
+import os
+from unittest.mock import AsyncMock
+
+import pytest
+
+from api.helpers._usagewriter import UsageWriter
+from api.sql.models import Usage as UsageTable
+
+
+def _usage(user_id: int = 1) -> UsageTable:
+    return UsageTable(created=datetime(2025, 1, 1), user_id=user_id, endpoint="/v1/chat/completions", method="POST", status=200)
+
+
+def _inserted_rows(execute: AsyncMock) -> list[dict]:
+    return [row for call in execute.await_args_list for row in call.args[1]]
+
+
+@pytest.mark.asyncio
+async def test_usages_are_inserted_in_batches(session_factory, postgres_session):
+    """Test that the queued usages are inserted in batches of `batch_size` rows."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=2, flush_interval=1000)
+
+    for user_id in range(3):
+        writer.put(usage=_usage(user_id=user_id))
+    writer.setup()
+    await writer.close()
+
+    assert execute.await_count == 2
+    assert [len(call.args[1]) for call in execute.await_args_list] == [2, 1]
+    assert [row["user_id"] for row in _inserted_rows(execute)] == [0, 1, 2]
+    assert "id" not in _inserted_rows(execute)[0]
+
+
+@pytest.mark.asyncio
+async def test_usages_are_flushed_after_interval(session_factory, postgres_session):
+    """Test that a queued usage is inserted once the flush interval is elapsed."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=100, flush_interval=10)
+    writer.setup()
+
+    writer.put(usage=_usage())
+    await asyncio.sleep(0.1)
+
+    execute.assert_awaited_once()
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_usages_are_dropped_when_queue_is_full(session_factory, postgres_session):
+    """Test that a usage is dropped when the queue is full and there is no spill directory."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=1, batch_size=10, flush_interval=1000)
+
+    writer.put(usage=_usage(user_id=1))
+    writer.put(usage=_usage(user_id=2))
+    writer.setup()
+    await writer.close()
+
+    assert [row["user_id"] for row in _inserted_rows(execute)] == [1]
+
+
+@pytest.mark.asyncio
+async def test_usages_are_spilled_and_replayed(tmp_path, session_factory, postgres_session):
+    """Test that the usages which cannot be inserted are spilled and inserted back after the next successful write."""
+    execute = postgres_session.execute
+    execute.side_effect = [ConnectionError("database down"), None, None]
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=10, flush_interval=1000, spill_directory=str(tmp_path))  # fmt: off
+
+    writer.put(usage=_usage(user_id=1))
+    writer.setup()
+    await writer.close()
+
+    assert len(list(tmp_path.iterdir())) == 1
+
+    writer.put(usage=_usage(user_id=2))
+    writer.setup()
+    await writer.close()
+
+    rows = _inserted_rows(execute)
+    assert [row["user_id"] for row in rows] == [1, 2, 1]
+    assert rows[-1]["created"] == datetime(2025, 1, 1)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_usages_are_spilled_when_queue_is_full(tmp_path, session_factory, postgres_session):
+    """Test that a usage is spilled when the queue is full and inserted back by the writer."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=1, batch_size=10, flush_interval=1000, spill_directory=str(tmp_path))  # fmt: off
+
+    writer.put(usage=_usage(user_id=1))
+    writer.put(usage=_usage(user_id=2))
+    writer.setup()
+    await writer.close()
+
+    assert sorted(row["user_id"] for row in _inserted_rows(execute)) == [1, 2]
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_claimed_spill_file_is_kept_until_inserted(tmp_path, session_factory, postgres_session):
+    """Test that the usages of a spill file claimed by a worker stopped before their insertion are replayed again."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=10, flush_interval=1000, spill_directory=str(tmp_path))  # fmt: off
+    (tmp_path / "usage-1.jsonl").write_text('{"user_id": 1, "created": "2025-01-01 00:00:00"}\n')
+    (tmp_path / "usage-2.jsonl.4194305.replay").write_text('{"user_id": 2, "created": "2025-01-01 00:00:00"}\n')  # not running worker
+
+    execute.side_effect = asyncio.CancelledError()
+    with pytest.raises(asyncio.CancelledError):
+        await writer._replay()
+    assert len(list(tmp_path.iterdir())) == 2
+
+    execute.reset_mock(side_effect=True)
+    await writer._replay()
+
+    assert sorted(row["user_id"] for row in _inserted_rows(execute)) == [1, 2]
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_claimed_spill_file_is_spilled_again_on_failure(tmp_path, session_factory, postgres_session):
+    """Test that the usages of a spill file which cannot be inserted are spilled again before the file is removed."""
+    execute = postgres_session.execute
+    execute.side_effect = [None, ConnectionError("database down")]
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=1, flush_interval=1000, spill_directory=str(tmp_path))  # fmt: off
+    (tmp_path / "usage-1.jsonl").write_text("".join(f'{{"user_id": {i}, "created": "2025-01-01 00:00:00"}}\n' for i in range(3)))
+
+    await writer._replay()
+
+    assert [path.name for path in tmp_path.iterdir()] == [os.path.basename(writer.spill_file)]
+    assert [json.loads(line)["user_id"] for line in open(writer.spill_file, encoding="utf-8")] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_corrupt_spill_file_is_quarantined(tmp_path, session_factory, postgres_session):
+    """Test that a spill file that cannot be read is moved aside without stopping the replay of the other files."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=10, flush_interval=1000, spill_directory=str(tmp_path))  # fmt: off
+    (tmp_path / "usage-1.jsonl").write_text("not json\n")
+    (tmp_path / "usage-2.jsonl").write_text('{"user_id": 3}\n')
+    (tmp_path / "usage-3.jsonl").write_text('{"user_id": 4, "created": "2025-01-01 00:00:00"}\n')
+
+    writer.put(usage=_usage(user_id=1))
+    writer.setup()
+    await writer.close()
+
+    assert sorted(row["user_id"] for row in _inserted_rows(execute)) == [1, 4]
+    assert sorted(path.name.split(".")[0] for path in tmp_path.iterdir()) == ["usage-1", "usage-2"]
+    assert all(path.name.endswith(UsageWriter.QUARANTINE_FILE_SUFFIX) for path in tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_writer_survives_unexpected_errors(session_factory, postgres_session):
+    """Test that an unexpected error does not stop the background writer."""
+    execute = postgres_session.execute
+    writer = UsageWriter(session_factory=session_factory, queue_size=10, batch_size=1, flush_interval=1000)
+    writer._replay = AsyncMock(side_effect=[RuntimeError("boom"), None])
+
+    writer.put(usage=_usage(user_id=1))
+    writer.put(usage=_usage(user_id=2))
+    writer.setup()
+    await writer.close()
+
+    assert [row["user_id"] for row in _inserted_rows(execute)] == [1, 2]
@@ -0,0 +1,55 @@
+import base64
+
+import numpy as np
+
+from api.utils.embeddings import decode_embeddings, encode_embedding
+from api.utils.lifespan import OrjsonNdjsonSerializer
+
+
+class TestEncodeEmbedding:
+    def test_encodes_little_endian_float32(self):
+        """Test that the embeddings are encoded as little-endian float32."""
+        # Given
+        embedding = [0.5, -1.0, 2.0]
+        # When
+        encoded = encode_embedding(embedding=embedding)
+        # Then
+        assert base64.b64decode(encoded) == np.array(embedding, dtype="<f4").tobytes()
+        assert len(base64.b64decode(encoded)) == 4 * len(embedding)
+
+
+class TestDecodeEmbeddings:
+    def test_decodes_base64_batch_into_float32_array(self):
+        """Test that a batch of base64 embeddings is decoded into a float32 array."""
+        # Given
+        embeddings = [encode_embedding(embedding=[0.1, 0.2]), encode_embedding(embedding=[0.3, 0.4])]
+        # When
+        decoded = decode_embeddings(embeddings=embeddings)
+        # Then
+        assert decoded.dtype == np.float32
+        assert decoded.shape == (2, 2)
+        np.testing.assert_allclose(decoded, [[0.1, 0.2], [0.3, 0.4]], rtol=1e-6)
+
+    def test_decodes_float_lists(self):
+        """Test that a batch of float lists is decoded into a float32 array."""
+        # When
+        decoded = decode_embeddings(embeddings=[[0.1, 0.2], [0.3, 0.4]])
+        # Then
+        assert decoded.dtype == np.float32
+        assert decoded.shape == (2, 2)
+
+    def test_decodes_empty_batch(self):
+        """Test that an empty batch is decoded into an empty array."""
+        # When / Then
+        assert decode_embeddings(embeddings=[]).shape == (0, 0)
+
+
+class TestOrjsonNdjsonSerializer:
+    def test_serializes_float32_arrays_without_widening(self):
+        """Test that the float32 arrays are serialized without widening to float64."""
+        # Given
+        actions = [{"index": {"_id": "1"}}, {"embedding": np.array([0.1, 0.2], dtype=np.float32)}]
+        # When
+        body = OrjsonNdjsonSerializer().dumps(actions)
+        # Then
+        assert body == b'{"index":{"_id":"1"}}\n{"embedding":[0.1,0.2]}\n'
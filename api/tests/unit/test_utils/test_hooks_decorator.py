@@ -0,0 +1,132 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+import pytest
+
+from api.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
+from api.schemas.me.info import UserInfo
+from api.utils.context import global_context, request_context
+from api.utils.hooks_decorator import HooksMiddleware, hooks
+
+
+def _create_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(HooksMiddleware)
+
+    # set the user as the access controller dependency
+    def authenticate(user_id: int = 1) -> None:
+        context = request_context.get()
+        context.user_info = UserInfo(id=user_id, email="user@example.com", budget=10.0, permissions=[], limits=[], created=0, updated=0)
+        context.usage.cost = 0.5
+
+    @app.get("/unstreamed", dependencies=[Depends(authenticate)])
+    @hooks
+    async def unstreamed(request: Request):
+        return {"status": "ok"}
+
+    @app.get("/streamed", dependencies=[Depends(authenticate)])
+    @hooks
+    async def streamed(request: Request):
+        async def stream():
+            yield b"data: 1\n\n", 200
+            yield b'{"detail": "Model is too busy"}', 503
+
+        return StreamingResponseWithStatusCode(content=stream(), media_type="text/event-stream")
+
+    @app.get("/failed", dependencies=[Depends(authenticate)])
+    @hooks
+    async def failed(request: Request):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    return app
+
+
+class TestHooksMiddleware:
+    @pytest.fixture(autouse=True)
+    def context(self):
+        usage_writer = MagicMock()
+        budget_manager = MagicMock(consume=AsyncMock())
+        with patch.object(global_context, "usage_writer", usage_writer), patch.object(global_context, "budget_manager", budget_manager):
+            yield usage_writer, budget_manager
+
+    def test_logs_usage_once_response_is_sent(self, context):
+        """Test that the usage is logged once the response has been sent."""
+        # Given
+        usage_writer, budget_manager = context
+        # When
+        response = TestClient(_create_app()).get("/unstreamed")
+        # Then
+        assert response.status_code == 200
+        usage = usage_writer.put.call_args.kwargs["usage"]
+        assert usage.status == 200
+        assert usage.user_id == 1
+        assert usage.endpoint == "/unstreamed"
+        budget_manager.consume.assert_awaited_once_with(user_id=1, cost=0.5, budget=10.0)
+
+    def test_logs_mid_stream_error_status(self, context):
+        """Test that the status of an error raised during a stream is logged."""
+        # Given
+        usage_writer, _ = context
+        # When
+        response = TestClient(_create_app()).get("/streamed")
+        # Then
+        assert response.status_code == 200
+        assert usage_writer.put.call_args.kwargs["usage"].status == 503
+
+    def test_logs_http_exception_status(self, context):
+        """Test that the status of an HTTP exception is logged."""
+        # Given
+        usage_writer, _ = context
+        # When
+        response = TestClient(_create_app()).get("/failed")
+        # Then
+        assert response.status_code == 404
+        assert usage_writer.put.call_args.kwargs["usage"].status == 404
+
+    def test_skips_master_user(self, context):
+        """Test that the usage of the master user is not logged."""
+        # Given
+        usage_writer, budget_manager = context
+        # When
+        TestClient(_create_app()).get("/unstreamed", params={"user_id": 0})
+        # Then
+        usage_writer.put.assert_not_called()
+        budget_manager.consume.assert_not_called()
+
+
+class TestStreamingResponseWithStatusCode:
+    @pytest.mark.asyncio
+    async def test_client_disconnection_cancels_pending_stream(self):
+        """Test that a client disconnection cancels the pending stream."""
+        # Given
+        closed = asyncio.Event()
+
+        async def stream():
+            try:
+                yield b"data: 1\n\n", 200
+                await asyncio.sleep(60)  # waiting for the provider
+                yield b"data: 2\n\n", 200
+            finally:
+                closed.set()
+
+        messages = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message.get("body") == b"data: 1\n\n":
+                disconnected.set()
+
+        response = StreamingResponseWithStatusCode(content=stream(), media_type="text/event-stream")
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        # When
+        await asyncio.wait_for(response(scope, receive, send), timeout=1)
+        # Then
+        assert closed.is_set()
+        assert [message["type"] for message in messages] == ["http.response.start", "http.response.body"]
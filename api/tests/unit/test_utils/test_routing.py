@@ -0,0 +1,72 @@
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from api.tasks.routing import notify_routing_result
+from api.utils.exceptions import ModelIsTooBusyException
+from api.utils.routing import _wait_routing_result
+
+
+class TestWaitRoutingResult:
+    @pytest.mark.asyncio
+    async def test_returns_notified_result_without_polling(self):
+        """Test that the result notified by the reply channel is returned without polling."""
+        # Given
+        future = asyncio.get_running_loop().create_future()
+        future.set_result({"status_code": 200, "provider_id": 1})
+        # When
+        with patch("api.utils.routing.AsyncResult") as MockAsyncResult:
+            result = await _wait_routing_result(task_id="task-1", future=future, max_retries=3, retry_countdown=1)
+        # Then
+        assert result == {"status_code": 200, "provider_id": 1}
+        MockAsyncResult.return_value.ready.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_result_backend(self):
+        """Test that the result is read from the result backend if it is not notified."""
+        # Given
+        async_result = MagicMock(result={"status_code": 200, "provider_id": 2})
+        async_result.ready.return_value = True
+        # When
+        with patch("api.utils.routing.AsyncResult", return_value=async_result):
+            result = await _wait_routing_result(task_id="task-1", future=None, max_retries=3, retry_countdown=1)
+        # Then
+        assert result == {"status_code": 200, "provider_id": 2}
+
+    @pytest.mark.asyncio
+    async def test_raises_when_task_does_not_return(self):
+        """Test that an exception is raised if the task does not return in time."""
+        # Given
+        async_result = MagicMock()
+        async_result.ready.return_value = False
+        # When / Then
+        with patch("api.utils.routing.AsyncResult", return_value=async_result):
+            with pytest.raises(ModelIsTooBusyException):
+                await _wait_routing_result(task_id="task-1", future=None, max_retries=1, retry_countdown=0)
+
+
+class TestNotifyRoutingResult:
+    def test_publishes_result_on_reply_channel(self):
+        """Test that the result of a task is published on its reply channel."""
+        # Given
+        redis_client = MagicMock()
+        # When
+        with patch("api.tasks.routing.get_redis_client", return_value=redis_client):
+            notify_routing_result(
+                task_id="task-1", kwargs={"reply_channel": "channel"}, retval={"status_code": 200, "provider_id": 1}, state="SUCCESS"
+            )
+        # Then
+        redis_client.publish.assert_called_once_with("channel", json.dumps({"task_id": "task-1", "result": {"status_code": 200, "provider_id": 1}}))
+
+    def test_does_not_publish_retried_task(self):
+        """Test that the result of a retried task is not published."""
+        # Given
+        redis_client = MagicMock()
+        # When
+        with patch("api.tasks.routing.get_redis_client", return_value=redis_client):
+            notify_routing_result(task_id="task-1", kwargs={"reply_channel": "channel"}, retval=None, state="RETRY")
+            notify_routing_result(task_id="task-1", kwargs={}, retval={"status_code": 200, "provider_id": 1}, state="SUCCESS")
+        # Then
+        redis_client.publish.assert_not_called()
@@ -0,0 +1,60 @@
+import math
+import random
+from unittest.mock import MagicMock
+
+from api.utils.sketch import (
+    SKETCH_RELATIVE_ACCURACY,
+    SKETCH_SLOT_SECONDS,
+    add_to_sketch,
+    get_sketch_bucket,
+    get_sketch_keys,
+    get_sketch_quantile,
+)
+from api.utils.variables import PREFIX__REDIS_METRIC_SKETCH, REDIS__TIMESERIE_RETENTION_SECONDS
+
+
+class TestGetSketchKeys:
+    def test_keys_cover_retention_window(self):
+        """Test that the keys of a sketch cover its retention window."""
+        # Given
+        now = SKETCH_SLOT_SECONDS * 1000 + 5
+        # When
+        keys = get_sketch_keys(metric="ttft", provider_id=1, now=now)
+        # Then
+        assert keys[-1] == f"{PREFIX__REDIS_METRIC_SKETCH}:ttft:1:1000"
+        assert len(keys) == REDIS__TIMESERIE_RETENTION_SECONDS // SKETCH_SLOT_SECONDS + 1
+
+
+class TestAddToSketch:
+    def test_add_to_sketch_increments_bucket_of_current_slot(self):
+        """Test that a value increments its bucket in the slot of the current time."""
+        # Given
+        pipeline = MagicMock()
+        # When
+        add_to_sketch(pipeline, metric="ttft", provider_id=1, value=250)
+        # Then
+        key, bucket, increment = pipeline.hincrby.call_args.args
+        assert key.startswith(f"{PREFIX__REDIS_METRIC_SKETCH}:ttft:1:")
+        assert (bucket, increment) == (get_sketch_bucket(value=250), 1)
+        pipeline.expire.assert_called_once_with(key, REDIS__TIMESERIE_RETENTION_SECONDS + SKETCH_SLOT_SECONDS)
+
+
+class TestGetSketchQuantile:
+    def test_empty_sketch_returns_none(self):
+        """Test that the quantile of an empty sketch is None."""
+        assert get_sketch_quantile(slots=[{}, {}], quantile=0.95) is None
+
+    def test_quantile_is_within_relative_accuracy(self):
+        """Test that the quantile is within the relative accuracy of the sketch."""
+        # Given
+        random.seed(0)
+        values = [random.randint(1, 5000) for _ in range(1000)]
+        slots = [{}, {}]
+        for i, value in enumerate(values):
+            bucket = str(get_sketch_bucket(value=value)).encode()
+            slots[i % 2][bucket] = slots[i % 2].get(bucket, 0) + 1
+        # When
+        estimate = get_sketch_quantile(slots=slots, quantile=0.95)
+        # Then
+        expected = sorted(values)[math.ceil(0.95 * len(values)) - 1]
+        assert abs(estimate - expected) <= SKETCH_RELATIVE_ACCURACY * expected
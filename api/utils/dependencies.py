@@ -7,8 +7,9 @@ import redis.asyncio as redis
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
+from api.helpers._ingestionworker import IngestionWorker
 from api.helpers._usagemanager import UsageManager
 from api.helpers.models import ModelRegistry
 from api.schemas.core.context import RequestContext
@@ -69,15 +70,15 @@ def get_elasticsearch_client() -> AsyncElasticsearch:
     return global_context.elasticsearch_client
 
 
-def get_elasticsearch_vector_store(required: bool = True) -> ElasticsearchVectorStore:
+def get_vector_store(required: bool = True) -> BaseVectorStore:
     """
-    Get the ElasticsearchVectorStore instance from the global context.
+    Get the vector store instance from the global context.
     """
 
-    if required and not global_context.elasticsearch_vector_store:
+    if required and not global_context.vector_store:
         raise FeatureNotEnabledException()
 
-    return global_context.elasticsearch_vector_store
+    return global_context.vector_store
 
 
 def get_model_registry() -> ModelRegistry:
@@ -108,3 +109,11 @@ def get_document_manager() -> DocumentManager:
     """
 
     return global_context.document_manager
+
+
+def get_ingestion_worker() -> IngestionWorker | None:
+    """
+    Get the IngestionWorker instance from the global context, None if the documents are ingested during the upload request.
+    """
+
+    return global_context.ingestion_worker
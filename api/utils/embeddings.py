@@ -0,0 +1,37 @@
+"""
+Base64 encoding of the embeddings, as done by the OpenAI API: each vector is serialized as little-endian float32 and
+encoded in base64, which is about 4 times smaller than the JSON list of floats and is decoded without parsing floats.
+"""
+
+import base64
+
+import numpy as np
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def encode_embedding(embedding: list[float]) -> str:
+    """
+    Encode an embedding in base64.
+
+    Args:
+        embedding(list[float]): The embedding vector
+    """
+    return base64.b64encode(np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()).decode()
+
+
+def decode_embeddings(embeddings: list[str | list[float]]) -> np.ndarray:
+    """
+    Decode a batch of embeddings into a float32 array of shape (number of embeddings, dimensions).
+
+    Args:
+        embeddings(list[str | list[float]]): The embeddings, encoded in base64 or as lists of floats if the provider does not support base64
+    """
+    if not embeddings:
+        return np.empty(shape=(0, 0), dtype=np.float32)
+
+    if isinstance(embeddings[0], str):
+        buffer = b"".join(base64.b64decode(embedding) for embedding in embeddings)
+        return np.frombuffer(buffer, dtype=EMBEDDING_DTYPE).reshape(len(embeddings), -1).astype(np.float32, copy=False)
+
+    return np.asarray(embeddings, dtype=np.float32)
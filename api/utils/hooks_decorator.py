@@ -1,71 +1,78 @@
-import asyncio
 from datetime import datetime
 import functools
 import logging
 
-from fastapi import HTTPException, Request, Response
-from sqlalchemy import func, select, update
-from starlette.responses import StreamingResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from api.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
-from api.sql.models import Usage, User
-from api.utils.configuration import configuration
-from api.utils.context import request_context
-from api.utils.dependencies import get_postgres_session
+from api.schemas.core.context import RequestContext
+from api.schemas.usage import Usage
+from api.sql.models import Usage as UsageTable
+from api.utils.context import global_context, request_context
 
 logger = logging.getLogger(__name__)
 
 
 def hooks(func):
     """
-    Extracts usage information from the request and response and logs it to the database.
-    This decorator is designed to be used with FastAPI endpoints.
-    It captures the request method, endpoint, user ID, token ID, model name, prompt tokens,
-    completion tokens, and the duration of the request.
+    Marks a FastAPI endpoint to log its usage to the database and to update the user budget.
+    The usage is collected in the request context while the request is processed, and is logged by the HooksMiddleware
+    once the response has been sent, so streamed responses are not wrapped.
     """
 
     @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        usage = Usage(created=datetime.now(), endpoint="N/A")
-
-        # get the request context (initial values)
         context = request_context.get()
         if context.user_info is None:
             logger.info(f"No user ID found in request, skipping usage logging ({context.endpoint}).")
-            return await func(*args, **kwargs)
-        if context.user_info.id == 0:
+        elif context.user_info.id == 0:
             logger.info(f"Master user ID found in request, skipping usage logging ({context.endpoint}).")
-            return await func(*args, **kwargs)
+        else:
+            context.log_usage = True
 
-        # find the request object
-        request = next((arg for arg in args if isinstance(arg, Request)), None)
-        if not request:
-            request = kwargs.get("request", None)
-        if not request:
-            raise Exception("No request found in args or kwargs")
+        return await func(*args, **kwargs)
 
-        # extract usage from response
-        response = None  # initialize in case of early exception not from func
-        try:
-            # call the endpoint
-            response = await func(*args, **kwargs)
+    return wrapper
 
-            if isinstance(response, StreamingResponse):
-                return wrap_streaming_response(response=response, usage=usage)
 
-            else:
-                return wrap_unstreaming_response(response=response, usage=usage)
+class HooksMiddleware:
+    """
+    ASGI middleware setting the request context of each request and logging the usage of the endpoints decorated by
+    `hooks` once the response has been sent, whether it is complete, failed or abandoned by the client.
+    The response messages are only observed to get the status code, the response body is not wrapped.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-        except HTTPException as e:
-            usage = set_usage_from_context(usage=usage)
-            usage.status = e.status_code
-            asyncio.create_task(log_usage(usage=usage))
-            raise e  # Re-raise the exception for FastAPI to handle
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    return wrapper
+        context = RequestContext(method=scope["method"], endpoint=scope["path"], usage=Usage())
+        request_context.set(context)
+        usage = UsageTable(created=datetime.now(), endpoint="N/A")
+        status_code = 500  # if the response has not been started
 
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-def set_usage_from_context(usage: Usage):
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await release_inflight_reservations()
+            if context.log_usage:
+                usage = set_usage_from_context(usage=usage)
+                usage.status = context.status_code or status_code
+
+                log_usage(usage=usage)
+                await update_budget(usage=usage)
+
+
+def set_usage_from_context(usage: UsageTable):
     context = request_context.get()
     usage.user_id = context.user_info.id
     usage.user_email = context.user_info.email
@@ -89,106 +96,47 @@ def set_usage_from_context(usage: Usage):
     return usage
 
 
-def wrap_unstreaming_response(response: Response, usage: Usage) -> Response:
-    """
-    Wrap a non-streaming response to capture the final status code and log usage.
-    Usage data is already populated from request_context, so no parsing is needed.
-    """
-
-    usage = set_usage_from_context(usage=usage)
-    usage.status = response.status_code
-
-    asyncio.create_task(log_usage(usage=usage))
-    asyncio.create_task(update_budget(usage=usage))
-
-    return response
-
-
-def wrap_streaming_response(response: StreamingResponse, usage: Usage) -> StreamingResponseWithStatusCode:
+async def release_inflight_reservations():
     """
-    Wrap a streaming response to capture the final status code and log usage.
-    Usage data is already populated from request_context, so no parsing is needed.
+    Releases the inflight request slots reserved by the admission queue and not used by the request, e.g. when the
+    request failed before being forwarded to the provider.
     """
-    original_stream = response.body_iterator
-
-    async def wrapped_stream():
-        nonlocal usage
-        response_status_code = None
-
-        try:
-            async for chunk in original_stream:
-                if isinstance(chunk, tuple):
-                    response_status_code = chunk[1]
-
-                yield chunk
-        finally:
-            if response_status_code is not None:
-                usage.status = response_status_code
-
-            usage = set_usage_from_context(usage=usage)
-
-            asyncio.create_task(log_usage(usage=usage))
-            asyncio.create_task(update_budget(usage=usage))
+    context = request_context.get()
+    if not context.inflight_reservations or global_context.admission_queue is None:
+        return
 
-    return StreamingResponseWithStatusCode(wrapped_stream(), media_type=response.media_type)
+    for provider_id in context.inflight_reservations:
+        await global_context.admission_queue.release(provider_id=provider_id)
+    context.inflight_reservations.clear()
 
 
-async def log_usage(usage: Usage):
+def log_usage(usage: UsageTable):
     """
-    Logs the usage information to the database.
-    This function captures the duration of the request and sets the status code of the response if available.
+    Queues the usage information to be written to the database by the usage writer of the worker.
     """
 
-    if configuration.settings.monitoring_postgres_enabled is False:
+    if global_context.usage_writer is None:
         return
 
-    async for postgres_session in get_postgres_session():
-        postgres_session.add(usage)
-        try:
-            await postgres_session.commit()
-        except Exception as e:
-            logger.error(f"Failed to log usage: {e}")
-            await postgres_session.rollback()
+    global_context.usage_writer.put(usage=usage)
 
 
-async def update_budget(usage: Usage):
+async def update_budget(usage: UsageTable):
     """
     Updates the budget of the user by decreasing it by the calculated cost.
-    Retrieves the current user budget, and decreases it by min(usage.budget, current_budget_value).
-    Uses row-level locking to prevent concurrency issues.
+    The budget is decreased in Redis, without going below 0, and periodically written in the database by the budget manager.
     """
     # Check if there's a budget cost to deduct
     if usage.cost is None or usage.cost == 0:
         return
 
-    user_id = usage.user_id
-    cost = usage.cost
-
-    if not user_id:
+    if not usage.user_id:
         logger.warning("No user_id found in usage object for budget update")
         return
 
-    # Decrease the user's budget by the calculated cost with proper locking
-    async for postgres_session in get_postgres_session():
-        try:
-            async with postgres_session.begin():
-                # Use SELECT FOR UPDATE to lock the user row during the transaction. This prevents concurrent modifications to the budget
-                select_stmt = select(User.budget).where(User.id == user_id).with_for_update()
-                result = await postgres_session.execute(select_stmt)
-                current_budget = result.scalar_one_or_none()
-
-                if current_budget is None or current_budget == 0:
-                    return
-
-                # Calculate the actual cost to deduct (minimum of requested cost and available budget)
-                actual_cost = min(cost, current_budget)
-                new_budget = round(current_budget - actual_cost, ndigits=6)
-
-                # Update the budget
-                update_stmt = update(User).where(User.id == user_id).values(budget=new_budget, updated=func.now()).returning(User.budget)
-
-                await postgres_session.execute(update_stmt)
+    # None means unlimited budget
+    budget = request_context.get().user_info.budget
+    if budget is None or global_context.budget_manager is None:
+        return
 
-        except Exception as e:
-            logger.exception(f"Failed to update budget for user {user_id}: {e}")
-            return
+    await global_context.budget_manager.consume(user_id=usage.user_id, cost=usage.cost, budget=budget)
@@ -1,20 +1,32 @@
 from contextlib import asynccontextmanager
 
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.serializer import NdjsonSerializer, OrjsonSerializer
 from fastapi import FastAPI
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
 
+from api.clients.http import HttpClientPool
 from api.clients.parser import BaseParserClient as ParserClient
+from api.helpers._admissionqueue import AdmissionQueue
+from api.helpers._authcache import AuthCache
+from api.helpers._basevectorstore import BaseVectorStore
+from api.helpers._budgetmanager import BudgetManager
+from api.helpers._documentcache import DocumentCache
 from api.helpers._documentmanager import DocumentManager
 from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.helpers._identityaccessmanager import IdentityAccessManager
+from api.helpers._ingestionworker import IngestionWorker
 from api.helpers._limiter import Limiter
+from api.helpers._localvectorstore import LocalVectorStore
 from api.helpers._parsermanager import ParserManager
+from api.helpers._routingresultsubscriber import RoutingResultSubscriber
 from api.helpers._usagemanager import UsageManager
 from api.helpers._usagetokenizer import UsageTokenizer
+from api.helpers._usagewriter import UsageWriter
 from api.helpers.models import ModelRegistry
-from api.schemas.core.configuration import Configuration
+from api.schemas.core.configuration import Configuration, QueuingStrategy
 from api.utils.configuration import get_configuration
 from api.utils.context import global_context
 from api.utils.exceptions import RouterNotFoundException
@@ -27,23 +39,62 @@ logger = init_logger(name=__name__)
 async def lifespan(app: FastAPI):
     configuration = get_configuration()
 
+    global_context.http_client_pool = create_http_client_pool(configuration)
     global_context.redis_pool = await create_redis_pool(configuration)
     global_context.elasticsearch_client = await create_elasticsearch_client(configuration)
     global_context.postgres_engine, global_context.postgres_session_factory = create_postgres_session_factory(configuration)
-    global_context.model_registry = await create_model_registry(configuration, global_context.postgres_session_factory)
-    global_context.elasticsearch_vector_store = await create_elasticsearch_vector_store(configuration, global_context.elasticsearch_client, global_context.model_registry, global_context.postgres_session_factory)  # fmt: off
+    global_context.routing_result_subscriber = await create_routing_result_subscriber(configuration, global_context.redis_pool)
+    global_context.admission_queue = await create_admission_queue(configuration, global_context.redis_pool)
+    global_context.model_registry = await create_model_registry(configuration, global_context.postgres_session_factory, global_context.redis_pool)
+    global_context.vector_store = await create_vector_store(configuration, global_context.elasticsearch_client, global_context.model_registry, global_context.postgres_session_factory)  # fmt: off
     global_context.usage_manager = create_usage_manager()
+    global_context.usage_writer = create_usage_writer(configuration, global_context.postgres_session_factory)
 
     global_context.identity_access_manager = create_identity_access_manager(configuration=configuration)
+    global_context.auth_cache = await create_auth_cache(configuration, global_context.postgres_session_factory, global_context.redis_pool)
+    global_context.budget_manager = create_budget_manager(configuration, global_context.redis_pool, global_context.postgres_session_factory)
     global_context.limiter = create_limiter(configuration=configuration, redis_pool=global_context.redis_pool)
     global_context.tokenizer = create_tokenizer(configuration=configuration)
     global_context.parser = await create_parser(configuration=configuration)
-    global_context.document_manager = create_document_manager(configuration, elasticsearch_vector_store=global_context.elasticsearch_vector_store)
+    global_context.document_manager = create_document_manager(configuration, vector_store=global_context.vector_store, document_cache=await create_document_cache(configuration))  # fmt: off
+    global_context.ingestion_worker = create_ingestion_worker(configuration, global_context.postgres_session_factory, global_context.redis_pool, global_context.vector_store)  # fmt: off
 
     await global_context.limiter.reset()
 
     yield
 
+    if global_context.ingestion_worker:
+        await global_context.ingestion_worker.close()
+
+    if global_context.document_manager:
+        global_context.document_manager.parser_manager.close()
+        if global_context.document_manager.document_cache:
+            await global_context.document_manager.document_cache.close()
+
+    if global_context.vector_store:
+        await global_context.vector_store.close()
+
+    if global_context.model_registry:
+        await global_context.model_registry.routing_table.close()
+
+    if global_context.routing_result_subscriber:
+        await global_context.routing_result_subscriber.close()
+
+    if global_context.admission_queue:
+        await global_context.admission_queue.close()
+
+    if global_context.auth_cache:
+        await global_context.auth_cache.close()
+
+    if global_context.usage_writer:
+        await global_context.usage_writer.close()
+
+    if global_context.budget_manager:
+        await global_context.budget_manager.close()
+
+    if global_context.http_client_pool:
+        await global_context.http_client_pool.close()
+
     if global_context.elasticsearch_client:
         await global_context.elasticsearch_client.close()
 
@@ -54,6 +105,15 @@ async def lifespan(app: FastAPI):
         await global_context.postgres_engine.dispose()
 
 
+def create_http_client_pool(configuration: Configuration) -> HttpClientPool:
+    return HttpClientPool(
+        max_connections=configuration.settings.providers_max_connections,
+        max_keepalive_connections=configuration.settings.providers_max_keepalive_connections,
+        keepalive_expiry=configuration.settings.providers_keepalive_expiry,
+        http2=configuration.settings.providers_http2,
+    )
+
+
 async def create_redis_pool(configuration: Configuration) -> redis.ConnectionPool:
     pool = redis.ConnectionPool.from_url(**configuration.dependencies.redis.model_dump())
     pool.url = configuration.dependencies.redis.url
@@ -64,6 +124,12 @@ async def create_redis_pool(configuration: Configuration) -> redis.ConnectionPoo
     return pool
 
 
+class OrjsonNdjsonSerializer(NdjsonSerializer, OrjsonSerializer):
+    """
+    NDJSON serializer relying on orjson, used by the bulk requests.
+    """
+
+
 async def create_elasticsearch_client(configuration: Configuration) -> AsyncElasticsearch | None:
     if configuration.dependencies.elasticsearch is None:
         return None
@@ -74,7 +140,10 @@ async def create_elasticsearch_client(configuration: Configuration) -> AsyncElas
     kwargs.pop("number_of_shards")
     kwargs.pop("number_of_replicas")
 
-    client = AsyncElasticsearch(**kwargs)
+    # orjson serializes the embeddings float32 arrays without converting them to lists, for the search requests (JSON)
+    # and for the bulk indexing requests (NDJSON)
+    serializers = {OrjsonSerializer.mimetype: OrjsonSerializer(), OrjsonNdjsonSerializer.mimetype: OrjsonNdjsonSerializer()}
+    client = AsyncElasticsearch(**kwargs, serializers=serializers)
     if not await client.ping():
         await client.close()
         raise RuntimeError("Elasticsearch database is not reachable.")
@@ -83,34 +152,63 @@ async def create_elasticsearch_client(configuration: Configuration) -> AsyncElas
 
 def create_postgres_session_factory(configuration: Configuration) -> tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
     engine = create_async_engine(**configuration.dependencies.postgres.model_dump())
-    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # dedicated sync session class to listen only the API sessions (see RoutingTable.watch)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, sync_session_class=sessionmaker())
     return engine, session_factory
 
 
+async def create_routing_result_subscriber(configuration: Configuration, redis_pool: redis.ConnectionPool) -> RoutingResultSubscriber | None:
+    if configuration.dependencies.celery is None or configuration.settings.routing_queuing_strategy != QueuingStrategy.CELERY:
+        return None
+
+    subscriber = RoutingResultSubscriber()
+    await subscriber.setup(redis_pool=redis_pool)
+    return subscriber
+
+
+async def create_admission_queue(configuration: Configuration, redis_pool: redis.ConnectionPool) -> AdmissionQueue | None:
+    if configuration.settings.routing_queuing_strategy != QueuingStrategy.REDIS:
+        return None
+
+    admission_queue = AdmissionQueue(
+        max_priority=configuration.settings.routing_max_priority,
+        max_retries=configuration.settings.routing_max_retries,
+        retry_countdown=configuration.settings.routing_retry_countdown,
+    )
+    await admission_queue.setup(redis_pool=redis_pool)
+    return admission_queue
+
+
 async def create_model_registry(
     configuration: Configuration,
     session_factory: async_sessionmaker,
+    redis_pool: redis.ConnectionPool,
 ) -> ModelRegistry:
-    queuing_enabled = configuration.dependencies.celery is not None
+    queuing_enabled = configuration.dependencies.celery is not None and configuration.settings.routing_queuing_strategy == QueuingStrategy.CELERY
     registry = ModelRegistry(
         app_title=configuration.settings.app_title,
         queuing_enabled=queuing_enabled,
         max_priority=configuration.settings.routing_max_priority,
         max_retries=configuration.settings.routing_max_retries,
         retry_countdown=configuration.settings.routing_retry_countdown,
+        routing_table_ttl=configuration.settings.routing_cache_ttl,
     )
+    registry.routing_table.watch(session_factory=session_factory)
+    await registry.routing_table.setup(redis_pool=redis_pool)
     async with session_factory() as session:
         await registry.setup(models=configuration.models, postgres_session=session)
     return registry
 
 
-async def create_elasticsearch_vector_store(
+async def create_vector_store(
     configuration: Configuration,
-    elasticsearch_client: AsyncElasticsearch,
+    elasticsearch_client: AsyncElasticsearch | None,
     model_registry: ModelRegistry,
     session_factory: async_sessionmaker,
-) -> ElasticsearchVectorStore | None:
-    if configuration.dependencies.elasticsearch is None or configuration.settings.vector_store_model is None:
+) -> BaseVectorStore | None:
+    if configuration.settings.vector_store_model is None:
+        return None
+    if configuration.dependencies.elasticsearch is None and configuration.dependencies.local_vector_store is None:
         return None
 
     async with session_factory() as session:
@@ -127,15 +225,26 @@ async def create_elasticsearch_vector_store(
     if vector_size is None:
         raise RuntimeError("Vector size is None (no provider for this model).")
 
-    es_config = configuration.dependencies.elasticsearch
-    vector_store = ElasticsearchVectorStore(index_name=es_config.index_name)
-    await vector_store.setup(
-        client=elasticsearch_client,
-        index_language=es_config.index_language,
-        number_of_shards=es_config.number_of_shards,
-        number_of_replicas=es_config.number_of_replicas,
-        vector_size=vector_size,
-    )
+    if configuration.dependencies.local_vector_store is not None:
+        local_config = configuration.dependencies.local_vector_store
+        vector_store = LocalVectorStore(
+            directory=local_config.directory,
+            hnsw_threshold=local_config.hnsw_threshold,
+            hnsw_m=local_config.hnsw_m,
+            hnsw_ef_construction=local_config.hnsw_ef_construction,
+            hnsw_ef_search=local_config.hnsw_ef_search,
+        )
+        await vector_store.setup(client=None, vector_size=vector_size)
+    else:
+        es_config = configuration.dependencies.elasticsearch
+        vector_store = ElasticsearchVectorStore(index_name=es_config.index_name)
+        await vector_store.setup(
+            client=elasticsearch_client,
+            index_language=es_config.index_language,
+            number_of_shards=es_config.number_of_shards,
+            number_of_replicas=es_config.number_of_replicas,
+            vector_size=vector_size,
+        )
     return vector_store
 
 
@@ -143,6 +252,21 @@ def create_usage_manager() -> UsageManager:
     return UsageManager()
 
 
+def create_usage_writer(configuration: Configuration, session_factory: async_sessionmaker) -> UsageWriter | None:
+    if not configuration.settings.monitoring_postgres_enabled:
+        return None
+
+    usage_writer = UsageWriter(
+        session_factory=session_factory,
+        queue_size=configuration.settings.monitoring_postgres_queue_size,
+        batch_size=configuration.settings.monitoring_postgres_batch_size,
+        flush_interval=configuration.settings.monitoring_postgres_flush_interval,
+        spill_directory=configuration.settings.monitoring_postgres_spill_directory,
+    )
+    usage_writer.setup()
+    return usage_writer
+
+
 def create_identity_access_manager(configuration: Configuration) -> IdentityAccessManager:
     return IdentityAccessManager(
         master_key=configuration.settings.auth_master_key,
@@ -151,6 +275,27 @@ def create_identity_access_manager(configuration: Configuration) -> IdentityAcce
     )
 
 
+async def create_auth_cache(configuration: Configuration, session_factory: async_sessionmaker, redis_pool: redis.ConnectionPool) -> AuthCache:
+    auth_cache = AuthCache(
+        ttl=configuration.settings.auth_cache_ttl,
+        local_ttl=configuration.settings.auth_cache_local_ttl,
+        max_size=configuration.settings.auth_cache_max_size,
+    )
+    auth_cache.watch(session_factory=session_factory)
+    await auth_cache.setup(redis_pool=redis_pool)
+    return auth_cache
+
+
+def create_budget_manager(configuration: Configuration, redis_pool: redis.ConnectionPool, session_factory: async_sessionmaker) -> BudgetManager:
+    budget_manager = BudgetManager(
+        redis_pool=redis_pool,
+        session_factory=session_factory,
+        reconciliation_interval=configuration.settings.budget_reconciliation_interval,
+    )
+    budget_manager.setup()
+    return budget_manager
+
+
 def create_limiter(configuration: Configuration, redis_pool: redis.ConnectionPool) -> Limiter:
     return Limiter(redis_pool=redis_pool, strategy=configuration.settings.rate_limiting_strategy)
 
@@ -170,6 +315,58 @@ async def create_parser(configuration: Configuration) -> ParserClient | None:
     return parser
 
 
-def create_document_manager(configuration: Configuration, elasticsearch_vector_store: ElasticsearchVectorStore | None) -> DocumentManager | None:
-    parser_manager = ParserManager(max_concurrent=configuration.settings.document_parsing_max_concurrent)
-    return DocumentManager(vector_store_model=configuration.settings.vector_store_model, parser_manager=parser_manager)
+async def create_document_cache(configuration: Configuration) -> DocumentCache | None:
+    if configuration.dependencies.document_cache is None or configuration.settings.document_cache_ttl == 0:
+        return None
+
+    pool = redis.ConnectionPool.from_url(**configuration.dependencies.document_cache.model_dump(exclude={"max_memory"}))
+    document_cache = DocumentCache(
+        redis_pool=pool,
+        ttl=configuration.settings.document_cache_ttl,
+        max_size=configuration.settings.document_cache_max_size,
+        max_memory=configuration.dependencies.document_cache.max_memory,
+        local_ttl=configuration.settings.search_query_cache_local_ttl,
+        local_max_size=configuration.settings.search_query_cache_max_size,
+    )
+    await document_cache.setup()
+    return document_cache
+
+
+def create_document_manager(
+    configuration: Configuration, vector_store: BaseVectorStore | None, document_cache: DocumentCache | None
+) -> DocumentManager | None:
+    parser_manager = ParserManager(
+        max_concurrent=configuration.settings.document_parsing_max_concurrent,
+        processes=configuration.settings.document_parsing_processes,
+        pages_per_task=configuration.settings.document_parsing_pages_per_task,
+        timeout=configuration.settings.document_parsing_timeout,
+        max_memory=configuration.settings.document_parsing_max_memory,
+        spool_directory=configuration.settings.document_parsing_spool_directory,
+    )
+    parser_manager.setup()
+    return DocumentManager(
+        vector_store_model=configuration.settings.vector_store_model,
+        parser_manager=parser_manager,
+        document_cache=document_cache,
+    )
+
+
+def create_ingestion_worker(
+    configuration: Configuration,
+    session_factory: async_sessionmaker,
+    redis_pool: redis.ConnectionPool,
+    vector_store: BaseVectorStore | None,
+) -> IngestionWorker | None:
+    if vector_store is None or configuration.settings.document_ingestion_workers == 0:
+        return None
+
+    ingestion_worker = IngestionWorker(
+        session_factory=session_factory,
+        redis_pool=redis_pool,
+        directory=configuration.settings.document_ingestion_directory,
+        concurrency=configuration.settings.document_ingestion_workers,
+        max_retries=configuration.settings.document_ingestion_max_retries,
+        timeout=configuration.settings.document_ingestion_timeout,
+    )
+    ingestion_worker.setup()
+    return ingestion_worker
@@ -1,5 +1,7 @@
 import asyncio
 import logging
+from typing import TYPE_CHECKING
+from uuid import uuid4
 
 from celery.result import AsyncResult
 from redis.asyncio import Redis as AsyncRedis
@@ -13,6 +15,9 @@ from api.utils.exceptions import ModelIsTooBusyException, TaskFailedException
 from api.utils.load_balancing import apply_async_load_balancing
 from api.utils.qos import apply_async_qos_policy
 
+if TYPE_CHECKING:
+    from api.helpers._routingresultsubscriber import RoutingResultSubscriber
+
 logger = logging.getLogger(__name__)
 
 
@@ -61,78 +66,90 @@ async def apply_routing_with_queuing(
     max_retries: int,
     queue_name: str,
     priority: int,
+    result_subscriber: "RoutingResultSubscriber | None" = None,
 ) -> int:
     candidates = [(provider.id, provider.qos_metric, provider.qos_limit) for provider in providers]
 
-    queue_obj = create_model_queue(queue_name)
-    task = apply_routing.apply_async(
-        args=[
-            candidates,  # candidates
-            load_balancing_strategy,  # load_balancing_strategy
-            load_balancing_metric,  # load_balancing_metric
-            retry_countdown,  # task_retry_countdown
-            max_retries,  # task_max_retries
-        ],
-        queue=queue_name,
-        priority=priority,
-        declare=[queue_obj],
-    )
-
-    async_result = AsyncResult(id=task.id, app=app)
-    initial_state = async_result.state
-    logger.info(f"Task {task.id} sent to queue '{queue_name}', initial state: {initial_state}, waiting for result...")
-
-    loop = asyncio.get_event_loop()
-    start_time = loop.time()
-
-    task_interval = 0.1  # polling interval to check if the task is ready
-    task_timeout = 0.2  # estimed task execution time
-    max_wait_time = max_retries * (retry_countdown + task_timeout)
-    logger.debug(f"Task {task.id}: Polling for result (max wait: {max_wait_time}s, interval: {task_interval}s)")
-
-    poll_count = 0
-    last_state = initial_state
-    while not async_result.ready():
-        elapsed = loop.time() - start_time
-        current_state = async_result.state
-
-        # Log state changes
-        if current_state != last_state:
-            logger.info(f"Task {task.id}: State changed from {last_state} to {current_state} (elapsed: {elapsed:.2f}s)")
-            last_state = current_state
+    # the result is awaited on the reply channel of the worker, the result backend is only polled as fallback
+    task_id = str(uuid4())
+    future = result_subscriber.register(task_id=task_id) if result_subscriber is not None else None
 
-        if elapsed > max_wait_time:
-            logger.error(f"Task {task.id}: Timeout after {elapsed:.2f}s (state: {current_state})")
-            # Try to get more info about the task
-            try:
-                info = async_result.info
-                logger.error(f"Task {task.id}: Info={info}")
-            except Exception as e:
-                logger.error(f"Task {task.id}: Could not get task info: {e}")
-            raise ModelIsTooBusyException(detail=f"Model is too busy after {max_wait_time} seconds")
-
-        poll_count += 1
-        if poll_count % 10 == 0:  # Log every second (10 * 0.1s)
-            logger.debug(f"Task {task.id}: Still waiting... (elapsed: {elapsed:.2f}s, state: {current_state})")
+    try:
+        queue_obj = create_model_queue(queue_name)
+        apply_routing.apply_async(
+            args=[
+                candidates,  # candidates
+                load_balancing_strategy,  # load_balancing_strategy
+                load_balancing_metric,  # load_balancing_metric
+                retry_countdown,  # task_retry_countdown
+                max_retries,  # task_max_retries
+            ],
+            kwargs={"reply_channel": result_subscriber.channel if result_subscriber is not None else None},
+            task_id=task_id,
+            queue=queue_name,
+            priority=priority,
+            declare=[queue_obj],
+        )
+        logger.info(f"Task {task_id} sent to queue '{queue_name}', waiting for result...")
 
-        await asyncio.sleep(task_interval)
+        result = await _wait_routing_result(task_id=task_id, future=future, max_retries=max_retries, retry_countdown=retry_countdown)
+    finally:
+        if result_subscriber is not None:
+            result_subscriber.discard(task_id=task_id)
 
     try:
-        state = async_result.state
-        logger.info(f"Task {task.id}: Completed with state={state}")
-        result = async_result.result  # direct access is safe after ready() returns True
-        logger.debug(f"Task {task.id}: Result={result}")
+        logger.debug(f"Task {task_id}: Result={result}")
 
         if result["status_code"] != 200:
-            logger.error(f"Task {task.id}: Failed with status_code={result["status_code"]}, detail={result.get("body", {}).get("detail", "N/A")}")
+            logger.error(f"Task {task_id}: Failed with status_code={result["status_code"]}, detail={result.get("body", {}).get("detail", "N/A")}")
             raise TaskFailedException(status_code=result["status_code"], detail=result["body"]["detail"])
         provider_id = result["provider_id"]
-        logger.info(f"Task {task.id}: Successfully returned provider_id={provider_id}")
+        logger.info(f"Task {task_id}: Successfully returned provider_id={provider_id}")
 
     except TaskFailedException:
         raise
     except Exception as e:
-        logger.error(f"Task {task.id}: Error retrieving result: {e}", exc_info=True)
+        logger.error(f"Task {task_id}: Error retrieving result: {e}", exc_info=True)
         raise TaskFailedException(status_code=500, detail=str(e))
 
     return provider_id
+
+
+async def _wait_routing_result(task_id: str, future: asyncio.Future | None, max_retries: int, retry_countdown: int) -> dict:
+    """
+    Wait for the result of a routing task, notified on the future or polled from the result backend.
+
+    Args:
+        task_id(str): The ID of the routing task
+        future(asyncio.Future | None): The future resolved with the result by the routing result subscriber, if None the result backend is polled
+        max_retries(int): The maximum number of retries of the task
+        retry_countdown(int): The countdown between two retries of the task
+    """
+    async_result = AsyncResult(id=task_id, app=app)
+
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+
+    # backend calls are blocking, they are run in a thread and spaced out when the result is notified
+    task_interval = 1.0 if future is not None else 0.1  # polling interval to check if the task is ready
+    task_timeout = 0.2  # estimed task execution time
+    max_wait_time = max_retries * (retry_countdown + task_timeout)
+    logger.debug(f"Task {task_id}: Waiting for result (max wait: {max_wait_time}s, polling interval: {task_interval}s)")
+
+    while True:
+        if future is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=task_interval)
+            except TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(task_interval)
+
+        if await asyncio.to_thread(async_result.ready):
+            logger.debug(f"Task {task_id}: Result retrieved from the result backend")
+            return await asyncio.to_thread(lambda: async_result.result)  # direct access is safe after ready() returns True
+
+        elapsed = loop.time() - start_time
+        if elapsed > max_wait_time:
+            logger.error(f"Task {task_id}: Timeout after {elapsed:.2f}s")
+            raise ModelIsTooBusyException(detail=f"Model is too busy after {max_wait_time} seconds")
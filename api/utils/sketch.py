@@ -0,0 +1,93 @@
+"""
+Quantile sketches of the provider performance metrics, stored in Redis.
+
+Each sample is counted in a logarithmic bucket (DDSketch), so a quantile is estimated with a relative error of at most
+`SKETCH_RELATIVE_ACCURACY` from a bounded number of buckets, whatever the number of samples. Buckets are stored in one
+Redis hash per provider and per slot of `SKETCH_SLOT_SECONDS` seconds, and the slots older than the retention window
+expire, so the quantile is computed over the same window as the metric time series.
+"""
+
+import math
+import time
+
+from api.utils.variables import PREFIX__REDIS_METRIC_SKETCH, REDIS__TIMESERIE_RETENTION_SECONDS
+
+SKETCH_RELATIVE_ACCURACY = 0.02
+SKETCH_SLOT_SECONDS = 20
+
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def get_sketch_key(metric: str, provider_id: int, slot: int) -> str:
+    return f"{PREFIX__REDIS_METRIC_SKETCH}:{metric}:{provider_id}:{slot}"
+
+
+def get_sketch_keys(metric: str, provider_id: int, now: float | None = None) -> list[str]:
+    """
+    Get the keys of the slots of a sketch covering the retention window.
+
+    Args:
+        metric(str): The metric name
+        provider_id(int): The provider ID
+        now(float | None): The current timestamp in seconds, defaults to the current time
+    """
+    now = time.time() if now is None else now
+    first_slot = int((now - REDIS__TIMESERIE_RETENTION_SECONDS) // SKETCH_SLOT_SECONDS)
+    last_slot = int(now // SKETCH_SLOT_SECONDS)
+
+    return [get_sketch_key(metric=metric, provider_id=provider_id, slot=slot) for slot in range(first_slot, last_slot + 1)]
+
+
+def get_sketch_bucket(value: float) -> int:
+    """
+    Get the bucket of a value, values lower than 1 are counted in the bucket of 1.
+    """
+    return math.ceil(math.log(max(value, 1)) / _LOG_GAMMA)
+
+
+def add_to_sketch(redis_client, metric: str, provider_id: int, value: float) -> None:
+    """
+    Queue the commands adding a sample to a sketch on a Redis pipeline.
+
+    Args:
+        redis_client: The Redis pipeline
+        metric(str): The metric name
+        provider_id(int): The provider ID
+        value(float): The sample value
+    """
+    key = get_sketch_key(metric=metric, provider_id=provider_id, slot=int(time.time() // SKETCH_SLOT_SECONDS))
+    redis_client.hincrby(key, get_sketch_bucket(value=value), 1)
+    redis_client.expire(key, REDIS__TIMESERIE_RETENTION_SECONDS + SKETCH_SLOT_SECONDS)
+
+
+def get_sketch_quantile(slots: list[dict], quantile: float) -> float | None:
+    """
+    Estimate a quantile from the buckets of the slots of a sketch, as returned by HGETALL.
+
+    Args:
+        slots(list[dict]): The buckets (bucket -> count) of each slot
+        quantile(float): The quantile to estimate, between 0 and 1
+
+    Returns:
+        float | None: The estimated quantile, None if the sketch is empty.
+    """
+    counts = {}
+    for buckets in slots:
+        for bucket, count in buckets.items():
+            bucket = int(bucket)
+            counts[bucket] = counts.get(bucket, 0) + int(count)
+
+    total = sum(counts.values())
+    if total == 0:
+        return None
+
+    # same rank as the sorted samples percentile
+    rank = max(1, math.ceil(quantile * total))
+    cumulative = 0
+    for bucket in sorted(counts):
+        cumulative += counts[bucket]
+        if cumulative >= rank:
+            break
+
+    return 2 * _GAMMA**bucket / (_GAMMA + 1)
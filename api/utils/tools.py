@@ -6,8 +6,8 @@ from pydantic import TypeAdapter
 from redis.asyncio import Redis as AsyncRedis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.helpers._basevectorstore import BaseVectorStore
 from api.helpers._documentmanager import DocumentManager
-from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
 from api.helpers.models import ModelRegistry
 from api.schemas.core.context import RequestContext
 from api.schemas.core.models import RequestContent
@@ -45,7 +45,7 @@ Output Format:
         model_registry: ModelRegistry,
         request_context: ContextVar[RequestContext],
         document_manager: DocumentManager,
-        elasticsearch_vector_store: ElasticsearchVectorStore | None,
+        vector_store: BaseVectorStore | None,
         elasticsearch_client: AsyncElasticsearch | None,
     ) -> RequestContent:
         tools = request_content.body.get("tools", [])
@@ -71,7 +71,7 @@ Output Format:
         if not query:
             return request_content
 
-        if elasticsearch_vector_store is None or elasticsearch_client is None:
+        if vector_store is None:
             raise FeatureNotEnabledException(detail="Search build-in tool is not enabled, please contact an administrator.")
 
         metadata_filters = TypeAdapter(ComparisonFilter | CompoundFilter | None).validate_python(search_tool.get("metadata_filters"))
@@ -88,7 +88,7 @@ Output Format:
             metadata_filters=metadata_filters,
             model_registry=model_registry,
             request_context=request_context,
-            elasticsearch_vector_store=elasticsearch_vector_store,
+            vector_store=vector_store,
             elasticsearch_client=elasticsearch_client,
             postgres_session=postgres_session,
             redis_client=redis_client,
@@ -4,9 +4,20 @@ DEFAULT_APP_NAME = "OpenGateLLM"
 DEFAULT_TIMEOUT = 300
 
 PREFIX__CELERY_QUEUE_ROUTING = "ogl_qr"
+PREFIX__CELERY_ROUTING_RESULT = "ogl_rr"
+PREFIX__REDIS_ADMISSION_QUEUE = "ogl_aq"
+PREFIX__REDIS_AUTH_CACHE = "ogl_au"
+PREFIX__REDIS_BUDGET = "ogl_bg"
+PREFIX__REDIS_DOCUMENT_CACHE = "ogl_dc"
 PREFIX__REDIS_METRIC_GAUGE = "ogl_mg"
+PREFIX__REDIS_METRIC_SKETCH = "ogl_sk"
 PREFIX__REDIS_METRIC_TIMESERIE = "ogl_ts"
 PREFIX__REDIS_RATE_LIMIT = "ogl_rt"
+REDIS__ADMISSION_CHANNEL = "ogl_ac"
+REDIS__AUTH_CACHE_VERSION = "ogl_av"
+REDIS__BUDGET_DIRTY_USERS = "ogl_bd"
+REDIS__BUDGET_RECONCILIATION_LOCK = "ogl_bl"
+REDIS__ROUTING_TABLE_VERSION = "ogl_rv"
 REDIS__TIMESERIE_RETENTION_SECONDS = 120
 
 
@@ -0,0 +1,48 @@
+"""
+Set the owner and the visibility of the collections on their chunks indexed in Elasticsearch without them (before these
+fields were added) or with stale ones (the update of the chunks failed after a visibility change), so they are found by
+the searches without requested collections. The chunks of deleted collections are deleted.
+
+Run once after upgrading, once the API has been started with the new version (the fields are added to the index mapping
+at startup), and to repair the visibility of the chunks, with the configuration file of the API (CONFIG_FILE environment
+variable):
+
+    make sync-collection-chunks
+"""
+
+import asyncio
+import logging
+
+from api.helpers._documentmanager import DocumentManager
+from api.helpers._elasticsearchvectorstore import ElasticsearchVectorStore
+from api.utils.configuration import configuration
+from api.utils.lifespan import create_elasticsearch_client, create_postgres_session_factory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    elasticsearch_client = await create_elasticsearch_client(configuration=configuration)
+    if elasticsearch_client is None:
+        logger.info("Elasticsearch is not configured, nothing to synchronize.")
+        return
+
+    index_name = configuration.dependencies.elasticsearch.index_name
+    engine, session_factory = create_postgres_session_factory(configuration=configuration)
+    try:
+        mapping = await elasticsearch_client.indices.get_mapping(index=index_name)
+        if "user_id" not in mapping[index_name]["mappings"]["properties"]:
+            raise RuntimeError(f"Index {index_name} has no owner field, start the API once to update its mapping.")
+
+        vector_store = ElasticsearchVectorStore(index_name=index_name)
+        async with session_factory() as session:
+            await DocumentManager.sync_collection_chunks(postgres_session=session, vector_store=vector_store, elasticsearch_client=elasticsearch_client)  # fmt: off
+        logger.info("The chunks have the owner and the visibility of their collection.")
+    finally:
+        await elasticsearch_client.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())